@@ -8,7 +8,9 @@ class ApiConfig(AppConfig):
     def ready(self):
         """
         S'executa quan l'aplicació està llesta.
-        Inicialitza Firebase Admin SDK.
+        Inicialitza Firebase Admin SDK i la comptabilitat de cost de les peticions.
         """
         from .firebase_config import initialize_firebase
+        from .utils.request_cost import install_firestore_instrumentation
         initialize_firebase()
+        install_firestore_instrumentation()
@@ -5,6 +5,7 @@ import logging
 from rest_framework import authentication
 from rest_framework import exceptions
 from firebase_admin import auth
+from .services.token_cache_service import token_cache_service
 
 logger = logging.getLogger(__name__)
 
@@ -47,7 +48,7 @@ class FirebaseAuthentication(authentication.BaseAuthentication):
         token = token_parts[1]
         
         try:
-            decoded_token = auth.verify_id_token(token)
+            decoded_token = token_cache_service.verify_id_token(token, auth.verify_id_token)
             
             # Crea un objecte d'usuari amb la informació del token
             user = type('FirebaseUser', (), {
@@ -126,7 +126,8 @@ class DoubtController:
                 'creator_uid': creator_uid,
                 'message': message,
                 'created_at': created_at,
-                'parent_answer_id': parent_answer_id
+                'parent_answer_id': parent_answer_id,
+                'refuge_id': doubt.refuge_id  # Desnormalitzat per a la consulta collection_group
             }
             
             # Crear la resposta a Firestore
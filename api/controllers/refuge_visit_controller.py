@@ -1,19 +1,28 @@
 """
 Controller per a la gestió de visites a refugis
 """
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Optional, Dict, Any, Tuple
-from datetime import date
+from datetime import date, timedelta
 from ..daos.refuge_visit_dao import RefugeVisitDAO
 from ..daos.refugi_lliure_dao import RefugiLliureDAO
+from ..daos.user_dao import UserDAO
 from ..mappers.refuge_visit_mapper import RefugeVisitMapper
 from ..models.refuge_visit import RefugeVisit, UserVisit
-from ..controllers.user_controller import UserController
 from ..utils.timezone_utils import get_madrid_today
+from ..utils.request_cost import submit_with_context
 
 logger = logging.getLogger(__name__)
 
 
+def _chunk_dict(data: Dict[str, set], size: int) -> List[Dict[str, List[str]]]:
+    """Divideix un diccionari en fragments de com a màxim size entrades (una operació per entrada)"""
+    items = [(key, sorted(values)) for key, values in data.items()]
+    return [dict(items[k:k + size]) for k in range(0, len(items), size)]
+
+
 class RefugeVisitController:
     """Controller per gestionar operacions de visites a refugis"""
     
@@ -21,8 +30,8 @@ class RefugeVisitController:
         """Inicialitza el controller"""
         self.visit_dao = RefugeVisitDAO()
         self.refuge_dao = RefugiLliureDAO()
+        self.user_dao = UserDAO()
         self.mapper = RefugeVisitMapper()
-        self.user_controller = UserController()
     
     def get_refuge_visits(self, refuge_id: str) -> tuple[bool, List[RefugeVisit], Optional[str]]:
         """
@@ -239,78 +248,102 @@ class RefugeVisitController:
             logger.error(f"Error en delete_visit: {str(e)}")
             return False, f"Error intern: {str(e)}"
     
-    def process_yesterday_visits(self) -> tuple[bool, Dict[str, Any], Optional[str]]:
+    # Límit d'operacions d'un WriteBatch de Firestore
+    WRITE_BATCH_LIMIT = 500
+    DEFAULT_PROCESS_WORKERS = 4
+    
+    def process_yesterday_visits(
+        self,
+        target_date: Optional[str] = None,
+        batch_size: int = WRITE_BATCH_LIMIT,
+        workers: int = DEFAULT_PROCESS_WORKERS
+    ) -> tuple[bool, Dict[str, Any], Optional[str]]:
         """
-        Processa les visites d'ahir:
-        - Afegeix els visitants a la llista de visitors del refugi
-        - Elimina els documents de visita si estan buits (total_visitors=0 i visitors=[])
+        Processa les visites d'ahir (o d'una data concreta) en tres fases:
+        - Lectura: obté totes les visites de la data amb una sola consulta
+        - Agrupació: fusiona en memòria els visitants per refugi i els refugis per usuari
+        - Escriptura: aplica els canvis amb WriteBatches (ArrayUnion) en paral·lel:
+          afegeix els visitants als refugis, els refugis existents als visitats dels usuaris
+          i elimina les visites buides (total_visitors=0 i visitors=[])
+        
+        Args:
+            target_date: Data a processar (YYYY-MM-DD). Per defecte, ahir
+            batch_size: Nombre màxim d'operacions per WriteBatch (màxim 500)
+            workers: Nombre màxim de batches aplicats en paral·lel
         
         Returns:
-            tuple: (success, stats_dict, error_message)
+            tuple: (success, stats_dict, error_message). stats_dict inclou 'timings' amb els segons de cada fase
         """
         try:
-            from datetime import timedelta
-            
-            # Calcula la data d'ahir
-            today = get_madrid_today()
-            yesterday = today - timedelta(days=1)
-            yesterday_str = yesterday.isoformat()
-            
-            # Obté totes les visites d'ahir
-            visits = self.visit_dao.get_visits_by_date(yesterday_str)
-            
-            stats = {
-                'processed_visits': 0,
-                'deleted_visits': 0,
-                'updated_refuges': 0,
-                'total_visitors_added': 0
-            }
-            
+            timings = {}
+            started_at = time.perf_counter()
+            
+            if target_date is None:
+                # Calcula la data d'ahir
+                target_date = (get_madrid_today() - timedelta(days=1)).isoformat()
+            batch_size = max(1, min(batch_size, self.WRITE_BATCH_LIMIT))
+            workers = max(1, workers)
+            
+            # Fase 1: obté totes les visites de la data
+            phase_started_at = time.perf_counter()
+            visits = self.visit_dao.get_visits_by_date(target_date)
+            timings['load'] = round(time.perf_counter() - phase_started_at, 3)
+            
+            # Fase 2: agrupa i fusiona els visitants en memòria
+            phase_started_at = time.perf_counter()
+            empty_visits = []
+            visitors_by_refuge: Dict[str, set] = {}
             for visit_id, visit in visits:
-                stats['processed_visits'] += 1
-                
-                # Si la visita està buida, elimina-la
                 if visit.total_visitors == 0 and not visit.visitors:
-                    self.visit_dao.delete_visit(visit_id)
-                    stats['deleted_visits'] += 1
-                    logger.info(f"Visita buida eliminada: {visit_id}")
+                    empty_visits.append((visit_id, visit.refuge_id))
                     continue
+                for visitor in visit.visitors or []:
+                    visitors_by_refuge.setdefault(visit.refuge_id, set()).add(visitor.uid)
+            timings['merge'] = round(time.perf_counter() - phase_started_at, 3)
+            
+            # Fase 3: aplica els canvis amb WriteBatches independents en paral·lel.
+            # Els usuaris s'actualitzen després dels refugis: només reben els refugis que existeixen
+            phase_started_at = time.perf_counter()
+            results = {'refuges': [], 'users': [], 'deleted': []}
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                self._apply_batches(executor, results, (
+                    [('refuges', self.refuge_dao.add_visitors_to_refugis, chunk) for chunk in _chunk_dict(visitors_by_refuge, batch_size)]
+                    + [('deleted', self.visit_dao.delete_visits, empty_visits[k:k + batch_size]) for k in range(0, len(empty_visits), batch_size)]
+                ))
                 
-                # Afegeix els visitants al refugi
-                if visit.visitors:
-                    # Obté el refugi
-                    refuge = self.refuge_dao.get_by_id(visit.refuge_id)
-                    if not refuge:
-                        logger.warning(f"Refugi no trobat: {visit.refuge_id}")
-                        continue
-                    
-                    # Afegeix els UIDs a la llista de visitors del refugi
-                    existing_visitors = refuge.visitors if refuge.visitors else []
-                    new_visitors = [visitor.uid for visitor in visit.visitors]
-                    
-                    # Afegeix només els nous UIDs (evita duplicats)
-                    updated_visitors = list(set(existing_visitors + new_visitors))
-                    
-                    # Actualitza el refugi
-                    success = self.refuge_dao.update_refugi_visitors(visit.refuge_id, updated_visitors)
-                    if success:
-                        stats['updated_refuges'] += 1
-                        stats['total_visitors_added'] += len(new_visitors)
-                        logger.info(f"Refugi {visit.refuge_id} actualitzat amb {len(new_visitors)} visitants")
-                    else:
-                        logger.warning(f"Error actualitzant refugi: {visit.refuge_id}")
-
-                    # Afegeix el refuge_id a la llista de refugis visitats de cada usuari
-                    for visitor in visit.visitors:
-                        self.user_controller.add_refugi_visitat(visitor.uid, visit.refuge_id)
+                refuges_by_user: Dict[str, set] = {}
+                for refuge_id in results['refuges']:
+                    for uid in visitors_by_refuge[refuge_id]:
+                        refuges_by_user.setdefault(uid, set()).add(refuge_id)
+                self._apply_batches(executor, results, [
+                    ('users', self.user_dao.add_refugis_to_visited, chunk) for chunk in _chunk_dict(refuges_by_user, batch_size)
+                ])
+            timings['apply'] = round(time.perf_counter() - phase_started_at, 3)
+            timings['total'] = round(time.perf_counter() - started_at, 3)
             
-            logger.info(f"Visites d'ahir processades: {stats}")
+            stats = {
+                'processed_visits': len(visits),
+                'deleted_visits': len(results['deleted']),
+                'updated_refuges': len(results['refuges']),
+                'updated_users': len(results['users']),
+                'total_visitors_added': sum(len(visitors_by_refuge[refuge_id]) for refuge_id in results['refuges']),
+                'timings': timings
+            }
+            
+            logger.info(f"Visites del {target_date} processades: {stats}")
             return True, stats, None
             
         except Exception as e:
             logger.error(f"Error en process_yesterday_visits: {str(e)}")
             return False, {}, f"Error intern: {str(e)}"
     
+    @staticmethod
+    def _apply_batches(executor: ThreadPoolExecutor, results: Dict[str, list], jobs: List[tuple]) -> None:
+        """Executa en paral·lel els batches (tipus, funció, fragment) i acumula els resultats per tipus"""
+        futures = {submit_with_context(executor, apply_fn, chunk): kind for kind, apply_fn, chunk in jobs}
+        for future in as_completed(futures):
+            results[futures[future]].extend(future.result())
+    
     def remove_user_from_all_visits(self, uid: str) -> tuple[bool, Optional[str]]:
         """
         Elimina un usuari de visitors i decrementa total_visitors de totes les refuge_visits
@@ -2,10 +2,12 @@
 Controller per a la gestió de refugis
 """
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional, Tuple
 
 from api.models.media_metadata import RefugeMediaMetadata
 from api.utils.timezone_utils import get_madrid_now
+from api.utils.request_cost import submit_with_context
 from ..daos.refugi_lliure_dao import RefugiLliureDAO
 from ..daos.user_dao import UserDAO
 from ..models.refugi_lliure import Refugi, RefugiCoordinates, RefugiSearchFilters
@@ -16,6 +18,9 @@ logger = logging.getLogger(__name__)
 class RefugiLliureController:
     """Controller per a la gestió de refugis"""
     
+    # Nombre màxim de fitxers que es pugen a R2 en paral·lel en una petició
+    UPLOAD_MAX_WORKERS = 4
+    
     def __init__(self):
         self.refugi_dao = RefugiLliureDAO()
         self.user_dao = UserDAO()
@@ -58,15 +63,7 @@ class RefugiLliureController:
         """
         try:
             # Crear filtres de cerca des dels query_params validats
-            filters = RefugiSearchFilters(
-                name=query_params.get('name', '').strip() if isinstance(query_params.get('name', ''), str) else '',
-                type=query_params.get('type', []),
-                condition=query_params.get('condition', []),
-                places_min=query_params.get('places_min'),
-                places_max=query_params.get('places_max'),
-                altitude_min=query_params.get('altitude_min'),
-                altitude_max=query_params.get('altitude_max'),
-            )
+            filters = self._build_filters(query_params)
             
             # Obtenir dades del DAO (ja inclou models si cal)
             search_result = self.refugi_dao.search_refugis(filters)
@@ -97,6 +94,96 @@ class RefugiLliureController:
             logger.error(f'Error in search_refugis: {str(e)}')
             return None, f"Internal server error: {str(e)}"
     
+    def get_coordinates_changes(self, since: int) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Canvis del catàleg de coordenades des de la versió since (o el catàleg sencer si cal)
+        Returns: (Dades de resposta o None, missatge d'error o None)
+        """
+        try:
+            changes = self.refugi_dao.get_coordinates_changes(since)
+            if changes is None:
+                return None, "Refuge catalogue not available"
+            return changes, None
+        except Exception as e:
+            logger.error(f'Error in get_coordinates_changes: {str(e)}')
+            return None, f"Internal server error: {str(e)}"
+    
+    def get_clusters(self, zoom: int, bbox: List[float]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Agrupacions de refugis del mapa per al zoom i l'àrea visible
+        Returns: (Dades de resposta o None, missatge d'error o None)
+        """
+        try:
+            clusters = self.refugi_dao.get_clusters(zoom, bbox)
+            if clusters is None:
+                return None, "Refuge catalogue not available"
+            return clusters, None
+        except Exception as e:
+            logger.error(f'Error in get_clusters: {str(e)}')
+            return None, f"Internal server error: {str(e)}"
+    
+    def autocomplete(self, query: str, limit: int) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Suggeriments de refugis per a l'autocompletat del nom
+        Returns: (Dades de resposta o None, missatge d'error o None)
+        """
+        try:
+            results = self.refugi_dao.search_names(query, limit)
+            if results is None:
+                return None, "Refuge catalogue not available"
+            return {'query': query, 'count': len(results), 'results': results}, None
+        except Exception as e:
+            logger.error(f'Error in autocomplete: {str(e)}')
+            return None, f"Internal server error: {str(e)}"
+    
+    def get_catalogue_etag(self, query_params: Dict[str, Any]) -> Optional[str]:
+        """
+        ETag del catàleg de coordenades (cerca sense filtres)
+        Returns: ETag o None si la cerca té filtres o el catàleg no està disponible
+        """
+        try:
+            if self.refugi_dao._has_active_filters(self._build_filters(query_params)):
+                return None
+            return self.refugi_dao.get_coordinates_etag()
+        except Exception as e:
+            logger.error(f'Error in get_catalogue_etag: {str(e)}')
+            return None
+    
+    def get_refugi_etag(self, refuge_id: str, is_authenticated: bool) -> Optional[str]:
+        """
+        ETag del detall d'un refugi (la resposta pública i l'autenticada són variants diferents)
+        
+        La resposta autenticada inclou URLs prefirmades, que caduquen i es tornen a signar a cada
+        finestra de presigned_url_cache: la seva ETag inclou la finestra (un client no pot revalidar
+        URLs caducades) i és feble, perquè cada worker signa URLs diferents per al mateix document.
+        Returns: ETag o None si el refugi no existeix o no es pot obtenir
+        """
+        try:
+            if not is_authenticated:
+                return self.refugi_dao.get_etag(refuge_id, 'public')
+            window = r2_media_service.presigned_url_cache.current_window()
+            etag = self.refugi_dao.get_etag(refuge_id, f'auth-{window}')
+            return f'W/{etag}' if etag else None
+        except Exception as e:
+            logger.error(f'Error in get_refugi_etag: {str(e)}')
+            return None
+    
+    @staticmethod
+    def _build_filters(query_params: Dict[str, Any]) -> RefugiSearchFilters:
+        """Crea els filtres de cerca a partir dels query_params validats"""
+        return RefugiSearchFilters(
+            name=query_params.get('name', '').strip() if isinstance(query_params.get('name', ''), str) else '',
+            type=query_params.get('type', []),
+            condition=query_params.get('condition', []),
+            places_min=query_params.get('places_min'),
+            places_max=query_params.get('places_max'),
+            altitude_min=query_params.get('altitude_min'),
+            altitude_max=query_params.get('altitude_max'),
+            bbox=query_params.get('bbox'),
+            near=query_params.get('near'),
+            radius_km=query_params.get('radius_km'),
+        )
+    
 
     
     def health_check(self) -> Tuple[Dict[str, Any], Optional[str]]:
@@ -172,22 +259,15 @@ class RefugiLliureController:
             failed = []
             media_metadata_dict = {}
             
-            for file in files:
+            # Crear metadades del mitjà (la mateixa data per a tots els fitxers de la petició)
+            if uploaded_at is None:
+                uploaded_at = get_madrid_now().isoformat()
+            
+            # Pujar els fitxers en paral·lel i processar els resultats en l'ordre d'entrada
+            for file, result, upload_error in self._upload_files(refugi_id, files):
                 try:
-                    # Obtenir content type
-                    content_type = file.content_type
-                    
-                    # Pujar fitxer
-                    result = self.media_service.upload_file(
-                        file_content=file,
-                        entity_id=refugi_id,
-                        content_type=content_type,
-                        filename=file.name
-                    )
-                    
-                    # Crear metadades del mitjà
-                    if uploaded_at is None:
-                        uploaded_at = get_madrid_now().isoformat()
+                    if upload_error is not None:
+                        raise upload_error
                     
                     # Utilitzar la key com a clau del diccionari
                     key = result['key']
@@ -239,6 +319,35 @@ class RefugiLliureController:
             logger.error(f"Error pujant mitjans al refugi {refugi_id}: {str(e)}")
             return None, f"Internal server error: {str(e)}"
     
+    def _upload_files(self, refugi_id: str, files: List[Any]) -> List[Tuple[Any, Optional[Dict[str, str]], Optional[Exception]]]:
+        """
+        Puja els fitxers a R2 en paral·lel amb un pool de threads limitat
+        
+        Args:
+            refugi_id: ID del refugi
+            files: Llista de fitxers a pujar
+            
+        Returns: Llista de (fitxer, resultat de la pujada o None, excepció o None) en l'ordre d'entrada
+        """
+        def upload(file):
+            try:
+                result = self.media_service.upload_file(
+                    file_content=file,
+                    entity_id=refugi_id,
+                    content_type=file.content_type,
+                    filename=file.name
+                )
+                return file, result, None
+            except Exception as e:
+                return file, None, e
+        
+        if len(files) <= 1:
+            return [upload(file) for file in files]
+        
+        with ThreadPoolExecutor(max_workers=min(self.UPLOAD_MAX_WORKERS, len(files))) as executor:
+            futures = [submit_with_context(executor, upload, file) for file in files]
+            return [future.result() for future in futures]
+    
     def delete_refugi_media(self, refugi_id: str, media_key: str) -> Tuple[bool, Optional[str]]:
         """
         Elimina un mitjà d'un refugi
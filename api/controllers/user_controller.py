@@ -10,6 +10,7 @@ from ..daos.refugi_lliure_dao import RefugiLliureDAO
 from ..models.user import User
 from ..mappers.refugi_lliure_mapper import RefugiLliureMapper
 from ..utils.timezone_utils import get_madrid_now
+from ..utils.step_executor import DependencyStepExecutor, Step
 from ..services import r2_media_service
 
 logger = logging.getLogger(__name__)
@@ -19,6 +20,9 @@ UID_NOT_PROVIDED_ERROR = "UID no proporcionat"
 class UserController:
     """Controller per gestionar operacions d'usuaris"""
     
+    # Threads per executar en paral·lel els passos independents de delete_user
+    DELETE_USER_MAX_WORKERS = 4
+    
     def __init__(self):
         """Inicialitza el controller"""
         self.user_dao = UserDAO()
@@ -124,20 +128,23 @@ class UserController:
     
     def delete_user(self, uid: str) -> tuple[bool, Optional[str]]:
         """
-        Elimina un usuari i totes les seves dades associades seguint l'ordre específic:
+        Elimina un usuari i totes les seves dades associades.
+        
+        Els passos independents s'executen en paral·lel; els que depenen d'un altre
+        pas només s'executen si aquest ha acabat correctament:
         1. Eliminar experiències
         2. Eliminar dubtes
-        3. Eliminar respostes a dubtes
+        3. Eliminar respostes a dubtes (després de 2)
         4. Anonimitzar proposals
         5. Eliminar renovations actuals
-        6. Anonimitzar renovations
-        6.1 Eliminar participacions en renovations
-        6.2 Eliminar user en renovations on ha sigut expulsat
+        6. Anonimitzar renovations (després de 5)
+        6.1 Eliminar participacions en renovations (després de 5)
+        6.2 Eliminar user en renovations on ha sigut expulsat (després de 5)
         7. Eliminar fotos penjades
         8. Eliminar avatar
         9. Eliminar de visitors dels refugis
         10. Eliminar de refuge_visits
-        11. Eliminar usuari
+        11. Eliminar usuari (només si tots els passos anteriors han anat bé)
         
         Args:
             uid: UID de l'usuari
@@ -154,114 +161,18 @@ class UserController:
             if not user:
                 return False, f"Usuari amb UID {uid} no trobat"
             
-            # 1. Eliminar experiències
-            from ..controllers.experience_controller import ExperienceController
-            experience_controller = ExperienceController()
-            success, error = experience_controller.delete_experiences_by_creator(uid)
-            if not success:
-                return False, f"Error eliminant experiències: {error}"
-            logger.info(f"Experiències eliminades per a l'usuari {uid}")
-            
-            # 2. Eliminar dubtes
-            from ..controllers.doubt_controller import DoubtController
-            doubt_controller = DoubtController()
-            success, error = doubt_controller.delete_doubts_by_creator(uid)
-            if not success:
-                return False, f"Error eliminant dubtes: {error}"
-            logger.info(f"Dubtes eliminats per a l'usuari {uid}")
-            
-            # 3. Eliminar respostes a dubtes
-            success, error = doubt_controller.delete_answers_by_creator(uid)
-            if not success:
-                return False, f"Error eliminant respostes: {error}"
-            logger.info(f"Respostes eliminades per a l'usuari {uid}")
-            
-            # 4. Anonimitzar proposals
-            from ..controllers.refuge_proposal_controller import RefugeProposalController
-            proposal_controller = RefugeProposalController()
-            success, error = proposal_controller.anonymize_proposals_by_creator(uid)
-            if not success:
-                return False, f"Error anonimitzant proposals: {error}"
-            logger.info(f"Proposals anonimitzades per a l'usuari {uid}")
-
-            # 5. Eliminar renovations actuals
-            from ..controllers.renovation_controller import RenovationController
-            renovation_controller = RenovationController()
-            success, error = renovation_controller.delete_current_renovations_by_creator(uid)
-            if not success:
-                return False, f"Error eliminant renovations actuals: {error}"
-            logger.info(f"Renovations actuals eliminades per a l'usuari {uid}")
-            
-            # 6. Anonimitzar renovations
-            from ..controllers.renovation_controller import RenovationController
-            renovation_controller = RenovationController()
-            success, error = renovation_controller.anonymize_renovations_by_creator(uid)
-            if not success:
-                return False, f"Error anonimitzant renovations: {error}"
-            logger.info(f"Renovations anonimitzades per a l'usuari {uid}")
-            
-            # 6.1 Eliminar participacions en renovations
-            success, error = renovation_controller.remove_user_from_participations(uid)
-            if not success:
-                return False, f"Error eliminant participacions: {error}"
-            logger.info(f"Participacions eliminades per a l'usuari {uid}")
-
-            # 6.2 Eliminar user en renovations on ha sigut expulsat
-            success, error = renovation_controller.remove_user_from_expelled(uid)
-            if not success:
-                return False, f"Error eliminant expelleds: {error}"
-            logger.info(f"Expelleds eliminats per a l'usuari {uid}")
-            
-            # 7. Eliminar fotos penjades
-            if user.uploaded_photos_keys and len(user.uploaded_photos_keys) > 0:
-                # Agrupar keys per refugi
-                photos_by_refuge = {}
-                for key in user.uploaded_photos_keys:
-                    # Format: refugis-lliures/REFUGE_ID/filename
-                    parts = key.split('/')
-                    if len(parts) >= 3:
-                        refuge_id = parts[1]
-                        if refuge_id not in photos_by_refuge:
-                            photos_by_refuge[refuge_id] = []
-                        photos_by_refuge[refuge_id].append(key)
-                
-                # Eliminar fotos per refugi
-                from ..controllers.refugi_lliure_controller import RefugiLliureController
-                refugi_controller = RefugiLliureController()
-                for refuge_id, keys in photos_by_refuge.items():
-                    refuge = self.refugi_dao.get_by_id(refuge_id)
-                    if refuge:
-                        success, error = refugi_controller.delete_multiple_refugi_media(refuge_id, keys)
-                        if not success:
-                            logger.warning(f"Error eliminant fotos del refugi {refuge_id}: {error}")
-                            return False, f"Error eliminant fotos del refugi {refuge_id}: {error}"
-                    else:
-                        logger.warning(f"Refugi {refuge_id} no trobat per eliminar fotos")
-                logger.info(f"Fotos eliminades per a l'usuari {uid}")
-            
-            # 8. Eliminar avatar
-            if user.avatar_metadata:
-                success, error = self.delete_user_avatar(uid)
-                if not success:
-                    logger.warning(f"Error eliminant avatar: {error}")
-                    return False, f"Error eliminant avatar: {error}"
-                else:
-                    logger.info(f"Avatar eliminat per a l'usuari {uid}")
-            
-            # 9. Eliminar de visitors dels refugis
-            if user.visited_refuges and len(user.visited_refuges) > 0:
-                success, error = self.refugi_dao.remove_visitor_from_all_refuges(uid, user.visited_refuges)
-                if not success:
-                    return False, f"Error eliminant de refugis visitats: {error}"
-                logger.info(f"Eliminat de refugis visitats per a l'usuari {uid}")
+            executor = DependencyStepExecutor(
+                self._build_delete_user_steps(uid, user),
+                max_workers=self.DELETE_USER_MAX_WORKERS
+            )
+            results = executor.run()
+            timings = ', '.join(f"{name}={duration:.3f}s" for name, duration in executor.timings(results).items())
+            logger.info(f"Temps dels passos d'eliminació de l'usuari {uid}: {timings}")
             
-            # 10. Eliminar de refuge_visits
-            from ..controllers.refuge_visit_controller import RefugeVisitController
-            visit_controller = RefugeVisitController()
-            success, error = visit_controller.remove_user_from_all_visits(uid)
-            if not success:
-                return False, f"Error eliminant de visites: {error}"
-            logger.info(f"Eliminat de visites per a l'usuari {uid}")
+            failed_step = executor.first_error(results)
+            if failed_step:
+                logger.warning(f"Pas {failed_step.name} fallit eliminant l'usuari {uid}: {failed_step.error}")
+                return False, failed_step.error
             
             # 11. Elimina de Firebase
             success = self.user_dao.delete_user(uid)
@@ -275,6 +186,109 @@ class UserController:
             logger.error(f"Error en delete_user: {str(e)}")
             return False, f"Error intern: {str(e)}"
     
+    def _build_delete_user_steps(self, uid: str, user: User) -> List[Step]:
+        """
+        Construeix els passos d'eliminació de les dades associades a un usuari.
+        Cada pas crea el seu controller perquè s'executa en un thread propi.
+        
+        Args:
+            uid: UID de l'usuari
+            user: Usuari a eliminar
+            
+        Returns:
+            List[Step]: Passos amb les seves dependències
+        """
+        def run(label: str, operation) -> tuple[bool, Optional[str]]:
+            success, error = operation()
+            if not success:
+                return False, f"{label}: {error}"
+            return True, None
+        
+        def delete_experiences():
+            from ..controllers.experience_controller import ExperienceController
+            return run("Error eliminant experiències", lambda: ExperienceController().delete_experiences_by_creator(uid))
+        
+        def delete_doubts():
+            from ..controllers.doubt_controller import DoubtController
+            return run("Error eliminant dubtes", lambda: DoubtController().delete_doubts_by_creator(uid))
+        
+        def delete_answers():
+            from ..controllers.doubt_controller import DoubtController
+            return run("Error eliminant respostes", lambda: DoubtController().delete_answers_by_creator(uid))
+        
+        def anonymize_proposals():
+            from ..controllers.refuge_proposal_controller import RefugeProposalController
+            return run("Error anonimitzant proposals", lambda: RefugeProposalController().anonymize_proposals_by_creator(uid))
+        
+        def delete_current_renovations():
+            from ..controllers.renovation_controller import RenovationController
+            return run("Error eliminant renovations actuals", lambda: RenovationController().delete_current_renovations_by_creator(uid))
+        
+        def anonymize_renovations():
+            from ..controllers.renovation_controller import RenovationController
+            return run("Error anonimitzant renovations", lambda: RenovationController().anonymize_renovations_by_creator(uid))
+        
+        def remove_participations():
+            from ..controllers.renovation_controller import RenovationController
+            return run("Error eliminant participacions", lambda: RenovationController().remove_user_from_participations(uid))
+        
+        def remove_expelled():
+            from ..controllers.renovation_controller import RenovationController
+            return run("Error eliminant expelleds", lambda: RenovationController().remove_user_from_expelled(uid))
+        
+        def delete_photos():
+            if not user.uploaded_photos_keys:
+                return True, None
+            # Agrupar keys per refugi (format: refugis-lliures/REFUGE_ID/filename)
+            photos_by_refuge = {}
+            for key in user.uploaded_photos_keys:
+                parts = key.split('/')
+                if len(parts) >= 3:
+                    photos_by_refuge.setdefault(parts[1], []).append(key)
+            
+            from ..controllers.refugi_lliure_controller import RefugiLliureController
+            refugi_controller = RefugiLliureController()
+            for refuge_id, keys in photos_by_refuge.items():
+                if not self.refugi_dao.get_by_id(refuge_id):
+                    logger.warning(f"Refugi {refuge_id} no trobat per eliminar fotos")
+                    continue
+                success, error = refugi_controller.delete_multiple_refugi_media(refuge_id, keys)
+                if not success:
+                    return False, f"Error eliminant fotos del refugi {refuge_id}: {error}"
+            return True, None
+        
+        def delete_avatar():
+            if not user.avatar_metadata:
+                return True, None
+            return run("Error eliminant avatar", lambda: self.delete_user_avatar(uid))
+        
+        def remove_from_refuge_visitors():
+            if not user.visited_refuges:
+                return True, None
+            return run(
+                "Error eliminant de refugis visitats",
+                lambda: self.refugi_dao.remove_visitor_from_all_refuges(uid, user.visited_refuges)
+            )
+        
+        def remove_from_visits():
+            from ..controllers.refuge_visit_controller import RefugeVisitController
+            return run("Error eliminant de visites", lambda: RefugeVisitController().remove_user_from_all_visits(uid))
+        
+        return [
+            Step('experiences', delete_experiences),
+            Step('doubts', delete_doubts),
+            Step('answers', delete_answers, depends_on=('doubts',)),
+            Step('proposals', anonymize_proposals),
+            Step('current_renovations', delete_current_renovations),
+            Step('anonymize_renovations', anonymize_renovations, depends_on=('current_renovations',)),
+            Step('participations', remove_participations, depends_on=('current_renovations',)),
+            Step('expelled', remove_expelled, depends_on=('current_renovations',)),
+            Step('photos', delete_photos),
+            Step('avatar', delete_avatar),
+            Step('refuge_visitors', remove_from_refuge_visitors),
+            Step('visits', remove_from_visits),
+        ]
+    
     # Patró Template Method per gestionar llistes de refugis
     def _manage_refugi_list(
         self, 
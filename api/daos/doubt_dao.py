@@ -3,7 +3,7 @@ DAO per a la gestió de dubtes i respostes amb Firestore
 """
 import logging
 from typing import List, Optional, Dict, Any, Tuple
-from ..services.firestore_service import FirestoreService
+from ..services.firestore_service import FirestoreService, FirestoreBatchWriter
 from ..services.cache_service import cache_service
 from ..mappers.doubt_mapper import DoubtMapper, AnswerMapper
 from ..models.doubt import Doubt, Answer
@@ -46,7 +46,7 @@ class DoubtDAO:
             logger.info(f"Dubte creat amb ID: {doc_ref.id}")
             
             # Invalida cache de llistes de dubtes d'aquest refugi
-            cache_service.delete_pattern(f"doubt_list:refuge_id:{doubt_data['refuge_id']}")
+            cache_service.delete(cache_service.generate_key('doubt_list', refuge_id=doubt_data['refuge_id']))
             
             # Retornar la instància del model
             return self.doubt_mapper.firestore_to_model(doubt_data)
@@ -120,13 +120,18 @@ class DoubtDAO:
                 logger.log(23, f"Firestore READ: collection={self.COLLECTION_NAME} where refuge_id=={refuge_id}")
                 doubts_docs = doubts_ref.stream()
                 
+                # Obtenir totes les respostes del refugi amb una sola consulta collection_group
+                answers_by_doubt = self._get_answers_by_refuge_id(refuge_id)
+                
                 doubts_data = []
                 for doubt_doc in doubts_docs:
                     doubt_data = doubt_doc.to_dict()
                     doubt_data['id'] = doubt_doc.id
                     
-                    # Obtenir totes les respostes del dubte ordenades per created_at ascendent
-                    answers = self._get_answers_by_doubt_id(doubt_doc.id)
+                    answers = answers_by_doubt.get(doubt_doc.id, [])
+                    if len(answers) < doubt_data.get('answers_count', 0):
+                        # Respostes antigues sense refuge_id desnormalitzat: consulta la subcollection
+                        answers = self._get_answers_by_doubt_id(doubt_doc.id)
                     
                     # Preparar dades amb respostes
                     doubt_data['answers'] = [answer.to_dict() for answer in answers]
@@ -183,6 +188,44 @@ class DoubtDAO:
             logger.error(f"Error obtenint dubtes del refugi {refuge_id}: {str(e)}")
             return []
     
+    def _get_answers_by_refuge_id(self, refuge_id: str) -> Dict[str, List[Answer]]:
+        """
+        Obté totes les respostes dels dubtes d'un refugi agrupades per dubte
+        
+        Utilitza el camp refuge_id desnormalitzat a cada resposta per fer una sola
+        consulta collection_group en lloc d'una consulta per dubte.
+        
+        Args:
+            refuge_id: ID del refugi
+            
+        Returns:
+            Dict[str, List[Answer]]: Respostes de cada dubte ordenades per created_at ascendent
+        """
+        try:
+            db = self.firestore_service.get_db()
+            
+            logger.log(23, f"Firestore COLLECTION_GROUP_QUERY: {self.ANSWERS_SUBCOLLECTION} where refuge_id=={refuge_id}")
+            answers_docs = db.collection_group(self.ANSWERS_SUBCOLLECTION).where('refuge_id', '==', refuge_id).stream()
+            
+            answers_by_doubt: Dict[str, List[Answer]] = {}
+            for answer_doc in answers_docs:
+                answer_data = answer_doc.to_dict()
+                answer_data['id'] = answer_doc.id
+                # Path format: doubts/{doubt_id}/answers/{answer_id}
+                doubt_id = answer_doc.reference.parent.parent.id
+                answers_by_doubt.setdefault(doubt_id, []).append(self.answer_mapper.firestore_to_model(answer_data))
+            
+            # Ordenar en memòria per evitar un índex compost de collection group
+            for answers in answers_by_doubt.values():
+                answers.sort(key=lambda answer: answer.created_at)
+            
+            logger.log(23, f"Obtingudes respostes de {len(answers_by_doubt)} dubtes per al refugi {refuge_id}")
+            return answers_by_doubt
+            
+        except Exception as e:
+            logger.error(f"Error obtenint respostes del refugi {refuge_id}: {str(e)}")
+            return {}
+    
     def _get_answers_by_doubt_id(self, doubt_id: str) -> List[Answer]:
         """
         Obté totes les respostes d'un dubte ordenades per created_at ascendent
@@ -380,7 +423,7 @@ class DoubtDAO:
             doubt = self.get_doubt_by_id(doubt_id)
             if doubt:
                 # Invalida cache de la llista de dubtes del refugi
-                cache_service.delete_pattern(f"doubt_list:refuge_id:{doubt.refuge_id}")
+                cache_service.delete(cache_service.generate_key('doubt_list', refuge_id=doubt.refuge_id))
             
         except Exception as e:
             logger.error(f"Error invalidant cache per al dubte {doubt_id}: {str(e)}")
@@ -404,33 +447,38 @@ class DoubtDAO:
             
             deleted_count = 0
             refuge_ids = set()
+            detail_keys = []
             
-            for doubt_doc in doubts_query:
-                doubt_data = doubt_doc.to_dict()
-                refuge_id = doubt_data.get('refuge_id')
-                if refuge_id:
-                    refuge_ids.add(refuge_id)
-                
-                # Eliminar totes les respostes del dubte
-                answers_ref = doubt_doc.reference.collection(self.ANSWERS_SUBCOLLECTION)
-                logger.log(23, f"Firestore READ: collection={self.COLLECTION_NAME}/{doubt_doc.id}/{self.ANSWERS_SUBCOLLECTION}")
-                answers_docs = answers_ref.stream()
-                
-                for answer_doc in answers_docs:
-                    logger.log(23, f"Firestore DELETE: collection={self.COLLECTION_NAME}/{doubt_doc.id}/{self.ANSWERS_SUBCOLLECTION} document={answer_doc.id}")
-                    answer_doc.reference.delete()
-                
-                # Eliminar el dubte
-                logger.log(23, f"Firestore DELETE: collection={self.COLLECTION_NAME} document={doubt_doc.id}")
-                doubt_doc.reference.delete()
-                deleted_count += 1
-                
-                # Invalida cache de detall
-                cache_service.delete(cache_service.generate_key('doubt_detail', doubt_id=doubt_doc.id))
+            with FirestoreBatchWriter(db) as writer:
+                for doubt_doc in doubts_query:
+                    doubt_data = doubt_doc.to_dict()
+                    refuge_id = doubt_data.get('refuge_id')
+                    if refuge_id:
+                        refuge_ids.add(refuge_id)
+                    
+                    # Eliminar totes les respostes del dubte
+                    answers_ref = doubt_doc.reference.collection(self.ANSWERS_SUBCOLLECTION)
+                    logger.log(23, f"Firestore READ: collection={self.COLLECTION_NAME}/{doubt_doc.id}/{self.ANSWERS_SUBCOLLECTION}")
+                    answers_docs = answers_ref.stream()
+                    
+                    for answer_doc in answers_docs:
+                        logger.log(23, f"Firestore DELETE: collection={self.COLLECTION_NAME}/{doubt_doc.id}/{self.ANSWERS_SUBCOLLECTION} document={answer_doc.id}")
+                        writer.delete(answer_doc.reference)
+                    
+                    # Eliminar el dubte
+                    logger.log(23, f"Firestore DELETE: collection={self.COLLECTION_NAME} document={doubt_doc.id}")
+                    writer.delete(doubt_doc.reference)
+                    deleted_count += 1
+                    detail_keys.append(cache_service.generate_key('doubt_detail', doubt_id=doubt_doc.id))
+            
+            # Invalida cache de detall
+            cache_service.delete_many(detail_keys)
             
             # Invalida cache de llistes per cada refugi afectat
-            for refuge_id in refuge_ids:
-                cache_service.delete_pattern(f"doubt_list:refuge_id:{refuge_id}")
+            if refuge_ids:
+                cache_service.delete_many([
+                    cache_service.generate_key('doubt_list', refuge_id=refuge_id) for refuge_id in refuge_ids
+                ])
             
             logger.info(f"{deleted_count} dubtes eliminats del creador {creator_uid}")
             return True, None
@@ -457,37 +505,31 @@ class DoubtDAO:
             answers_query = db.collection_group(self.ANSWERS_SUBCOLLECTION).where('creator_uid', '==', creator_uid).stream()
             
             deleted_count = 0
-            doubt_ids = set()
-            
-            for answer_doc in answers_query:
-                # Obtenir el doubt_id del path del document
-                # Path format: doubts/{doubt_id}/answers/{answer_id}
-                doubt_id = answer_doc.reference.parent.parent.id
-                doubt_ids.add(doubt_id)
-                
-                # Eliminar la resposta
-                logger.log(23, f"Firestore DELETE: answers document={answer_doc.id} from doubt={doubt_id}")
-                answer_doc.reference.delete()
-                deleted_count += 1
-            
-            # Actualitzar el comptador answers_count per cada dubte afectat
-            for doubt_id in doubt_ids:
-                doubt_ref = db.collection(self.COLLECTION_NAME).document(doubt_id)
-                logger.log(23, f"Firestore READ: collection={self.COLLECTION_NAME} document={doubt_id}")
-                doubt_doc = doubt_ref.get()
-                
-                if doubt_doc.exists:
-                    # Comptar respostes restants
-                    answers_ref = doubt_ref.collection(self.ANSWERS_SUBCOLLECTION)
-                    logger.log(23, f"Firestore READ: collection={self.COLLECTION_NAME}/{doubt_id}/{self.ANSWERS_SUBCOLLECTION}")
-                    remaining_answers = len(list(answers_ref.stream()))
+            deleted_by_doubt: Dict[str, int] = {}
+            
+            with FirestoreBatchWriter(db) as writer:
+                for answer_doc in answers_query:
+                    # Obtenir el doubt_id del path del document
+                    # Path format: doubts/{doubt_id}/answers/{answer_id}
+                    doubt_id = answer_doc.reference.parent.parent.id
+                    deleted_by_doubt[doubt_id] = deleted_by_doubt.get(doubt_id, 0) + 1
                     
-                    # Actualitzar comptador
+                    # Eliminar la resposta
+                    logger.log(23, f"Firestore DELETE: answers document={answer_doc.id} from doubt={doubt_id}")
+                    writer.delete(answer_doc.reference)
+                    deleted_count += 1
+            
+            # Actualitzar el comptador answers_count dels dubtes que encara existeixen
+            existing_doubts = self.firestore_service.get_documents(self.COLLECTION_NAME, list(deleted_by_doubt), field_paths=['answers_count'])
+            with FirestoreBatchWriter(db) as writer:
+                for doubt_id in existing_doubts:
                     logger.log(23, f"Firestore UPDATE: collection={self.COLLECTION_NAME} document={doubt_id} (answers_count)")
-                    doubt_ref.update({'answers_count': remaining_answers})
-                    
-                    # Invalida cache (només detail, la list no canvia en updates)
-                    self._invalidate_doubt_detail_cache(doubt_id)
+                    writer.update(db.collection(self.COLLECTION_NAME).document(doubt_id), {'answers_count': Increment(-deleted_by_doubt[doubt_id])})
+            
+            # Invalida cache (només detail, la list no canvia en updates)
+            cache_service.delete_many([
+                cache_service.generate_key('doubt_detail', doubt_id=doubt_id) for doubt_id in existing_doubts
+            ])
             
             logger.info(f"{deleted_count} respostes eliminades del creador {creator_uid}")
             return True, None
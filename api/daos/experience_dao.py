@@ -3,7 +3,7 @@ DAO per a la gestió d'experiències amb Firestore
 """
 import logging
 from typing import List, Optional, Dict, Any, Tuple
-from ..services.firestore_service import FirestoreService
+from ..services.firestore_service import FirestoreService, FirestoreBatchWriter
 from ..services.cache_service import cache_service
 from ..mappers.experience_mapper import ExperienceMapper
 from ..models.experience import Experience
@@ -44,7 +44,7 @@ class ExperienceDAO:
             logger.info(f"Experiència creada amb ID: {doc_ref.id}")
             
             # Invalida cache de llistes d'experiències d'aquest refugi
-            cache_service.delete_pattern(f"experience_list:refuge_id:{experience_data['refuge_id']}")
+            cache_service.delete(cache_service.generate_key('experience_list', refuge_id=experience_data['refuge_id']))
             
             # Retornar la instància del model
             return self.mapper.firestore_to_model(experience_data)
@@ -137,6 +137,10 @@ class ExperienceDAO:
                     return experience_data
                 return None
             
+            # Funció per obtenir diversos elements per ID amb una sola lectura (get_all)
+            def fetch_many(ids: List[str]):
+                return self.firestore_service.get_documents(self.COLLECTION_NAME, ids)
+            
             # Funció per extreure l'ID d'una experiència
             def get_id(experience_data: Dict[str, Any]) -> str:
                 return experience_data['id']
@@ -150,7 +154,8 @@ class ExperienceDAO:
                 get_id_fn=get_id,
                 list_timeout=cache_service.get_timeout('experience_list'),
                 detail_timeout=cache_service.get_timeout('experience_detail'),
-                id_param_name='experience_id'
+                id_param_name='experience_id',
+                fetch_many_fn=fetch_many
             )
             
             logger.log(23, f"Trobades {len(experiences_data)} experiències per al refugi {refuge_id}")
@@ -235,7 +240,7 @@ class ExperienceDAO:
             # Invalida cache
             cache_service.delete(cache_service.generate_key('experience_detail', experience_id=experience_id))
             if experience_data and 'refuge_id' in experience_data:
-                cache_service.delete_pattern(f"experience_list:refuge_id:{experience_data['refuge_id']}")
+                cache_service.delete(cache_service.generate_key('experience_list', refuge_id=experience_data['refuge_id']))
             
             return True, None
             
@@ -339,24 +344,29 @@ class ExperienceDAO:
             
             deleted_count = 0
             refuge_ids = set()
-            
-            for exp_doc in experiences_query:
-                experience_data = exp_doc.to_dict()
-                refuge_id = experience_data.get('refuge_id')
-                if refuge_id:
-                    refuge_ids.add(refuge_id)
-                
-                # Eliminar document
-                logger.log(23, f"Firestore DELETE: collection={self.COLLECTION_NAME} document={exp_doc.id}")
-                exp_doc.reference.delete()
-                deleted_count += 1
-                
-                # Invalida cache de detall
-                cache_service.delete(cache_service.generate_key('experience_detail', experience_id=exp_doc.id))
+            detail_keys = []
+            
+            # Eliminar els documents amb WriteBatches
+            with FirestoreBatchWriter(db) as writer:
+                for exp_doc in experiences_query:
+                    experience_data = exp_doc.to_dict()
+                    refuge_id = experience_data.get('refuge_id')
+                    if refuge_id:
+                        refuge_ids.add(refuge_id)
+                    
+                    logger.log(23, f"Firestore DELETE: collection={self.COLLECTION_NAME} document={exp_doc.id}")
+                    writer.delete(exp_doc.reference)
+                    deleted_count += 1
+                    detail_keys.append(cache_service.generate_key('experience_detail', experience_id=exp_doc.id))
+            
+            # Invalida cache de detall
+            cache_service.delete_many(detail_keys)
             
             # Invalida cache de llistes per cada refugi afectat
-            for refuge_id in refuge_ids:
-                cache_service.delete_pattern(f"experience_list:refuge_id:{refuge_id}")
+            if refuge_ids:
+                cache_service.delete_many([
+                    cache_service.generate_key('experience_list', refuge_id=refuge_id) for refuge_id in refuge_ids
+                ])
             
             logger.info(f"{deleted_count} experiències eliminades del creador {creator_uid}")
             return True, None
@@ -8,7 +8,9 @@ from abc import ABC, abstractmethod
 from typing import List, Optional, Dict, Any, Tuple
 from google.cloud import firestore
 from ..services import firestore_service, cache_service
+from ..services.firestore_service import FirestoreBatchWriter
 from ..services.condition_service import ConditionService
+from ..services.refugi_index_service import refugi_index_service
 from ..models.refuge_proposal import RefugeProposal
 from ..models.refugi_lliure import Refugi, Coordinates, InfoComplementaria
 from ..mappers.refuge_proposal_mapper import RefugeProposalMapper
@@ -17,8 +19,53 @@ from ..utils.timezone_utils import get_madrid_now
 
 logger = logging.getLogger(__name__)
 
+# Camps dels refugis indexats per l'índex de cerca en memòria
+SEARCHABLE_FIELDS = {'type', 'condition', 'places', 'altitude', 'region', 'coord'}
+
 
 # ==================== FUNCIONS AUXILIARS PER COORDS_REFUGIS ====================
+# El catàleg de coordenades es reparteix en shards per prefix de geohash:
+#   coords_refugis/all_refugis_coords               -> manifest (version, changes_floor, shards, total_refugis)
+#   coords_refugis/all_refugis_coords/shards/{pref} -> entrades dels refugis del prefix
+# El manifest guarda la versió de l'últim canvi de cada shard: els lectors només tornen a
+# llegir els shards que han canviat. Cada modificació es fa en una transacció que llegeix el
+# manifest i els shards afectats, incrementa 'version' (que forma part de l'ETag del catàleg)
+# i afegeix una entrada al registre de canvis. GET /api/refuges/changes/?since=N respon a
+# partir d'aquest registre.
+
+COORDS_COLLECTION = 'coords_refugis'
+COORDS_DOCUMENT = 'all_refugis_coords'
+COORDS_SHARDS_SUBCOLLECTION = 'shards'
+COORDS_SHARDS_COLLECTION = f'{COORDS_COLLECTION}/{COORDS_DOCUMENT}/{COORDS_SHARDS_SUBCOLLECTION}'
+COORDS_CHANGES_COLLECTION = 'coords_refugis_changes'
+
+# Camps dels refugis que es copien al catàleg de coordenades
+COORDS_FIELDS = {'coord', 'name', 'surname'}
+
+# Longitud del prefix de geohash de cada shard (3 caràcters són cel·les de ~156 x 156 km)
+COORDS_SHARD_PRECISION = 3
+
+# Shard dels refugis sense coordenades
+COORDS_SHARD_NO_COORDS = '_'
+
+# Valor de change_fn per indicar que no cal modificar el catàleg
+_NO_CHANGE = object()
+
+
+def coords_manifest_ref(db):
+    """Referència al manifest del catàleg de coordenades"""
+    return db.collection(COORDS_COLLECTION).document(COORDS_DOCUMENT)
+
+
+def coords_shard_ref(db, shard_id: str):
+    """Referència a un shard del catàleg de coordenades"""
+    return db.collection(COORDS_SHARDS_COLLECTION).document(shard_id)
+
+
+def coords_change_ref(db, version: int):
+    """Referència a l'entrada del registre de canvis d'una versió (IDs ordenables)"""
+    return db.collection(COORDS_CHANGES_COLLECTION).document(f"{version:012d}")
+
 
 def generate_simple_geohash(lat: float, lng: float, precision: int = 5) -> str:
     """Generate a simple geohash for geographical indexing"""
@@ -59,13 +106,148 @@ def generate_simple_geohash(lat: float, lng: float, precision: int = 5) -> str:
     return geohash
 
 
+def coords_shard_id(entry: Dict[str, Any]) -> str:
+    """Shard on va una entrada del catàleg (prefix del seu geohash)"""
+    geohash = entry.get('geohash')
+    if not geohash:
+        coord = entry.get('coord') or {}
+        if coord.get('lat') is None or coord.get('long') is None:
+            return COORDS_SHARD_NO_COORDS
+        geohash = generate_simple_geohash(coord['lat'], coord['long'])
+    return geohash[:COORDS_SHARD_PRECISION]
+
+
+def group_coords_by_shard(entries: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Agrupa les entrades del catàleg per shard mantenint-ne l'ordre"""
+    shards: Dict[str, List[Dict[str, Any]]] = {}
+    for entry in entries:
+        shards.setdefault(coords_shard_id(entry), []).append(entry)
+    return shards
+
+
+def coords_shard_data(shard_id: str, entries: List[Dict[str, Any]], version: int) -> Dict[str, Any]:
+    """Contingut d'un document de shard ('ids' permet trobar el shard d'un refugi amb array_contains)"""
+    return {
+        'shard': shard_id,
+        'version': version,
+        'ids': [entry.get('id') for entry in entries],
+        'refugis_coordinates': entries,
+    }
+
+
+@firestore.transactional
+def _apply_coords_change(transaction, db, refuge_id: str, action: str, change_fn) -> Optional[int]:
+    """
+    Modifica l'entrada d'un refugi del catàleg dins una transacció
+
+    Args:
+        change_fn: Rep l'entrada actual (o None) i retorna la nova (None per eliminar-la)
+                   o _NO_CHANGE si no cal fer res
+
+    Returns:
+        Nova versió del catàleg o None si no hi ha hagut cap canvi
+    """
+    manifest_ref = coords_manifest_ref(db)
+    logger.log(23, f"Firestore READ: collection={COORDS_COLLECTION} document={COORDS_DOCUMENT} ({action.upper()} refuge {refuge_id})")
+    manifest_doc = manifest_ref.get(transaction=transaction)
+    manifest = manifest_doc.to_dict() if manifest_doc.exists else None
+
+    # Format anterior (un sol array al document): el primer canvi el reparteix en shards
+    migrate = manifest is not None and 'shards' not in manifest
+    if migrate:
+        shards = group_coords_by_shard(manifest.get('refugis_coordinates', []))
+        current_shard_id = next(
+            (shard_id for shard_id, entries in shards.items() if any(e.get('id') == refuge_id for e in entries)),
+            None
+        )
+    else:
+        shards = {}
+        current_shard_id = None
+        query = (
+            db.collection(COORDS_SHARDS_COLLECTION)
+            .where(filter=firestore.FieldFilter('ids', 'array_contains', refuge_id))
+            .limit(1)
+        )
+        logger.log(23, f"Firestore QUERY: collection={COORDS_SHARDS_COLLECTION} where ids array_contains {refuge_id}")
+        for doc in transaction.get(query):
+            current_shard_id = doc.id
+            shards[doc.id] = (doc.to_dict() or {}).get('refugis_coordinates', [])
+
+    current = next((e for e in shards.get(current_shard_id, []) if e.get('id') == refuge_id), None)
+    new_entry = change_fn(dict(current) if current is not None else None)
+    if new_entry is _NO_CHANGE or (new_entry is None and current is None):
+        return None
+
+    # Shard de destinació (s'ha de llegir abans de qualsevol escriptura de la transacció)
+    new_shard_id = coords_shard_id(new_entry) if new_entry is not None else None
+    if new_shard_id is not None and new_shard_id not in shards:
+        shards[new_shard_id] = []
+        if not migrate:
+            logger.log(23, f"Firestore READ: collection={COORDS_SHARDS_COLLECTION} document={new_shard_id}")
+            shard_doc = coords_shard_ref(db, new_shard_id).get(transaction=transaction)
+            if shard_doc.exists:
+                shards[new_shard_id] = (shard_doc.to_dict() or {}).get('refugis_coordinates', [])
+
+    if current_shard_id is not None and current_shard_id == new_shard_id:
+        # Mateix shard: es manté la posició de l'entrada
+        shards[new_shard_id] = [new_entry if e.get('id') == refuge_id else e for e in shards[new_shard_id]]
+    else:
+        if current_shard_id is not None:
+            shards[current_shard_id] = [e for e in shards[current_shard_id] if e.get('id') != refuge_id]
+        if new_shard_id is not None:
+            shards[new_shard_id] = [e for e in shards[new_shard_id] if e.get('id') != refuge_id] + [new_entry]
+
+    version = (manifest or {}).get('version', 0) + 1
+    touched = set(shards) if migrate else {shard_id for shard_id in (current_shard_id, new_shard_id) if shard_id is not None}
+    shard_versions = {} if migrate else dict((manifest or {}).get('shards', {}))
+    for shard_id in sorted(touched):
+        entries = shards[shard_id]
+        if entries:
+            logger.log(23, f"Firestore WRITE: collection={COORDS_SHARDS_COLLECTION} document={shard_id} ({len(entries)} refugis)")
+            transaction.set(coords_shard_ref(db, shard_id), coords_shard_data(shard_id, entries, version))
+            shard_versions[shard_id] = version
+        else:
+            logger.log(23, f"Firestore DELETE: collection={COORDS_SHARDS_COLLECTION} document={shard_id}")
+            transaction.delete(coords_shard_ref(db, shard_id))
+            shard_versions.pop(shard_id, None)
+
+    if migrate:
+        total_refugis = sum(len(entries) for entries in shards.values())
+    else:
+        total_refugis = (manifest or {}).get('total_refugis', 0) + (new_entry is not None) - (current is not None)
+    manifest_update = {
+        'version': version,
+        'shards': shard_versions,
+        'total_refugis': total_refugis,
+        'last_updated': firestore.SERVER_TIMESTAMP
+    }
+    logger.log(23, f"Firestore UPDATE: collection={COORDS_COLLECTION} document={COORDS_DOCUMENT} (version {version})")
+    if manifest is None:
+        transaction.set(manifest_ref, {**manifest_update, 'created_at': firestore.SERVER_TIMESTAMP})
+    else:
+        if migrate:
+            manifest_update['refugis_coordinates'] = firestore.DELETE_FIELD
+        transaction.update(manifest_ref, manifest_update)
+
+    logger.log(23, f"Firestore WRITE: collection={COORDS_CHANGES_COLLECTION} version={version} ({action} refuge {refuge_id})")
+    transaction.set(coords_change_ref(db, version), {
+        'version': version,
+        'refuge_id': refuge_id,
+        'action': action,
+        'refuge': new_entry,
+        'created_at': firestore.SERVER_TIMESTAMP
+    })
+    return version
+
+
+def _change_coords_entry(db, refuge_id: str, action: str, change_fn) -> Optional[int]:
+    """Executa _apply_coords_change en una transacció nova (Firestore la reintenta si hi ha conflicte)"""
+    return _apply_coords_change(db.transaction(), db, refuge_id, action, change_fn)
+
+
 def add_refuge_to_coords_refugis(db, refuge_id: str, refuge_data: Dict[str, Any]) -> None:
     """Afegeix un nou refugi a la col·lecció coords_refugis"""
     try:
-        coords_ref = db.collection('coords_refugis').document('all_refugis_coords')
-        logger.log(23, f"Firestore READ: collection=coords_refugis document=all_refugis_coords (for CREATE)")
-        coords_doc = coords_ref.get()
-        
         # Preparar la nova entrada de coordenades
         coord_data = refuge_data.get('coord', {})
         new_coord_entry = {
@@ -82,28 +264,7 @@ def add_refuge_to_coords_refugis(db, refuge_id: str, refuge_data: Dict[str, Any]
         if 'surname' in refuge_data and refuge_data['surname']:
             new_coord_entry['surname'] = refuge_data['surname']
         
-        if coords_doc.exists:
-            # Actualitzar el document existent
-            coords_data = coords_doc.to_dict()
-            refugis_coordinates = coords_data.get('refugis_coordinates', [])
-            refugis_coordinates.append(new_coord_entry)
-            
-            logger.log(23, f"Firestore UPDATE: collection=coords_refugis document=all_refugis_coords (ADD refuge {refuge_id})")
-            coords_ref.update({
-                'refugis_coordinates': refugis_coordinates,
-                'total_refugis': len(refugis_coordinates),
-                'last_updated': firestore.SERVER_TIMESTAMP
-            })
-        else:
-            # Crear el document si no existeix
-            logger.log(23, f"Firestore WRITE: collection=coords_refugis document=all_refugis_coords (CREATE with refuge {refuge_id})")
-            coords_ref.set({
-                'refugis_coordinates': [new_coord_entry],
-                'total_refugis': 1,
-                'created_at': firestore.SERVER_TIMESTAMP,
-                'last_updated': firestore.SERVER_TIMESTAMP
-            })
-        
+        _change_coords_entry(db, refuge_id, 'create', lambda current: new_coord_entry)
         logger.info(f"Coordenades del refugi {refuge_id} afegides a coords_refugis")
     except Exception as e:
         logger.error(f"Error actualitzant coords_refugis per CREATE: {str(e)}")
@@ -111,61 +272,43 @@ def add_refuge_to_coords_refugis(db, refuge_id: str, refuge_data: Dict[str, Any]
 
 
 def update_refuge_from_coords_refugis(db, refuge_id: str, update_data: Dict[str, Any]) -> None:
-    """Actualitza les coordenades d'un refugi a coords_refugis si 'coord' o 'name' estan al payload"""
+    """Actualitza les coordenades d'un refugi a coords_refugis si 'coord', 'name' o 'surname' estan al payload"""
     try:
-        # Només actualitzar si hi ha 'coord' o 'name' al payload
-        if 'coord' not in update_data and 'name' not in update_data:
-            logger.info(f"No cal actualitzar coords_refugis per refugi {refuge_id} (no hi ha 'coord' ni 'name' al payload)")
+        # Només actualitzar si hi ha algun camp del catàleg al payload
+        if not COORDS_FIELDS.intersection(update_data):
+            logger.info(f"No cal actualitzar coords_refugis per refugi {refuge_id} (no hi ha 'coord', 'name' ni 'surname' al payload)")
             return
         
-        coords_ref = db.collection('coords_refugis').document('all_refugis_coords')
-        logger.log(23, f"Firestore READ: collection=coords_refugis document=all_refugis_coords (for UPDATE)")
-        coords_doc = coords_ref.get()
-        
-        if not coords_doc.exists:
-            logger.warning(f"Document coords_refugis no existeix, no es pot actualitzar refugi {refuge_id}")
-            return
-        
-        coords_data = coords_doc.to_dict()
-        refugis_coordinates = coords_data.get('refugis_coordinates', [])
-        
-        # Trobar i actualitzar el refugi
-        updated = False
-        for i, coord_entry in enumerate(refugis_coordinates):
-            if coord_entry.get('id') == refuge_id:
-                # Actualitzar coord si està present
-                if 'coord' in update_data:
-                    coord_data = update_data['coord']
-                    refugis_coordinates[i]['coord'] = {
-                        'lat': coord_data.get('lat'),
-                        'long': coord_data.get('long')
-                    }
-                    refugis_coordinates[i]['geohash'] = generate_simple_geohash(
-                        coord_data.get('lat'), 
-                        coord_data.get('long')
-                    )
-                
-                # Actualitzar name si està present
-                if 'name' in update_data:
-                    refugis_coordinates[i]['name'] = update_data['name']
-                
-                # Actualitzar surname si està present
-                if 'surname' in update_data:
-                    if update_data['surname']:
-                        refugis_coordinates[i]['surname'] = update_data['surname']
-                    elif 'surname' in refugis_coordinates[i]:
-                        # Eliminar surname si és null o buit
-                        del refugis_coordinates[i]['surname']
-                
-                updated = True
-                break
+        def change(entry):
+            if entry is None:
+                return _NO_CHANGE
+            
+            # Actualitzar coord si està present
+            if 'coord' in update_data:
+                coord_data = update_data['coord']
+                entry['coord'] = {
+                    'lat': coord_data.get('lat'),
+                    'long': coord_data.get('long')
+                }
+                entry['geohash'] = generate_simple_geohash(
+                    coord_data.get('lat'), 
+                    coord_data.get('long')
+                )
+            
+            # Actualitzar name si està present
+            if 'name' in update_data:
+                entry['name'] = update_data['name']
+            
+            # Actualitzar surname si està present
+            if 'surname' in update_data:
+                if update_data['surname']:
+                    entry['surname'] = update_data['surname']
+                elif 'surname' in entry:
+                    # Eliminar surname si és null o buit
+                    del entry['surname']
+            return entry
         
-        if updated:
-            logger.log(23, f"Firestore UPDATE: collection=coords_refugis document=all_refugis_coords (UPDATE refuge {refuge_id})")
-            coords_ref.update({
-                'refugis_coordinates': refugis_coordinates,
-                'last_updated': firestore.SERVER_TIMESTAMP
-            })
+        if _change_coords_entry(db, refuge_id, 'update', change) is not None:
             logger.info(f"Coordenades del refugi {refuge_id} actualitzades a coords_refugis")
         else:
             logger.warning(f"Refugi {refuge_id} no trobat a coords_refugis per actualitzar")
@@ -178,28 +321,7 @@ def update_refuge_from_coords_refugis(db, refuge_id: str, update_data: Dict[str,
 def delete_refuge_from_coords_refugis(db, refuge_id: str) -> None:
     """Elimina un refugi de la col·lecció coords_refugis"""
     try:
-        coords_ref = db.collection('coords_refugis').document('all_refugis_coords')
-        logger.log(23, f"Firestore READ: collection=coords_refugis document=all_refugis_coords (for DELETE)")
-        coords_doc = coords_ref.get()
-        
-        if not coords_doc.exists:
-            logger.warning(f"Document coords_refugis no existeix, no es pot eliminar refugi {refuge_id}")
-            return
-        
-        coords_data = coords_doc.to_dict()
-        refugis_coordinates = coords_data.get('refugis_coordinates', [])
-        
-        # Filtrar per eliminar el refugi
-        original_count = len(refugis_coordinates)
-        refugis_coordinates = [coord for coord in refugis_coordinates if coord.get('id') != refuge_id]
-        
-        if len(refugis_coordinates) < original_count:
-            logger.log(23, f"Firestore UPDATE: collection=coords_refugis document=all_refugis_coords (DELETE refuge {refuge_id})")
-            coords_ref.update({
-                'refugis_coordinates': refugis_coordinates,
-                'total_refugis': len(refugis_coordinates),
-                'last_updated': firestore.SERVER_TIMESTAMP
-            })
+        if _change_coords_entry(db, refuge_id, 'delete', lambda current: None) is not None:
             logger.info(f"Refugi {refuge_id} eliminat de coords_refugis")
         else:
             logger.warning(f"Refugi {refuge_id} no trobat a coords_refugis per eliminar")
@@ -294,8 +416,8 @@ class CreateRefugeStrategy(ProposalApprovalStrategy):
             proposal_ref.update({'refuge_id': new_refugi_id})
             
             # Invalidar cache de llistes de refugis
-            cache_service.delete_pattern('refugi_search:')
-            cache_service.delete_pattern('refugi_coords:')
+            cache_service.invalidate_tags(['refugi_search', 'refugi_coords'])
+            refugi_index_service.invalidate()
             
             logger.info(f"Refugi creat amb ID {new_refugi_id} des de la proposta {proposal.id}")
             return True, None
@@ -372,10 +494,15 @@ class UpdateRefugeStrategy(ProposalApprovalStrategy):
             
             # Invalidar cache relacionada amb aquest refugi
             cache_service.delete(cache_service.generate_key('refugi_detail', refugi_id=proposal.refuge_id))
-            # NO invalidem refugi_search perquè les IDs no canvien (només update)
-            # Només invalidem refugi_coords si 'coord' o 'name' estan al payload
-            if 'coord' in update_data or 'name' in update_data:
-                cache_service.delete_pattern('refugi_coords:')
+            # Només invalidem refugi_coords si algun camp del catàleg és al payload. Les cerques
+            # només canvien d'IDs si canvia el nom (la cerca per nom és parcial)
+            if 'name' in update_data or 'surname' in update_data:
+                cache_service.invalidate_tags(['refugi_search', 'refugi_coords'])
+            elif 'coord' in update_data:
+                cache_service.invalidate_tags(['refugi_coords'])
+            # L'índex de cerca en memòria només s'ha de reconstruir si canvia algun camp cercable
+            if SEARCHABLE_FIELDS.intersection(update_data):
+                refugi_index_service.invalidate()
             
             logger.info(f"Refugi {proposal.refuge_id} actualitzat des de la proposta {proposal.id}")
             return True, None
@@ -545,8 +672,8 @@ class DeleteRefugeStrategy(ProposalApprovalStrategy):
             
             # Invalidar cache relacionada amb aquest refugi
             cache_service.delete(cache_service.generate_key('refugi_detail', refugi_id=proposal.refuge_id))
-            cache_service.delete_pattern('refugi_search:')
-            cache_service.delete_pattern('refugi_coords:')
+            cache_service.invalidate_tags(['refugi_search', 'refugi_coords'])
+            refugi_index_service.invalidate()
             
             logger.info(f"Refugi {proposal.refuge_id} i totes les seves dades relacionades eliminats correctament des de la proposta {proposal.id}")
             return True, None
@@ -607,7 +734,7 @@ class RefugeProposalDAO:
             doc_ref.set(proposal_dict)
             
             # Invalidar cache de llistes de propostes
-            cache_service.delete_pattern('proposal_list:')
+            cache_service.invalidate_tags(['proposal_list'])
             
             return self.mapper.firestore_to_model(proposal_dict)
             
@@ -711,6 +838,10 @@ class RefugeProposalDAO:
                     return data
                 return None
             
+            # Funció per obtenir diversos elements per ID amb una sola lectura (get_all)
+            def fetch_many(ids: List[str]):
+                return firestore_service.get_documents(self.collection_name, ids)
+            
             # Funció per extreure l'ID d'una proposta
             def get_id(proposal_data: Dict[str, Any]) -> str:
                 return proposal_data['id']
@@ -724,7 +855,9 @@ class RefugeProposalDAO:
                 get_id_fn=get_id,
                 list_timeout=cache_service.get_timeout('proposal_list'),
                 detail_timeout=cache_service.get_timeout('proposal_detail'),
-                id_param_name='proposal_id'
+                id_param_name='proposal_id',
+                fetch_many_fn=fetch_many,
+                tags=['proposal_list']
             )
             
             return self.mapper.firestore_list_to_models(proposals_data)
@@ -767,7 +900,7 @@ class RefugeProposalDAO:
             })
             
             # Invalidar cache (només detail, la list no canvia en updates)
-            cache_service.delete_pattern(f'proposal_detail:proposal_id:{proposal_id}:*')
+            cache_service.delete(cache_service.generate_key('proposal_detail', proposal_id=proposal_id))
             
             return True, None
             
@@ -803,7 +936,7 @@ class RefugeProposalDAO:
             proposal_ref.update(update_data)
             
             # Invalidar cache (només detail, la list no canvia en updates)
-            cache_service.delete_pattern(f'proposal_detail:proposal_id:{proposal_id}:*')
+            cache_service.delete(cache_service.generate_key('proposal_detail', proposal_id=proposal_id))
             
             return True, None
             
@@ -829,15 +962,18 @@ class RefugeProposalDAO:
             proposals_query = db.collection(self.collection_name).where('creator_uid', '==', creator_uid).stream()
             
             anonymized_count = 0
-            
-            for proposal_doc in proposals_query:
-                # Actualitzar creator_uid a 'unknown'
-                logger.log(23, f"Firestore UPDATE: collection={self.collection_name} document={proposal_doc.id} (anonymize)")
-                proposal_doc.reference.update({'creator_uid': 'unknown'})
-                anonymized_count += 1
-                
-                # Invalida cache de detall
-                cache_service.delete(cache_service.generate_key('proposal_detail', proposal_id=proposal_doc.id))
+            detail_keys = []
+            
+            # Actualitzar creator_uid a 'unknown' amb WriteBatches
+            with FirestoreBatchWriter(db) as writer:
+                for proposal_doc in proposals_query:
+                    logger.log(23, f"Firestore UPDATE: collection={self.collection_name} document={proposal_doc.id} (anonymize)")
+                    writer.update(proposal_doc.reference, {'creator_uid': 'unknown'})
+                    anonymized_count += 1
+                    detail_keys.append(cache_service.generate_key('proposal_detail', proposal_id=proposal_doc.id))
+            
+            # Invalida cache de detall
+            cache_service.delete_many(detail_keys)
             
             # NO invalidem proposal_list perquè les IDs no canvien (només update)
             
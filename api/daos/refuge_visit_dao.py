@@ -5,7 +5,7 @@ import logging
 from typing import List, Optional, Dict, Any
 from datetime import date
 from firebase_admin import firestore
-from ..services.firestore_service import FirestoreService
+from ..services.firestore_service import FirestoreService, FirestoreBatchWriter
 from ..services.cache_service import cache_service
 from ..mappers.refuge_visit_mapper import RefugeVisitMapper
 from ..models.refuge_visit import RefugeVisit, UserVisit
@@ -23,6 +23,20 @@ class RefugeVisitDAO:
         self.firestore_service = FirestoreService()
         self.mapper = RefugeVisitMapper()
     
+    @staticmethod
+    def get_visitor_uids(visitors: List[Dict[str, Any]]) -> List[str]:
+        """
+        Obté els UIDs dels visitants d'una visita.
+        Es guarden desnormalitzats al camp 'visitor_uids' per poder consultar amb array_contains.
+        
+        Args:
+            visitors: Llista de diccionaris de visitants ({'uid':, 'num_visitors':})
+            
+        Returns:
+            List[str]: UIDs dels visitants
+        """
+        return [visitor.get('uid') for visitor in visitors or [] if isinstance(visitor, dict) and visitor.get('uid')]
+    
     def create_visit(self, data: Dict[str, Any]) -> tuple[bool, Optional[str], Optional[str]]:
         """
         Crea una nova visita amb les dades ja transformades
@@ -39,6 +53,7 @@ class RefugeVisitDAO:
             logger.log(23, f"Firestore CREATE: collection={self.COLLECTION_NAME}")
             doc_ref = db.collection(self.COLLECTION_NAME).document()
             data['id'] = doc_ref.id
+            data['visitor_uids'] = self.get_visitor_uids(data.get('visitors', []))
             doc_ref.set(data)
             
             # Invalida cache de llista
@@ -179,6 +194,10 @@ class RefugeVisitDAO:
                     return visit_data
                 return None
             
+            # Funció per obtenir diversos elements per ID amb una sola lectura (get_all)
+            def fetch_many(ids: List[str]):
+                return self.firestore_service.get_documents(self.COLLECTION_NAME, ids)
+            
             # Funció per extreure l'ID d'una visita
             def get_id(visit_data: Dict[str, Any]) -> str:
                 return visit_data['id']
@@ -192,7 +211,9 @@ class RefugeVisitDAO:
                 get_id_fn=get_id,
                 list_timeout=cache_service.get_timeout('refuge_visits_list'),
                 detail_timeout=cache_service.get_timeout('refuge_visit_detail'),
-                id_param_name='visit_id'
+                id_param_name='visit_id',
+                fetch_many_fn=fetch_many,
+                tags=[self._list_cache_tag(refuge_id)]
             )
             
             visits = [self.mapper.firebase_to_model(visit_data) for visit_data in visits_data]
@@ -216,29 +237,21 @@ class RefugeVisitDAO:
         """
         try:
             db = self.firestore_service.get_db()
-            logger.log(23, f"Firestore QUERY: collection={self.COLLECTION_NAME} filter=visitors array_contains uid={uid} order_by=date DESC")
+            logger.log(23, f"Firestore QUERY: collection={self.COLLECTION_NAME} filter=visitor_uids array_contains uid={uid} order_by=date DESC")
             
-            # Firestore no pot fer array-contains amb objectes, així que necessitem fer un filtre més manual
-            # Obtenim totes les visites i filtrem en memòria
-            query = db.collection(self.COLLECTION_NAME).order_by('date', direction=firestore.Query.DESCENDING)
+            # 'visitor_uids' és la llista desnormalitzada de UIDs de 'visitors', de manera que
+            # només es llegeixen les visites de l'usuari (requereix índex composat visitor_uids + date)
+            query = db.collection(self.COLLECTION_NAME).where(
+                filter=firestore.FieldFilter('visitor_uids', 'array_contains', uid)
+            ).order_by('date', direction=firestore.Query.DESCENDING)
             
             docs = query.get()
             visits = []
             
             for doc in docs:
                 visit_data = doc.to_dict()
-                visitors = visit_data.get('visitors', [])
-                
-                # Comprova si l'usuari està a la llista de visitors
-                user_found = False
-                for visitor in visitors:
-                    if visitor.get('uid') == uid:
-                        user_found = True
-                        break
-                
-                if user_found:
-                    visit = self.mapper.firebase_to_model(visit_data)
-                    visits.append((doc.id, visit))
+                visit = self.mapper.firebase_to_model(visit_data)
+                visits.append((doc.id, visit))
             
             logger.info(f"Obtingudes {len(visits)} visites per a l'usuari {uid}")
             return visits
@@ -273,6 +286,7 @@ class RefugeVisitDAO:
             logger.log(23, f"Firestore UPDATE: collection={self.COLLECTION_NAME} document={visit_id}")
             doc_ref.update({
                 'visitors': data.get('visitors', []),
+                'visitor_uids': self.get_visitor_uids(data.get('visitors', [])),
                 'total_visitors': data.get('total_visitors', 0)
             })
             
@@ -312,6 +326,7 @@ class RefugeVisitDAO:
             logger.log(23, f"Firestore UPDATE: collection={self.COLLECTION_NAME} document={visit_id}")
             doc_ref.update({
                 'visitors': data.get('visitors', []),
+                'visitor_uids': self.get_visitor_uids(data.get('visitors', [])),
                 'total_visitors': data.get('total_visitors', 0)
             })
             
@@ -371,6 +386,7 @@ class RefugeVisitDAO:
             logger.log(23, f"Firestore UPDATE: collection={self.COLLECTION_NAME} document={visit_id}")
             doc_ref.update({
                 'visitors': new_visitors,
+                'visitor_uids': self.get_visitor_uids(new_visitors),
                 'total_visitors': total_visitors
             })
             
@@ -454,6 +470,43 @@ class RefugeVisitDAO:
             logger.error(f"Error eliminant visita {visit_id}: {str(e)}")
             return False
     
+    def delete_visits(self, visits: List[tuple[str, str]]) -> List[str]:
+        """
+        Elimina diverses visites amb un sol WriteBatch
+        
+        Args:
+            visits: Llista de tuples (visit_id, refuge_id) (màxim 500 visites)
+            
+        Returns:
+            List[str]: IDs de les visites eliminades
+        """
+        if not visits:
+            return []
+        
+        try:
+            db = self.firestore_service.get_db()
+            collection = db.collection(self.COLLECTION_NAME)
+            
+            batch = db.batch()
+            for visit_id, _ in visits:
+                batch.delete(collection.document(visit_id))
+            
+            logger.log(23, f"Firestore BATCH DELETE: collection={self.COLLECTION_NAME} documents={len(visits)}")
+            batch.commit()
+            
+            # Invalida cache (la llista de cada refugi només una vegada)
+            for visit_id, _ in visits:
+                self._invalidate_visit_detail_cache(visit_id)
+            for refuge_id in {refuge_id for _, refuge_id in visits if refuge_id}:
+                self._invalidate_list_cache(refuge_id)
+            
+            logger.info(f"{len(visits)} visites eliminades")
+            return [visit_id for visit_id, _ in visits]
+            
+        except Exception as e:
+            logger.error(f"Error eliminant {len(visits)} visites: {str(e)}")
+            return []
+    
     def _invalidate_visit_detail_cache(self, visit_id: str):
         """
         Invalida la cache de detall d'una visita específica
@@ -470,9 +523,13 @@ class RefugeVisitDAO:
         Args:
             refuge_id: ID del refugi
         """
-        # Invalida totes les claus de llista que continguin aquest refuge_id
-        # El patró inclou :* al final per coincidir amb qualsevol from_date
-        cache_service.delete_pattern(f'refuge_visits_list:from_date:*:refuge_id:{refuge_id}')
+        # Les llistes (una per from_date) es registren amb l'etiqueta del refugi
+        cache_service.invalidate_tags([self._list_cache_tag(refuge_id)])
+    
+    @staticmethod
+    def _list_cache_tag(refuge_id: str) -> str:
+        """Etiqueta de cache de totes les llistes de visites d'un refugi"""
+        return cache_service.generate_key('refuge_visits_list', refuge_id=refuge_id)
     
     def _invalidate_visit_cache(self, visit_id: str, refuge_id: Optional[str] = None):
         """
@@ -503,47 +560,43 @@ class RefugeVisitDAO:
                 return True, None
             
             db = self.firestore_service.get_db()
-            updated_count = 0
+            collection = db.collection(self.COLLECTION_NAME)
             
-            for visit_id, visit in user_visits:
-                try:
-                    doc_ref = db.collection(self.COLLECTION_NAME).document(visit_id)
-                    logger.log(23, f"Firestore READ: collection={self.COLLECTION_NAME} document={visit_id}")
-                    doc = doc_ref.get()
-                    
-                    if doc.exists:
-                        visit_data = doc.to_dict()
-                        visitors = visit_data.get('visitors', [])
-                        
-                        # Buscar i eliminar l'usuari de la llista de visitors
-                        new_visitors = []
-                        found = False
-                        for visitor in visitors:
-                            if isinstance(visitor, dict) and visitor.get('uid') == uid:
-                                found = True
-                                continue
-                            new_visitors.append(visitor)
-                        
-                        if found:
-                            # Actualitzar visitors i decrementar total_visitors
-                            new_total = visit_data.get('total_visitors', 0) - 1
-                            if new_total < 0:
-                                new_total = 0
-                            
-                            logger.log(23, f"Firestore UPDATE: collection={self.COLLECTION_NAME} document={visit_id} (remove visitor)")
-                            doc_ref.update({
-                                'visitors': new_visitors,
-                                'total_visitors': new_total
-                            })
-                            updated_count += 1
-                            
-                            # Invalida cache (només detail, la list no canvia en updates)
-                            self._invalidate_visit_detail_cache(visit_id)
-                    else:
+            # Rellegeix totes les visites amb una sola crida (get_all)
+            visit_ids = [visit_id for visit_id, _ in user_visits]
+            visits_data = self.firestore_service.get_documents(self.COLLECTION_NAME, visit_ids)
+            
+            updated_ids = []
+            with FirestoreBatchWriter(db) as writer:
+                for visit_id in visit_ids:
+                    visit_data = visits_data.get(visit_id)
+                    if visit_data is None:
                         logger.warning(f"Visita {visit_id} no trobada al eliminar usuari {uid}")
-                except Exception as e:
-                    logger.error(f"Error eliminant usuari {uid} de la visita {visit_id}: {str(e)}")
-                    # Continua amb les altres visites
+                        continue
+                    
+                    # Buscar i eliminar l'usuari de la llista de visitors
+                    visitors = visit_data.get('visitors', [])
+                    new_visitors = [
+                        visitor for visitor in visitors
+                        if not (isinstance(visitor, dict) and visitor.get('uid') == uid)
+                    ]
+                    if len(new_visitors) == len(visitors):
+                        continue
+                    
+                    # Actualitzar visitors i decrementar total_visitors
+                    new_total = max(visit_data.get('total_visitors', 0) - 1, 0)
+                    logger.log(23, f"Firestore UPDATE: collection={self.COLLECTION_NAME} document={visit_id} (remove visitor)")
+                    writer.update(collection.document(visit_id), {
+                        'visitors': new_visitors,
+                        'visitor_uids': self.get_visitor_uids(new_visitors),
+                        'total_visitors': new_total
+                    })
+                    updated_ids.append(visit_id)
+            updated_count = len(updated_ids)
+            
+            # Invalida cache (només detail, la list no canvia en updates)
+            for visit_id in updated_ids:
+                self._invalidate_visit_detail_cache(visit_id)
             
             logger.info(f"Usuari {uid} eliminat de {updated_count} visites")
             return True, None
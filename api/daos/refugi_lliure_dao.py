@@ -2,33 +2,70 @@
 DAO per a la gestió de refugis amb Firestore
 """
 import logging
+from dataclasses import replace
 from typing import List, Optional, Dict, Any, Tuple
 from firebase_admin import firestore
 from ..services import firestore_service, cache_service, r2_media_service
+from ..services.firestore_service import FirestoreBatchWriter
 from ..models.refugi_lliure import Refugi, RefugiCoordinates, RefugiSearchFilters
 from ..mappers.refugi_lliure_mapper import RefugiLliureMapper
-from .search_strategies import SearchStrategySelector
+from ..services.refugi_index_service import refugi_index_service, GeoArea
+from ..services.refugi_cluster_service import refugi_cluster_service
+from ..services.refugi_name_index_service import refugi_name_index_service
+from ..utils.http_cache import content_etag
+from .refuge_proposal_dao import COORDS_COLLECTION, COORDS_DOCUMENT, COORDS_SHARDS_COLLECTION, COORDS_CHANGES_COLLECTION
+from .search_strategies import SearchStrategySelector, _docs_to_dict_with_id, matches_field
 
 logger = logging.getLogger(__name__)
 
 class RefugiLliureDAO:
     """DAO per a la gestió de refugis"""
     
+    # Màxim de refugis que retorna una cerca per nom
+    NAME_SEARCH_LIMIT = 50
+    
+    # Registre de les cerques amb la llista d'IDs a la cache (per derivar-ne cerques més restrictives)
+    SEARCH_REGISTRY_KEY = 'refugi_search:registry'
+    SEARCH_REGISTRY_SIZE = 64
+    
     def __init__(self):
         self.collection_name = 'data_refugis_lliures'
-        self.coords_collection_name = 'coords_refugis'
-        self.coords_document_name = 'all_refugis_coords'
+        self.coords_collection_name = COORDS_COLLECTION
+        self.coords_document_name = COORDS_DOCUMENT
         self.mapper = RefugiLliureMapper()
     
     def get_by_id(self, refugi_id: str) -> Optional[Refugi]:
         """Obtenir un refugi per ID amb cache"""
+        refugi_data = self._get_raw_by_id(refugi_id)
+        if refugi_data is None:
+            return None
+        return self.mapper.firestore_to_model(refugi_data)
+    
+    def get_etag(self, refugi_id: str, variant: str = '') -> Optional[str]:
+        """
+        ETag del refugi derivada del contingut del document (cache o Firestore)
+        
+        Args:
+            refugi_id: ID del refugi
+            variant: Distingeix respostes diferents del mateix document (p. ex. autenticat o no)
+        
+        Returns:
+            ETag o None si el refugi no existeix
+        """
+        refugi_data = self._get_raw_by_id(refugi_id)
+        if refugi_data is None:
+            return None
+        return content_etag(refugi_data, *([variant] if variant else []))
+    
+    def _get_raw_by_id(self, refugi_id: str) -> Optional[Dict[str, Any]]:
+        """Document del refugi tal com està a Firestore (de la cache si hi és)"""
         # Genera clau de cache
         cache_key = cache_service.generate_key('refugi_detail', refugi_id=refugi_id)
         
         # Intenta obtenir de cache
         cached_data = cache_service.get(cache_key)
         if cached_data is not None:
-            return self.mapper.firestore_to_model(cached_data)
+            return cached_data
         
         try:
             db = firestore_service.get_db()
@@ -45,7 +82,7 @@ class RefugiLliureDAO:
             timeout = cache_service.get_timeout('refugi_detail')
             cache_service.set(cache_key, refugi_data, timeout)
             
-            return self.mapper.firestore_to_model(refugi_data)
+            return refugi_data
             
         except Exception as e:
             logger.error(f'Error getting refugi by ID {refugi_id}: {str(e)}')
@@ -69,11 +106,6 @@ class RefugiLliureDAO:
         cache_key = cache_service.generate_key('refugi_search', **filters.to_dict())
         
         try:
-            # Funció per obtenir TOTES les dades completes d'una des de Firestore
-            def fetch_all():
-                db = firestore_service.get_db()
-                return self._build_optimized_query(db, filters)
-            
             # Funció per obtenir un refugi individual per ID
             def fetch_single(refugi_id: str):
                 db = firestore_service.get_db()
@@ -86,10 +118,50 @@ class RefugiLliureDAO:
                     return data
                 return None
             
+            # Funció per obtenir diversos elements per ID amb una sola lectura (get_all)
+            def fetch_many(ids: List[str]):
+                return firestore_service.get_documents(self.collection_name, ids)
+            
+            # Funció per obtenir TOTES les dades completes d'una
+            def fetch_all():
+                if not filters.has_geo_filters():
+                    derived = self._find_subsuming_result(filters, fetch_single, fetch_many)
+                    if derived is not None:
+                        return derived
+                
+                # Els filtres es resolen amb els índexs en memòria (sense queries a Firestore)
+                if filters.name and filters.name.strip():
+                    ids = self._search_name_ids(filters)
+                else:
+                    index = self._get_search_index()
+                    ids = index.search(filters) if index is not None else None
+                
+                if ids is not None:
+                    return cache_service.get_or_fetch_many(
+                        ids=ids,
+                        detail_key_prefix='refugi_detail',
+                        fetch_single_fn=fetch_single,
+                        detail_timeout=cache_service.get_timeout('refugi_detail'),
+                        id_param_name='refugi_id',
+                        fetch_many_fn=fetch_many
+                    )
+                
+                # Índexs no disponibles: query optimitzada a Firestore
+                db = firestore_service.get_db()
+                results = self._build_optimized_query(db, filters)
+                area = GeoArea.from_filters(filters)
+                return area.filter_documents(results) if area is not None else results
+            
             # Funció per extreure l'ID d'un refugi
             def get_id(refugi_data: Dict[str, Any]) -> str:
                 return refugi_data['id']
             
+            if filters.has_geo_filters():
+                # Cada àrea del mapa és diferent: la llista d'IDs no es guarda a la cache
+                # (els detalls sí, via get_or_fetch_many)
+                results = self.mapper.firestore_list_to_models(fetch_all())
+                return {'results': results, 'has_filters': True}
+            
             # Usar estratègia ID caching del cache_service
             results_data = cache_service.get_or_fetch_list(
                 list_cache_key=cache_key,
@@ -99,8 +171,11 @@ class RefugiLliureDAO:
                 get_id_fn=get_id,
                 list_timeout=cache_service.get_timeout('refugi_search'),
                 detail_timeout=cache_service.get_timeout('refugi_detail'),
-                id_param_name='refugi_id'
+                id_param_name='refugi_id',
+                fetch_many_fn=fetch_many,
+                tags=['refugi_search']
             )
+            self._register_cached_search(filters)
             
             # Convertir a models
             results = self.mapper.firestore_list_to_models(results_data)
@@ -111,57 +186,357 @@ class RefugiLliureDAO:
             logger.error(f'Error searching refugis: {str(e)}')
             raise
     
+    def _get_search_index(self):
+        """
+        Obté l'índex de cerca en memòria del worker, construint-lo si cal amb una sola lectura
+        de la col·lecció. Els documents llegits també es guarden a la cache de detall perquè les
+        cerques posteriors no hagin de tornar a llegir-los de Firestore.
+        
+        Returns:
+            RefugiSearchIndex o None si no està disponible (s'utilitzen les estratègies de Firestore)
+        """
+        def load_catalogue() -> List[Dict[str, Any]]:
+            db = firestore_service.get_db()
+            logger.log(23, f"Firestore QUERY: collection={self.collection_name} (search index build)")
+            documents = _docs_to_dict_with_id(db.collection(self.collection_name).stream())
+            
+            cache_service.set_many(
+                {
+                    cache_service.generate_key('refugi_detail', refugi_id=doc['id']): doc
+                    for doc in documents
+                },
+                cache_service.get_timeout('refugi_detail')
+            )
+            return documents
+        
+        return refugi_index_service.get_index(load_catalogue)
+    
+    def _get_name_index(self):
+        """
+        Obté l'índex de noms en memòria del worker, construït a partir del catàleg de coordenades
+        
+        Returns:
+            RefugiNameIndex o None si el catàleg no està disponible
+        """
+        try:
+            return refugi_name_index_service.get_index(self._get_coordinates_snapshot)
+        except Exception as e:
+            logger.error(f"Error obtenint l'índex de noms: {str(e)}")
+            return None
+    
+    def _find_subsuming_result(self, filters: RefugiSearchFilters, fetch_single, fetch_many) -> Optional[List[Dict[str, Any]]]:
+        """
+        Deriva el resultat d'una cerca a partir d'una cerca més àmplia que ja és a la cache
+        
+        Les cerques dels filtres amb control lliscant (altitud, places) generen moltes consultes
+        gairebé iguals: si una cerca registrada inclou tots els resultats d'aquesta, n'hi ha prou
+        amb filtrar els seus detalls (també a la cache) en memòria, sense llegir Firestore.
+        
+        Returns:
+            Dades dels refugis (en l'ordre de la cerca àmplia) o None si no hi ha cap cerca que la inclogui
+        """
+        registry = cache_service.get(self.SEARCH_REGISTRY_KEY)
+        if not isinstance(registry, list):
+            return None
+        
+        canonical = filters.to_dict()
+        candidates = {}
+        for entry in registry:
+            if not isinstance(entry, dict) or entry == canonical:
+                continue
+            candidate = RefugiSearchFilters.from_dict(entry)
+            if candidate.subsumes(filters):
+                candidates[cache_service.generate_key('refugi_search', **entry)] = entry
+        if not candidates:
+            return None
+        
+        cached = {
+            key: ids for key, ids in cache_service.peek_many(list(candidates)).items()
+            if isinstance(ids, list)
+        }
+        if not cached:
+            return None
+        key = min(cached, key=lambda candidate_key: len(cached[candidate_key]))
+        
+        refugis = cache_service.get_or_fetch_many(
+            ids=cached[key],
+            detail_key_prefix='refugi_detail',
+            fetch_single_fn=fetch_single,
+            detail_timeout=cache_service.get_timeout('refugi_detail'),
+            id_param_name='refugi_id',
+            fetch_many_fn=fetch_many
+        )
+        fields = SearchStrategySelector.active_fields(filters)
+        results = [refugi for refugi in refugis if all(matches_field(refugi, field, filters) for field in fields)]
+        logger.info(
+            f"Search derived from cached broader search: filters={candidates[key]} "
+            f"cached_rows={len(cached[key])} returned={len(results)}"
+        )
+        return results
+    
+    def _register_cached_search(self, filters: RefugiSearchFilters) -> None:
+        """Afegeix una cerca al registre de cerques amb la llista d'IDs a la cache"""
+        canonical = filters.to_dict()
+        try:
+            registry = cache_service.get(self.SEARCH_REGISTRY_KEY)
+            if not isinstance(registry, list):
+                registry = []
+            if registry and registry[0] == canonical:
+                return
+            registry = [canonical] + [entry for entry in registry if entry != canonical]
+            cache_service.set(
+                self.SEARCH_REGISTRY_KEY,
+                registry[:self.SEARCH_REGISTRY_SIZE],
+                cache_service.get_timeout('refugi_search'),
+                tags=['refugi_search']
+            )
+        except Exception as e:
+            logger.error(f"Error registrant la cerca a la cache: {str(e)}")
+    
+    def _search_name_ids(self, filters: RefugiSearchFilters) -> Optional[List[str]]:
+        """
+        IDs dels refugis que coincideixen amb el nom (parcial, sense accents i tolerant a errors),
+        ordenats per qualitat de la coincidència i restringits a la resta de filtres
+        
+        Returns:
+            Llista d'IDs o None si els índexs no estan disponibles (es cerca el nom exacte a Firestore)
+        """
+        name_index = self._get_name_index()
+        if name_index is None:
+            return None
+        ids = [match['id'] for match in name_index.search(filters.name, self.NAME_SEARCH_LIMIT)]
+        
+        if not self._has_active_filters(replace(filters, name='')):
+            return ids
+        
+        index = self._get_search_index()
+        if index is None:
+            return None
+        allowed = index.search(filters)
+        if filters.has_geo_filters():
+            # Amb una àrea els resultats s'ordenen per distància
+            matched = set(ids)
+            return [refugi_id for refugi_id in allowed if refugi_id in matched]
+        allowed = set(allowed)
+        return [refugi_id for refugi_id in ids if refugi_id in allowed]
+    
+    def search_names(self, query: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Suggeriments de refugis per a l'autocompletat del nom
+        
+        Args:
+            query: Text escrit per l'usuari (pot ser parcial, sense accents o amb errors)
+            limit: Nombre màxim de suggeriments
+        
+        Returns:
+            Llista de refugis (id, name, surname, coord, match) ordenada per qualitat de la
+            coincidència. None si el catàleg no està disponible.
+        """
+        name_index = self._get_name_index()
+        if name_index is None:
+            return None
+        return name_index.search(query, limit)
+    
     def _get_coordinates_as_refugi_list(self) -> List[Dict[str, Any]]:
         """Get refugi data from coordinates collection when no filters are applied amb cache"""
+        snapshot = self._get_coordinates_snapshot()
+        return snapshot['refugis'] if snapshot is not None else []
+    
+    def get_coordinates_etag(self) -> Optional[str]:
+        """ETag del catàleg de coordenades (None si no està disponible)"""
+        snapshot = self._get_coordinates_snapshot()
+        return snapshot['etag'] if snapshot is not None else None
+    
+    def _get_coordinates_snapshot(self) -> Optional[Dict[str, Any]]:
+        """
+        Catàleg de coordenades amb la seva ETag, tal com es guarda a la cache.
+        L'ETag es calcula un sol cop en llegir el document: validar-la no llegeix Firestore
+        ni torna a serialitzar el catàleg.
+        """
         # Clau de cache per coordenades
-        cache_key = cache_service.generate_key('refugi_coords', document='all')
-        
-        # Intenta obtenir de cache
-        cached_data = cache_service.get(cache_key)
-        if cached_data is not None:
-            return cached_data
+        cache_key = cache_service.generate_key('refugi_coords', document='snapshot')
         
         try:
-            db = firestore_service.get_db()
-            
-            # Get coordinates document
-            doc_ref = db.collection(self.coords_collection_name).document(self.coords_document_name)
-            logger.log(23, f"Firestore READ: collection={self.coords_collection_name} document={self.coords_document_name} (coordinates) ")
-            doc = doc_ref.get()
-            
-            if not doc.exists:
-                return []
-            
-            data = doc.to_dict()
-            all_coordinates = data.get('refugis_coordinates', [])
-            
-            # Convert coordinates format to refugi format (all coordinates)
-            refugis = []
-            for coord_data in all_coordinates:
-                # Convert coordinate data to refugi format
-                refugi_data = {
-                    'id': coord_data.get('id', ''),
-                    'name': coord_data.get('name', ''),
-                    'coord': coord_data.get('coord', {}),
-                    'geohash': coord_data.get('geohash', None)
-                }
-                
-                # Add surname if available
-                if 'surname' in coord_data and coord_data['surname']:
-                    refugi_data['surname'] = coord_data['surname']
-                    
-                refugis.append(refugi_data)
-            
-            # Guarda a cache (timeout llarg per coordenades)
-            timeout = cache_service.get_timeout('refugi_coords')
-            cache_service.set(cache_key, refugis, timeout)
-            
-            return refugis
+            # Un sol worker llegeix el document quan la cache caduca (la resta serveix el valor anterior)
+            return cache_service.get_or_compute(
+                cache_key,
+                self._fetch_coordinates_snapshot,
+                cache_service.get_timeout('refugi_coords'),
+                tags=['refugi_coords']
+            )
             
         except Exception as e:
             logger.error(f'Error getting coordinates as refugi list: {str(e)}')
-            # Fallback to empty list if coordinates collection fails
-            return []
+            # Catàleg no disponible (es retorna una llista buida i sense ETag)
+            return None
+    
+    def _fetch_coordinates_snapshot(self) -> Optional[Dict[str, Any]]:
+        """Llegeix el document de coordenades de Firestore (None si no existeix)"""
+        db = firestore_service.get_db()
+        
+        # Get coordinates document
+        doc_ref = db.collection(self.coords_collection_name).document(self.coords_document_name)
+        logger.log(23, f"Firestore READ: collection={self.coords_collection_name} document={self.coords_document_name} (coordinates) ")
+        doc = doc_ref.get()
+        
+        if not doc.exists:
+            return None
+        
+        data = doc.to_dict()
+        if 'shards' in data:
+            all_coordinates = self._get_coordinates_shards(data['shards'])
+        else:
+            # Format anterior: totes les coordenades en un sol array del document
+            all_coordinates = data.get('refugis_coordinates', [])
+        
+        # Convert coordinates format to refugi format (all coordinates)
+        refugis = [self._coord_entry_to_refugi(coord_data) for coord_data in all_coordinates]
+        
+        # La versió l'incrementen els helpers de les propostes; el hash cobreix escriptures externes
+        version = data.get('version', 0)
+        return {
+            'version': version,
+            # Versió més antiga a partir de la qual el registre de canvis és complet
+            'changes_floor': data.get('changes_floor', 0),
+            'etag': content_etag(refugis, f"coords-v{version}"),
+            'refugis': refugis,
+        }
+    
+    def _get_coordinates_shards(self, shard_versions: Dict[str, int]) -> List[Dict[str, Any]]:
+        """
+        Entrades de tots els shards del catàleg. Cada shard es guarda a la cache amb la seva
+        versió a la clau (el contingut d'una versió no canvia mai): després d'un canvi només
+        es torna a llegir de Firestore el shard modificat.
+        """
+        keys = {
+            shard_id: cache_service.generate_key('refugi_coords_shard', shard=shard_id, version=version)
+            for shard_id, version in sorted(shard_versions.items())
+        }
+        entries_by_key = cache_service.get_many(list(keys.values()))
+        
+        missing = [shard_id for shard_id, key in keys.items() if key not in entries_by_key]
+        if missing:
+            documents = firestore_service.get_documents(COORDS_SHARDS_COLLECTION, missing)
+            to_cache = {}
+            for shard_id in missing:
+                document = documents.get(shard_id)
+                if document is None:
+                    # El shard s'ha buidat després de llegir el manifest
+                    logger.warning(f"Shard de coordenades {shard_id} no trobat")
+                    continue
+                entries = document.get('refugis_coordinates', [])
+                entries_by_key[keys[shard_id]] = entries
+                # Només es guarda si el document correspon a la versió del manifest
+                if document.get('version') == shard_versions[shard_id]:
+                    to_cache[keys[shard_id]] = entries
+            if to_cache:
+                cache_service.set_many(to_cache, cache_service.get_timeout('refugi_coords_shard'))
+        
+        return [entry for key in keys.values() for entry in entries_by_key.get(key, [])]
+    
+    @staticmethod
+    def _coord_entry_to_refugi(coord_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Converteix una entrada de coords_refugis al format de refugi del catàleg"""
+        refugi_data = {
+            'id': coord_data.get('id', ''),
+            'name': coord_data.get('name', ''),
+            'coord': coord_data.get('coord', {}),
+            'geohash': coord_data.get('geohash', None)
+        }
+        
+        # Add surname if available
+        if 'surname' in coord_data and coord_data['surname']:
+            refugi_data['surname'] = coord_data['surname']
+        
+        return refugi_data
+    
+    def get_coordinates_changes(self, since: int) -> Optional[Dict[str, Any]]:
+        """
+        Canvis del catàleg de coordenades des de la versió since
+        
+        Si el registre de canvis no cobreix l'interval (s'ha compactat, falta alguna entrada
+        o el client té una versió desconeguda) es retorna el catàleg sencer amb full=True.
+        
+        Returns:
+            Dict amb 'version', 'full' i, segons el cas, 'added'/'updated'/'deleted' o 'refugis'.
+            None si el catàleg no està disponible.
+        """
+        snapshot = self._get_coordinates_snapshot()
+        if snapshot is None:
+            return None
+        version = snapshot['version']
+        
+        if since == version:
+            return {'version': version, 'full': False, 'added': [], 'updated': [], 'deleted': []}
+        
+        changes = None
+        if snapshot['changes_floor'] <= since < version:
+            # La versió forma part de la clau: les entrades d'un interval tancat no canvien mai
+            cache_key = cache_service.generate_key('refugi_changes', since=since, version=version)
+            changes = cache_service.get_or_compute(
+                cache_key,
+                lambda: self._fetch_coordinates_changes(since, version),
+                cache_service.get_timeout('refugi_changes')
+            )
+        
+        if changes is None:
+            return {'version': version, 'full': True, 'refugis': snapshot['refugis']}
+        return {'version': version, 'full': False, **changes}
+    
+    def _fetch_coordinates_changes(self, since: int, version: int) -> Optional[Dict[str, Any]]:
+        """
+        Llegeix les entrades del registre (since, version] i les agrupa per refugi.
+        Retorna None si hi falta alguna entrada (el client ha de descarregar el catàleg sencer).
+        """
+        db = firestore_service.get_db()
+        logger.log(23, f"Firestore QUERY: collection={COORDS_CHANGES_COLLECTION} where version > {since} and version <= {version}")
+        query = (
+            db.collection(COORDS_CHANGES_COLLECTION)
+            .where(filter=firestore.FieldFilter('version', '>', since))
+            .where(filter=firestore.FieldFilter('version', '<=', version))
+            .order_by('version')
+        )
+        entries = [doc.to_dict() for doc in query.stream()]
+        
+        if [entry.get('version') for entry in entries] != list(range(since + 1, version + 1)):
+            logger.warning(f"Registre de canvis incomplet entre les versions {since} i {version}")
+            return None
+        
+        # Estat final de cada refugi dins l'interval
+        created, latest = set(), {}
+        for entry in entries:
+            refuge_id = entry['refuge_id']
+            if entry['action'] == 'create':
+                created.add(refuge_id)
+            latest[refuge_id] = entry
+        
+        added, updated, deleted = [], [], []
+        for refuge_id, entry in latest.items():
+            if entry['action'] == 'delete':
+                # Un refugi creat i eliminat dins l'interval no l'ha vist mai el client
+                if refuge_id not in created:
+                    deleted.append(refuge_id)
+            elif refuge_id in created:
+                added.append(self._coord_entry_to_refugi(entry['refuge']))
+            else:
+                updated.append(self._coord_entry_to_refugi(entry['refuge']))
+        
+        return {'added': added, 'updated': updated, 'deleted': deleted}
+    
+    def get_clusters(self, zoom: int, bbox: List[float]) -> Optional[Dict[str, Any]]:
+        """
+        Agrupacions de refugis visibles dins el bbox al zoom indicat
+        
+        L'índex d'agrupació es manté a la memòria del worker i s'actualitza amb el registre
+        de canvis quan avança la versió del catàleg de coordenades.
+        
+        Returns:
+            Dict amb 'zoom', 'version', 'count' i 'clusters'. None si el catàleg no està disponible.
+        """
+        index = refugi_cluster_service.get_index(self._get_coordinates_snapshot, self.get_coordinates_changes)
+        if index is None:
+            return None
+        return index.clusters(zoom, bbox)
     
     def _has_active_filters(self, filters: RefugiSearchFilters) -> bool:
         """Comprova si hi ha filtres actius (exclou limit)"""
@@ -175,7 +550,7 @@ class RefugiLliureDAO:
         has_places = filters.places_min is not None or filters.places_max is not None
         has_altitude = filters.altitude_min is not None or filters.altitude_max is not None
         
-        return has_type or has_condition or has_places or has_altitude
+        return has_type or has_condition or has_places or has_altitude or filters.has_geo_filters()
     
     def _build_optimized_query(self, db, filters: RefugiSearchFilters) -> List[Dict[str, Any]]:
         """
@@ -192,14 +567,18 @@ class RefugiLliureDAO:
         if filters.name and filters.name.strip():
             return self._search_by_name(db, filters.name.strip())
         
-        # Selecciona l'estratègia òptima segons els filtres
-        strategy = SearchStrategySelector.select_strategy(filters)
-        logger.info(f"Using search strategy: {strategy.get_strategy_name()}")
+        # Només filtres geogràfics: Firestore no els pot resoldre, es llegeix la col·lecció
+        # sencera i l'àrea es filtra en memòria
+        if not SearchStrategySelector.has_field_filters(filters):
+            logger.log(23, f"Firestore QUERY: collection={self.collection_name} (geo search)")
+            return _docs_to_dict_with_id(db.collection(self.collection_name).stream())
         
-        # Executa la query amb l'estratègia seleccionada
-        results = strategy.execute_query(db, self.collection_name, filters)
+        # Selecciona l'estratègia més barata segons la selectivitat estimada dels filtres
+        plan = SearchStrategySelector.plan(filters, refugi_index_service.get_statistics())
+        logger.info(f"Using search strategy: {plan.strategy.get_strategy_name()}")
         
-        return results
+        # Executa la query amb l'estratègia seleccionada (i els filtres que no cobreix)
+        return plan.execute(db, self.collection_name, filters)
     
     def _search_by_name(self, db, name: str) -> List[Dict[str, Any]]:
         """
@@ -296,13 +675,10 @@ class RefugiLliureDAO:
                 logger.info(f"Usuari {uid} ja està a la llista de visitants del refugi {refugi_id}")
                 return True
             
-            # Afegeix l'usuari a la llista
-            current_visitors.append(uid)
-            
-            # Actualitza a Firestore
+            # Actualitza a Firestore (ArrayUnion: no modifica el refugi en cache, compartit per referència)
             db = firestore_service.get_db()
             doc_ref = db.collection(self.collection_name).document(str(refugi_id))
-            doc_ref.update({'visitors': current_visitors})
+            doc_ref.update({'visitors': firestore.ArrayUnion([uid])})
             
             # Invalida cache del refugi
             cache_service.delete(cache_service.generate_key('refugi_detail', refugi_id=refugi_id))
@@ -340,13 +716,10 @@ class RefugiLliureDAO:
                 logger.info(f"Usuari {uid} no està a la llista de visitants del refugi {refugi_id}")
                 return True
             
-            # Elimina l'usuari de la llista
-            current_visitors.remove(uid)
-            
-            # Actualitza a Firestore
+            # Actualitza a Firestore (ArrayRemove: no modifica el refugi en cache, compartit per referència)
             db = firestore_service.get_db()
             doc_ref = db.collection(self.collection_name).document(str(refugi_id))
-            doc_ref.update({'visitors': current_visitors})
+            doc_ref.update({'visitors': firestore.ArrayRemove([uid])})
             
             # Invalida cache del refugi
             cache_service.delete(cache_service.generate_key('refugi_detail', refugi_id=refugi_id))
@@ -574,6 +947,53 @@ class RefugiLliureDAO:
             logger.error(f'Error actualitzant visitors del refugi {refugi_id}: {str(e)}')
             return False
     
+    def add_visitors_to_refugis(self, visitors_by_refugi: Dict[str, List[str]]) -> List[str]:
+        """
+        Afegeix visitants a diversos refugis amb un sol WriteBatch (ArrayUnion, sense duplicats)
+        
+        Args:
+            visitors_by_refugi: Diccionari ID del refugi -> UIDs dels visitants (màxim 500 refugis)
+            
+        Returns:
+            List[str]: IDs dels refugis actualitzats (els que no existeixen s'ometen)
+        """
+        if not visitors_by_refugi:
+            return []
+        
+        try:
+            db = firestore_service.get_db()
+            collection = db.collection(self.collection_name)
+            
+            # Una sola lectura per descartar refugis inexistents (update fallaria tot el batch)
+            existing = firestore_service.get_documents(self.collection_name, list(visitors_by_refugi), field_paths=['visitors'])
+            
+            batch = db.batch()
+            updated_ids = []
+            for refugi_id, uids in visitors_by_refugi.items():
+                if refugi_id not in existing:
+                    logger.warning(f"No es pot actualitzar visitors, refugi no trobat amb ID: {refugi_id}")
+                    continue
+                batch.update(collection.document(str(refugi_id)), {'visitors': firestore.ArrayUnion(list(uids))})
+                updated_ids.append(refugi_id)
+            
+            if not updated_ids:
+                return []
+            
+            logger.log(23, f"Firestore BATCH UPDATE: collection={self.collection_name} documents={len(updated_ids)}")
+            batch.commit()
+            
+            # Invalida cache dels refugis
+            cache_service.delete_many([
+                cache_service.generate_key('refugi_detail', refugi_id=refugi_id) for refugi_id in updated_ids
+            ])
+            
+            logger.info(f"Actualitzada la llista de visitors de {len(updated_ids)} refugis")
+            return updated_ids
+            
+        except Exception as e:
+            logger.error(f'Error actualitzant visitors de {len(visitors_by_refugi)} refugis: {str(e)}')
+            return []
+    
     def remove_visitor_from_all_refuges(self, uid: str, visited_refuges: List[str]) -> Tuple[bool, Optional[str]]:
         """
         Elimina un usuari de la llista de visitors de tots els refugis que ha visitat
@@ -591,28 +1011,28 @@ class RefugiLliureDAO:
                 return True, None
             
             db = firestore_service.get_db()
-            removed_count = 0
+            collection = db.collection(self.collection_name)
+            refuge_ids = [str(refuge_id) for refuge_id in visited_refuges]
             
-            for refuge_id in visited_refuges:
-                try:
-                    doc_ref = db.collection(self.collection_name).document(str(refuge_id))
-                    logger.log(23, f"Firestore READ: collection={self.collection_name} document={refuge_id}")
-                    doc = doc_ref.get()
-                    
-                    if doc.exists:
-                        # Eliminar uid de visitors
-                        from google.cloud.firestore import ArrayRemove
-                        logger.log(23, f"Firestore UPDATE: collection={self.collection_name} document={refuge_id} (remove visitor)")
-                        doc_ref.update({'visitors': ArrayRemove([uid])})
-                        removed_count += 1
-                        
-                        # Invalida cache del refugi
-                        cache_service.delete(cache_service.generate_key('refugi_detail', refugi_id=refuge_id))
-                    else:
+            # Una sola lectura per descartar refugis inexistents (update fallaria tot el batch)
+            existing = firestore_service.get_documents(self.collection_name, refuge_ids, field_paths=['visitors'])
+            
+            from google.cloud.firestore import ArrayRemove
+            removed_ids = []
+            with FirestoreBatchWriter(db) as writer:
+                for refuge_id in refuge_ids:
+                    if refuge_id not in existing:
                         logger.warning(f"Refugi {refuge_id} no trobat al eliminar visitor {uid}")
-                except Exception as e:
-                    logger.error(f"Error eliminant visitor {uid} del refugi {refuge_id}: {str(e)}")
-                    # Continua amb els altres refugis
+                        continue
+                    logger.log(23, f"Firestore UPDATE: collection={self.collection_name} document={refuge_id} (remove visitor)")
+                    writer.update(collection.document(refuge_id), {'visitors': ArrayRemove([uid])})
+                    removed_ids.append(refuge_id)
+            removed_count = len(removed_ids)
+            
+            # Invalida cache dels refugis
+            cache_service.delete_many([
+                cache_service.generate_key('refugi_detail', refugi_id=refuge_id) for refuge_id in removed_ids
+            ])
             
             logger.info(f"Usuari {uid} eliminat de {removed_count} refugis")
             return True, None
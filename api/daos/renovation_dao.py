@@ -4,7 +4,7 @@ DAO per a la gestió de renovations amb Firestore
 import logging
 from typing import List, Optional, Dict, Any
 from datetime import datetime
-from ..services.firestore_service import FirestoreService
+from ..services.firestore_service import FirestoreService, FirestoreBatchWriter
 from ..services.cache_service import cache_service
 from ..mappers.renovation_mapper import RenovationMapper
 from ..models.renovation import Renovation
@@ -56,8 +56,7 @@ class RenovationDAO:
             logger.info(f"Renovation creada amb ID: {doc_ref.id}")
 
             # Invalida cache de llistes (totes les variants de renovation_list i del refugi)
-            cache_service.delete_pattern('renovation_list:')
-            cache_service.delete_pattern(f"renovation_refuge:")
+            cache_service.invalidate_tags(['renovation_list', 'renovation_refuge'])
 
             # Retornar la instància del model (usar les dades normalitzades)
             return self.mapper.firestore_to_model(renovation_data)
@@ -152,6 +151,10 @@ class RenovationDAO:
                     return renovation_data
                 return None
             
+            # Funció per obtenir diversos elements per ID amb una sola lectura (get_all)
+            def fetch_many(ids: List[str]):
+                return self.firestore_service.get_documents(self.COLLECTION_NAME, ids)
+            
             # Funció per extreure l'ID d'una renovation
             def get_id(renovation_data: Dict[str, Any]) -> str:
                 return renovation_data['id']
@@ -165,7 +168,9 @@ class RenovationDAO:
                 get_id_fn=get_id,
                 list_timeout=cache_service.get_timeout('renovation_list'),
                 detail_timeout=cache_service.get_timeout('renovation_detail'),
-                id_param_name='renovation_id'
+                id_param_name='renovation_id',
+                fetch_many_fn=fetch_many,
+                tags=['renovation_list']
             )
             
             logger.log(23, f"Trobades {len(renovations_data)} renovations actives")
@@ -254,8 +259,7 @@ class RenovationDAO:
             
             # Invalida cache
             cache_service.delete(cache_service.generate_key('renovation_detail', renovation_id=renovation_id))
-            cache_service.delete_pattern('renovation_list:')
-            cache_service.delete_pattern('renovation_refuge:')
+            cache_service.invalidate_tags(['renovation_list', 'renovation_refuge'])
             
             logger.info(f"Renovation eliminada: {renovation_id}")
             return True, creator_uid_from_data, participants
@@ -319,6 +323,10 @@ class RenovationDAO:
                     return renovation_data
                 return None
             
+            # Funció per obtenir diversos elements per ID amb una sola lectura (get_all)
+            def fetch_many(ids: List[str]):
+                return self.firestore_service.get_documents(self.COLLECTION_NAME, ids)
+            
             # Funció per extreure l'ID d'una renovation
             def get_id(renovation_data: Dict[str, Any]) -> str:
                 return renovation_data['id']
@@ -332,7 +340,9 @@ class RenovationDAO:
                 get_id_fn=get_id,
                 list_timeout=cache_service.get_timeout('renovation_list'),
                 detail_timeout=cache_service.get_timeout('renovation_detail'),
-                id_param_name='renovation_id'
+                id_param_name='renovation_id',
+                fetch_many_fn=fetch_many,
+                tags=['renovation_refuge']
             )
             
             logger.log(23, f"Trobades {len(renovations_data)} renovations per refugi {refuge_id}")
@@ -530,29 +540,31 @@ class RenovationDAO:
             deleted_count = 0
             refuge_ids = set()
             participants_count: Dict[str, int] = {}
-            
-            for renovation_doc in renovations_query:
-                renovation_data = renovation_doc.to_dict()
-                refuge_id = renovation_data.get('refuge_id')
-                if refuge_id:
-                    refuge_ids.add(refuge_id)
-                
-                # Recopilar participants
-                participants_uids = renovation_data.get('participants_uids', [])
-                for participant_uid in participants_uids:
-                    participants_count[participant_uid] = participants_count.get(participant_uid, 0) + 1
-                
-                # Eliminar la renovation
-                logger.log(23, f"Firestore DELETE: collection={self.COLLECTION_NAME} document={renovation_doc.id} (delete current)")
-                renovation_doc.reference.delete()
-                deleted_count += 1
-                
-                # Invalida cache de detall
-                cache_service.delete(cache_service.generate_key('renovation_detail', renovation_id=renovation_doc.id))
+            detail_keys = []
+            
+            with FirestoreBatchWriter(db) as writer:
+                for renovation_doc in renovations_query:
+                    renovation_data = renovation_doc.to_dict()
+                    refuge_id = renovation_data.get('refuge_id')
+                    if refuge_id:
+                        refuge_ids.add(refuge_id)
+                    
+                    # Recopilar participants
+                    participants_uids = renovation_data.get('participants_uids', [])
+                    for participant_uid in participants_uids:
+                        participants_count[participant_uid] = participants_count.get(participant_uid, 0) + 1
+                    
+                    # Eliminar la renovation
+                    logger.log(23, f"Firestore DELETE: collection={self.COLLECTION_NAME} document={renovation_doc.id} (delete current)")
+                    writer.delete(renovation_doc.reference)
+                    deleted_count += 1
+                    detail_keys.append(cache_service.generate_key('renovation_detail', renovation_id=renovation_doc.id))
+            
+            # Invalida cache de detall
+            cache_service.delete_many(detail_keys)
             
             # Invalida cache de llistes
-            cache_service.delete_pattern('renovation_list:')
-            cache_service.delete_pattern('renovation_refuge:')
+            cache_service.invalidate_tags(['renovation_list', 'renovation_refuge'])
             
             logger.info(f"{deleted_count} renovations actuals eliminades del creador {creator_uid}")
             return True, participants_count, None
@@ -580,23 +592,26 @@ class RenovationDAO:
             
             anonymized_count = 0
             refuge_ids = set()
-            
-            for renovation_doc in renovations_query:
-                renovation_data = renovation_doc.to_dict()
-                refuge_id = renovation_data.get('refuge_id')
-                if refuge_id:
-                    refuge_ids.add(refuge_id)
-                
-                # Actualitzar creator_uid a 'unknown' i group_link a None
-                logger.log(23, f"Firestore UPDATE: collection={self.COLLECTION_NAME} document={renovation_doc.id} (anonymize)")
-                renovation_doc.reference.update({
-                    'creator_uid': 'unknown',
-                    'group_link': None
-                })
-                anonymized_count += 1
-                
-                # Invalida cache de detall
-                cache_service.delete(cache_service.generate_key('renovation_detail', renovation_id=renovation_doc.id))
+            detail_keys = []
+            
+            with FirestoreBatchWriter(db) as writer:
+                for renovation_doc in renovations_query:
+                    renovation_data = renovation_doc.to_dict()
+                    refuge_id = renovation_data.get('refuge_id')
+                    if refuge_id:
+                        refuge_ids.add(refuge_id)
+                    
+                    # Actualitzar creator_uid a 'unknown' i group_link a None
+                    logger.log(23, f"Firestore UPDATE: collection={self.COLLECTION_NAME} document={renovation_doc.id} (anonymize)")
+                    writer.update(renovation_doc.reference, {
+                        'creator_uid': 'unknown',
+                        'group_link': None
+                    })
+                    anonymized_count += 1
+                    detail_keys.append(cache_service.generate_key('renovation_detail', renovation_id=renovation_doc.id))
+            
+            # Invalida cache de detall
+            cache_service.delete_many(detail_keys)
             
             # NO invalidem llistes perquè és un update (IDs no canvien)
             
@@ -626,21 +641,24 @@ class RenovationDAO:
             
             removed_count = 0
             refuge_ids = set()
-            
-            for renovation_doc in renovations_query:
-                renovation_data = renovation_doc.to_dict()
-                refuge_id = renovation_data.get('refuge_id')
-                if refuge_id:
-                    refuge_ids.add(refuge_id)
-                
-                # Eliminar uid de participants_uids
-                from google.cloud.firestore import ArrayRemove
-                logger.log(23, f"Firestore UPDATE: collection={self.COLLECTION_NAME} document={renovation_doc.id} (remove participant)")
-                renovation_doc.reference.update({'participants_uids': ArrayRemove([uid])})
-                removed_count += 1
-                
-                # Invalida cache de detall
-                cache_service.delete(cache_service.generate_key('renovation_detail', renovation_id=renovation_doc.id))
+            detail_keys = []
+            
+            from google.cloud.firestore import ArrayRemove
+            with FirestoreBatchWriter(db) as writer:
+                for renovation_doc in renovations_query:
+                    renovation_data = renovation_doc.to_dict()
+                    refuge_id = renovation_data.get('refuge_id')
+                    if refuge_id:
+                        refuge_ids.add(refuge_id)
+                    
+                    # Eliminar uid de participants_uids
+                    logger.log(23, f"Firestore UPDATE: collection={self.COLLECTION_NAME} document={renovation_doc.id} (remove participant)")
+                    writer.update(renovation_doc.reference, {'participants_uids': ArrayRemove([uid])})
+                    removed_count += 1
+                    detail_keys.append(cache_service.generate_key('renovation_detail', renovation_id=renovation_doc.id))
+            
+            # Invalida cache de detall
+            cache_service.delete_many(detail_keys)
             
             # NO invalidem llistes perquè és un update (IDs no canvien)
             
@@ -670,21 +688,24 @@ class RenovationDAO:
         
             removed_count = 0
             refuge_ids = set()
-            
-            for renovation_doc in renovations_query:
-                renovation_data = renovation_doc.to_dict()
-                refuge_id = renovation_data.get('refuge_id')
-                if refuge_id:
-                    refuge_ids.add(refuge_id)
-                
-                # Eliminar uid de expelled_uids
-                from google.cloud.firestore import ArrayRemove
-                logger.log(23, f"Firestore UPDATE: collection={self.COLLECTION_NAME} document={renovation_doc.id} (remove expelled)")
-                renovation_doc.reference.update({'expelled_uids': ArrayRemove([uid])})
-                removed_count += 1
-                
-                # Invalida cache de detall
-                cache_service.delete(cache_service.generate_key('renovation_detail', renovation_id=renovation_doc.id))
+            detail_keys = []
+            
+            from google.cloud.firestore import ArrayRemove
+            with FirestoreBatchWriter(db) as writer:
+                for renovation_doc in renovations_query:
+                    renovation_data = renovation_doc.to_dict()
+                    refuge_id = renovation_data.get('refuge_id')
+                    if refuge_id:
+                        refuge_ids.add(refuge_id)
+                    
+                    # Eliminar uid de expelled_uids
+                    logger.log(23, f"Firestore UPDATE: collection={self.COLLECTION_NAME} document={renovation_doc.id} (remove expelled)")
+                    writer.update(renovation_doc.reference, {'expelled_uids': ArrayRemove([uid])})
+                    removed_count += 1
+                    detail_keys.append(cache_service.generate_key('renovation_detail', renovation_id=renovation_doc.id))
+            
+            # Invalida cache de detall
+            cache_service.delete_many(detail_keys)
             
             # NO invalidem llistes perquè és un update (IDs no canvien)
             
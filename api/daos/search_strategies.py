@@ -9,14 +9,21 @@ Cada estratègia optimitza les queries de Firestore segons els índexs composats
 - type + altitude  
 - condition + places
 - condition + altitude
+
+Quan hi ha estadístiques del catàleg (RefugiSearchStatistics), el selector tria l'estratègia
+que llegirà menys documents segons la selectivitat estimada dels filtres que resol a Firestore;
+els filtres que l'estratègia no cobreix s'apliquen en memòria sobre els resultats.
 """
 import logging
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional, TYPE_CHECKING
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple, TYPE_CHECKING
 from google.cloud import firestore
+from ..services.refugi_index_service import _as_number
 
 if TYPE_CHECKING:
     from ..models.refugi_lliure import RefugiSearchFilters
+    from ..services.refugi_index_service import RefugiSearchStatistics
 
 logger = logging.getLogger(__name__)
 
@@ -39,9 +46,53 @@ def _docs_to_dict_with_id(docs) -> List[Dict[str, Any]]:
     return results
 
 
+def _in_range(value: Any, minimum: Optional[float], maximum: Optional[float]) -> bool:
+    """Comprova un rang com Firestore: els documents sense valor numèric no hi són mai"""
+    number = _as_number(value)
+    if number is None:
+        return False
+    return (minimum is None or number >= minimum) and (maximum is None or number <= maximum)
+
+
+def matches_field(refugi: Dict[str, Any], field: str, filters: 'RefugiSearchFilters') -> bool:
+    """
+    Comprova en memòria el filtre d'un camp amb la mateixa semàntica que la query de Firestore
+    
+    Args:
+        refugi: Dades del refugi
+        field: 'type', 'condition', 'places' o 'altitude'
+        filters: Filtres de cerca
+    """
+    if field == 'type':
+        return refugi.get('type') in filters.type
+    if field == 'condition':
+        return refugi.get('condition') is not None and refugi.get('condition') in filters.condition
+    if field == 'places':
+        return _in_range(refugi.get('places'), filters.places_min, filters.places_max)
+    if field == 'altitude':
+        return _in_range(refugi.get('altitude'), filters.altitude_min, filters.altitude_max)
+    return True
+
+
 class RefugiSearchStrategy(ABC):
     """Interfície base per a les estratègies de cerca de refugis"""
     
+    # Camps que la query de Firestore filtra amb l'índex (determinen els documents llegits)
+    index_fields: Tuple[str, ...] = ()
+    
+    # Camps que l'estratègia resol (a Firestore o filtrant manualment els resultats)
+    filtered_fields: Tuple[str, ...] = ()
+    
+    def __init__(self):
+        # Documents llegits de Firestore per l'última query (abans dels filtres manuals)
+        self.rows_read: Optional[int] = None
+    
+    def _read(self, docs) -> List[Dict[str, Any]]:
+        """Converteix els documents de la query i en guarda el nombre llegit"""
+        results = _docs_to_dict_with_id(docs)
+        self.rows_read = len(results)
+        return results
+    
     @abstractmethod
     def execute_query(self, db: firestore.Client, collection_name: str, filters: 'RefugiSearchFilters') -> List[Dict[str, Any]]:
         """
@@ -68,6 +119,9 @@ class RefugiSearchStrategy(ABC):
 class TypeConditionStrategy(RefugiSearchStrategy):
     """Estratègia per a filtres: type + condition (utilitza type i després filtra condition manualment)"""
     
+    index_fields = ('type',)
+    filtered_fields = ('type', 'condition')
+    
     def execute_query(self, db: firestore.Client, collection_name: str, filters: 'RefugiSearchFilters') -> List[Dict[str, Any]]:
         query = db.collection(collection_name)
         
@@ -76,7 +130,7 @@ class TypeConditionStrategy(RefugiSearchStrategy):
         
         logger.log(23, f"Firestore QUERY: collection={collection_name} filters=type (manual condition)")
         docs = query.stream()
-        results = _docs_to_dict_with_id(docs)
+        results = self._read(docs)
         
         # Filtrar manualment per condition: només refugis amb condition vàlid i dins dels filtres
         filtered = []
@@ -94,6 +148,9 @@ class TypeConditionStrategy(RefugiSearchStrategy):
 class TypeConditionPlacesStrategy(RefugiSearchStrategy):
     """Estratègia per a filtres: type + condition + places (utilitza índex: type, condition, places)"""
     
+    index_fields = ('type', 'condition', 'places')
+    filtered_fields = ('type', 'condition', 'places')
+    
     def execute_query(self, db: firestore.Client, collection_name: str, filters: 'RefugiSearchFilters') -> List[Dict[str, Any]]:
         query = db.collection(collection_name)
         
@@ -108,7 +165,7 @@ class TypeConditionPlacesStrategy(RefugiSearchStrategy):
         
         logger.log(23, f"Firestore QUERY: collection={collection_name} filters=type+condition+places")
         docs = query.stream()
-        results = _docs_to_dict_with_id(docs)
+        results = self._read(docs)
         
         # Filtrar manualment per excloure refugis amb condition null o inexistent
         # i assegurar que el valor de condition està dins dels filtres sol·licitats
@@ -127,6 +184,9 @@ class TypeConditionPlacesStrategy(RefugiSearchStrategy):
 class TypeConditionAltitudeStrategy(RefugiSearchStrategy):
     """Estratègia per a filtres: type + condition + altitude (utilitza índex: type, condition, altitude)"""
     
+    index_fields = ('type', 'condition', 'altitude')
+    filtered_fields = ('type', 'condition', 'altitude')
+    
     def execute_query(self, db: firestore.Client, collection_name: str, filters: 'RefugiSearchFilters') -> List[Dict[str, Any]]:
         query = db.collection(collection_name)
         
@@ -141,7 +201,7 @@ class TypeConditionAltitudeStrategy(RefugiSearchStrategy):
         
         logger.log(23, f"Firestore QUERY: collection={collection_name} filters=type+condition+altitude")
         docs = query.stream()
-        results = _docs_to_dict_with_id(docs)
+        results = self._read(docs)
         
         # Filtrar manualment per excloure refugis amb condition null o inexistent
         # i assegurar que el valor de condition està dins dels filtres sol·licitats
@@ -163,6 +223,9 @@ class TypeConditionPlacesAltitudeStrategy(RefugiSearchStrategy):
     Utilitza índex type+condition+places i filtra altitude manualment
     """
     
+    index_fields = ('type', 'condition', 'places')
+    filtered_fields = ('type', 'condition', 'places', 'altitude')
+    
     def execute_query(self, db: firestore.Client, collection_name: str, filters: 'RefugiSearchFilters') -> List[Dict[str, Any]]:
         query = db.collection(collection_name)
         
@@ -177,7 +240,7 @@ class TypeConditionPlacesAltitudeStrategy(RefugiSearchStrategy):
         
         logger.log(23, f"Firestore QUERY: collection={collection_name} filters=type+condition+places (manual altitude)")
         docs = query.stream()
-        results = _docs_to_dict_with_id(docs)
+        results = self._read(docs)
         
         # Filtrar manualment per excloure refugis amb condition null o inexistent
         # i assegurar que el valor de condition està dins dels filtres sol·licitats
@@ -212,6 +275,9 @@ class TypeConditionPlacesAltitudeStrategy(RefugiSearchStrategy):
 class TypePlacesStrategy(RefugiSearchStrategy):
     """Estratègia per a filtres: type + places (utilitza índex: type, places)"""
     
+    index_fields = ('type', 'places')
+    filtered_fields = ('type', 'places')
+    
     def execute_query(self, db: firestore.Client, collection_name: str, filters: 'RefugiSearchFilters') -> List[Dict[str, Any]]:
         query = db.collection(collection_name)
         
@@ -225,7 +291,7 @@ class TypePlacesStrategy(RefugiSearchStrategy):
         
         logger.log(23, f"Firestore QUERY: collection={collection_name} filters=type+places")
         docs = query.stream()
-        return _docs_to_dict_with_id(docs)
+        return self._read(docs)
     
     def get_strategy_name(self) -> str:
         return "TypePlacesStrategy"
@@ -234,6 +300,9 @@ class TypePlacesStrategy(RefugiSearchStrategy):
 class TypeAltitudeStrategy(RefugiSearchStrategy):
     """Estratègia per a filtres: type + altitude (utilitza índex: type, altitude)"""
     
+    index_fields = ('type', 'altitude')
+    filtered_fields = ('type', 'altitude')
+    
     def execute_query(self, db: firestore.Client, collection_name: str, filters: 'RefugiSearchFilters') -> List[Dict[str, Any]]:
         query = db.collection(collection_name)
         
@@ -247,7 +316,7 @@ class TypeAltitudeStrategy(RefugiSearchStrategy):
         
         logger.log(23, f"Firestore QUERY: collection={collection_name} filters=type+altitude")
         docs = query.stream()
-        return _docs_to_dict_with_id(docs)
+        return self._read(docs)
     
     def get_strategy_name(self) -> str:
         return "TypeAltitudeStrategy"
@@ -256,6 +325,9 @@ class TypeAltitudeStrategy(RefugiSearchStrategy):
 class ConditionPlacesStrategy(RefugiSearchStrategy):
     """Estratègia per a filtres: condition + places (utilitza índex: condition, places)"""
     
+    index_fields = ('condition', 'places')
+    filtered_fields = ('condition', 'places')
+    
     def execute_query(self, db: firestore.Client, collection_name: str, filters: 'RefugiSearchFilters') -> List[Dict[str, Any]]:
         query = db.collection(collection_name)
         
@@ -269,7 +341,7 @@ class ConditionPlacesStrategy(RefugiSearchStrategy):
         
         logger.log(23, f"Firestore QUERY: collection={collection_name} filters=condition+places")
         docs = query.stream()
-        results = _docs_to_dict_with_id(docs)
+        results = self._read(docs)
         
         # Filtrar manualment per excloure refugis amb condition null o inexistent
         return [r for r in results if 'condition' in r and r['condition'] is not None]
@@ -281,6 +353,9 @@ class ConditionPlacesStrategy(RefugiSearchStrategy):
 class ConditionAltitudeStrategy(RefugiSearchStrategy):
     """Estratègia per a filtres: condition + altitude (utilitza índex: condition, altitude)"""
     
+    index_fields = ('condition', 'altitude')
+    filtered_fields = ('condition', 'altitude')
+    
     def execute_query(self, db: firestore.Client, collection_name: str, filters: 'RefugiSearchFilters') -> List[Dict[str, Any]]:
         query = db.collection(collection_name)
         
@@ -294,7 +369,7 @@ class ConditionAltitudeStrategy(RefugiSearchStrategy):
         
         logger.log(23, f"Firestore QUERY: collection={collection_name} filters=condition+altitude")
         docs = query.stream()
-        results = _docs_to_dict_with_id(docs)
+        results = self._read(docs)
         
         # Filtrar manualment per excloure refugis amb condition null o inexistent
         return [r for r in results if 'condition' in r and r['condition'] is not None]
@@ -309,6 +384,9 @@ class TypePlacesAltitudeStrategy(RefugiSearchStrategy):
     Utilitza índex type+places i filtra altitude manualment
     """
     
+    index_fields = ('type', 'places')
+    filtered_fields = ('type', 'places', 'altitude')
+    
     def execute_query(self, db: firestore.Client, collection_name: str, filters: 'RefugiSearchFilters') -> List[Dict[str, Any]]:
         query = db.collection(collection_name)
         
@@ -322,7 +400,7 @@ class TypePlacesAltitudeStrategy(RefugiSearchStrategy):
         
         logger.log(23, f"Firestore QUERY: collection={collection_name} filters=type+places (manual altitude)")
         docs = query.stream()
-        results = _docs_to_dict_with_id(docs)
+        results = self._read(docs)
         
         # Filtre manual per altitude
         if filters.altitude_min is not None or filters.altitude_max is not None:
@@ -348,6 +426,9 @@ class ConditionPlacesAltitudeStrategy(RefugiSearchStrategy):
     Utilitza índex condition+places i filtra altitude manualment
     """
     
+    index_fields = ('condition', 'places')
+    filtered_fields = ('condition', 'places', 'altitude')
+    
     def execute_query(self, db: firestore.Client, collection_name: str, filters: 'RefugiSearchFilters') -> List[Dict[str, Any]]:
         query = db.collection(collection_name)
         
@@ -361,7 +442,7 @@ class ConditionPlacesAltitudeStrategy(RefugiSearchStrategy):
         
         logger.log(23, f"Firestore QUERY: collection={collection_name} filters=condition+places (manual altitude)")
         docs = query.stream()
-        results = _docs_to_dict_with_id(docs)
+        results = self._read(docs)
         
         # Filtrar manualment per excloure refugis amb condition null o inexistent
         results = [r for r in results if 'condition' in r and r['condition'] is not None]
@@ -390,6 +471,9 @@ class PlacesAltitudeStrategy(RefugiSearchStrategy):
     Utilitza el filtre de places i filtra altitude manualment
     """
     
+    index_fields = ('places',)
+    filtered_fields = ('places', 'altitude')
+    
     def execute_query(self, db: firestore.Client, collection_name: str, filters: 'RefugiSearchFilters') -> List[Dict[str, Any]]:
         query = db.collection(collection_name)
         
@@ -401,7 +485,7 @@ class PlacesAltitudeStrategy(RefugiSearchStrategy):
         
         logger.log(23, f"Firestore QUERY: collection={collection_name} filters=places (manual altitude)")
         docs = query.stream()
-        results = _docs_to_dict_with_id(docs)
+        results = self._read(docs)
         
         # Filtre manual per altitude
         if filters.altitude_min is not None or filters.altitude_max is not None:
@@ -426,13 +510,16 @@ class PlacesAltitudeStrategy(RefugiSearchStrategy):
 class TypeOnlyStrategy(RefugiSearchStrategy):
     """Estratègia per a filtres: només type"""
     
+    index_fields = ('type',)
+    filtered_fields = ('type',)
+    
     def execute_query(self, db: firestore.Client, collection_name: str, filters: 'RefugiSearchFilters') -> List[Dict[str, Any]]:
         query = db.collection(collection_name)
         query = query.where(filter=firestore.FieldFilter('type', 'in', filters.type))
         
         logger.log(23, f"Firestore QUERY: collection={collection_name} filters=type")
         docs = query.stream()
-        return _docs_to_dict_with_id(docs)
+        return self._read(docs)
     
     def get_strategy_name(self) -> str:
         return "TypeOnlyStrategy"
@@ -441,13 +528,16 @@ class TypeOnlyStrategy(RefugiSearchStrategy):
 class ConditionOnlyStrategy(RefugiSearchStrategy):
     """Estratègia per a filtres: només condition"""
     
+    index_fields = ('condition',)
+    filtered_fields = ('condition',)
+    
     def execute_query(self, db: firestore.Client, collection_name: str, filters: 'RefugiSearchFilters') -> List[Dict[str, Any]]:
         query = db.collection(collection_name)
         query = query.where(filter=firestore.FieldFilter('condition', 'in', filters.condition))
         
         logger.log(23, f"Firestore QUERY: collection={collection_name} filters=condition")
         docs = query.stream()
-        results = _docs_to_dict_with_id(docs)
+        results = self._read(docs)
         
         # Filtrar manualment per excloure refugis amb condition null o inexistent
         return [r for r in results if 'condition' in r and r['condition'] is not None]
@@ -459,6 +549,9 @@ class ConditionOnlyStrategy(RefugiSearchStrategy):
 class PlacesOnlyStrategy(RefugiSearchStrategy):
     """Estratègia per a filtres: només places"""
     
+    index_fields = ('places',)
+    filtered_fields = ('places',)
+    
     def execute_query(self, db: firestore.Client, collection_name: str, filters: 'RefugiSearchFilters') -> List[Dict[str, Any]]:
         query = db.collection(collection_name)
         
@@ -469,7 +562,7 @@ class PlacesOnlyStrategy(RefugiSearchStrategy):
         
         logger.log(23, f"Firestore QUERY: collection={collection_name} filters=places")
         docs = query.stream()
-        return _docs_to_dict_with_id(docs)
+        return self._read(docs)
     
     def get_strategy_name(self) -> str:
         return "PlacesOnlyStrategy"
@@ -478,6 +571,9 @@ class PlacesOnlyStrategy(RefugiSearchStrategy):
 class AltitudeOnlyStrategy(RefugiSearchStrategy):
     """Estratègia per a filtres: només altitude"""
     
+    index_fields = ('altitude',)
+    filtered_fields = ('altitude',)
+    
     def execute_query(self, db: firestore.Client, collection_name: str, filters: 'RefugiSearchFilters') -> List[Dict[str, Any]]:
         query = db.collection(collection_name)
         
@@ -488,17 +584,91 @@ class AltitudeOnlyStrategy(RefugiSearchStrategy):
         
         logger.log(23, f"Firestore QUERY: collection={collection_name} filters=altitude")
         docs = query.stream()
-        return _docs_to_dict_with_id(docs)
+        return self._read(docs)
     
     def get_strategy_name(self) -> str:
         return "AltitudeOnlyStrategy"
 
 
+# ==================== PLA DE CERCA ====================
+
+@dataclass
+class SearchPlan:
+    """Estratègia escollida per a una cerca i els filtres que s'apliquen en memòria"""
+    strategy: RefugiSearchStrategy
+    residual_fields: Tuple[str, ...] = ()
+    estimated_rows: Optional[float] = None
+    
+    def execute(self, db: firestore.Client, collection_name: str, filters: 'RefugiSearchFilters') -> List[Dict[str, Any]]:
+        """
+        Executa l'estratègia, aplica els filtres residuals i registra les files estimades i reals
+        
+        Returns:
+            Llista de documents de refugis que compleixen tots els filtres
+        """
+        results = self.strategy.execute_query(db, collection_name, filters)
+        if self.residual_fields:
+            results = [
+                refugi for refugi in results
+                if all(matches_field(refugi, field, filters) for field in self.residual_fields)
+            ]
+        
+        estimated = 'n/a' if self.estimated_rows is None else f'{self.estimated_rows:.0f}'
+        residual = '+'.join(self.residual_fields) or 'none'
+        logger.info(
+            f"Search plan: strategy={self.strategy.get_strategy_name()} residual={residual} "
+            f"estimated_rows={estimated} actual_rows={self.strategy.rows_read} returned={len(results)}"
+        )
+        return results
+
+
 # ==================== SELECTOR D'ESTRATÈGIA ====================
 
 class SearchStrategySelector:
     """Selector d'estratègia segons els filtres actius"""
     
+    # Totes les estratègies, en l'ordre de preferència de select_strategy (desempata els costos)
+    STRATEGIES = (
+        TypeConditionPlacesAltitudeStrategy,
+        TypeConditionPlacesStrategy,
+        TypeConditionAltitudeStrategy,
+        TypeConditionStrategy,
+        TypePlacesAltitudeStrategy,
+        TypePlacesStrategy,
+        TypeAltitudeStrategy,
+        TypeOnlyStrategy,
+        ConditionPlacesAltitudeStrategy,
+        ConditionPlacesStrategy,
+        ConditionAltitudeStrategy,
+        ConditionOnlyStrategy,
+        PlacesAltitudeStrategy,
+        PlacesOnlyStrategy,
+        AltitudeOnlyStrategy,
+    )
+    
+    @staticmethod
+    def active_fields(filters: 'RefugiSearchFilters') -> Tuple[str, ...]:
+        """Camps amb filtre actiu que Firestore pot resoldre"""
+        fields = []
+        if filters.type:
+            fields.append('type')
+        if filters.condition:
+            fields.append('condition')
+        if filters.places_min is not None or filters.places_max is not None:
+            fields.append('places')
+        if filters.altitude_min is not None or filters.altitude_max is not None:
+            fields.append('altitude')
+        return tuple(fields)
+    
+    @staticmethod
+    def has_field_filters(filters: 'RefugiSearchFilters') -> bool:
+        """Indica si hi ha algun filtre que Firestore pugui resoldre (type, condition, places o altitude)"""
+        return (
+            bool(filters.type) or bool(filters.condition)
+            or filters.places_min is not None or filters.places_max is not None
+            or filters.altitude_min is not None or filters.altitude_max is not None
+        )
+    
     @staticmethod
     def select_strategy(filters: 'RefugiSearchFilters') -> RefugiSearchStrategy:
         """
@@ -581,4 +751,42 @@ class SearchStrategySelector:
         
         # No hauria d'arribar aquí si _has_active_filters funciona correctament
         raise ValueError("No s'ha pogut determinar cap estratègia per als filtres proporcionats")
+    
+    @classmethod
+    def plan(cls, filters: 'RefugiSearchFilters', statistics: Optional['RefugiSearchStatistics'] = None) -> SearchPlan:
+        """
+        Planifica la cerca triant l'estratègia que llegirà menys documents de Firestore
+        
+        Per a cada estratègia que només consulta camps amb filtre actiu s'estimen els documents
+        que retornarà la query (selectivitat de cada camp segons les estadístiques del catàleg).
+        Els camps que l'estratègia no resol es filtren en memòria.
+        
+        Args:
+            filters: Filtres de cerca
+            statistics: Estadístiques del catàleg (sense estadístiques s'usa select_strategy)
+            
+        Returns:
+            Pla de cerca amb l'estratègia, els filtres residuals i les files estimades
+        """
+        if statistics is None:
+            return SearchPlan(cls.select_strategy(filters))
+        
+        active = cls.active_fields(filters)
+        best = None
+        for order, strategy_class in enumerate(cls.STRATEGIES):
+            if not set(strategy_class.index_fields) <= set(active):
+                continue
+            residual = tuple(field for field in active if field not in strategy_class.filtered_fields)
+            unused = len(set(strategy_class.filtered_fields) - set(active))
+            estimated = statistics.estimate_rows(strategy_class.index_fields, filters)
+            # A igual cost, la que resol més filtres i s'ajusta millor als filtres actius
+            key = (estimated, len(residual), unused, order)
+            if best is None or key < best[0]:
+                best = (key, strategy_class, residual, estimated)
+        
+        if best is None:
+            raise ValueError("No s'ha pogut determinar cap estratègia per als filtres proporcionats")
+        
+        _, strategy_class, residual, estimated = best
+        return SearchPlan(strategy_class(), residual, estimated)
 
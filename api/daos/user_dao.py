@@ -8,7 +8,7 @@ from ..services.cache_service import cache_service
 from ..mappers.user_mapper import UserMapper
 from ..mappers.refugi_lliure_mapper import RefugiLliureMapper
 from ..models.user import User
-from google.cloud.firestore_v1.transforms import Increment
+from google.cloud.firestore_v1.transforms import Increment, ArrayUnion
 
 
 logger = logging.getLogger(__name__)
@@ -296,29 +296,19 @@ class UserDAO:
                 if not refugis_ids:
                     return []
             
-            # Obté la informació de cada refugi
-            db = self.firestore_service.get_db()
-            refugis_info = []
+            # Obté la informació de tots els refugis: una lectura múltiple a la cache,
+            # una sola lectura a Firestore (get_all) pels que falten i una escriptura múltiple
+            def fetch_many(ids: List[str]):
+                return self.firestore_service.get_documents('data_refugis_lliures', ids)
             
-            for refugi_id in refugis_ids:
-                # Comprova primer si està a cache
-                refugi_cache_key = cache_service.generate_key('refugi_detail', refugi_id=refugi_id)
-                refugi_data = cache_service.get(refugi_cache_key)
-                
-                if refugi_data is None:
-                    # Si no està a cache, obté de Firestore
-                    doc_ref = db.collection('data_refugis_lliures').document(str(refugi_id))
-                    logger.log(23, f"Firestore READ: collection=data_refugis_lliures document={refugi_id}")
-                    doc = doc_ref.get()
-                    
-                    if doc.exists:
-                        refugi_data = doc.to_dict()
-                        # Guarda a cache
-                        timeout = cache_service.get_timeout('refugi_detail')
-                        cache_service.set(refugi_cache_key, refugi_data, timeout)
-                
-                if refugi_data:
-                    refugis_info.append(refugi_data)
+            refugis_info = cache_service.get_or_fetch_many(
+                ids=[str(refugi_id) for refugi_id in refugis_ids],
+                detail_key_prefix='refugi_detail',
+                fetch_single_fn=None,
+                detail_timeout=cache_service.get_timeout('refugi_detail'),
+                id_param_name='refugi_id',
+                fetch_many_fn=fetch_many
+            )
             
             # Guarda a cache
             timeout = cache_service.get_timeout('user_detail')
@@ -331,6 +321,55 @@ class UserDAO:
             logger.error(f"Error obtenint informació de refugis de {list_name} per l'usuari {uid}: {str(e)}")
             return []
     
+    def add_refugis_to_visited(self, refugis_by_user: Dict[str, List[str]]) -> List[str]:
+        """
+        Afegeix refugis als visitats de diversos usuaris amb un sol WriteBatch (ArrayUnion)
+        
+        Args:
+            refugis_by_user: Diccionari UID -> IDs dels refugis visitats (màxim 500 usuaris)
+            
+        Returns:
+            List[str]: UIDs dels usuaris actualitzats (els que no existeixen s'ometen)
+        """
+        if not refugis_by_user:
+            return []
+        
+        try:
+            db = self.firestore_service.get_db()
+            collection = db.collection(self.COLLECTION_NAME)
+            
+            # Una sola lectura per descartar usuaris inexistents (update fallaria tot el batch)
+            existing = self.firestore_service.get_documents(self.COLLECTION_NAME, list(refugis_by_user), field_paths=['visited_refuges'])
+            
+            batch = db.batch()
+            updated_uids = []
+            for uid, refugis_ids in refugis_by_user.items():
+                if uid not in existing:
+                    logger.warning(f"No es poden afegir refugis visitats, usuari no trobat amb UID: {uid}")
+                    continue
+                batch.update(collection.document(uid), {'visited_refuges': ArrayUnion(list(refugis_ids))})
+                updated_uids.append(uid)
+            
+            if not updated_uids:
+                return []
+            
+            logger.log(23, f"Firestore BATCH UPDATE: collection={self.COLLECTION_NAME} documents={len(updated_uids)}")
+            batch.commit()
+            
+            # Invalida cache dels usuaris i de la info dels refugis visitats
+            keys = []
+            for uid in updated_uids:
+                keys.append(cache_service.generate_key('user_detail', uid=uid))
+                keys.append(cache_service.generate_key('user_refugis_info', uid=uid, list_name='visited_refuges'))
+            cache_service.delete_many(keys)
+            
+            logger.log(23, f"Refugis visitats afegits a {len(updated_uids)} usuaris")
+            return updated_uids
+            
+        except Exception as e:
+            logger.error(f"Error afegint refugis visitats a {len(refugis_by_user)} usuaris: {str(e)}")
+            return []
+    
     def increment_renovated_refuges(self, uid: str) -> bool:
         """
         Incrementa el comptador de refugis renovats per un usuari
@@ -0,0 +1,83 @@
+"""
+Management command per omplir el camp desnormalitzat 'visitor_uids' de les visites existents.
+
+RefugeVisitDAO.get_visits_by_user consulta les visites amb array_contains sobre
+'visitor_uids', per tant les visites creades abans d'aquest camp s'han d'actualitzar
+una sola vegada a partir de la llista 'visitors'.
+"""
+import logging
+from django.core.management.base import BaseCommand
+from api.daos.refuge_visit_dao import RefugeVisitDAO
+from api.services.firestore_service import FirestoreService
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Omple el camp visitor_uids de les visites a partir de la llista de visitors'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Mostra què s\'actualitzaria sense fer cap canvi'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Nombre de documents per batch (màxim 500)'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        batch_size = max(1, min(options['batch_size'], 500))  # Límit de Firestore
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('\n=== DRY RUN MODE - No es farà cap canvi ===\n'))
+
+        try:
+            db = FirestoreService().get_db()
+            collection = db.collection(RefugeVisitDAO.COLLECTION_NAME)
+            self.stdout.write(f'Llegint les visites de {RefugeVisitDAO.COLLECTION_NAME}...')
+
+            updated_count = 0
+            skipped_count = 0
+            batch = db.batch()
+            batch_counter = 0
+
+            for doc in collection.stream():
+                visit_data = doc.to_dict() or {}
+                visitor_uids = RefugeVisitDAO.get_visitor_uids(visit_data.get('visitors', []))
+
+                if visit_data.get('visitor_uids') == visitor_uids:
+                    skipped_count += 1
+                    continue
+
+                updated_count += 1
+                if dry_run:
+                    self.stdout.write(f'S\'actualitzaria {doc.id}: visitor_uids={visitor_uids}')
+                    continue
+
+                batch.update(collection.document(doc.id), {'visitor_uids': visitor_uids})
+                batch_counter += 1
+
+                if batch_counter >= batch_size:
+                    batch.commit()
+                    self.stdout.write(self.style.SUCCESS(f'Batch de {batch_counter} visites actualitzat'))
+                    batch = db.batch()
+                    batch_counter = 0
+
+            if not dry_run and batch_counter > 0:
+                batch.commit()
+                self.stdout.write(self.style.SUCCESS(f'Batch final de {batch_counter} visites actualitzat'))
+
+            self.stdout.write('\n' + '=' * 60)
+            self.stdout.write(self.style.SUCCESS('RESUM:'))
+            self.stdout.write(f'Visites actualitzades: {updated_count}')
+            self.stdout.write(f'Visites ja actualitzades: {skipped_count}')
+            self.stdout.write('=' * 60 + '\n')
+
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error inesperat: {str(e)}'))
+            logger.error(f'Error en backfill_visitor_uids command: {str(e)}')
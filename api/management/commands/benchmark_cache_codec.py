@@ -0,0 +1,129 @@
+"""
+Management command per comparar el format antic dels valors de cache (pickle + zlib de
+django-redis) amb el codec de CACHE_CODEC (msgpack + compressió segons la mida).
+
+Utilitza dades sintètiques amb la forma dels valors més grans de la cache: la llista de
+coordenades de tots els refugis i els detalls de refugi.
+"""
+import time
+import zlib
+import pickle
+from django.core.management.base import BaseCommand
+from api.services.cache_codec import CacheValueCodec, zstandard, lz4_frame
+
+
+class Command(BaseCommand):
+    help = 'Compara el cost de CPU i la mida dels valors de cache amb pickle+zlib i amb el codec'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--refuges',
+            type=int,
+            default=2000,
+            help='Nombre de refugis de les dades sintètiques'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Repeticions de cada codificació/descodificació'
+        )
+
+    def handle(self, *args, **options):
+        refuges = max(1, options['refuges'])
+        iterations = max(1, options['iterations'])
+        samples = {
+            'refugi_coords': self._coords(refuges),
+            'refugi_detail': [self._detail(i) for i in range(min(refuges, 200))],
+        }
+
+        codecs = [('pickle+zlib', self._legacy_encode, self._legacy_decode)]
+        for label, compression in self._codec_variants():
+            codec = CacheValueCodec(serializer='msgpack', compression=compression)
+            codecs.append((label, codec.encode, codec.decode))
+
+        self.stdout.write('\n' + '=' * 60)
+        self.stdout.write(self.style.SUCCESS('RESUM:'))
+        for sample_name, values in samples.items():
+            self.stdout.write(f'\n{sample_name} ({len(values)} valors):')
+            for label, encode, decode in codecs:
+                size, encode_time, decode_time = self._measure(values, encode, decode, iterations)
+                self.stdout.write(
+                    f'  {label:<14} {size:>10} bytes  '
+                    f'encode {encode_time * 1000:8.2f} ms  decode {decode_time * 1000:8.2f} ms'
+                )
+        self.stdout.write('=' * 60 + '\n')
+
+    @staticmethod
+    def _codec_variants():
+        variants = [('msgpack', 'none'), ('msgpack+zlib', 'zlib')]
+        if zstandard is not None:
+            variants.append(('msgpack+zstd', 'zstd'))
+        if lz4_frame is not None:
+            variants.append(('msgpack+lz4', 'lz4'))
+        return variants
+
+    @staticmethod
+    def _legacy_encode(value):
+        # Equivalent al PickleSerializer + ZlibCompressor de django-redis
+        data = pickle.dumps(value, protocol=pickle.DEFAULT_PROTOCOL)
+        return zlib.compress(data) if len(data) > 15 else data
+
+    @staticmethod
+    def _legacy_decode(data):
+        try:
+            data = zlib.decompress(data)
+        except zlib.error:
+            pass
+        return pickle.loads(data)
+
+    @staticmethod
+    def _measure(values, encode, decode, iterations):
+        """Retorna (bytes totals, temps mitjà d'encode, temps mitjà de decode) en segons"""
+        encoded = [encode(value) for value in values]
+        started_at = time.perf_counter()
+        for _ in range(iterations):
+            for value in values:
+                encode(value)
+        encode_time = (time.perf_counter() - started_at) / iterations
+
+        started_at = time.perf_counter()
+        for _ in range(iterations):
+            for data in encoded:
+                decode(data)
+        decode_time = (time.perf_counter() - started_at) / iterations
+        return sum(len(data) for data in encoded), encode_time, decode_time
+
+    @staticmethod
+    def _coords(refuges):
+        return [[{
+            'id': f'refugi_{i:05d}',
+            'coord': {'latitude': 42.0 + (i % 1000) / 1000, 'longitude': 0.5 + (i % 700) / 700},
+            'geohash': f'sp3e{i % 36:02d}x',
+            'name': f'Refugi número {i}',
+        } for i in range(refuges)]]
+
+    @staticmethod
+    def _detail(i):
+        return {
+            'id': f'refugi_{i:05d}',
+            'name': f'Refugi número {i}',
+            'surname': 'Cabana',
+            'coord': {'latitude': 42.0 + i / 1000, 'longitude': 0.5 + i / 1000},
+            'altitude': 1500 + i,
+            'places': i % 20,
+            'description': 'Refugi lliure de muntanya amb llar de foc i lliteres. ' * 6,
+            'links': [f'https://example.com/refugi/{i}'],
+            'type': 'non gardée',
+            'region': 'Pirineu',
+            'departement': 'Lleida',
+            'condition': i % 4,
+            'visitors': [f'uid_{j}' for j in range(i % 10)],
+            'images_metadata': [
+                {'key': f'refugis-lliures/refugi_{i}/foto_{j}.jpg', 'uploaded_at': '2025-06-01T10:00:00', 'creator_uid': 'uid_1'}
+                for j in range(3)
+            ],
+            'info_comp': {'manque_un_mur': False, 'cheminee': True, 'poele': False, 'couvertures': True,
+                          'latrines': False, 'bois': True, 'eau': True, 'matelas': False, 'couchage': True,
+                          'lits': True, 'mezzanine/etage': False},
+        }
@@ -0,0 +1,67 @@
+"""
+Management command per mesurar el cost de construir clients de R2 per crida
+respecte al client i els serveis de mitjans compartits pel procés.
+
+Simula una resposta de cerca amb N refugis amb imatges: per a cada refugi s'obté
+el servei de mitjans i es signa una URL (la signatura és local, no fa cap petició a R2).
+"""
+import time
+from django.core.management.base import BaseCommand
+from api.r2_config import create_r2_client, reset_r2_clients
+from api.services.r2_media_service import (
+    R2MediaService, RefugiMediaStrategy, get_refugi_media_service, reset_media_services
+)
+
+
+class Command(BaseCommand):
+    help = 'Compara clients de R2 creats per crida amb el registre de clients compartit'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--refuges',
+            type=int,
+            default=200,
+            help='Nombre de refugis amb imatges per petició simulada'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=3,
+            help='Nombre de peticions simulades'
+        )
+
+    def handle(self, *args, **options):
+        refuges = max(1, options['refuges'])
+        requests = max(1, options['requests'])
+        keys = [f'refugis-lliures/refugi_{i}/foto.jpg' for i in range(refuges)]
+
+        def per_call_request():
+            for key in keys:
+                service = R2MediaService(RefugiMediaStrategy())
+                service.client = create_r2_client()
+                service._sign_url(key, 3600)
+
+        def shared_request():
+            for key in keys:
+                get_refugi_media_service()._sign_url(key, 3600)
+
+        reset_r2_clients()
+        reset_media_services()
+        per_call = self._measure(per_call_request, requests)
+        shared = self._measure(shared_request, requests)
+
+        self.stdout.write('\n' + '=' * 60)
+        self.stdout.write(self.style.SUCCESS('RESUM:'))
+        self.stdout.write(f'Refugis per petició: {refuges}')
+        self.stdout.write(f'Client per crida: {per_call * 1000:.1f} ms/petició')
+        self.stdout.write(f'Client compartit: {shared * 1000:.1f} ms/petició')
+        self.stdout.write(f'Estalvi per petició: {(per_call - shared) * 1000:.1f} ms')
+        self.stdout.write('=' * 60 + '\n')
+
+    @staticmethod
+    def _measure(fn, repetitions: int) -> float:
+        """Retorna el temps mitjà en segons d'executar fn"""
+        started_at = time.perf_counter()
+        for _ in range(repetitions):
+            fn()
+        return (time.perf_counter() - started_at) / repetitions
@@ -0,0 +1,71 @@
+"""
+Management command per compactar el registre de canvis del catàleg de coordenades.
+
+GET /api/refuges/changes/?since=N respon a partir de les entrades de 'coords_refugis_changes'.
+Aquesta comanda elimina les entrades més antigues i avança el camp 'changes_floor' del document
+de coordenades: els clients amb una versió anterior reben el catàleg sencer.
+"""
+import logging
+from django.core.management.base import BaseCommand
+from api.daos.refuge_proposal_dao import COORDS_CHANGES_COLLECTION, coords_manifest_ref
+from api.services import cache_service
+from api.services.firestore_service import FirestoreService, FirestoreBatchWriter
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Elimina les entrades antigues del registre de canvis del catàleg de coordenades'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep',
+            type=int,
+            default=1000,
+            help='Nombre de versions més recents que es conserven al registre'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Mostra què s\'eliminaria sense fer cap canvi'
+        )
+
+    def handle(self, *args, **options):
+        keep = max(0, options['keep'])
+        dry_run = options['dry_run']
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('\n=== DRY RUN MODE - No es farà cap canvi ===\n'))
+
+        try:
+            db = FirestoreService().get_db()
+            coords_ref = coords_manifest_ref(db)
+            coords_doc = coords_ref.get()
+            if not coords_doc.exists:
+                self.stdout.write(self.style.WARNING('El document de coordenades no existeix'))
+                return
+
+            coords_data = coords_doc.to_dict() or {}
+            version = coords_data.get('version', 0)
+            floor = max(coords_data.get('changes_floor', 0), version - keep)
+            self.stdout.write(f'Versió actual: {version}. Es conserven les entrades posteriors a la versió {floor}')
+
+            # Primer s'avança el floor: un client no ha de rebre mai un interval parcialment eliminat
+            if not dry_run and floor > coords_data.get('changes_floor', 0):
+                coords_ref.update({'changes_floor': floor})
+                cache_service.invalidate_tags(['refugi_coords'])
+
+            old_entries = db.collection(COORDS_CHANGES_COLLECTION).where('version', '<=', floor).stream()
+            deleted_count = 0
+            with FirestoreBatchWriter(db) as writer:
+                for doc in old_entries:
+                    deleted_count += 1
+                    if not dry_run:
+                        writer.delete(doc.reference)
+
+            action = 'S\'eliminarien' if dry_run else 'Eliminades'
+            self.stdout.write(self.style.SUCCESS(f'{action} {deleted_count} entrades del registre de canvis'))
+
+        except Exception as e:
+            logger.error(f'Error compactant el registre de canvis: {str(e)}')
+            self.stdout.write(self.style.ERROR(f'Error: {str(e)}'))
@@ -4,10 +4,18 @@ from django.conf import settings
 import firebase_admin
 from firebase_admin import credentials, firestore
 from pathlib import Path
+from api.daos.refuge_proposal_dao import (
+    COORDS_DOCUMENT,
+    COORDS_SHARDS_SUBCOLLECTION,
+    coords_shard_data,
+    group_coords_by_shard,
+)
+from api.services.firestore_service import FirestoreBatchWriter
 
 """
 IMPORTANT: Aquesta comanda està dissenyada per a ser executada una sola vegada per migrar les coordenades dels refugis existents a una nova col·lecció
-anomenada 'coords_refugis'. Aquesta col·lecció contindrà un únic document amb totes les coordenades per facilitar les consultes geogràfiques.
+anomenada 'coords_refugis'. Aquesta col·lecció contindrà un document manifest (versió i shards) i les coordenades repartides en shards
+per prefix de geohash (subcol·lecció 'shards') per facilitar les consultes geogràfiques.
 
 Si ja s'ha executat aquesta comanda i la col·lecció 'coords_refugis' ja existeix, NO s'ha d'executar de nou per evitar duplicats, inconsistències o perdua d'informació.
 
@@ -65,6 +73,10 @@ class Command(BaseCommand):
         db = firestore.client()
 
         try:
+            # El catàleg reescrit ha de tenir una versió més alta que l'anterior perquè els clients
+            # el tornin a descarregar (el registre de canvis no cobreix la reescriptura)
+            version = self._next_version(db, target_collection) if not dry_run else None
+
             # Clear target collection if requested
             if clear_target and not dry_run:
                 self.stdout.write(f'Clearing target collection: {target_collection}')
@@ -126,30 +138,39 @@ class Command(BaseCommand):
                     )
 
             if not dry_run:
-                # Create a single document with all coordinates
-                self.stdout.write(f'Writing all {len(coords_data)} coordinates to a single document in {target_collection}')
+                # Repartir les coordenades en shards per prefix de geohash
+                shards = group_coords_by_shard([coord_item['data'] for coord_item in coords_data])
+                self.stdout.write(f'Writing {len(coords_data)} coordinates in {len(shards)} shards to {target_collection}')
+                
+                manifest_ref = db.collection(target_collection).document(COORDS_DOCUMENT)
+                shards_ref = manifest_ref.collection(COORDS_SHARDS_SUBCOLLECTION)
+                with FirestoreBatchWriter(db) as writer:
+                    for shard_id, entries in shards.items():
+                        writer.set(shards_ref.document(shard_id), coords_shard_data(shard_id, entries, version))
+                    # Els shards que ja no tenen refugis s'eliminen
+                    for doc in shards_ref.stream():
+                        if doc.id not in shards:
+                            writer.delete(doc.reference)
                 
-                # Prepare the single document with all coordinates
-                all_coords_doc = {
-                    'refugis_coordinates': [coord_item['data'] for coord_item in coords_data],
+                # El manifest s'escriu al final: els lectors no veuen la nova versió fins que tots els shards hi són
+                manifest_ref.set({
+                    'shards': {shard_id: version for shard_id in shards},
                     'total_refugis': len(coords_data),
+                    'version': version,
+                    'changes_floor': version,
                     'created_at': firestore.SERVER_TIMESTAMP,
                     'last_updated': firestore.SERVER_TIMESTAMP
-                }
-                
-                target_ref = db.collection(target_collection)
-                doc_ref = target_ref.document('all_refugis_coords')  # Single document ID
-                doc_ref.set(all_coords_doc)
+                })
                 
                 self.stdout.write(
                     self.style.SUCCESS(
-                        f'Successfully created single document with {processed_count} refugi coordinates in collection: {target_collection}'
+                        f'Successfully created {len(shards)} shards with {processed_count} refugi coordinates in collection: {target_collection}'
                     )
                 )
             else:
                 self.stdout.write(
                     self.style.SUCCESS(
-                        f'[DRY RUN] Would create a single document with {processed_count} refugi coordinates'
+                        f'[DRY RUN] Would create the sharded catalogue with {processed_count} refugi coordinates'
                     )
                 )
 
@@ -167,6 +188,14 @@ class Command(BaseCommand):
                 self.style.ERROR(f'Error processing refugis: {str(e)}')
             )
 
+    def _next_version(self, db, collection_name):
+        """Versió següent a la del document de coordenades actual (1 si no existeix)"""
+        doc = db.collection(collection_name).document('all_refugis_coords').get()
+        if not doc.exists:
+            return 1
+        version = (doc.to_dict() or {}).get('version', 0)
+        return version + 1 if isinstance(version, int) else 1
+
     def _clear_collection(self, db, collection_name):
         """Clear all documents from a collection"""
         docs = db.collection(collection_name).stream()
@@ -196,7 +225,10 @@ class Command(BaseCommand):
             if doc.exists:
                 data = doc.to_dict()
                 refugis_count = data.get('total_refugis', 0)
-                self.stdout.write(f'Collection {collection_name} contains 1 document with {refugis_count} refugi coordinates')
+                self.stdout.write(
+                    f'Collection {collection_name} contains {refugis_count} refugi coordinates '
+                    f'in {len(data.get("shards", {}))} shards'
+                )
             else:
                 self.stdout.write(f'Collection {collection_name} is empty')
         except Exception as e:
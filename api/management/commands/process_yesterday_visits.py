@@ -3,7 +3,8 @@ Management command per processar les visites d'ahir
 Afegeix els visitants a la llista de visitors del refugi i elimina visites buides
 """
 import logging
-from django.core.management.base import BaseCommand
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
 from api.controllers.refuge_visit_controller import RefugeVisitController
 
 logger = logging.getLogger(__name__)
@@ -12,13 +13,44 @@ logger = logging.getLogger(__name__)
 class Command(BaseCommand):
     help = 'Processa les visites d\'ahir: afegeix visitants als refugis i elimina visites buides'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            type=str,
+            default=None,
+            help='Data a processar (YYYY-MM-DD). Per defecte, ahir'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=RefugeVisitController.WRITE_BATCH_LIMIT,
+            help='Nombre màxim d\'operacions per WriteBatch (màxim 500)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=RefugeVisitController.DEFAULT_PROCESS_WORKERS,
+            help='Nombre màxim de batches aplicats en paral·lel'
+        )
+
     def handle(self, *args, **options):
         """Processa les visites d'ahir"""
-        self.stdout.write(self.style.NOTICE('Processant visites d\'ahir...'))
+        target_date = options.get('date')
+        if target_date:
+            try:
+                date.fromisoformat(target_date)
+            except ValueError:
+                raise CommandError(f'Data invàlida: {target_date}. Format esperat: YYYY-MM-DD')
+        
+        self.stdout.write(self.style.NOTICE(f'Processant visites del {target_date}...' if target_date else 'Processant visites d\'ahir...'))
         
         try:
             controller = RefugeVisitController()
-            success, stats, error = controller.process_yesterday_visits()
+            success, stats, error = controller.process_yesterday_visits(
+                target_date=target_date,
+                batch_size=options.get('batch_size') or RefugeVisitController.WRITE_BATCH_LIMIT,
+                workers=options.get('workers') or RefugeVisitController.DEFAULT_PROCESS_WORKERS
+            )
             
             if not success:
                 self.stdout.write(self.style.ERROR(f'Error processant visites: {error}'))
@@ -31,8 +63,14 @@ class Command(BaseCommand):
             self.stdout.write(f'\nVisites processades: {stats["processed_visits"]}')
             self.stdout.write(f'Visites buides eliminades: {stats["deleted_visits"]}')
             self.stdout.write(f'Refugis actualitzats: {stats["updated_refuges"]}')
+            if 'updated_users' in stats:
+                self.stdout.write(f'Usuaris actualitzats: {stats["updated_users"]}')
             self.stdout.write(f'Total visitants afegits: {stats["total_visitors_added"]}\n')
             
+            # Mostra el temps de cada fase
+            for phase, seconds in stats.get('timings', {}).items():
+                self.stdout.write(f'Temps {phase}: {seconds:.3f}s')
+            
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Error inesperat: {str(e)}'))
             logger.error(f'Error en process_yesterday_visits command: {str(e)}')
@@ -90,7 +90,7 @@ class RefugiLliureMapper:
             refugi_dict = refugi.to_dict()
             if 'media_metadata' in refugi_dict:
                 refugi_dict.pop('media_metadata', None)
-            results.append(refugi.to_dict())
+            results.append(refugi_dict)
         
         return {
             'count': len(refugis),
@@ -2,5 +2,6 @@
 Middleware per a l'aplicació API
 """
 from .firebase_auth_middleware import FirebaseAuthenticationMiddleware
+from .request_cost_middleware import RequestCostMiddleware
 
-__all__ = ['FirebaseAuthenticationMiddleware']
+__all__ = ['FirebaseAuthenticationMiddleware', 'RequestCostMiddleware']
@@ -6,6 +6,7 @@ from django.utils.deprecation import MiddlewareMixin
 from firebase_admin import auth
 from rest_framework import status
 from django.http import JsonResponse
+from ..services.token_cache_service import token_cache_service
 
 logger = logging.getLogger(__name__)
 
@@ -56,8 +57,8 @@ class FirebaseAuthenticationMiddleware(MiddlewareMixin):
         token = token_parts[1]
         
         try:
-            # Verifica el token amb Firebase Admin SDK
-            decoded_token = auth.verify_id_token(token)
+            # Verifica el token amb Firebase Admin SDK (reutilitza verificacions anteriors fins a 'exp')
+            decoded_token = token_cache_service.verify_id_token(token, auth.verify_id_token)
             
             # Afegeix la informació de l'usuari a la request
             request.firebase_user = decoded_token
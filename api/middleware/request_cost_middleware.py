@@ -0,0 +1,49 @@
+"""
+Middleware que comptabilitza el cost de cada petició (Firestore, cache i R2)
+"""
+import json
+import logging
+from django.conf import settings
+from ..utils.request_cost import track_request
+
+logger = logging.getLogger('api.access')
+
+
+class RequestCostMiddleware:
+    """
+    Obre un RequestCost per a cada petició i l'emet com a capçalera Server-Timing
+    (visible a les DevTools del navegador) i com a línia JSON al log d'accés.
+    """
+
+    # Configuració per defecte (es pot sobreescriure amb settings.REQUEST_COST)
+    DEFAULTS = {
+        'ENABLED': True,
+        'SERVER_TIMING': True,
+        'ACCESS_LOG': True,
+    }
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = {**self.DEFAULTS, **getattr(settings, 'REQUEST_COST', {})}
+        self.enabled = config['ENABLED']
+        self.server_timing = config['SERVER_TIMING']
+        self.access_log = config['ACCESS_LOG']
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        with track_request() as cost:
+            response = self.get_response(request)
+
+            if self.server_timing:
+                response['Server-Timing'] = cost.server_timing()
+            if self.access_log and logger.isEnabledFor(logging.INFO):
+                logger.info(json.dumps({
+                    'method': request.method,
+                    'path': request.path,
+                    'status': response.status_code,
+                    'uid': getattr(request, 'user_uid', None),
+                    'cost': cost.as_dict(),
+                }))
+        return response
@@ -1,10 +1,13 @@
 """
 Model per representar metadades de mitjans (imatges i vídeos) emmagatzemats a R2
 """
-from dataclasses import dataclass
-from typing import Optional
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, Optional
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass
 class MediaMetadata:
@@ -17,16 +20,28 @@ class MediaMetadata:
         url: URL prefirmada per accedir al fitxer
         creator_uid: UID de l'usuari que ha pujat el mitjà
         uploaded_at: Data i hora de pujada (ISO 8601 format)
+        url_resolver: Funció que genera la URL a partir de la key quan es necessita (signatura diferida)
     """
     key: str
     url: str
     uploaded_at: str = None  # ISO 8601 format: "2024-12-08T10:30:00Z"
+    url_resolver: Optional[Callable[[str], str]] = field(default=None, repr=False, compare=False, kw_only=True)
+    
+    def resolve_url(self) -> str:
+        """Retorna la URL del mitjà, generant-la amb url_resolver la primera vegada que es necessita"""
+        if not self.url and self.key and self.url_resolver is not None:
+            try:
+                self.url = self.url_resolver(self.key)
+            except Exception as e:
+                logger.warning(f"No s'ha pogut generar la URL per {self.key}: {str(e)}")
+            self.url_resolver = None
+        return self.url
     
     def to_dict(self) -> dict:
         """Converteix les metadades a diccionari"""
         return {
             'key': self.key,
-            'url': self.url,
+            'url': self.resolve_url(),
             'uploaded_at': self.uploaded_at
         }
     
@@ -147,12 +147,13 @@ class Refugi:
         coord_data = data.get('coord', {})
         info_comp_data = data.get('info_comp', {})
 
-        # Generem les metadades amb URLs prefirmades
+        # Generem les metadades amb signatura diferida: les URLs prefirmades només
+        # es generen quan es serialitza el refugi (to_dict)
         images_metadata = []
         if 'media_metadata' in data and data['media_metadata']:
             try:
                 media_service = r2_media_service.get_refugi_media_service()
-                images_metadata = media_service.generate_media_metadata_list(data['media_metadata'])
+                images_metadata = media_service.generate_media_metadata_list(data['media_metadata'], lazy=True)
             except Exception as e:
                 logger.warning(f"Error generant MediaMetadata per refugi {data.get('id', '')}: {str(e)}")
                 images_metadata = []
@@ -166,13 +167,14 @@ class Refugi:
             remarque=data.get('remarque', ''),
             info_comp=InfoComplementaria.from_dict(info_comp_data),
             description=data.get('description'),
-            links=data.get('links', []),
+            # Còpies de les llistes: data pot ser el diccionari compartit de la cache L1
+            links=list(data.get('links') or []),
             type=data.get('type', ''),
             modified_at=data.get('modified_at', ''),
             region=data.get('region'),
             departement=data.get('departement'),
             condition=data.get('condition'),
-            visitors=data.get('visitors', []),
+            visitors=list(data.get('visitors') or []),
             images_metadata=images_metadata
         )
     
@@ -228,6 +230,11 @@ class RefugiSearchFilters:
     altitude_min: Optional[int] = None
     altitude_max: Optional[int] = None
     
+    # Geographic filters
+    bbox: Optional[List[float]] = None  # [min_long, min_lat, max_long, max_lat]
+    near: Optional[List[float]] = None  # [lat, long]
+    radius_km: Optional[float] = None
+    
     def __post_init__(self):
         """Validacions dels filtres"""
         # Normalize empty strings to defaults
@@ -239,34 +246,71 @@ class RefugiSearchFilters:
             self.condition = []
 
     def to_dict(self) -> dict:
-        """Retorna una representació dict dels filtres.
+        """Retorna una representació dict canònica dels filtres.
 
         Aquesta representació s'utilitza per generar claus de cache
         basades en els valors dels filtres. Només incloem camps
-        que siguin rellevants i establim valors normals per a None.
+        que siguin rellevants i normalitzem els valors perquè filtres
+        equivalents (llistes en un altre ordre o amb repetits, límits
+        1000 i 1000.0) generin la mateixa clau.
         """
         out: Dict[str, Any] = {}
 
         # Include text filters only when non-empty
         if isinstance(self.name, str) and self.name.strip():
             out['name'] = self.name.strip()
-        if isinstance(self.type, list) and len(self.type) > 0:
-            out['type'] = sorted(self.type)  # Sort for consistent cache keys
+        if isinstance(self.type, list):
+            types = {t.strip() for t in self.type if isinstance(t, str) and t.strip()}
+            if types:
+                out['type'] = sorted(types)  # Sort for consistent cache keys
         if isinstance(self.condition, list) and len(self.condition) > 0:
-            out['condition'] = sorted(self.condition)  # Sort for consistent cache keys
+            out['condition'] = sorted(set(self.condition))  # Sort for consistent cache keys
 
         # Numeric ranges
-        if self.places_min is not None:
-            out['places_min'] = self.places_min
-        if self.places_max is not None:
-            out['places_max'] = self.places_max
-        if self.altitude_min is not None:
-            out['altitude_min'] = self.altitude_min
-        if self.altitude_max is not None:
-            out['altitude_max'] = self.altitude_max
+        for key in ('places_min', 'places_max', 'altitude_min', 'altitude_max'):
+            value = getattr(self, key)
+            if value is not None:
+                out[key] = int(value) if isinstance(value, float) and value.is_integer() else value
+
+        # Geographic filters (coordenades arrodonides a ~10 cm)
+        if self.bbox:
+            out['bbox'] = [round(value, 6) for value in self.bbox]
+        if self.near:
+            out['near'] = [round(value, 6) for value in self.near]
+            if self.radius_km is not None:
+                out['radius_km'] = self.radius_km
 
         return out
 
+    def has_geo_filters(self) -> bool:
+        """Indica si la cerca està limitada a una àrea (bbox o near + radius_km)"""
+        return bool(self.bbox) or bool(self.near and self.radius_km is not None)
+
+    def subsumes(self, other: 'RefugiSearchFilters') -> bool:
+        """Indica si els resultats d'aquesta cerca inclouen tots els de other (igual o més restrictiva).
+
+        Només es comparen cerques sense filtres geogràfics i amb el mateix nom:
+        els resultats de other són els d'aquesta cerca que compleixen els seus filtres.
+        """
+        if self.has_geo_filters() or other.has_geo_filters():
+            return False
+        mine, theirs = self.to_dict(), other.to_dict()
+        if mine.get('name') != theirs.get('name'):
+            return False
+
+        for key in ('type', 'condition'):
+            if key in mine and not (key in theirs and set(theirs[key]) <= set(mine[key])):
+                return False
+
+        for field_name in ('places', 'altitude'):
+            minimum, maximum = mine.get(f'{field_name}_min'), mine.get(f'{field_name}_max')
+            other_minimum, other_maximum = theirs.get(f'{field_name}_min'), theirs.get(f'{field_name}_max')
+            if minimum is not None and (other_minimum is None or other_minimum < minimum):
+                return False
+            if maximum is not None and (other_maximum is None or other_maximum > maximum):
+                return False
+        return True
+
     @classmethod
     def from_dict(cls, data: dict) -> 'RefugiSearchFilters':
         """Crea un RefugiSearchFilters a partir d'un dict (opcional)."""
@@ -278,5 +322,8 @@ class RefugiSearchFilters:
             places_max=data.get('places_max'),
             altitude_min=data.get('altitude_min'),
             altitude_max=data.get('altitude_max'),
+            bbox=data.get('bbox'),
+            near=data.get('near'),
+            radius_km=data.get('radius_km'),
         )
             
\ No newline at end of file
@@ -1,11 +1,41 @@
 import os
+import threading
 import boto3
 from botocore.config import Config
+from .utils.request_cost import instrument_r2_client
 
+# Mida del pool de connexions HTTP de cada client (compartit per tots els threads del procés)
+DEFAULT_R2_MAX_POOL_CONNECTIONS = 25
 
-def get_r2_client():
+# Registre de clients per procés: (pid, credencials, endpoint) -> client
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _reset_clients_after_fork():
+    """
+    Descarta els clients heretats del procés pare. Els workers de gunicorn es creen
+    amb fork (preload_app) i no poden compartir les connexions obertes pel master.
+    """
+    global _clients_lock
+    _clients.clear()
+    _clients_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_clients_after_fork)
+
+
+def _get_max_pool_connections():
+    try:
+        return max(1, int(os.getenv("R2_MAX_POOL_CONNECTIONS", DEFAULT_R2_MAX_POOL_CONNECTIONS)))
+    except ValueError:
+        return DEFAULT_R2_MAX_POOL_CONNECTIONS
+
+
+def create_r2_client():
     """
-    Creates and returns a configured boto3 S3 client for Cloudflare R2.
+    Creates and returns a new configured boto3 S3 client for Cloudflare R2.
     Les variables d'entorn es llegeixen dins de la funció per permetre
     que els tests les configurin abans de la primera crida.
     """
@@ -17,7 +47,7 @@ def get_r2_client():
     if not all([r2_access_key_id, r2_secret_access_key, r2_endpoint, r2_bucket_name]):
         raise ValueError("R2 configuration is incomplete. Please check environment variables.")
     
-    return boto3.client(
+    client = boto3.client(
         service_name='s3',
         endpoint_url=r2_endpoint,
         aws_access_key_id=r2_access_key_id,
@@ -25,9 +55,44 @@ def get_r2_client():
         region_name='auto',  # Cloudflare R2 uses 'auto' as region
         config=Config(
             signature_version='s3v4',
-            s3={'addressing_style': 'path'}
+            s3={'addressing_style': 'path'},
+            max_pool_connections=_get_max_pool_connections(),
+            tcp_keepalive=True
         )
     )
+    instrument_r2_client(client)
+    return client
+
+
+def get_r2_client():
+    """
+    Returns the process-wide boto3 S3 client for Cloudflare R2.
+    El client es crea una sola vegada per procés i configuració (els clients de boto3
+    són thread-safe) i es torna a crear després d'un fork o si canvien les variables d'entorn.
+    """
+    key = (
+        os.getpid(),
+        os.getenv("R2_ACCESS_KEY_ID"),
+        os.getenv("R2_SECRET_ACCESS_KEY"),
+        os.getenv("R2_ENDPOINT"),
+        os.getenv("R2_BUCKET_NAME")
+    )
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = create_r2_client()
+            _clients[key] = client
+        return client
+
+
+def reset_r2_clients():
+    """Descarta tots els clients del registre (tests i canvis de configuració)"""
+    with _clients_lock:
+        _clients.clear()
 
 
 # Per mantenir compatibilitat, exportem les variables com a funcions
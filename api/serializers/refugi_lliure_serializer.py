@@ -2,6 +2,7 @@
 Serializers per a la gestió de refugis
 """
 from rest_framework import serializers
+from ..services.refugi_cluster_service import MIN_ZOOM, MAX_ZOOM
 
 VALID_TYPES = ['non gardé', 'fermée', 'cabane ouverte mais ocupee par le berger l ete', 'orri', 'emergence', 'key_needed']
 
@@ -79,6 +80,43 @@ class RefugiSearchResponseSerializer(serializers.Serializer):
     count = serializers.IntegerField()
     results = RefugiSerializer(many=True)
 
+def _parse_coordinates(value, field_name, size, format_name):
+    """Converteix una llista de nombres separats per comes (None si és buida)"""
+    if not value or not value.strip():
+        return None
+    try:
+        numbers = [float(part.strip()) for part in value.split(',')]
+    except ValueError:
+        numbers = []
+    if len(numbers) != size or any(number != number for number in numbers):
+        raise serializers.ValidationError({
+            field_name: f'{field_name} ha de tenir el format {format_name}'
+        })
+    return numbers
+
+
+def _validate_lat_long(lat, long, field_name):
+    if not -90 <= lat <= 90:
+        raise serializers.ValidationError({field_name: 'La latitud ha d\'estar entre -90 i 90'})
+    if not -180 <= long <= 180:
+        raise serializers.ValidationError({field_name: 'La longitud ha d\'estar entre -180 i 180'})
+
+
+def parse_bbox(value):
+    """Valida un bbox 'min_lon,min_lat,max_lon,max_lat' i el retorna com a llista (None si és buit)"""
+    bbox = _parse_coordinates(value, 'bbox', 4, 'min_lon,min_lat,max_lon,max_lat')
+    if bbox is not None:
+        min_long, min_lat, max_long, max_lat = bbox
+        _validate_lat_long(min_lat, min_long, 'bbox')
+        _validate_lat_long(max_lat, max_long, 'bbox')
+        # No es contemplen les àrees que travessen l'antimeridià
+        if min_long > max_long or min_lat > max_lat:
+            raise serializers.ValidationError({
+                'bbox': 'Els valors mínims del bbox han de ser menors o iguals que els màxims'
+            })
+    return bbox
+
+
 class RefugiSearchFiltersSerializer(serializers.Serializer):
     """Serializer per a filtres de cerca"""
     # Text search
@@ -104,6 +142,34 @@ class RefugiSearchFiltersSerializer(serializers.Serializer):
     altitude_min = serializers.IntegerField(required=False, allow_null=True, min_value=0, max_value=8848)
     altitude_max = serializers.IntegerField(required=False, allow_null=True, min_value=0, max_value=8848)
     
+    # Geographic filters
+    bbox = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        default='',
+        help_text="Bounding box min_lon,min_lat,max_lon,max_lat"
+    )
+    near = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        default='',
+        help_text="Search centre lat,lon (requires radius_km). Results are sorted by distance"
+    )
+    radius_km = serializers.FloatField(required=False, allow_null=True, min_value=0.1, max_value=500)
+    
+    def _validate_geo(self, data):
+        data['bbox'] = parse_bbox(data.get('bbox'))
+        
+        near = _parse_coordinates(data.get('near'), 'near', 2, 'lat,lon')
+        if near is not None:
+            _validate_lat_long(near[0], near[1], 'near')
+        data['near'] = near
+        
+        if near is not None and data.get('radius_km') is None:
+            raise serializers.ValidationError({'radius_km': 'radius_km és obligatori si s\'indica near'})
+        if near is None and data.get('radius_km') is not None:
+            raise serializers.ValidationError({'near': 'near és obligatori si s\'indica radius_km'})
+    
     def _validate_range(self, min_value, max_value, field_prefix):
         if min_value is not None and min_value < 0:
             raise serializers.ValidationError({
@@ -161,8 +227,44 @@ class RefugiSearchFiltersSerializer(serializers.Serializer):
         altitude_max = data.get('altitude_max')
         self._validate_range(altitude_min, altitude_max, 'altitude')
         
+        self._validate_geo(data)
+        
+        return data
+
+class RefugiChangesQuerySerializer(serializers.Serializer):
+    """Serializer per als paràmetres de la sincronització incremental del catàleg"""
+    since = serializers.IntegerField(
+        min_value=0,
+        help_text="Versió del catàleg que té el client (la retornada per l'última sincronització)"
+    )
+
+class RefugiClustersQuerySerializer(serializers.Serializer):
+    """Serializer per als paràmetres de l'agrupació de refugis del mapa"""
+    zoom = serializers.IntegerField(
+        min_value=MIN_ZOOM,
+        max_value=MAX_ZOOM,
+        help_text="Nivell de zoom del mapa"
+    )
+    bbox = serializers.CharField(help_text="Àrea visible min_lon,min_lat,max_lon,max_lat")
+    
+    def validate(self, data):
+        data['bbox'] = parse_bbox(data['bbox'])
         return data
 
+class RefugiAutocompleteQuerySerializer(serializers.Serializer):
+    """Serializer per als paràmetres de l'autocompletat del nom dels refugis"""
+    q = serializers.CharField(
+        max_length=100,
+        help_text="Text escrit per l'usuari (nom parcial, sense accents o amb errors)"
+    )
+    limit = serializers.IntegerField(
+        required=False,
+        default=10,
+        min_value=1,
+        max_value=50,
+        help_text="Nombre màxim de suggeriments"
+    )
+
 class UserRefugiInfoSerializer(serializers.Serializer):
     """Serializer per a llistar refugis preferits o visitats amb informació resumida"""
     
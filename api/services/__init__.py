@@ -2,5 +2,9 @@ from .firestore_service import firestore_service
 from .cache_service import cache_service, cache_result
 from .r2_media_service import R2MediaService
 from .condition_service import ConditionService
+from .refugi_index_service import refugi_index_service
+from .refugi_cluster_service import refugi_cluster_service
+from .refugi_name_index_service import refugi_name_index_service
+from .token_cache_service import token_cache_service
 
-__all__ = ['firestore_service', 'cache_service', 'cache_result', 'R2MediaService', 'ConditionService']
\ No newline at end of file
+__all__ = ['firestore_service', 'cache_service', 'cache_result', 'R2MediaService', 'ConditionService', 'refugi_index_service', 'refugi_cluster_service', 'refugi_name_index_service', 'token_cache_service']
\ No newline at end of file
@@ -0,0 +1,218 @@
+"""
+Codec dels valors guardats a Redis
+
+Els valors es serialitzen amb msgpack (més compacte i ràpid que pickle per als diccionaris
+de Firestore) i, a partir d'una mida mínima, es comprimeixen amb zstd, lz4 o zlib segons
+el que estigui instal·lat. Cada valor porta una capçalera amb la versió, el format i la
+compressió, de manera que es poden canviar aquests paràmetres sense invalidar la cache:
+els valors antics (pickle + zlib de django-redis) es continuen llegint.
+
+Capçalera (5 bytes): MAGIC (2) + versió (1) + format (1) + compressió (1)
+"""
+import zlib
+import pickle
+import logging
+from typing import Any, Dict, Optional
+from .cache_metrics import cache_metrics
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - depèn de l'entorn
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+logger = logging.getLogger(__name__)
+
+
+class CacheCodecError(Exception):
+    """Error descodificant un valor de la cache"""
+    pass
+
+
+class CacheValueCodec:
+    """Codifica i descodifica valors de cache amb capçalera de versió"""
+
+    MAGIC = b'\xc1R'  # 0xc1 no és un byte inicial vàlid ni de pickle ni de zlib
+    VERSION = 1
+
+    FORMAT_MSGPACK = 1
+    FORMAT_PICKLE = 2
+
+    COMPRESSION_NONE = 0
+    COMPRESSION_ZLIB = 1
+    COMPRESSION_ZSTD = 2
+    COMPRESSION_LZ4 = 3
+
+    COMPRESSION_NAMES = {
+        'none': COMPRESSION_NONE,
+        'zlib': COMPRESSION_ZLIB,
+        'zstd': COMPRESSION_ZSTD,
+        'lz4': COMPRESSION_LZ4,
+    }
+
+    def __init__(
+        self,
+        serializer: str = 'msgpack',
+        compression: str = 'auto',
+        compress_min_size: int = 512,
+        level: Optional[int] = None
+    ):
+        """
+        Args:
+            serializer: 'msgpack' o 'pickle' (msgpack recorre a pickle pels tipus no suportats)
+            compression: 'auto' (zstd > lz4 > zlib segons disponibilitat), 'zstd', 'lz4', 'zlib' o 'none'
+            compress_min_size: Mida mínima en bytes per comprimir un valor
+            level: Nivell de compressió (None = per defecte de cada algorisme)
+        """
+        self.format = self.FORMAT_MSGPACK if serializer == 'msgpack' and msgpack is not None else self.FORMAT_PICKLE
+        self.compression = self._resolve_compression(compression)
+        self.compress_min_size = compress_min_size
+        self.level = level
+        self._zstd_compressor = None
+        self._zstd_decompressor = None
+
+    @classmethod
+    def _resolve_compression(cls, name: str) -> int:
+        if name == 'auto':
+            if zstandard is not None:
+                return cls.COMPRESSION_ZSTD
+            if lz4_frame is not None:
+                return cls.COMPRESSION_LZ4
+            return cls.COMPRESSION_ZLIB
+        compression = cls.COMPRESSION_NAMES.get(name)
+        if compression is None:
+            raise ValueError(f"Compressió de cache desconeguda: {name}")
+        if compression == cls.COMPRESSION_ZSTD and zstandard is None:
+            logger.warning("zstandard no està instal·lat, s'utilitza zlib per a la cache")
+            return cls.COMPRESSION_ZLIB
+        if compression == cls.COMPRESSION_LZ4 and lz4_frame is None:
+            logger.warning("lz4 no està instal·lat, s'utilitza zlib per a la cache")
+            return cls.COMPRESSION_ZLIB
+        return compression
+
+    @staticmethod
+    def _msgpack_default(value: Any) -> Any:
+        # Tipus no representables sense pèrdua (tuples, sets, objectes...): es fa servir pickle
+        raise TypeError(f"Tipus no suportat per msgpack: {type(value).__name__}")
+
+    def _serialize(self, value: Any) -> tuple:
+        if self.format == self.FORMAT_MSGPACK:
+            try:
+                return self.FORMAT_MSGPACK, msgpack.packb(
+                    value, use_bin_type=True, strict_types=True, default=self._msgpack_default
+                )
+            except (TypeError, ValueError, OverflowError):
+                pass
+        return self.FORMAT_PICKLE, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _compress(self, compression: int, payload: bytes) -> bytes:
+        if compression == self.COMPRESSION_ZSTD:
+            if self._zstd_compressor is None:
+                self._zstd_compressor = zstandard.ZstdCompressor(level=self.level or 3)
+            return self._zstd_compressor.compress(payload)
+        if compression == self.COMPRESSION_LZ4:
+            return lz4_frame.compress(payload, compression_level=self.level or 0)
+        return zlib.compress(payload, self.level or 6)
+
+    def _decompress(self, compression: int, payload: bytes) -> bytes:
+        if compression == self.COMPRESSION_NONE:
+            return payload
+        if compression == self.COMPRESSION_ZLIB:
+            return zlib.decompress(payload)
+        if compression == self.COMPRESSION_ZSTD:
+            if zstandard is None:
+                raise CacheCodecError("Valor comprimit amb zstd però zstandard no està instal·lat")
+            if self._zstd_decompressor is None:
+                self._zstd_decompressor = zstandard.ZstdDecompressor()
+            return self._zstd_decompressor.decompress(payload)
+        if compression == self.COMPRESSION_LZ4:
+            if lz4_frame is None:
+                raise CacheCodecError("Valor comprimit amb lz4 però lz4 no està instal·lat")
+            return lz4_frame.decompress(payload)
+        raise CacheCodecError(f"Compressió desconeguda: {compression}")
+
+    def encode(self, value: Any) -> bytes:
+        """Serialitza (i comprimeix si supera la mida mínima) un valor"""
+        value_format, payload = self._serialize(value)
+        compression = self.COMPRESSION_NONE
+        if self.compression != self.COMPRESSION_NONE and len(payload) >= self.compress_min_size:
+            compressed = self._compress(self.compression, payload)
+            if len(compressed) < len(payload):
+                compression, payload = self.compression, compressed
+        return self.MAGIC + bytes((self.VERSION, value_format, compression)) + payload
+
+    def decode(self, data: bytes) -> Any:
+        """Descodifica un valor amb capçalera o un valor antic (pickle, opcionalment amb zlib)"""
+        if not data.startswith(self.MAGIC):
+            return self._decode_legacy(data)
+
+        version, value_format, compression = data[2], data[3], data[4]
+        if version != self.VERSION:
+            raise CacheCodecError(f"Versió de codec desconeguda: {version}")
+        payload = self._decompress(compression, data[5:])
+        if value_format == self.FORMAT_MSGPACK:
+            if msgpack is None:
+                raise CacheCodecError("Valor en msgpack però msgpack no està instal·lat")
+            return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+        if value_format == self.FORMAT_PICKLE:
+            return pickle.loads(payload)
+        raise CacheCodecError(f"Format desconegut: {value_format}")
+
+    @staticmethod
+    def _decode_legacy(data: bytes) -> Any:
+        """Valors escrits amb el PickleSerializer + ZlibCompressor de django-redis"""
+        try:
+            data = zlib.decompress(data)
+        except zlib.error:
+            pass  # Valors petits que django-redis no comprimia
+        return pickle.loads(data)
+
+    def describe(self) -> Dict[str, Any]:
+        names = {value: name for name, value in self.COMPRESSION_NAMES.items()}
+        return {
+            'version': self.VERSION,
+            'serializer': 'msgpack' if self.format == self.FORMAT_MSGPACK else 'pickle',
+            'compression': names[self.compression],
+            'compress_min_size': self.compress_min_size,
+        }
+
+
+def build_codec(options: Optional[Dict[str, Any]] = None) -> CacheValueCodec:
+    """Construeix el codec a partir de settings.CACHE_CODEC (o de les opcions donades)"""
+    if options is None:
+        from django.conf import settings
+        options = getattr(settings, 'CACHE_CODEC', {})
+    return CacheValueCodec(
+        serializer=options.get('SERIALIZER', 'msgpack'),
+        compression=options.get('COMPRESSION', 'auto'),
+        compress_min_size=options.get('COMPRESS_MIN_SIZE', 512),
+        level=options.get('LEVEL')
+    )
+
+
+class CodecSerializer:
+    """
+    Serializer de django-redis que utilitza CacheValueCodec (OPTIONS['SERIALIZER']).
+    S'ha de combinar amb l'IdentityCompressor: la compressió la fa el codec.
+    """
+
+    def __init__(self, options):
+        self.codec = build_codec()
+
+    def dumps(self, value: Any) -> bytes:
+        data = self.codec.encode(value)
+        cache_metrics.record_bytes('written', len(data))
+        return data
+
+    def loads(self, value: bytes) -> Any:
+        cache_metrics.record_bytes('read', len(value))
+        return self.codec.decode(value)
@@ -0,0 +1,262 @@
+"""
+Mètriques de la cache per prefix de clau (refugi_detail, refugi_search, doubt_list...)
+
+Cada worker acumula comptadors en memòria (hits, misses, sets, errors, bytes i histogrames
+de latència) i els bolca periòdicament a un hash de Redis amb HINCRBY: el hash conté
+els totals agregats de tots els workers de gunicorn sense haver de coordinar-los.
+"""
+import time
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+from django.conf import settings
+from ..firebase_config import _is_testing_environment
+from ..utils import request_cost
+
+logger = logging.getLogger(__name__)
+
+# Prefix assignat quan una operació no té una única clau (o no n'hi ha cap activa)
+OTHER_PREFIX = '_other'
+
+
+def key_prefix(key: str) -> str:
+    """Prefix d'una clau de cache ('refugi_detail:refugi_id:1' -> 'refugi_detail')"""
+    return key.split(':', 1)[0]
+
+
+def common_prefix(keys: Iterable[str]) -> str:
+    """Prefix compartit per totes les claus o OTHER_PREFIX si n'hi ha de diversos"""
+    prefixes = {key_prefix(key) for key in keys}
+    return prefixes.pop() if len(prefixes) == 1 else OTHER_PREFIX
+
+
+class CacheMetrics:
+    """Comptadors i histogrames de latència per prefix, agregats entre workers a Redis"""
+
+    # Clau del hash de Redis amb els totals de tots els workers (camps "<prefix>|<mètrica>")
+    REDIS_KEY = 'cache_metrics'
+
+    COUNTERS = ('hits', 'l1_hits', 'misses', 'sets', 'deletes', 'errors', 'bytes_read', 'bytes_written')
+    OPERATIONS = ('get', 'set', 'delete')
+    # Comptadors que també s'afegeixen al cost de la petició en curs (Server-Timing)
+    REQUEST_COUNTERS = ('hits', 'l1_hits', 'misses')
+
+    # Configuració per defecte (es pot sobreescriure amb settings.CACHE_METRICS)
+    DEFAULTS = {
+        'ENABLED': True,
+        'FLUSH_INTERVAL': 10,  # segons entre bolcats a Redis
+        # Límits superiors (segons) dels buckets dels histogrames de latència
+        'BUCKETS': [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0],
+    }
+
+    def __init__(self, config: Optional[dict] = None):
+        if config is None:
+            # La instància global no bolca res a Redis durant els tests
+            config = getattr(settings, 'CACHE_METRICS', {})
+            if _is_testing_environment():
+                config = {**config, 'ENABLED': False}
+        config = {**self.DEFAULTS, **config}
+        self.enabled = config['ENABLED']
+        self.flush_interval = config['FLUSH_INTERVAL']
+        self.buckets: Tuple[float, ...] = tuple(sorted(config['BUCKETS']))
+        self._lock = threading.Lock()
+        self._pending: Dict[str, float] = defaultdict(float)
+        self._flushed_at = time.monotonic()
+        self._current = threading.local()
+
+    # ------------------------------------------------------------------
+    # Registre
+    # ------------------------------------------------------------------
+
+    def incr(self, prefix: str, counter: str, amount: int = 1) -> None:
+        if counter in self.REQUEST_COUNTERS:
+            request_cost.record(f"cache_{counter}", amount)
+        if not self.enabled or not amount:
+            return
+        with self._lock:
+            self._pending[f"{prefix}|{counter}"] += amount
+        self._maybe_flush()
+
+    def observe(self, prefix: str, operation: str, seconds: float) -> None:
+        """Afegeix una mostra de latència a l'histograma de l'operació"""
+        if not self.enabled:
+            return
+        bucket = next((str(bound) for bound in self.buckets if seconds <= bound), '+Inf')
+        with self._lock:
+            self._pending[f"{prefix}|{operation}_latency|{bucket}"] += 1
+            self._pending[f"{prefix}|{operation}_latency_sum"] += seconds
+        self._maybe_flush()
+
+    @contextmanager
+    def timed(self, prefix: str, operation: str):
+        """Mesura la latència del bloc i fixa el prefix actual (per als bytes del serializer)"""
+        previous = getattr(self._current, 'prefix', None)
+        self._current.prefix = prefix
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._current.prefix = previous
+            elapsed = time.perf_counter() - started_at
+            request_cost.record_time('cache', elapsed)
+            self.observe(prefix, operation, elapsed)
+
+    def record_bytes(self, direction: str, size: int) -> None:
+        """Bytes llegits ('read') o escrits ('written') a Redis pel prefix de l'operació en curs"""
+        prefix = getattr(self._current, 'prefix', None) or OTHER_PREFIX
+        self.incr(prefix, f"bytes_{direction}", size)
+
+    # ------------------------------------------------------------------
+    # Agregació a Redis
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _get_redis_connection():
+        from django_redis import get_redis_connection
+        return get_redis_connection("default")
+
+    @classmethod
+    def _redis_key(cls) -> str:
+        from django.core.cache import cache
+        return cache.make_key(cls.REDIS_KEY)
+
+    def _maybe_flush(self) -> None:
+        if time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> bool:
+        """Bolca els comptadors pendents del worker al hash compartit (un sol pipeline)"""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(float)
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return True
+        try:
+            redis_key = self._redis_key()
+            pipe = self._get_redis_connection().pipeline(transaction=False)
+            for field, amount in pending.items():
+                if field.endswith('_sum'):
+                    pipe.hincrbyfloat(redis_key, field, amount)
+                else:
+                    pipe.hincrby(redis_key, field, int(amount))
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error flushing cache metrics: {str(e)}")
+            # Es conserven per al proper bolcat
+            with self._lock:
+                for field, amount in pending.items():
+                    self._pending[field] += amount
+            return False
+
+    def reset(self) -> None:
+        """Descarta els comptadors locals i els agregats (tests i manteniment)"""
+        with self._lock:
+            self._pending = defaultdict(float)
+        try:
+            self._get_redis_connection().delete(self._redis_key())
+        except Exception as e:
+            logger.error(f"Error resetting cache metrics: {str(e)}")
+
+    def _load(self) -> Dict[str, float]:
+        """Totals de tots els workers (inclou els pendents d'aquest worker)"""
+        self.flush()
+        raw = self._get_redis_connection().hgetall(self._redis_key())
+        totals = {}
+        for field, value in raw.items():
+            field = field.decode() if isinstance(field, bytes) else field
+            value = value.decode() if isinstance(value, bytes) else value
+            totals[field] = float(value)
+        return totals
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def _histogram(self, totals: Dict[str, float], prefix: str, operation: str) -> Optional[dict]:
+        counts = [totals.get(f"{prefix}|{operation}_latency|{bound}", 0) for bound in self.buckets]
+        counts.append(totals.get(f"{prefix}|{operation}_latency|+Inf", 0))
+        count = int(sum(counts))
+        if not count:
+            return None
+        cumulative, buckets = 0, []
+        for bound, bucket_count in zip([str(bound) for bound in self.buckets] + ['+Inf'], counts):
+            cumulative += int(bucket_count)
+            buckets.append((bound, cumulative))
+        total_seconds = totals.get(f"{prefix}|{operation}_latency_sum", 0.0)
+        return {
+            'count': count,
+            'sum_seconds': total_seconds,
+            'avg_ms': round(total_seconds / count * 1000, 3),
+            'buckets': buckets,
+        }
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Mètriques agregades per prefix"""
+        totals = self._load()
+        prefixes = sorted({field.split('|', 1)[0] for field in totals})
+        result = {}
+        for prefix in prefixes:
+            data = {counter: int(totals.get(f"{prefix}|{counter}", 0)) for counter in self.COUNTERS}
+            lookups = data['hits'] + data['l1_hits'] + data['misses']
+            data['hit_rate'] = round((data['hits'] + data['l1_hits']) / lookups, 4) if lookups else 0.0
+            data['latency'] = {}
+            for operation in self.OPERATIONS:
+                histogram = self._histogram(totals, prefix, operation)
+                if histogram is not None:
+                    data['latency'][operation] = {
+                        'count': histogram['count'],
+                        'avg_ms': histogram['avg_ms'],
+                        'buckets': {bound: count for bound, count in histogram['buckets']},
+                    }
+            result[prefix] = data
+        return result
+
+    def prometheus(self, namespace: str = 'refugis_cache') -> str:
+        """Exposició en format de text de Prometheus"""
+        totals = self._load()
+        prefixes = sorted({field.split('|', 1)[0] for field in totals})
+        lines: List[str] = [
+            f"# HELP {namespace}_requests_total Lectures de cache per prefix i resultat",
+            f"# TYPE {namespace}_requests_total counter",
+        ]
+        for prefix in prefixes:
+            for result, counter in (('hit', 'hits'), ('l1_hit', 'l1_hits'), ('miss', 'misses')):
+                value = int(totals.get(f"{prefix}|{counter}", 0))
+                lines.append(f'{namespace}_requests_total{{prefix="{prefix}",result="{result}"}} {value}')
+
+        for counter, description in (
+            ('sets', 'Escriptures'), ('deletes', 'Eliminacions'), ('errors', 'Errors de Redis')
+        ):
+            lines.append(f"# HELP {namespace}_{counter}_total {description} per prefix")
+            lines.append(f"# TYPE {namespace}_{counter}_total counter")
+            for prefix in prefixes:
+                value = int(totals.get(f"{prefix}|{counter}", 0))
+                lines.append(f'{namespace}_{counter}_total{{prefix="{prefix}"}} {value}')
+
+        lines.append(f"# HELP {namespace}_bytes_total Bytes serialitzats llegits i escrits per prefix")
+        lines.append(f"# TYPE {namespace}_bytes_total counter")
+        for prefix in prefixes:
+            for direction in ('read', 'written'):
+                value = int(totals.get(f"{prefix}|bytes_{direction}", 0))
+                lines.append(f'{namespace}_bytes_total{{prefix="{prefix}",direction="{direction}"}} {value}')
+
+        lines.append(f"# HELP {namespace}_operation_seconds Latència de les operacions de cache")
+        lines.append(f"# TYPE {namespace}_operation_seconds histogram")
+        for prefix in prefixes:
+            for operation in self.OPERATIONS:
+                histogram = self._histogram(totals, prefix, operation)
+                if histogram is None:
+                    continue
+                labels = f'prefix="{prefix}",op="{operation}"'
+                for bound, count in histogram['buckets']:
+                    lines.append(f'{namespace}_operation_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{namespace}_operation_seconds_sum{{{labels}}} {histogram["sum_seconds"]}')
+                lines.append(f'{namespace}_operation_seconds_count{{{labels}}} {histogram["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+# Instància global (compartida per CacheService i pel serializer de django-redis)
+cache_metrics = CacheMetrics()
@@ -2,26 +2,143 @@
 Servei per gestionar la cache amb Redis
 """
 import json
+import math
+import time
+import random
 import logging
 import hashlib
-from typing import Any, Optional, Callable, List, Dict
+import secrets
+import threading
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from typing import Any, Optional, Callable, List, Dict, Tuple
 from functools import wraps
 from django.core.cache import cache
 from django.conf import settings
+from .cache_metrics import cache_metrics, key_prefix, common_prefix
 
 logger = logging.getLogger(__name__)
 
+# Marca dels valors guardats amb get_or_compute (valor + metadades de frescor)
+ENVELOPE_MARKER = '__cache_envelope__'
+
+# Sentinel per distingir "no trobat" de valors guardats
+_MISSING = object()
+
+
+class LocalLRUCache:
+    """
+    Cache LRU en memòria del procés (L1), limitada per nombre d'entrades i per TTL.
+
+    Cada entrada guarda la generació de cache vigent quan es va desar: si la generació
+    canvia (algun worker ha invalidat claus), l'entrada deixa de ser vàlida.
+    Els valors es retornen per referència, per tant s'han de tractar com a només lectura
+    (Refugi.from_dict en copia les llistes perquè els models es puguin modificar).
+    """
+
+    def __init__(self, max_entries: int = 2048, max_ttl: int = 60):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._entries: 'OrderedDict[str, Tuple[Any, float, int]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, generation: int) -> Optional[Any]:
+        """Retorna el valor si existeix, no ha caducat i és de la generació actual"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, entry_generation = entry
+            if entry_generation != generation or expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, timeout: Optional[int], generation: int) -> None:
+        """Desa un valor amb TTL = min(timeout, max_ttl)"""
+        ttl = self.max_ttl if not timeout else min(timeout, self.max_ttl)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl, generation)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_pattern(self, pattern: str) -> None:
+        """Elimina les claus que contenen el patró (mateixa semàntica que CacheService.delete_pattern)"""
+        with self._lock:
+            for key in [key for key in self._entries if fnmatchcase(key, f"*{pattern}*")]:
+                del self._entries[key]
+
+    def delete_matching(self, redis_keys: set, make_key: Callable[[str], str]) -> int:
+        """Elimina les entrades la clau de Redis de les quals (make_key) és a redis_keys"""
+        with self._lock:
+            keys = [key for key in self._entries if make_key(key) in redis_keys]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
 class CacheService:
     """Servei singleton per gestionar operacions de cache"""
     
     _instance = None
     
+    # Clau de Redis amb la generació de cache compartida per tots els workers (invalidació de la L1)
+    GENERATION_CACHE_KEY = 'cache_l1:generation'
+    
+    # Prefix dels conjunts de Redis que indexen les claus de cada etiqueta
+    TAG_KEY_PREFIX = 'cache_tag'
+    
+    # Configuració per defecte de la cache L1 (es pot sobreescriure amb settings.CACHE_L1)
+    L1_DEFAULTS = {
+        'ENABLED': True,
+        'MAX_ENTRIES': 2048,
+        'MAX_TTL': 60,                     # segons
+        'GENERATION_CHECK_INTERVAL': 1.0,  # segons entre lectures de la generació a Redis
+        'PREFIXES': ['refugi_coords', 'refugi_detail'],
+    }
+    
+    # Protecció contra stampedes de get_or_compute (es pot sobreescriure amb settings.CACHE_STAMPEDE)
+    STAMPEDE_DEFAULTS = {
+        'STALE_TTL': 120,          # segons que es pot servir un valor caducat mentre un worker el refresca
+        'EARLY_REFRESH_BETA': 1.0,  # 0 desactiva el refresc probabilístic anticipat
+        'LOCK_TIMEOUT': 30,        # segons màxims que un worker pot tenir el lock de recàlcul
+        'WAIT_TIMEOUT': 5.0,       # segons que s'espera el valor d'un altre worker abans de calcular-lo
+        'WAIT_INTERVAL': 0.05,     # segons entre lectures mentre s'espera
+    }
+    
     # Cache timeouts per defecte (en segons)
     CACHE_TIMEOUTS = {
         # Refugis
         'refugi_detail': 600,      # 10 minuts
         'refugi_search': 600,      # 10 minuts
         'refugi_coords': 3600,     # 1 hora
+        'refugi_index': 3600,      # 1 hora (índex de cerca en memòria de cada worker)
+        'refugi_search_stats': 86400,  # 1 dia (es renoven a cada construcció de l'índex)
+        'refugi_changes': 3600,    # 1 hora (deltes del catàleg entre dues versions, immutables)
+        'refugi_coords_shard': 86400,  # 1 dia (shards del catàleg per versió, immutables)
         
         # Usuaris
         'user_detail': 600,        # 10 minuts
@@ -55,6 +172,58 @@ class CacheService:
     def __init__(self):
         # Inicialitza els timeouts definits en CACHE_TIMEOUTS
         self.timeouts = self.CACHE_TIMEOUTS.copy()
+        
+        # Cache L1 en memòria del worker per als prefixos més llegits
+        l1_config = {**self.L1_DEFAULTS, **getattr(settings, 'CACHE_L1', {})}
+        self.l1_prefixes = tuple(l1_config['PREFIXES'])
+        self.l1 = LocalLRUCache(l1_config['MAX_ENTRIES'], l1_config['MAX_TTL']) if l1_config['ENABLED'] else None
+        self._generation_check_interval = l1_config['GENERATION_CHECK_INTERVAL']
+        self._generation: Optional[int] = None
+        self._generation_checked_at = float('-inf')
+        
+        # Recàlcul single-flight amb stale-while-revalidate
+        self.stampede = {**self.STAMPEDE_DEFAULTS, **getattr(settings, 'CACHE_STAMPEDE', {})}
+        
+        # Els conjunts d'etiquetes viuen almenys tant com la clau amb el timeout més llarg
+        self.tag_ttl = max(self.timeouts.values()) + self.stampede['STALE_TTL']
+    
+    def _uses_l1(self, key: str) -> bool:
+        """Indica si la clau es guarda també a la cache L1"""
+        return self.l1 is not None and key.startswith(self.l1_prefixes)
+    
+    def _current_generation(self) -> Optional[int]:
+        """
+        Retorna la generació de cache vigent, llegint-la de Redis com a molt un cop
+        per interval. Retorna None si no es pot llegir (la L1 queda desactivada).
+        """
+        now = time.monotonic()
+        if now - self._generation_checked_at >= self._generation_check_interval:
+            self._generation_checked_at = now
+            try:
+                self._generation = int(cache.get(self.GENERATION_CACHE_KEY) or 0)
+            except Exception as e:
+                logger.error(f"Error getting cache generation: {str(e)}")
+                self._generation = None
+        return self._generation
+    
+    def _bump_generation(self) -> None:
+        """Incrementa la generació compartida perquè els altres workers descartin la seva L1"""
+        if self.l1 is None:
+            return
+        try:
+            try:
+                self._generation = cache.incr(self.GENERATION_CACHE_KEY)
+            except ValueError:
+                # La clau no existeix encara (o s'ha buidat la cache): es crea amb un valor que no pot
+                # coincidir amb cap generació anterior, o els workers que ja l'havien vist no buidarien la L1
+                seed = max(time.time_ns(), (self._generation or 0) + 1)
+                if cache.add(self.GENERATION_CACHE_KEY, seed, None):
+                    self._generation = seed
+                else:
+                    self._generation = cache.incr(self.GENERATION_CACHE_KEY)
+            self._generation_checked_at = time.monotonic()
+        except Exception as e:
+            logger.error(f"Error bumping cache generation: {str(e)}")
     
     def get_timeout(self, key_type: str) -> int:
         """Obté el timeout específic per un tipus de clau"""
@@ -94,20 +263,98 @@ class CacheService:
         Returns:
             Valor de la cache o None si no existeix
         """
+        prefix = key_prefix(key)
+        generation = self._current_generation() if self._uses_l1(key) else None
+        if generation is not None:
+            value = self.l1.get(key, generation)
+            if value is not None:
+                logger.log(21, "Cache HIT (L1)")
+                cache_metrics.incr(prefix, 'l1_hits')
+                return value
+        
         try:
             # Only log whether it's a hit or miss (no key) per request
-            value = cache.get(key)
+            with cache_metrics.timed(prefix, 'get'):
+                value = cache.get(key)
             if value is not None:
                 # Use numeric custom level so the logger configured with CACHE_LEVEL will emit it
                 logger.log(21, "Cache HIT")
+                cache_metrics.incr(prefix, 'hits')
+                if generation is not None:
+                    self.l1.set(key, value, None, generation)
             else:
                 logger.log(21, "Cache MISS")
+                cache_metrics.incr(prefix, 'misses')
             return value
         except Exception as e:
             logger.error(f"Error getting cache key {key}: {str(e)}")
+            cache_metrics.incr(prefix, 'errors')
             return None
     
-    def set(self, key: str, value: Any, timeout: Optional[int] = None) -> bool:
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        Obté múltiples valors de la cache amb una sola operació (MGET)
+        
+        Args:
+            keys: Llista de claus de cache
+            
+        Returns:
+            Diccionari clau -> valor només amb les claus trobades
+        """
+        found = {}
+        pending = list(dict.fromkeys(keys))
+        if not pending:
+            return found
+        
+        l1_keys = [key for key in pending if self._uses_l1(key)]
+        generation = self._current_generation() if l1_keys else None
+        if generation is not None:
+            for key in l1_keys:
+                value = self.l1.get(key, generation)
+                if value is not None:
+                    found[key] = value
+                    cache_metrics.incr(key_prefix(key), 'l1_hits')
+            pending = [key for key in pending if key not in found]
+        
+        if pending:
+            prefix = common_prefix(pending)
+            try:
+                with cache_metrics.timed(prefix, 'get'):
+                    values = cache.get_many(pending)
+            except Exception as e:
+                logger.error(f"Error getting {len(pending)} cache keys: {str(e)}")
+                cache_metrics.incr(prefix, 'errors')
+                values = {}
+            
+            for key, value in values.items():
+                if value is None:
+                    continue
+                found[key] = value
+                if generation is not None and self._uses_l1(key):
+                    self.l1.set(key, value, None, generation)
+            
+            for key in pending:
+                cache_metrics.incr(key_prefix(key), 'hits' if key in found else 'misses')
+        
+        logger.log(21, f"Cache GET MANY ({len(found)} hits / {len(keys)} keys)")
+        return found
+
+    def peek_many(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        Obté valors guardats amb get_or_compute sense recalcular-los
+
+        Args:
+            keys: Llista de claus de cache
+
+        Returns:
+            Diccionari clau -> valor (sense l'envoltori de get_or_compute) només amb les claus trobades
+        """
+        return {
+            key: value['value'] if self._is_envelope(value) else value
+            for key, value in self.get_many(keys).items()
+        }
+
+    def set(self, key: str, value: Any, timeout: Optional[int] = None, tags: Optional[List[str]] = None) -> bool:
         """
         Estableix un valor a la cache
         
@@ -115,18 +362,79 @@ class CacheService:
             key: Clau de cache
             value: Valor a guardar
             timeout: Temps en segons (None = default)
+            tags: Etiquetes amb què es registra la clau (veure invalidate_tags)
             
         Returns:
             True si s'ha guardat correctament
         """
         try:
-            cache.set(key, value, timeout)
+            if tags:
+                # Primer l'etiqueta: una clau guardada sempre és invalidable
+                self._register_tags({key: tags}, timeout)
+            with cache_metrics.timed(key_prefix(key), 'set'):
+                cache.set(key, value, timeout)
             logger.log(21, f"Cache SET (timeout: {timeout}s)")
+            cache_metrics.incr(key_prefix(key), 'sets')
+            if self._uses_l1(key):
+                generation = self._current_generation()
+                if generation is not None:
+                    self.l1.set(key, value, timeout, generation)
             return True
         except Exception as e:
             logger.error(f"Error setting cache key {key}: {str(e)}")
+            cache_metrics.incr(key_prefix(key), 'errors')
             return False
     
+    def set_many(
+        self,
+        data: Dict[str, Any],
+        timeout: Optional[int] = None,
+        tags: Optional[List[str]] = None
+    ) -> bool:
+        """
+        Estableix múltiples valors a la cache en una sola operació (pipeline)
+        
+        Args:
+            data: Diccionari clau -> valor a guardar
+            timeout: Temps en segons (None = default)
+            tags: Etiquetes amb què es registren totes les claus (veure invalidate_tags)
+            
+        Returns:
+            True si s'han guardat correctament
+        """
+        if not data:
+            return True
+        try:
+            if tags:
+                self._register_tags({key: tags for key in data}, timeout)
+            with cache_metrics.timed(common_prefix(data), 'set'):
+                cache.set_many(data, timeout)
+            logger.log(21, f"Cache SET MANY ({len(data)} keys, timeout: {timeout}s)")
+            for key in data:
+                cache_metrics.incr(key_prefix(key), 'sets')
+            l1_keys = [key for key in data if self._uses_l1(key)]
+            generation = self._current_generation() if l1_keys else None
+            if generation is not None:
+                for key in l1_keys:
+                    self.l1.set(key, data[key], timeout, generation)
+            return True
+        except Exception as e:
+            logger.error(f"Error setting {len(data)} cache keys: {str(e)}")
+            cache_metrics.incr(common_prefix(data), 'errors')
+            return False
+    
+    def _evict_l1(self, keys: List[str]) -> None:
+        """
+        Elimina les claus de la L1 i incrementa la generació. S'ha de cridar després d'eliminar-les
+        de Redis: si no, un altre worker podria tornar a llegir el valor antic amb la generació nova.
+        """
+        l1_keys = [key for key in keys if self._uses_l1(key)]
+        if not l1_keys:
+            return
+        for key in l1_keys:
+            self.l1.delete(key)
+        self._bump_generation()
+    
     def delete(self, key: str) -> bool:
         """
         Elimina una clau de la cache
@@ -138,16 +446,50 @@ class CacheService:
             True si s'ha eliminat correctament
         """
         try:
-            cache.delete(key)
+            with cache_metrics.timed(key_prefix(key), 'delete'):
+                cache.delete(key)
             logger.log(21, "Cache DELETE")
+            cache_metrics.incr(key_prefix(key), 'deletes')
             return True
         except Exception as e:
             logger.error(f"Error deleting cache key {key}: {str(e)}")
+            cache_metrics.incr(key_prefix(key), 'errors')
             return False
+        finally:
+            self._evict_l1([key])
+    
+    def delete_many(self, keys: List[str]) -> bool:
+        """
+        Elimina múltiples claus de la cache en una sola operació (pipeline)
+        
+        Args:
+            keys: Claus a eliminar
+            
+        Returns:
+            True si s'han eliminat correctament
+        """
+        if not keys:
+            return True
+        
+        try:
+            with cache_metrics.timed(common_prefix(keys), 'delete'):
+                cache.delete_many(keys)
+            logger.log(21, f"Cache DELETE MANY ({len(keys)} keys)")
+            for key in keys:
+                cache_metrics.incr(key_prefix(key), 'deletes')
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting {len(keys)} cache keys: {str(e)}")
+            cache_metrics.incr(common_prefix(keys), 'errors')
+            return False
+        finally:
+            self._evict_l1(keys)
     
     def delete_pattern(self, pattern: str) -> bool:
         """
-        Elimina totes les claus que coincideixin amb un patró
+        Elimina totes les claus que coincideixin amb un patró.
+        Recorre tot l'espai de claus de Redis (SCAN): per invalidar des dels DAOs
+        s'ha d'utilitzar invalidate_tags, que només toca les claus afectades.
         
         Args:
             pattern: Patró de claus (ex: 'refugi_*')
@@ -162,6 +504,105 @@ class CacheService:
         except Exception as e:
             logger.error(f"Error deleting cache pattern {pattern}: {str(e)}")
             return False
+        finally:
+            if self.l1 is not None:
+                self.l1.delete_pattern(pattern)
+                self._bump_generation()
+    
+    # ------------------------------------------------------------------
+    # Invalidació per etiquetes
+    # ------------------------------------------------------------------
+    
+    @classmethod
+    def _tag_key(cls, tag: str) -> str:
+        return f"{cls.TAG_KEY_PREFIX}:{tag}"
+    
+    @staticmethod
+    def _get_redis_connection():
+        from django_redis import get_redis_connection
+        return get_redis_connection("default")
+    
+    def _register_tags(self, key_tags: Dict[str, List[str]], timeout: Optional[int]) -> None:
+        """
+        Afegeix les claus als conjunts de les seves etiquetes amb un sol pipeline.
+        El TTL del conjunt és com a mínim el de la clau més llarga que pot contenir,
+        perquè una etiqueta no caduqui abans que les claus que indexa.
+        """
+        members: Dict[str, List[str]] = {}
+        for key, tags in key_tags.items():
+            for tag in tags:
+                members.setdefault(tag, []).append(cache.make_key(key))
+        if not members:
+            return
+        
+        ttl = max(self.tag_ttl, (timeout or self.get_timeout('default')) + self.stampede['STALE_TTL'])
+        try:
+            pipe = self._get_redis_connection().pipeline(transaction=False)
+            for tag, keys in members.items():
+                tag_key = cache.make_key(self._tag_key(tag))
+                pipe.sadd(tag_key, *keys)
+                pipe.expire(tag_key, ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Error registering cache tags {list(members)}: {str(e)}")
+    
+    def invalidate_tags(self, tags: List[str]) -> bool:
+        """
+        Elimina totes les claus registrades amb alguna de les etiquetes. El cost depèn
+        del nombre de claus afectades, no de la mida de la cache: es llegeixen els conjunts
+        de les etiquetes (SMEMBERS) i s'eliminen les claus i els conjunts en un sol pipeline.
+        
+        Args:
+            tags: Etiquetes a invalidar (ex: ['refugi_search', 'refuge_visits_list:refuge_id:123'])
+            
+        Returns:
+            True si s'han eliminat correctament
+        """
+        tags = list(dict.fromkeys(tags))
+        if not tags:
+            return True
+        
+        try:
+            tag_keys = [cache.make_key(self._tag_key(tag)) for tag in tags]
+            con = self._get_redis_connection()
+            
+            pipe = con.pipeline(transaction=False)
+            for tag_key in tag_keys:
+                pipe.smembers(tag_key)
+            tag_members = [
+                {member.decode() if isinstance(member, bytes) else member for member in read}
+                for read in pipe.execute()
+            ]
+            members = set().union(*tag_members)
+            
+            # Les claus del conjunt porten el prefix de Redis, la L1 les guarda sense
+            redis_prefix = cache.make_key('')
+            uses_l1 = any(
+                self._uses_l1(member[len(redis_prefix):] if member.startswith(redis_prefix) else member)
+                for member in members
+            )
+            if uses_l1:
+                self.l1.delete_matching(members, cache.make_key)
+            
+            # Només es treuen dels conjunts les claus llegides: una clau registrada mentrestant
+            # (SADD entre SMEMBERS i aquest pipeline) continua indexada per a la propera invalidació.
+            # Redis elimina el conjunt quan queda buit
+            pipe = con.pipeline(transaction=False)
+            if members:
+                pipe.delete(*members)
+            for tag_key, read in zip(tag_keys, tag_members):
+                if read:
+                    pipe.srem(tag_key, *read)
+            pipe.execute()
+            
+            if uses_l1:
+                # Encara que la L1 d'aquest worker no tingués cap de les claus, les dels altres workers sí
+                self._bump_generation()
+            logger.log(21, f"Cache INVALIDATE TAGS ({len(tags)} tags, {len(members)} keys)")
+            return True
+        except Exception as e:
+            logger.error(f"Error invalidating cache tags {tags}: {str(e)}")
+            return False
     
     def clear_all(self) -> bool:
         """
@@ -170,9 +611,13 @@ class CacheService:
         Returns:
             True si s'ha netejat correctament
         """
+        if self.l1 is not None:
+            self.l1.clear()
+        
         try:
             cache.clear()
             logger.log(21, "Cache cleared completely")
+            self._bump_generation()
             return True
         except Exception as e:
             logger.error(f"Error clearing cache: {str(e)}")
@@ -197,6 +642,8 @@ class CacheService:
                 'memory_used': info.get('used_memory_human', 'N/A'),
                 'hits': info.get('keyspace_hits', 0),
                 'misses': info.get('keyspace_misses', 0),
+                'l1': self.l1.stats() if self.l1 is not None else None,
+                'prefixes': cache_metrics.snapshot() if cache_metrics.enabled else None,
             }
         except Exception as e:
             logger.error(f"Error getting cache stats: {str(e)}")
@@ -205,6 +652,175 @@ class CacheService:
                 'error': str(e)
             }
     
+    # ------------------------------------------------------------------
+    # Protecció contra stampedes (single-flight + stale-while-revalidate)
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def _is_envelope(value: Any) -> bool:
+        return isinstance(value, dict) and value.get(ENVELOPE_MARKER) == 1
+    
+    @staticmethod
+    def _lock_key(key: str) -> str:
+        # Hash de la clau perquè delete_pattern no elimini els locks
+        return f"stampede_lock:{hashlib.sha1(key.encode('utf-8')).hexdigest()}"
+    
+    def _needs_refresh(self, envelope: Dict[str, Any]) -> bool:
+        """
+        Indica si cal refrescar un valor: ja ha caducat o, abans de caducar, amb probabilitat
+        creixent a mesura que s'acosta el final (XFetch: now - delta * beta * ln(rand) >= fresh_until).
+        """
+        now = time.time()
+        fresh_until = envelope.get('fresh_until', 0)
+        if now >= fresh_until:
+            return True
+        beta = self.stampede['EARLY_REFRESH_BETA']
+        delta = envelope.get('delta', 0)
+        if beta <= 0 or delta <= 0:
+            return False
+        return now - delta * beta * math.log(max(random.random(), 1e-12)) >= fresh_until
+    
+    def _acquire_lock(self, key: str) -> Tuple[bool, Optional[str]]:
+        """
+        Intenta obtenir el lock de recàlcul d'una clau (SET NX amb expiració).
+        
+        Returns:
+            (adquirit, fencing token). El fencing token és un valor aleatori guardat com a valor del lock:
+            un worker amb un lock caducat (que ja té un altre token) no pot sobreescriure el valor del nou titular.
+            Si Redis no respon, es considera adquirit sense token (es calcula sense coordinació).
+        """
+        token = secrets.token_hex(8)
+        try:
+            if cache.add(self._lock_key(key), token, self.stampede['LOCK_TIMEOUT']):
+                return True, token
+            return False, None
+        except Exception as e:
+            logger.error(f"Error acquiring cache lock for {key}: {str(e)}")
+            return True, None
+    
+    def _release_lock(self, key: str, token: Optional[str]) -> None:
+        """Allibera el lock només si encara és d'aquest worker"""
+        if token is None:
+            return
+        try:
+            if cache.get(self._lock_key(key)) == token:
+                cache.delete(self._lock_key(key))
+        except Exception as e:
+            logger.error(f"Error releasing cache lock for {key}: {str(e)}")
+    
+    def _wait_for_value(self, key: str) -> Any:
+        """
+        Espera que el worker amb el lock guardi el valor. Retorna _MISSING si s'esgota el temps
+        o si el lock desapareix sense valor (el worker ha fallat).
+        """
+        deadline = time.monotonic() + self.stampede['WAIT_TIMEOUT']
+        while time.monotonic() < deadline:
+            time.sleep(self.stampede['WAIT_INTERVAL'])
+            try:
+                envelope = cache.get(key)
+                if envelope is not None:
+                    return envelope['value'] if self._is_envelope(envelope) else envelope
+                if cache.get(self._lock_key(key)) is None:
+                    return _MISSING
+            except Exception as e:
+                logger.error(f"Error waiting for cache key {key}: {str(e)}")
+                return _MISSING
+        return _MISSING
+    
+    def _compute_and_store(
+        self,
+        key: str,
+        compute_fn: Callable[[], Any],
+        timeout: int,
+        token: Optional[str],
+        tags: Optional[List[str]] = None
+    ) -> Any:
+        """Calcula el valor i el guarda amb les metadades de frescor (si el fencing token ho permet)"""
+        started_at = time.monotonic()
+        value = compute_fn()
+        delta = time.monotonic() - started_at
+        if value is None:
+            return None
+        
+        if token is not None:
+            try:
+                current = cache.get(self._lock_key(key))
+                if current is not None and current != token:
+                    # El lock ha caducat i un altre worker l'ha agafat: el seu valor és més nou
+                    logger.log(21, "Cache SET skipped (stale fencing token)")
+                    return value
+            except Exception as e:
+                logger.error(f"Error checking fencing token for {key}: {str(e)}")
+        
+        envelope = {
+            ENVELOPE_MARKER: 1,
+            'value': value,
+            'fresh_until': time.time() + timeout,
+            'delta': round(delta, 4),
+            'fence': token,
+        }
+        self.set(key, envelope, timeout + self.stampede['STALE_TTL'], tags)
+        return value
+    
+    def get_or_compute(
+        self,
+        key: str,
+        compute_fn: Callable[[], Any],
+        timeout: Optional[int] = None,
+        tags: Optional[List[str]] = None
+    ) -> Any:
+        """
+        Obté un valor de la cache o el calcula amb protecció contra stampedes:
+        - Només un worker recalcula cada clau alhora (lock a Redis amb fencing token)
+        - Mentre un worker recalcula, la resta continua servint el valor anterior durant
+          STALE_TTL segons (stale-while-revalidate); si no hi ha valor anterior, l'esperen
+        - Abans de caducar, el valor es refresca anticipadament amb una probabilitat que
+          creix a mesura que s'acosta l'expiració (evita que tots els workers fallin alhora)
+        
+        Args:
+            key: Clau de cache
+            compute_fn: Funció que calcula el valor (None = no es guarda)
+            timeout: Segons que el valor es considera fresc (None = timeout del prefix)
+            tags: Etiquetes amb què es registra la clau (veure invalidate_tags)
+            
+        Returns:
+            Valor de la cache o el calculat
+        """
+        timeout = timeout or self.get_timeout(key.split(':', 1)[0])
+        cached = self.get(key)
+        
+        if cached is not None:
+            if not self._is_envelope(cached):
+                # Valor guardat sense metadades (p. ex. abans del desplegament): es considera fresc
+                return cached
+            if not self._needs_refresh(cached):
+                return cached['value']
+            
+            acquired, token = self._acquire_lock(key)
+            if not acquired:
+                logger.log(21, "Cache STALE (refresh in progress)")
+                return cached['value']
+            try:
+                logger.log(21, "Cache REFRESH")
+                return self._compute_and_store(key, compute_fn, timeout, token, tags)
+            except Exception as e:
+                logger.error(f"Error refreshing cache key {key}, serving stale value: {str(e)}")
+                return cached['value']
+            finally:
+                self._release_lock(key, token)
+        
+        acquired, token = self._acquire_lock(key)
+        if not acquired:
+            value = self._wait_for_value(key)
+            if value is not _MISSING:
+                return value
+            logger.log(21, "Cache WAIT timeout, computing value")
+            return self._compute_and_store(key, compute_fn, timeout, None, tags)
+        try:
+            return self._compute_and_store(key, compute_fn, timeout, token, tags)
+        finally:
+            self._release_lock(key, token)
+    
     def get_or_fetch_list(
         self, 
         list_cache_key: str, 
@@ -214,15 +830,17 @@ class CacheService:
         get_id_fn: Callable[[Dict[str, Any]], str],
         list_timeout: Optional[int] = None,
         detail_timeout: Optional[int] = None,
-        id_param_name: str = 'id'
+        id_param_name: str = 'id',
+        fetch_many_fn: Optional[Callable[[List[str]], Dict[str, Dict[str, Any]]]] = None,
+        tags: Optional[List[str]] = None
     ) -> List[Dict[str, Any]]:
         """
         Implementa l'estratègia ID caching per llistes:
         1. Busca la llista d'IDs a la cache
-        2. Per cada ID, busca el detall a la cache
+        2. Busca tots els detalls a la cache amb una sola operació (MGET)
         3. Si no hi ha llista cached, llegeix TOTES les dades d'una (no el doble de lectures)
-        4. Guarda la llista d'IDs i cada detall per separat
-        5. Si algun detall ha expirat, el llegeix individualment de Firestore
+        4. Guarda la llista d'IDs i tots els detalls amb una sola operació (pipeline)
+        5. Si algun detall ha expirat, el llegeix de Firestore (en bloc si hi ha fetch_many_fn)
         
         Args:
             list_cache_key: Clau de cache per la llista d'IDs
@@ -233,52 +851,96 @@ class CacheService:
             list_timeout: Timeout per la llista d'IDs
             detail_timeout: Timeout per cada detall
             id_param_name: Nom del paràmetre per la clau de detall (ex: 'renovation_id', 'experience_id')
+            fetch_many_fn: Funció que retorna diversos elements per ID amb una sola lectura (opcional)
+            tags: Etiquetes amb què es registra la llista d'IDs (els detalls no s'etiqueten)
             
         Returns:
             Llista de diccionaris amb les dades completes
         """
-        # 1. Intenta obtenir llista d'IDs de la cache
-        cached_ids = self.get(list_cache_key)
+        fetched = {}
         
-        if cached_ids is None:
-            # Cache MISS: Llegeix TOTES les dades d'una des de Firestore (no el doble de lectures)
+        def fetch_ids():
+            # Cache MISS (o refresc): Llegeix TOTES les dades d'una des de Firestore (no el doble de lectures)
             all_data = fetch_all_fn()
+            fetched['data'] = all_data
             
-            # Extreu les IDs i guarda la llista
-            ids = [get_id_fn(item) for item in all_data]
-            actual_list_timeout = list_timeout or self.get_timeout(detail_key_prefix.replace('_detail', '_list'))
-            self.set(list_cache_key, ids, actual_list_timeout)
-            
-            # Guarda cada detall individualment a la cache
+            # Guarda tots els detalls a la cache amb una sola operació
             actual_detail_timeout = detail_timeout or self.get_timeout(detail_key_prefix)
-            for item_data in all_data:
-                item_id = get_id_fn(item_data)
-                detail_cache_key = self.generate_key(detail_key_prefix, **{id_param_name: item_id})
-                self.set(detail_cache_key, item_data, actual_detail_timeout)
+            self.set_many({
+                self.generate_key(detail_key_prefix, **{id_param_name: get_id_fn(item_data)}): item_data
+                for item_data in all_data
+            }, actual_detail_timeout)
             
-            return all_data
+            # La llista d'IDs és el valor que es guarda a la clau de llista
+            return [get_id_fn(item) for item in all_data]
         
-        # Cache HIT: Usa la llista d'IDs cached i busca cada detall
-        results = []
-        actual_detail_timeout = detail_timeout or self.get_timeout(detail_key_prefix)
+        # 1. Obté la llista d'IDs de la cache (un sol worker la recalcula quan caduca)
+        actual_list_timeout = list_timeout or self.get_timeout(detail_key_prefix.replace('_detail', '_list'))
+        cached_ids = self.get_or_compute(list_cache_key, fetch_ids, actual_list_timeout, tags)
+        
+        if 'data' in fetched:
+            # Aquesta crida ha llegit les dades completes: no cal tornar a llegir els detalls
+            return fetched['data']
         
-        for item_id in cached_ids:
-            detail_cache_key = self.generate_key(detail_key_prefix, **{id_param_name: item_id})
-            cached_detail = self.get(detail_cache_key)
+        # Cache HIT: Usa la llista d'IDs cached i busca tots els detalls
+        return self.get_or_fetch_many(
+            ids=cached_ids,
+            detail_key_prefix=detail_key_prefix,
+            fetch_single_fn=fetch_single_fn,
+            detail_timeout=detail_timeout,
+            id_param_name=id_param_name,
+            fetch_many_fn=fetch_many_fn
+        )
+    
+    def get_or_fetch_many(
+        self,
+        ids: List[str],
+        detail_key_prefix: str,
+        fetch_single_fn: Optional[Callable[[str], Optional[Dict[str, Any]]]],
+        detail_timeout: Optional[int] = None,
+        id_param_name: str = 'id',
+        fetch_many_fn: Optional[Callable[[List[str]], Dict[str, Dict[str, Any]]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Obté els detalls d'una llista d'IDs de la cache i llegeix de Firestore només els que hagin expirat.
+        Els detalls es llegeixen amb un sol MGET i els que falten es guarden amb un sol pipeline.
+        
+        Args:
+            ids: Llista d'IDs dels elements (es respecta l'ordre)
+            detail_key_prefix: Prefix per les claus de detall (ex: 'refugi_detail')
+            fetch_single_fn: Funció que retorna un element individual per ID des de Firestore
+                (no cal si es proporciona fetch_many_fn)
+            detail_timeout: Timeout per cada detall
+            id_param_name: Nom del paràmetre per la clau de detall (ex: 'refugi_id')
+            fetch_many_fn: Funció que retorna un diccionari ID -> dades amb una sola lectura
+                a Firestore (get_all). Si no es proporciona, es fa servir fetch_single_fn per cada ID
             
-            if cached_detail is not None:
-                # Detall trobat a la cache
-                results.append(cached_detail)
+        Returns:
+            Llista de diccionaris amb les dades dels elements que existeixen
+        """
+        actual_detail_timeout = detail_timeout or self.get_timeout(detail_key_prefix)
+        detail_keys = {item_id: self.generate_key(detail_key_prefix, **{id_param_name: item_id}) for item_id in ids}
+        cached_details = self.get_many(list(detail_keys.values()))
+        
+        missing_ids = [item_id for item_id, detail_cache_key in detail_keys.items() if detail_cache_key not in cached_details]
+        if missing_ids:
+            # Detalls no cached: llegeix-los de Firestore (en bloc si és possible)
+            logger.log(21, f"Cache MISS for {len(missing_ids)} details {detail_key_prefix}, fetching from Firestore")
+            if fetch_many_fn is not None:
+                fetched = fetch_many_fn(missing_ids)
             else:
-                # Detall no cached: llegeix-lo individualment de Firestore
-                logger.log(21, f"Cache MISS for detail {detail_key_prefix}:{item_id}, fetching from Firestore")
-                item_data = fetch_single_fn(item_id)
-                if item_data:
-                    # Guarda el detall a la cache per futures lectures
-                    self.set(detail_cache_key, item_data, actual_detail_timeout)
-                    results.append(item_data)
+                fetched = {item_id: fetch_single_fn(item_id) for item_id in missing_ids}
+            
+            # Guarda els detalls a la cache per futures lectures
+            fetched_details = {
+                detail_keys[item_id]: item_data
+                for item_id, item_data in fetched.items()
+                if item_data and item_id in detail_keys
+            }
+            self.set_many(fetched_details, actual_detail_timeout)
+            cached_details.update(fetched_details)
         
-        return results
+        return [cached_details[detail_keys[item_id]] for item_id in ids if detail_keys[item_id] in cached_details]
     
     def get_or_fetch_detail(
         self,
@@ -297,20 +959,13 @@ class CacheService:
         Returns:
             Diccionari amb les dades o None si no existeix
         """
-        # Intenta obtenir de cache
-        cached_data = self.get(detail_cache_key)
-        if cached_data is not None:
-            logger.info(f"Retrieved detail for cache key {detail_cache_key} from cache")
-            return cached_data
-        
-        # Cache MISS: llegeix de Firestore
-        data = fetch_fn()
-        logger.info(f"Fetched detail for cache key {detail_cache_key} from Firestore")
-        if data:
-            # Guarda a cache
-            self.set(detail_cache_key, data, timeout)
+        def fetch():
+            # Cache MISS: llegeix de Firestore (només es guarda si existeix)
+            data = fetch_fn()
+            logger.info(f"Fetched detail for cache key {detail_cache_key} from Firestore")
+            return data or None
         
-        return data
+        return self.get_or_compute(detail_cache_key, fetch, timeout)
 
 
 # Instància global del servei
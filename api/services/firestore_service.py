@@ -4,12 +4,73 @@ Servei per gestionar la connexió amb Firestore
 import os
 import json
 import logging
+from typing import Any, Dict, List, Optional
 from django.conf import settings
 import firebase_admin
 from firebase_admin import credentials, firestore
 
 logger = logging.getLogger(__name__)
 
+
+class FirestoreBatchWriter:
+    """
+    Acumula escriptures en WriteBatches de Firestore i en fa commit cada max_operations
+    
+    S'utilitza com a context manager: les operacions pendents es confirmen en sortir
+    del bloc (excepte si hi ha hagut una excepció).
+    """
+    
+    # Límit d'operacions d'un WriteBatch de Firestore
+    MAX_OPERATIONS = 500
+    
+    def __init__(self, db, max_operations: int = MAX_OPERATIONS):
+        self.db = db
+        self.max_operations = max(1, min(max_operations, self.MAX_OPERATIONS))
+        self.committed = 0
+        self._batch = None
+        self._pending = 0
+    
+    def set(self, doc_ref, data: Dict[str, Any], merge: bool = False) -> None:
+        self._current_batch().set(doc_ref, data, merge=merge)
+        self._after_operation()
+    
+    def update(self, doc_ref, data: Dict[str, Any]) -> None:
+        self._current_batch().update(doc_ref, data)
+        self._after_operation()
+    
+    def delete(self, doc_ref) -> None:
+        self._current_batch().delete(doc_ref)
+        self._after_operation()
+    
+    def commit(self) -> None:
+        """Confirma les operacions pendents"""
+        if not self._pending:
+            return
+        logger.log(22, f"Firestore BATCH COMMIT: operations={self._pending}")
+        self._batch.commit()
+        self.committed += self._pending
+        self._batch = None
+        self._pending = 0
+    
+    def _current_batch(self):
+        if self._batch is None:
+            self._batch = self.db.batch()
+        return self._batch
+    
+    def _after_operation(self) -> None:
+        self._pending += 1
+        if self._pending >= self.max_operations:
+            self.commit()
+    
+    def __enter__(self) -> 'FirestoreBatchWriter':
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is None:
+            self.commit()
+        return False
+
+
 class FirestoreService:
     """Servei singleton per gestionar la connexió amb Firestore"""
     
@@ -37,6 +98,39 @@ class FirestoreService:
             # Inicialitza Firebase
             return self._initialize_firebase()
     
+    def get_documents(
+        self,
+        collection_name: str,
+        document_ids: List[str],
+        field_paths: Optional[List[str]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Llegeix múltiples documents d'una col·lecció amb una sola crida (get_all)
+        
+        Args:
+            collection_name: Nom de la col·lecció
+            document_ids: IDs dels documents a llegir
+            field_paths: Camps a llegir (opcional, per defecte el document sencer)
+            
+        Returns:
+            Diccionari ID -> dades (amb el camp 'id') només amb els documents que existeixen
+        """
+        if not document_ids:
+            return {}
+        
+        db = self.get_db()
+        collection = db.collection(collection_name)
+        refs = [collection.document(str(document_id)) for document_id in document_ids]
+        logger.log(22, f"Firestore BATCH READ: collection={collection_name} documents={len(refs)}")
+        
+        documents = {}
+        for doc in db.get_all(refs, field_paths=field_paths):
+            if doc.exists:
+                data = doc.to_dict()
+                data['id'] = doc.id
+                documents[doc.id] = data
+        return documents
+    
     def _initialize_firebase(self):
         """Inicialitza Firebase Admin SDK"""
         try:
@@ -3,11 +3,17 @@ R2 Media Service - Servei per gestionar la pujada, obtenció i eliminació de mi
 Utilitza el patró Strategy per a gestionar diferents tipus de fitxers i destinacions.
 """
 import uuid
+import time
 import logging
+import threading
+from collections import OrderedDict
 from abc import ABC, abstractmethod
-from typing import List, Optional, Dict, BinaryIO
+from functools import partial
+from typing import Callable, List, Optional, Dict, BinaryIO, Tuple
 from urllib.parse import urlparse, unquote
 from datetime import datetime
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 from ..r2_config import get_r2_client, get_r2_bucket_name, get_r2_endpoint
 from ..models.media_metadata import MediaMetadata, RefugeMediaMetadata
@@ -15,6 +21,16 @@ from ..services.cache_service import CacheService
 
 logger = logging.getLogger(__name__)
 
+# Configuració de pujada: els fitxers es llegeixen en chunks i, a partir de
+# MULTIPART_THRESHOLD (vídeos grans), es pugen amb multipart upload
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+UPLOAD_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=MULTIPART_THRESHOLD,
+    multipart_chunksize=MULTIPART_CHUNKSIZE,
+    max_concurrency=4
+)
+
 class MediaPathStrategy(ABC):
     """
     Estratègia abstracta per definir com es construeixen els paths per a diferents tipus de mitjans.
@@ -36,11 +52,23 @@ class MediaPathStrategy(ABC):
         pass
 
     @abstractmethod
-    def generate_media_metadata_from_dict(self, metadata_dict: Dict[str, str], service, expiration: int = 3600) -> MediaMetadata:
+    def generate_media_metadata_from_dict(self, metadata_dict: Dict[str, str], service, expiration: int = 3600, lazy: bool = False) -> MediaMetadata:
         """Genera un objecte MediaMetadata amb URL prefirmada a partir d'un diccionari de metadades."""
         pass
 
 
+def _build_url_args(key: str, service, expiration: int, lazy: bool) -> Dict[str, object]:
+    """
+    Retorna els arguments 'url' i 'url_resolver' per construir un MediaMetadata.
+    Amb lazy=True la URL no es signa fins que es serialitza el mitjà.
+    """
+    if not key:
+        return {'url': ''}
+    if lazy:
+        return {'url': '', 'url_resolver': partial(service.generate_presigned_url, expiration=expiration)}
+    return {'url': service.generate_presigned_url(key, expiration)}
+
+
 class RefugiMediaStrategy(MediaPathStrategy):
     """
     Estratègia per a mitjans (imatges i vídeos) de refugis.
@@ -72,7 +100,7 @@ class RefugiMediaStrategy(MediaPathStrategy):
     def validate_file(self, content_type: str) -> bool:
         return content_type in self.get_allowed_content_types()
     
-    def generate_media_metadata_from_dict(self, metadata_dict: Dict[str, str], service, expiration: int = 3600) -> MediaMetadata:
+    def generate_media_metadata_from_dict(self, metadata_dict: Dict[str, str], service, expiration: int = 3600, lazy: bool = False) -> MediaMetadata:
         """
         Genera un objecte MediaMetadata amb URL prefirmada a partir d'un diccionari de metadades.
         Per a mitjans de refugi.
@@ -81,17 +109,17 @@ class RefugiMediaStrategy(MediaPathStrategy):
             metadata_dict: Diccionari amb keys: {'key': {'creator_uid':, 'uploaded_at': }}
             service: Instància de R2MediaService per generar URLs
             expiration: Temps d'expiració de la URL en segons
+            lazy: Si True, la URL es signa quan es serialitza el mitjà
         
         Returns:
             Objecte MediaMetadata amb URL prefirmada
         """
         key = next(iter(metadata_dict)) if metadata_dict else ''
         key_dict = metadata_dict[key] if key else {}
-        url = service.generate_presigned_url(key, expiration) if key else ''
         
         return RefugeMediaMetadata(
             key=key,
-            url=url,
+            **_build_url_args(key, service, expiration, lazy),
             creator_uid=key_dict.get('creator_uid', ''),
             uploaded_at=key_dict.get('uploaded_at', ''),
             experience_id=key_dict.get('experience_id', None)
@@ -122,7 +150,7 @@ class UserAvatarStrategy(MediaPathStrategy):
     def validate_file(self, content_type: str) -> bool:
         return content_type in self.get_allowed_content_types()
     
-    def generate_media_metadata_from_dict(self, metadata_dict: Dict[str, str], service, expiration: int = 3600) -> MediaMetadata:
+    def generate_media_metadata_from_dict(self, metadata_dict: Dict[str, str], service, expiration: int = 3600, lazy: bool = False) -> MediaMetadata:
         """
         Genera un objecte MediaMetadata amb URL prefirmada a partir d'un diccionari de metadades.
         Per a l'avatar d'usuari.
@@ -131,20 +159,108 @@ class UserAvatarStrategy(MediaPathStrategy):
             metadata_dict: Diccionari amb keys: {'key': , 'uploaded_at': }
             service: Instància de R2MediaService per generar URLs
             expiration: Temps d'expiració de la URL en segons
+            lazy: Si True, la URL es signa quan es serialitza el mitjà
         
         Returns:
             Objecte MediaMetadata amb URL prefirmada
         """
         key = metadata_dict.get('key', '')
-        url = service.generate_presigned_url(key, expiration) if key else ''
         
         return MediaMetadata(
             key=key,
-            url=url,
+            **_build_url_args(key, service, expiration, lazy),
             uploaded_at=metadata_dict.get('uploaded_at', '')
         )
 
 
+class PresignedUrlCache:
+    """
+    Cache en memòria d'URLs prefirmades, compartida per totes les instàncies del servei.
+
+    Les entrades es guarden per (bucket, key, expiration, finestra). La finestra és la meitat
+    del temps d'expiració: una URL signada dins d'una finestra es reutilitza fins que la
+    finestra acaba, de manera que sempre es retorna una URL amb almenys la meitat de la
+    seva validesa. Quan la cache és plena s'eliminen primer les entrades caducades i
+    després les menys usades recentment.
+    """
+
+    MAX_ENTRIES = 10000
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[str, str, int, int], Tuple[str, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _window(expiration: int, now: float) -> Tuple[int, float]:
+        """Retorna l'índex de la finestra actual i el moment en què acaba"""
+        length = max(expiration // 2, 1)
+        index = int(now // length)
+        return index, (index + 1) * length
+
+    def current_window(self, expiration: int = 3600) -> int:
+        """Índex de la finestra de signatura actual (les URLs signades canvien quan canvia)"""
+        return self._window(expiration, time.time())[0]
+
+    def get_or_sign(self, bucket: str, key: str, expiration: int, sign_fn: Callable[[str, int], str]) -> str:
+        """
+        Retorna la URL prefirmada en cache o la genera amb sign_fn
+
+        Args:
+            bucket: Nom del bucket
+            key: Path del fitxer al bucket
+            expiration: Temps d'expiració de la URL en segons
+            sign_fn: Funció que signa la URL (key, expiration)
+
+        Returns:
+            URL prefirmada
+        """
+        now = time.time()
+        window, expires_at = self._window(expiration, now)
+        cache_key = (bucket, key, expiration, window)
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        url = sign_fn(key, expiration)
+
+        with self._lock:
+            self._entries[cache_key] = (url, expires_at)
+            self._entries.move_to_end(cache_key)
+            if len(self._entries) > self.max_entries:
+                self._evict(now)
+        return url
+
+    def _evict(self, now: float) -> None:
+        """Elimina les entrades caducades i, si encara cal, les menys usades recentment"""
+        expired = [cache_key for cache_key, (_, expires_at) in self._entries.items() if expires_at <= now]
+        for cache_key in expired:
+            del self._entries[cache_key]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Buida la cache"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Instància global de la cache d'URLs prefirmades
+presigned_url_cache = PresignedUrlCache()
+
+
 class R2MediaService:
     """
     Servei principal per gestionar mitjans al bucket R2 de Cloudflare.
@@ -159,10 +275,21 @@ class R2MediaService:
             strategy: Estratègia per determinar paths i validacions
         """
         self.strategy = strategy
-        self.client = get_r2_client()
+        self._client = None
         self.bucket_name = get_r2_bucket_name()
         self.endpoint = get_r2_endpoint()
     
+    @property
+    def client(self):
+        """Client de R2 compartit pel procés (obtingut del registre la primera vegada que es necessita)"""
+        if self._client is not None:
+            return self._client
+        return get_r2_client()
+    
+    @client.setter
+    def client(self, value):
+        self._client = value
+    
     def upload_file(
         self, 
         file_content: BinaryIO, 
@@ -203,12 +330,15 @@ class R2MediaService:
         key = f"{base_path}/{filename}"
         
         try:
-            # Pujar fitxer amb AWS Signature
-            self.client.put_object(
+            # Pujar fitxer amb AWS Signature, llegint-lo per chunks (multipart si és gran)
+            if hasattr(file_content, 'seek'):
+                file_content.seek(0)
+            self.client.upload_fileobj(
+                Fileobj=file_content,
                 Bucket=self.bucket_name,
                 Key=key,
-                Body=file_content,
-                ContentType=content_type
+                ExtraArgs={'ContentType': content_type},
+                Config=UPLOAD_TRANSFER_CONFIG
             )
             
             logger.info(f"Fitxer pujat correctament: {key}")
@@ -221,13 +351,14 @@ class R2MediaService:
                 'url': presigned_url
             }
             
-        except ClientError as e:
+        except (ClientError, S3UploadFailedError) as e:
             logger.error(f"Error pujant fitxer a R2: {str(e)}")
             raise Exception(f"Error pujant fitxer: {str(e)}")
     
     def generate_presigned_url(self, key: str, expiration: int = 3600) -> str:
         """
         Genera una URL prefirmada per accedir a un fitxer.
+        Les URLs es reutilitzen des de la cache mentre els queda almenys la meitat de la validesa.
         
         Args:
             key: Path del fitxer al bucket
@@ -236,6 +367,10 @@ class R2MediaService:
         Returns:
             URL prefirmada per accedir al fitxer
         """
+        return presigned_url_cache.get_or_sign(self.bucket_name, key, expiration, self._sign_url)
+    
+    def _sign_url(self, key: str, expiration: int) -> str:
+        """Signa una URL prefirmada amb el client de R2 (sense cache)"""
         try:
             url = self.client.generate_presigned_url(
                 'get_object',
@@ -283,7 +418,7 @@ class R2MediaService:
         """
         return self.strategy.generate_media_metadata_from_dict(metadata_dict, self, expiration)
     
-    def generate_media_metadata_list(self, metadata_input, expiration: int = 3600) -> List[MediaMetadata]:
+    def generate_media_metadata_list(self, metadata_input, expiration: int = 3600, lazy: bool = False) -> List[MediaMetadata]:
         """
         Genera una llista d'objectes MediaMetadata amb URLs prefirmades.
         Accepta tant diccionari com llista per compatibilitat.
@@ -291,6 +426,7 @@ class R2MediaService:
         Args:
             metadata_input: Diccionari o llista de diccionaris amb metadades
             expiration: Temps d'expiració de les URLs en segons
+            lazy: Si True, les URLs no es signen fins que es serialitzen els mitjans
         
         Returns:
             Llista d'objectes MediaMetadata
@@ -303,7 +439,7 @@ class R2MediaService:
                 try:
                     # Crear diccionari amb key i metadata
                     single_key_dict = {key: metadata}
-                    media_metadata = self.strategy.generate_media_metadata_from_dict(single_key_dict, self, expiration)
+                    media_metadata = self.strategy.generate_media_metadata_from_dict(single_key_dict, self, expiration, lazy)
                     result.append(media_metadata)
                 except Exception as e:
                     logger.warning(f"No s'ha pogut generar MediaMetadata per {key}: {str(e)}")
@@ -312,7 +448,7 @@ class R2MediaService:
         elif isinstance(metadata_input, list):
             for metadata_dict in metadata_input:
                 try:
-                    media_metadata = self.generate_media_metadata_from_dict(metadata_dict, expiration)
+                    media_metadata = self.strategy.generate_media_metadata_from_dict(metadata_dict, self, expiration, lazy)
                     result.append(media_metadata)
                 except Exception as e:
                     logger.warning(f"No s'ha pogut generar MediaMetadata per {metadata_dict.get('key', 'unknown')}: {str(e)}")
@@ -457,13 +593,38 @@ class R2MediaService:
         return extensions.get(content_type, '.bin')
 
 
-# Factory functions per crear instàncies del servei amb diferents estratègies
+# Factory functions per obtenir instàncies del servei amb diferents estratègies.
+# Els serveis no tenen estat mutable, de manera que es reutilitza una instància per
+# estratègia i configuració de bucket.
+
+_media_services: Dict[Tuple[type, Optional[str], Optional[str]], R2MediaService] = {}
+_media_services_lock = threading.Lock()
+
+
+def _get_media_service(strategy_class: type) -> R2MediaService:
+    key = (strategy_class, get_r2_bucket_name(), get_r2_endpoint())
+    service = _media_services.get(key)
+    if service is not None:
+        return service
+    with _media_services_lock:
+        service = _media_services.get(key)
+        if service is None:
+            service = R2MediaService(strategy_class())
+            _media_services[key] = service
+        return service
+
+
+def reset_media_services() -> None:
+    """Descarta les instàncies del servei en cache (tests i canvis de configuració)"""
+    with _media_services_lock:
+        _media_services.clear()
+
 
 def get_refugi_media_service() -> R2MediaService:
-    """Retorna una instància del servei configurada per a mitjans de refugis."""
-    return R2MediaService(RefugiMediaStrategy())
+    """Retorna la instància del servei configurada per a mitjans de refugis."""
+    return _get_media_service(RefugiMediaStrategy)
 
 
 def get_user_avatar_service() -> R2MediaService:
-    """Retorna una instància del servei configurada per a avatars d'usuaris."""
-    return R2MediaService(UserAvatarStrategy())
+    """Retorna la instància del servei configurada per a avatars d'usuaris."""
+    return _get_media_service(UserAvatarStrategy)
@@ -0,0 +1,262 @@
+"""
+Agrupació (clustering) dels refugis per al mapa, precalculada per a cada nivell de zoom.
+
+Per a cada zoom els refugis s'agrupen en una graella de cel·les de CELL_PX píxels de la
+projecció Web Mercator (la mateixa que fan servir els mapes de l'app). Una petició només
+recorre les cel·les del bbox visible: la mida de la resposta depèn de la pantalla i no de
+la mida del catàleg.
+
+L'índex es construeix a partir del catàleg de coordenades (coords_refugis) i es manté
+sincronitzat amb el registre de canvis: quan augmenta la versió del catàleg només s'apliquen
+els refugis afegits, moguts o eliminats des de la versió que té construïda cada worker.
+"""
+import math
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Nivells de zoom precalculats (a partir de MAX_ZOOM es retornen els refugis individuals)
+MIN_ZOOM = 0
+MAX_ZOOM = 16
+
+# Mida de la tessel·la i de la cel·la d'agrupació (en píxels)
+TILE_SIZE = 256
+CELL_PX = 64
+
+# Màxim de cel·les que es recorren per petició: si el bbox és massa gran per al zoom
+# demanat es respon amb el zoom més detallat que hi càpiga
+MAX_CELLS = 1024
+
+# Latitud màxima de la projecció Web Mercator
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def _project(lat: float, long: float) -> Tuple[float, float]:
+    """Coordenades Web Mercator normalitzades a [0, 1)"""
+    lat = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, lat))
+    x = (long + 180.0) / 360.0
+    sin_lat = math.sin(math.radians(lat))
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return min(max(x, 0.0), 1 - 1e-12), min(max(y, 0.0), 1 - 1e-12)
+
+
+def _cells_per_axis(zoom: int) -> int:
+    return (TILE_SIZE << zoom) // CELL_PX
+
+
+class _Cell:
+    """Refugis d'una cel·la: comptador i suma de coordenades per calcular el centroide"""
+
+    __slots__ = ('ids', 'sum_lat', 'sum_long')
+
+    def __init__(self):
+        self.ids = set()
+        self.sum_lat = 0.0
+        self.sum_long = 0.0
+
+
+class RefugiClusterIndex:
+    """Graelles d'agrupació de tots els nivells de zoom"""
+
+    def __init__(self, refugis: List[Dict[str, Any]], version: int = 0, etag: Optional[str] = None):
+        self.version = version
+        self.etag = etag
+        self.built_at = time.monotonic()
+        self.points: Dict[str, Dict[str, Any]] = {}
+        self.grids: List[Dict[Tuple[int, int], _Cell]] = [{} for _ in range(MIN_ZOOM, MAX_ZOOM + 1)]
+        for refugi in refugis:
+            self.add(refugi)
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    @staticmethod
+    def _coordinates(refugi: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+        coord = refugi.get('coord') or {}
+        lat, long = coord.get('lat'), coord.get('long')
+        if not isinstance(lat, (int, float)) or not isinstance(long, (int, float)):
+            return None
+        if isinstance(lat, bool) or isinstance(long, bool) or math.isnan(lat) or math.isnan(long):
+            return None
+        return float(lat), float(long)
+
+    def _cells(self, lat: float, long: float):
+        x, y = _project(lat, long)
+        for zoom in range(MIN_ZOOM, MAX_ZOOM + 1):
+            cells = _cells_per_axis(zoom)
+            yield self.grids[zoom - MIN_ZOOM], (int(x * cells), int(y * cells))
+
+    def add(self, refugi: Dict[str, Any]) -> None:
+        """Afegeix un refugi (o el mou si ja hi era)"""
+        refugi_id = refugi.get('id')
+        coordinates = self._coordinates(refugi)
+        if not refugi_id or coordinates is None:
+            return
+        self.remove(refugi_id)
+
+        lat, long = coordinates
+        self.points[refugi_id] = {'id': refugi_id, 'name': refugi.get('name', ''), 'lat': lat, 'long': long}
+        for grid, key in self._cells(lat, long):
+            cell = grid.get(key)
+            if cell is None:
+                cell = grid[key] = _Cell()
+            cell.ids.add(refugi_id)
+            cell.sum_lat += lat
+            cell.sum_long += long
+
+    def remove(self, refugi_id: str) -> None:
+        """Elimina un refugi de totes les graelles"""
+        point = self.points.pop(refugi_id, None)
+        if point is None:
+            return
+        for grid, key in self._cells(point['lat'], point['long']):
+            cell = grid[key]
+            cell.ids.discard(refugi_id)
+            if not cell.ids:
+                del grid[key]
+            else:
+                cell.sum_lat -= point['lat']
+                cell.sum_long -= point['long']
+
+    def apply_changes(self, changes: Dict[str, Any]) -> None:
+        """Aplica els canvis retornats pel registre de canvis (added / updated / deleted)"""
+        for refugi_id in changes.get('deleted', []):
+            self.remove(refugi_id)
+        for refugi in changes.get('added', []) + changes.get('updated', []):
+            self.add(refugi)
+        self.version = changes['version']
+
+    def _effective_zoom(self, zoom: int, bounds: Tuple[float, float, float, float]) -> Tuple[int, Tuple[int, int, int, int]]:
+        """Redueix el zoom fins que el bbox no cobreix més de MAX_CELLS cel·les"""
+        zoom = max(MIN_ZOOM, min(MAX_ZOOM, zoom))
+        min_x, min_y, max_x, max_y = bounds
+        while True:
+            cells = _cells_per_axis(zoom)
+            cell_range = (int(min_x * cells), int(min_y * cells), int(max_x * cells), int(max_y * cells))
+            area = (cell_range[2] - cell_range[0] + 1) * (cell_range[3] - cell_range[1] + 1)
+            if area <= MAX_CELLS or zoom == MIN_ZOOM:
+                return zoom, cell_range
+            zoom -= 1
+
+    def clusters(self, zoom: int, bbox: List[float]) -> Dict[str, Any]:
+        """
+        Agrupacions visibles dins el bbox [min_long, min_lat, max_long, max_lat] al zoom indicat.
+        Les cel·les amb un sol refugi es retornen com el refugi (id, name, coord).
+        """
+        min_long, min_lat, max_long, max_lat = bbox
+        # A Web Mercator la y creix cap al sud
+        min_x, max_y = _project(min_lat, min_long)
+        max_x, min_y = _project(max_lat, max_long)
+        zoom, (x_lo, y_lo, x_hi, y_hi) = self._effective_zoom(zoom, (min_x, min_y, max_x, max_y))
+        grid = self.grids[zoom - MIN_ZOOM]
+
+        if (x_hi - x_lo + 1) * (y_hi - y_lo + 1) <= len(grid):
+            cells = ((key, grid.get(key)) for key in (
+                (x, y) for x in range(x_lo, x_hi + 1) for y in range(y_lo, y_hi + 1)
+            ))
+        else:
+            cells = (
+                (key, cell) for key, cell in list(grid.items())
+                if x_lo <= key[0] <= x_hi and y_lo <= key[1] <= y_hi
+            )
+
+        clusters = []
+        for key, cell in cells:
+            if cell is None or not cell.ids:
+                continue
+            count = len(cell.ids)
+            if count == 1:
+                point = self.points[next(iter(cell.ids))]
+                clusters.append({
+                    'id': point['id'],
+                    'name': point['name'],
+                    'count': 1,
+                    'coord': {'lat': point['lat'], 'long': point['long']},
+                })
+            else:
+                clusters.append({
+                    'count': count,
+                    'coord': {'lat': round(cell.sum_lat / count, 6), 'long': round(cell.sum_long / count, 6)},
+                })
+
+        return {'zoom': zoom, 'version': self.version, 'count': len(clusters), 'clusters': clusters}
+
+
+class RefugiClusterService:
+    """
+    Servei singleton que manté l'índex d'agrupació resident a cada worker.
+
+    Cada petició compara la versió i l'ETag del catàleg de coordenades (a la cache) amb les de
+    l'índex construït: si la versió ha avançat s'apliquen només els canvis del registre, i si el
+    registre no els cobreix (o el catàleg s'ha reescrit) es reconstrueix l'índex sencer.
+    """
+
+    _instance = None
+    _index: Optional[RefugiClusterIndex] = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(RefugiClusterService, cls).__new__(cls)
+        return cls._instance
+
+    def get_index(
+        self,
+        snapshot_loader: Callable[[], Optional[Dict[str, Any]]],
+        changes_loader: Callable[[int], Optional[Dict[str, Any]]],
+    ) -> Optional[RefugiClusterIndex]:
+        """
+        Obté l'índex d'agrupació, actualitzant-lo si el catàleg ha canviat
+
+        Args:
+            snapshot_loader: Funció que retorna el catàleg de coordenades (version, etag, refugis)
+            changes_loader: Funció que retorna els canvis des d'una versió
+
+        Returns:
+            Índex d'agrupació o None si el catàleg no està disponible
+        """
+        snapshot = snapshot_loader()
+        index = self._index
+        if snapshot is None:
+            return index
+        if index is not None and index.etag == snapshot['etag']:
+            return index
+
+        with self._lock:
+            index = self._index
+            if index is not None and index.etag == snapshot['etag']:
+                return index
+
+            started = time.perf_counter()
+            if index is not None and index.version < snapshot['version']:
+                try:
+                    changes = changes_loader(index.version)
+                except Exception as e:
+                    logger.error(f"Error llegint els canvis del catàleg per a l'agrupació: {str(e)}")
+                    changes = None
+                if changes is not None and not changes['full'] and changes['version'] == snapshot['version']:
+                    index.apply_changes(changes)
+                    index.etag = snapshot['etag']
+                    logger.info(
+                        f"Índex d'agrupació actualitzat a la versió {index.version} "
+                        f"en {(time.perf_counter() - started) * 1000:.1f} ms"
+                    )
+                    return index
+
+            self._index = RefugiClusterIndex(snapshot['refugis'], snapshot['version'], snapshot['etag'])
+            logger.info(
+                f"Índex d'agrupació construït amb {len(self._index)} refugis "
+                f"en {(time.perf_counter() - started) * 1000:.1f} ms"
+            )
+            return self._index
+
+    def invalidate(self) -> None:
+        """Descarta l'índex local (es reconstrueix a la següent petició)"""
+        self._index = None
+
+
+# Instància global del servei
+refugi_cluster_service = RefugiClusterService()
@@ -0,0 +1,547 @@
+"""
+Servei per mantenir un índex columnar en memòria dels camps cercables dels refugis.
+
+L'índex es construeix una sola vegada per worker a partir d'una única lectura de la
+col·lecció de refugis i resol qualsevol combinació de filtres (type, condition, places,
+altitude) amb operacions de bits sobre màscares, sense consultar Firestore.
+
+Cada columna es guarda en un `array` i cada filtre es tradueix a una màscara de bits
+(un enter de Python amb un bit per fila). Les màscares es combinen amb `&`, de manera
+que el cost d'una cerca és independent del nombre de filtres actius.
+
+Les coordenades s'indexen en una graella regular de cel·les (GeoGridColumn): una cerca per
+àrea (bbox o near + radius_km) només comprova la distància exacta dels refugis de les cel·les
+que toquen l'àrea i retorna els resultats ordenats per distància.
+
+Cada cop que es construeix l'índex se'n publiquen a Redis les estadístiques de selectivitat
+(RefugiSearchStatistics): el planificador de les estratègies de Firestore les fa servir per
+estimar quants documents llegirà cada query quan l'índex no està disponible.
+"""
+import math
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+
+def _as_number(value: Any) -> Optional[float]:
+    """Retorna el valor com a float si és numèric, None altrament"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+def mask_to_rows(mask: int) -> List[int]:
+    """
+    Converteix una màscara de bits a la llista ordenada de files actives
+
+    Args:
+        mask: Enter on el bit i indica que la fila i compleix els filtres
+
+    Returns:
+        Llista de posicions de les files actives
+    """
+    bits = bin(mask)[:1:-1]
+    rows = []
+    position = bits.find('1')
+    while position != -1:
+        rows.append(position)
+        position = bits.find('1', position + 1)
+    return rows
+
+
+# Radi mitjà de la Terra (km)
+EARTH_RADIUS_KM = 6371.0088
+
+# Quilòmetres per grau de latitud
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1: float, long1: float, lat2: float, long2: float) -> float:
+    """Distància de gran cercle entre dos punts (en km)"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(long2 - long1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+@dataclass(frozen=True)
+class GeoArea:
+    """
+    Àrea d'una cerca geogràfica: rectangle límit (bbox, o el que envolta el cercle de near +
+    radius_km, o la intersecció de tots dos) i punt d'origen per ordenar per distància
+    (near o el centre del bbox)
+    """
+    min_lat: float
+    min_long: float
+    max_lat: float
+    max_long: float
+    origin_lat: float
+    origin_long: float
+    radius_km: Optional[float] = None
+
+    @classmethod
+    def from_filters(cls, filters) -> Optional['GeoArea']:
+        """Crea l'àrea a partir dels filtres (None si no n'hi ha de geogràfics)"""
+        if not filters.has_geo_filters():
+            return None
+        bounds = [-90.0, -180.0, 90.0, 180.0]
+        radius_km = None
+
+        if filters.near and filters.radius_km is not None:
+            lat, long = filters.near
+            radius_km = float(filters.radius_km)
+            d_lat = radius_km / KM_PER_DEGREE
+            cos_lat = math.cos(math.radians(lat))
+            d_long = 180.0 if cos_lat < 1e-6 else min(180.0, d_lat / cos_lat)
+            bounds = [lat - d_lat, long - d_long, lat + d_lat, long + d_long]
+            origin = (lat, long)
+
+        if filters.bbox:
+            min_long, min_lat, max_long, max_lat = filters.bbox
+            bounds = [
+                max(bounds[0], min_lat), max(bounds[1], min_long),
+                min(bounds[2], max_lat), min(bounds[3], max_long),
+            ]
+            if radius_km is None:
+                origin = ((min_lat + max_lat) / 2, (min_long + max_long) / 2)
+
+        return cls(bounds[0], bounds[1], bounds[2], bounds[3], origin[0], origin[1], radius_km)
+
+    def distance(self, lat: float, long: float) -> Optional[float]:
+        """Distància a l'origen si el punt és dins l'àrea, None altrament (també si no té coordenades)"""
+        if not (self.min_lat <= lat <= self.max_lat and self.min_long <= long <= self.max_long):
+            return None  # també descarta NaN
+        distance = haversine_km(self.origin_lat, self.origin_long, lat, long)
+        if self.radius_km is not None and distance > self.radius_km:
+            return None
+        return distance
+
+    def filter_documents(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Documents dins l'àrea ordenats per distància (per a les cerques sense índex)"""
+        matches = []
+        for position, doc in enumerate(documents):
+            coord = doc.get('coord') or {}
+            lat, long = _as_number(coord.get('lat')), _as_number(coord.get('long'))
+            if lat is None or long is None:
+                continue
+            distance = self.distance(lat, long)
+            if distance is not None:
+                matches.append((distance, position))
+        matches.sort()
+        return [documents[position] for _, position in matches]
+
+
+class GeoGridColumn:
+    """Graella regular de cel·les de cell_degrees graus amb una màscara de bits per cel·la ocupada"""
+
+    def __init__(self, lats: array, longs: array, cell_degrees: float = 0.1):
+        self.cell_degrees = cell_degrees
+        self.masks: Dict[Tuple[int, int], int] = {}
+        for row, (lat, long) in enumerate(zip(lats, longs)):
+            if math.isnan(lat) or math.isnan(long):
+                continue
+            cell = self._cell(lat, long)
+            self.masks[cell] = self.masks.get(cell, 0) | (1 << row)
+
+    def _cell(self, lat: float, long: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_degrees), math.floor(long / self.cell_degrees)
+
+    def mask(self, min_lat: float, min_long: float, max_lat: float, max_long: float) -> int:
+        """Màscara de les files de les cel·les que toquen el rectangle (candidates, no exactes)"""
+        if min_lat > max_lat or min_long > max_long:
+            return 0
+        lat_lo, long_lo = self._cell(min_lat, min_long)
+        lat_hi, long_hi = self._cell(max_lat, max_long)
+        result = 0
+        # Per rectangles grans surt més a compte recórrer només les cel·les ocupades
+        if (lat_hi - lat_lo + 1) * (long_hi - long_lo + 1) <= len(self.masks):
+            for lat_cell in range(lat_lo, lat_hi + 1):
+                for long_cell in range(long_lo, long_hi + 1):
+                    result |= self.masks.get((lat_cell, long_cell), 0)
+        else:
+            for (lat_cell, long_cell), mask in self.masks.items():
+                if lat_lo <= lat_cell <= lat_hi and long_lo <= long_cell <= long_hi:
+                    result |= mask
+        return result
+
+
+class CategoryColumn:
+    """Columna categòrica amb una màscara de bits per cada valor diferent"""
+
+    def __init__(self, values: List[Any]):
+        self.categories: List[Any] = []
+        self.codes = array('i')
+        self.masks: Dict[Any, int] = {}
+        category_codes: Dict[Any, int] = {}
+
+        for row, value in enumerate(values):
+            if value is None:
+                self.codes.append(-1)
+                continue
+            if value not in category_codes:
+                category_codes[value] = len(self.categories)
+                self.categories.append(value)
+            self.codes.append(category_codes[value])
+            self.masks[value] = self.masks.get(value, 0) | (1 << row)
+
+    def mask(self, wanted: Iterable[Any]) -> int:
+        """Màscara de les files amb algun dels valors demanats (els None mai coincideixen)"""
+        result = 0
+        for value in wanted:
+            result |= self.masks.get(value, 0)
+        return result
+
+    def frequencies(self) -> Dict[Any, int]:
+        """Nombre de files per cada valor de la columna"""
+        return {value: bin(mask).count('1') for value, mask in self.masks.items()}
+
+
+class RangeColumn:
+    """
+    Columna numèrica amb màscares acumulades per valor.
+
+    `cumulative[i]` conté les files amb valor <= `keys[i]`, de manera que qualsevol rang
+    [min, max] es resol amb dues cerques binàries i una operació de bits.
+    Les files sense valor (None o no numèric) no coincideixen amb cap rang, igual que
+    les queries de rang de Firestore sobre documents sense el camp.
+    """
+
+    def __init__(self, values: List[Any]):
+        self.values = array('d')
+        by_value: Dict[float, int] = {}
+
+        for row, raw_value in enumerate(values):
+            value = _as_number(raw_value)
+            self.values.append(value if value is not None else float('nan'))
+            if value is not None:
+                by_value[value] = by_value.get(value, 0) | (1 << row)
+
+        self.keys = array('d', sorted(by_value))
+        self.counts = array('l', (bin(by_value[key]).count('1') for key in self.keys))
+        self.cumulative: List[int] = []
+        accumulated = 0
+        for key in self.keys:
+            accumulated |= by_value[key]
+            self.cumulative.append(accumulated)
+
+    def mask(self, minimum: Optional[float] = None, maximum: Optional[float] = None) -> int:
+        """Màscara de les files amb valor dins de [minimum, maximum] (extrems opcionals)"""
+        upper = len(self.keys) - 1 if maximum is None else bisect_right(self.keys, maximum) - 1
+        lower = -1 if minimum is None else bisect_left(self.keys, minimum) - 1
+        if upper < 0 or upper <= lower:
+            return 0
+        if lower < 0:
+            return self.cumulative[upper]
+        return self.cumulative[upper] & ~self.cumulative[lower]
+
+
+class Histogram:
+    """
+    Histograma equi-depth d'una columna numèrica: cada cubeta [low, high] té aproximadament
+    el mateix nombre de files i els valors repetits no es reparteixen entre cubetes.
+    """
+
+    def __init__(self, buckets: List[Tuple[float, float, int]]):
+        self.buckets = buckets
+
+    @classmethod
+    def from_counts(cls, keys: Iterable[float], counts: Iterable[int], max_buckets: int = 32) -> 'Histogram':
+        """Construeix l'histograma a partir dels valors diferents (ordenats) i les seves freqüències"""
+        pairs = list(zip(keys, counts))
+        total = sum(count for _, count in pairs)
+        depth = max(1, math.ceil(total / max_buckets))
+        buckets = []
+        low, accumulated = None, 0
+        for value, count in pairs:
+            if low is None:
+                low = value
+            accumulated += count
+            if accumulated >= depth:
+                buckets.append((low, value, accumulated))
+                low, accumulated = None, 0
+        if low is not None:
+            buckets.append((low, pairs[-1][0], accumulated))
+        return cls(buckets)
+
+    def estimate(self, minimum: Optional[float] = None, maximum: Optional[float] = None) -> float:
+        """
+        Nombre estimat de files amb valor dins de [minimum, maximum]. Dins de cada cubeta se
+        suposa una distribució uniforme de valors enters (places i altitude ho són).
+        """
+        total = 0.0
+        for low, high, count in self.buckets:
+            lo = low if minimum is None else max(low, minimum)
+            hi = high if maximum is None else min(high, maximum)
+            if lo > hi:
+                continue
+            total += count * min(1.0, (hi - lo + 1) / (high - low + 1))
+        return total
+
+    def to_list(self) -> List[List[float]]:
+        return [[low, high, count] for low, high, count in self.buckets]
+
+    @classmethod
+    def from_list(cls, buckets: List[List[float]]) -> 'Histogram':
+        return cls([(low, high, int(count)) for low, high, count in buckets])
+
+
+class RefugiSearchStatistics:
+    """
+    Estadístiques de selectivitat del catàleg: freqüències de type i condition i histogrames de
+    places i altitude. Permeten estimar quants documents retorna una query de Firestore sobre
+    un subconjunt dels filtres (suposant que els camps són independents).
+    """
+
+    FIELDS = ('type', 'condition', 'places', 'altitude')
+
+    def __init__(
+        self,
+        total: int,
+        type_counts: Dict[Any, int],
+        condition_counts: Dict[Any, int],
+        places: Histogram,
+        altitude: Histogram,
+    ):
+        self.total = total
+        self.type_counts = type_counts
+        self.condition_counts = condition_counts
+        self.places = places
+        self.altitude = altitude
+
+    @classmethod
+    def from_index(cls, index: 'RefugiSearchIndex') -> 'RefugiSearchStatistics':
+        """Calcula les estadístiques a partir de les columnes de l'índex (sense llegir Firestore)"""
+        return cls(
+            total=len(index),
+            type_counts=index.type.frequencies(),
+            condition_counts=index.condition.frequencies(),
+            places=Histogram.from_counts(index.places.keys, index.places.counts),
+            altitude=Histogram.from_counts(index.altitude.keys, index.altitude.counts),
+        )
+
+    def estimate_field(self, field: str, filters) -> float:
+        """Nombre estimat de refugis que compleixen el filtre d'un sol camp"""
+        if field == 'type':
+            return float(sum(self.type_counts.get(value, 0) for value in set(filters.type)))
+        if field == 'condition':
+            return float(sum(self.condition_counts.get(value, 0) for value in set(filters.condition)))
+        if field == 'places':
+            return self.places.estimate(filters.places_min, filters.places_max)
+        if field == 'altitude':
+            return self.altitude.estimate(filters.altitude_min, filters.altitude_max)
+        return float(self.total)
+
+    def estimate_rows(self, fields: Iterable[str], filters) -> float:
+        """Nombre estimat de documents que retorna una query amb els filtres dels camps indicats"""
+        if self.total <= 0:
+            return 0.0
+        rows = float(self.total)
+        for field in fields:
+            rows *= self.estimate_field(field, filters) / self.total
+        return rows
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'total': self.total,
+            'type': [[value, count] for value, count in self.type_counts.items()],
+            'condition': [[value, count] for value, count in self.condition_counts.items()],
+            'places': self.places.to_list(),
+            'altitude': self.altitude.to_list(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Any) -> Optional['RefugiSearchStatistics']:
+        """Reconstrueix les estadístiques guardades a la cache (None si el format no és vàlid)"""
+        if not isinstance(data, dict):
+            return None
+        try:
+            return cls(
+                total=int(data['total']),
+                type_counts={value: int(count) for value, count in data['type']},
+                condition_counts={value: int(count) for value, count in data['condition']},
+                places=Histogram.from_list(data['places']),
+                altitude=Histogram.from_list(data['altitude']),
+            )
+        except (KeyError, TypeError, ValueError):
+            return None
+
+
+class RefugiSearchIndex:
+    """Instantània columnar i immutable dels camps cercables del catàleg de refugis"""
+
+    def __init__(self, documents: List[Dict[str, Any]], version: Optional[str] = None):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.ids: List[str] = [str(doc.get('id', '')) for doc in documents]
+        self.positions: Dict[str, int] = {refugi_id: row for row, refugi_id in enumerate(self.ids)}
+        self.all_rows = (1 << len(self.ids)) - 1
+
+        self.type = CategoryColumn([doc.get('type') for doc in documents])
+        self.condition = CategoryColumn([doc.get('condition') for doc in documents])
+        self.region = CategoryColumn([doc.get('region') for doc in documents])
+        self.places = RangeColumn([doc.get('places') for doc in documents])
+        self.altitude = RangeColumn([doc.get('altitude') for doc in documents])
+
+        self.lat = array('d')
+        self.long = array('d')
+        for doc in documents:
+            coord = doc.get('coord') or {}
+            lat = _as_number(coord.get('lat'))
+            long = _as_number(coord.get('long'))
+            self.lat.append(lat if lat is not None else float('nan'))
+            self.long.append(long if long is not None else float('nan'))
+        self.grid = GeoGridColumn(self.lat, self.long)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def filters_mask(self, filters) -> int:
+        """
+        Calcula la màscara de files que compleixen els filtres de cerca
+
+        Args:
+            filters: RefugiSearchFilters (el filtre per nom no es resol amb l'índex)
+
+        Returns:
+            Màscara de bits amb les files que compleixen tots els filtres
+        """
+        mask = self.all_rows
+        if filters.type:
+            mask &= self.type.mask(filters.type)
+        if filters.condition:
+            mask &= self.condition.mask(filters.condition)
+        if filters.places_min is not None or filters.places_max is not None:
+            mask &= self.places.mask(filters.places_min, filters.places_max)
+        if filters.altitude_min is not None or filters.altitude_max is not None:
+            mask &= self.altitude.mask(filters.altitude_min, filters.altitude_max)
+        return mask
+
+    def search(self, filters) -> List[str]:
+        """
+        Retorna els IDs dels refugis que compleixen els filtres: en l'ordre del catàleg o,
+        si la cerca és per àrea, ordenats per distància a l'origen de l'àrea
+        """
+        mask = self.filters_mask(filters)
+        area = GeoArea.from_filters(filters)
+        if area is None:
+            return [self.ids[row] for row in mask_to_rows(mask)]
+
+        mask &= self.grid.mask(area.min_lat, area.min_long, area.max_lat, area.max_long)
+        matches = []
+        for row in mask_to_rows(mask):
+            distance = area.distance(self.lat[row], self.long[row])
+            if distance is not None:
+                matches.append((distance, row))
+        matches.sort()
+        return [self.ids[row] for _, row in matches]
+
+
+class RefugiIndexService:
+    """
+    Servei singleton que manté l'índex de cerca resident a cada worker.
+
+    L'índex es reconstrueix quan expira (timeout 'refugi_index') o quan algun worker
+    l'invalida. La invalidació entre workers es fa amb un segell de versió guardat a
+    Redis: cada worker compara el segell amb el de l'índex que té construït.
+    """
+
+    _instance = None
+    _index: Optional[RefugiSearchIndex] = None
+    _lock = threading.Lock()
+
+    VERSION_CACHE_KEY = 'refugi_index:version'
+    STATISTICS_CACHE_KEY = 'refugi_index:statistics'
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(RefugiIndexService, cls).__new__(cls)
+        return cls._instance
+
+    def _is_fresh(self, index: Optional[RefugiSearchIndex], version: Optional[str]) -> bool:
+        """Comprova si l'índex construït encara és vàlid"""
+        if index is None or index.version != version:
+            return False
+        return time.monotonic() - index.built_at < cache_service.get_timeout('refugi_index')
+
+    def get_index(self, loader: Callable[[], List[Dict[str, Any]]]) -> Optional[RefugiSearchIndex]:
+        """
+        Obté l'índex de cerca, construint-lo si no existeix o ha quedat obsolet
+
+        Args:
+            loader: Funció que retorna TOTS els documents del catàleg (una sola lectura)
+
+        Returns:
+            Índex de cerca o None si no s'ha pogut construir (cal fer servir Firestore)
+        """
+        version = cache_service.get(self.VERSION_CACHE_KEY)
+        index = self._index
+        if self._is_fresh(index, version):
+            return index
+
+        with self._lock:
+            if self._is_fresh(self._index, version):
+                return self._index
+
+            started = time.perf_counter()
+            try:
+                documents = loader()
+            except Exception as e:
+                logger.error(f"Error construint l'índex de cerca de refugis: {str(e)}")
+                return index
+
+            if not documents:
+                logger.warning("No s'ha pogut construir l'índex de cerca: catàleg buit")
+                return None
+
+            self._index = RefugiSearchIndex(documents, version=version)
+            logger.info(
+                f"Índex de cerca de refugis construït amb {len(self._index)} refugis "
+                f"en {(time.perf_counter() - started) * 1000:.1f} ms"
+            )
+            self._publish_statistics(self._index)
+            return self._index
+
+    def _publish_statistics(self, index: RefugiSearchIndex) -> None:
+        """Guarda a Redis les estadístiques del catàleg per al planificador de Firestore"""
+        try:
+            statistics = RefugiSearchStatistics.from_index(index)
+            cache_service.set(
+                self.STATISTICS_CACHE_KEY,
+                statistics.to_dict(),
+                cache_service.get_timeout('refugi_search_stats')
+            )
+        except Exception as e:
+            logger.error(f"Error guardant les estadístiques de cerca: {str(e)}")
+
+    def get_statistics(self) -> Optional[RefugiSearchStatistics]:
+        """
+        Estadístiques de selectivitat del catàleg publicades per l'última construcció de l'índex
+        (de qualsevol worker)
+
+        Returns:
+            RefugiSearchStatistics o None si no n'hi ha (el planificador usa l'ordre fix)
+        """
+        try:
+            return RefugiSearchStatistics.from_dict(cache_service.get(self.STATISTICS_CACHE_KEY))
+        except Exception as e:
+            logger.error(f"Error llegint les estadístiques de cerca: {str(e)}")
+            return None
+
+    def invalidate(self) -> None:
+        """Descarta l'índex local i força la reconstrucció a la resta de workers"""
+        self._index = None
+        cache_service.set(self.VERSION_CACHE_KEY, str(time.time_ns()), None)
+        logger.info("Índex de cerca de refugis invalidat")
+
+
+# Instància global del servei
+refugi_index_service = RefugiIndexService()
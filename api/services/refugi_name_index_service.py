@@ -0,0 +1,236 @@
+"""
+Índex en memòria per cercar refugis pel nom (autocompletat i cerca parcial).
+
+Els noms (i sobrenoms) del catàleg de coordenades es normalitzen sense accents ni majúscules
+(fold), de manera que 'etang' troba 'Étang' i 'pleta' troba 'Pletà'. L'índex té dues parts:
+
+- Prefixos: totes les paraules normalitzades en una llista ordenada (equivalent a un trie
+  aplanat). Els refugis amb paraules que comencen per cada paraula de la consulta es troben
+  amb una cerca binària.
+- Trigrames: per a cada trigrama, els refugis que el contenen. Permet trobar noms amb errors
+  d'ortografia per similitud: per a cada paraula de la consulta es pren la paraula del nom
+  amb més trigrames en comú (Jaccard) i es fa la mitjana.
+
+Els resultats s'ordenen per la qualitat de la coincidència: nom exacte, prefix del nom,
+prefixos de paraula i, finalment, similitud de trigrames.
+"""
+import re
+import logging
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+# Lligadures que la descomposició Unicode no separa
+_LIGATURES = str.maketrans({'œ': 'oe', 'æ': 'ae', 'ø': 'o', 'ł': 'l', 'đ': 'd'})
+
+# Tipus de coincidència, de millor a pitjor
+MATCH_EXACT = 'exact'
+MATCH_PREFIX = 'prefix'
+MATCH_WORDS = 'words'
+MATCH_FUZZY = 'fuzzy'
+_MATCH_RANK = {MATCH_EXACT: 0, MATCH_PREFIX: 1, MATCH_WORDS: 2, MATCH_FUZZY: 3}
+
+
+def fold(text: Optional[str]) -> str:
+    """Normalitza un text: sense accents, en minúscules i amb les paraules separades per un espai"""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(text).casefold().translate(_LIGATURES))
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(_NON_ALNUM.sub(' ', stripped).split())
+
+
+def trigrams(folded: str) -> Set[str]:
+    """Trigrames de cada paraula d'un text normalitzat (amb dos espais davant i un darrere)"""
+    result = set()
+    for word in folded.split():
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class RefugiNameIndex:
+    """Índex de prefixos i trigrames dels noms dels refugis"""
+
+    # Similitud mínima perquè una coincidència per trigrames es consideri vàlida
+    MIN_SIMILARITY = 0.3
+
+    # Els trigrames presents en més d'aquesta fracció de refugis ('ref', 'efu'...) no serveixen
+    # per trobar candidats (la similitud sí que els té en compte)
+    COMMON_TRIGRAM_RATIO = 0.5
+
+    def __init__(self, refugis: List[Dict[str, Any]], version: int = 0, etag: Optional[str] = None):
+        self.version = version
+        self.etag = etag
+        self.built_at = time.monotonic()
+        self.entries: List[Dict[str, Any]] = []
+        self.names: List[str] = []
+        self.texts: List[str] = []
+        self.row_tokens: List[tuple] = []
+        self.token_trigrams: Dict[str, frozenset] = {}
+        self.trigram_rows: Dict[str, List[int]] = {}
+
+        tokens = []
+        for refugi in refugis:
+            name = refugi.get('name') or ''
+            surname = refugi.get('surname') or ''
+            text = fold(f'{name} {surname}')
+            if not refugi.get('id') or not text:
+                continue
+            row = len(self.entries)
+            entry = {'id': refugi['id'], 'name': name, 'coord': refugi.get('coord', {})}
+            if surname:
+                entry['surname'] = surname
+            self.entries.append(entry)
+            self.names.append(fold(name))
+            self.texts.append(text)
+            row_tokens = tuple(dict.fromkeys(text.split()))
+            self.row_tokens.append(row_tokens)
+            tokens.extend((token, row) for token in row_tokens)
+            row_trigrams = set()
+            for token in row_tokens:
+                if token not in self.token_trigrams:
+                    self.token_trigrams[token] = frozenset(trigrams(token))
+                row_trigrams |= self.token_trigrams[token]
+            for trigram in row_trigrams:
+                self.trigram_rows.setdefault(trigram, []).append(row)
+
+        tokens.sort()
+        self.tokens = [token for token, _ in tokens]
+        self.token_rows = [row for _, row in tokens]
+        self.max_trigram_rows = max(1, int(len(self.entries) * self.COMMON_TRIGRAM_RATIO))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _prefix_rows(self, prefix: str) -> Set[int]:
+        """Refugis amb alguna paraula que comença per prefix"""
+        start = bisect_left(self.tokens, prefix)
+        end = bisect_left(self.tokens, prefix + '￿', start)
+        return set(self.token_rows[start:end])
+
+    def _similarity(self, query_words: List[Set[str]], row: int) -> float:
+        """Mitjana, per a cada paraula de la consulta, de la millor similitud amb una paraula del nom"""
+        total = 0.0
+        for word_trigrams in query_words:
+            best = 0.0
+            for token in self.row_tokens[row]:
+                token_trigrams = self.token_trigrams[token]
+                shared = len(word_trigrams & token_trigrams)
+                if shared:
+                    best = max(best, shared / (len(word_trigrams) + len(token_trigrams) - shared))
+            total += best
+        return total / len(query_words)
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Refugis que coincideixen amb la consulta, ordenats per qualitat de la coincidència
+
+        Returns:
+            Llista d'entrades (id, name, surname, coord) amb el tipus de coincidència ('match')
+        """
+        folded = fold(query)
+        if not folded or limit <= 0:
+            return []
+        words = folded.split()
+        query_words = [trigrams(word) for word in words]
+
+        # Totes les paraules de la consulta han de ser prefix d'alguna paraula del nom
+        rows: Optional[Set[int]] = None
+        for word in words:
+            matches = self._prefix_rows(word)
+            rows = matches if rows is None else rows & matches
+            if not rows:
+                break
+
+        matches: Dict[int, str] = {}
+        for row in rows or ():
+            if self.names[row] == folded:
+                matches[row] = MATCH_EXACT
+            elif self.names[row].startswith(folded) or self.texts[row].startswith(folded):
+                matches[row] = MATCH_PREFIX
+            else:
+                matches[row] = MATCH_WORDS
+
+        # Errors d'ortografia: candidats que comparteixen algun trigrama poc freqüent
+        if len(matches) < limit:
+            candidates = set()
+            for trigram in set().union(*query_words):
+                posting = self.trigram_rows.get(trigram, ())
+                if len(posting) <= self.max_trigram_rows:
+                    candidates.update(posting)
+            for row in candidates - matches.keys():
+                if self._similarity(query_words, row) >= self.MIN_SIMILARITY:
+                    matches[row] = MATCH_FUZZY
+
+        ranked = sorted(
+            matches,
+            key=lambda row: (
+                _MATCH_RANK[matches[row]],
+                -self._similarity(query_words, row),
+                len(self.names[row]),
+                self.names[row],
+            )
+        )
+        return [{**self.entries[row], 'match': matches[row]} for row in ranked[:limit]]
+
+
+class RefugiNameIndexService:
+    """
+    Servei singleton que manté l'índex de noms resident a cada worker.
+
+    L'índex es reconstrueix quan canvia l'ETag del catàleg de coordenades (que inclou la
+    versió): cada aprovació de proposta que afegeix, elimina o reanomena un refugi el refresca.
+    """
+
+    _instance = None
+    _index: Optional[RefugiNameIndex] = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(RefugiNameIndexService, cls).__new__(cls)
+        return cls._instance
+
+    def get_index(self, snapshot_loader: Callable[[], Optional[Dict[str, Any]]]) -> Optional[RefugiNameIndex]:
+        """
+        Obté l'índex de noms, reconstruint-lo si el catàleg ha canviat
+
+        Args:
+            snapshot_loader: Funció que retorna el catàleg de coordenades (version, etag, refugis)
+
+        Returns:
+            Índex de noms o None si el catàleg no està disponible
+        """
+        snapshot = snapshot_loader()
+        index = self._index
+        if snapshot is None:
+            return index
+        if index is not None and index.etag == snapshot['etag']:
+            return index
+
+        with self._lock:
+            if self._index is not None and self._index.etag == snapshot['etag']:
+                return self._index
+
+            started = time.perf_counter()
+            self._index = RefugiNameIndex(snapshot['refugis'], snapshot['version'], snapshot['etag'])
+            logger.info(
+                f"Índex de noms de refugis construït amb {len(self._index)} refugis "
+                f"en {(time.perf_counter() - started) * 1000:.1f} ms"
+            )
+            return self._index
+
+    def invalidate(self) -> None:
+        """Descarta l'índex local (es reconstrueix a la següent petició)"""
+        self._index = None
+
+
+# Instància global del servei
+refugi_name_index_service = RefugiNameIndexService()
@@ -0,0 +1,234 @@
+"""
+Cache de tokens d'ID de Firebase ja verificats i precàrrega dels certificats de Google.
+
+Una mateixa app mòbil envia el mateix token desenes de vegades per hora: un cop verificat,
+les claims es reutilitzen fins a l'expiració del token ('exp'), sense tornar a comprovar
+la signatura. Les entrades es guarden per hash SHA-256 del token (el token no es guarda).
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+from django.conf import settings
+from ..firebase_config import _is_testing_environment
+
+logger = logging.getLogger(__name__)
+
+
+class VerifiedTokenCache:
+    """
+    Cache LRU en memòria del procés de claims de tokens verificats.
+
+    Cada entrada caduca al mínim entre l'expiració del token (menys un marge) i max_ttl.
+    Només es guarden verificacions correctes: els errors (token expirat, revocat o invàlid)
+    sempre es tornen a verificar.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_ttl: int = 3600, expiry_margin: int = 5):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.expiry_margin = expiry_margin
+        self._entries: 'OrderedDict[str, Tuple[Dict[str, Any], float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _hash(token: str) -> str:
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Retorna una còpia de les claims si el token és a la cache i no ha caducat"""
+        key = self._hash(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            claims, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(claims)
+
+    def set(self, token: str, claims: Dict[str, Any]) -> None:
+        """Desa les claims d'un token verificat (els tokens sense 'exp' no es guarden)"""
+        exp = claims.get('exp')
+        if not isinstance(exp, (int, float)):
+            return
+        now = time.time()
+        expires_at = min(exp - self.expiry_margin, now + self.max_ttl)
+        if expires_at <= now:
+            return
+        key = self._hash(token)
+        with self._lock:
+            self._entries[key] = (dict(claims), expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_verify(self, token: str, verify_fn: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Retorna les claims del token des de la cache o verificant-lo amb verify_fn
+
+        Args:
+            token: Token d'ID de Firebase
+            verify_fn: Funció de verificació (p. ex. firebase_admin.auth.verify_id_token)
+
+        Returns:
+            Claims del token verificat
+
+        Raises:
+            Les mateixes excepcions que verify_fn
+        """
+        claims = self.get(token)
+        if claims is not None:
+            return claims
+        claims = verify_fn(token)
+        self.set(token, claims)
+        return claims
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class CertificatePrefetcher:
+    """
+    Thread en segon pla que refresca periòdicament els certificats públics de Google
+    amb la mateixa sessió HTTP (amb cache-control) que utilitza firebase_admin per
+    verificar tokens. Així les verificacions troben els certificats ja en cache i cap
+    petició queda bloquejada per una descàrrega de certificats.
+
+    El thread s'inicia la primera vegada que es necessita a cada procés (els threads
+    del master de gunicorn no sobreviuen al fork dels workers).
+    """
+
+    def __init__(self, interval: float = 300.0):
+        self.interval = interval
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.refreshes = 0
+        self.failures = 0
+
+    def ensure_started(self) -> None:
+        """Inicia el thread de precàrrega si encara no s'ha iniciat en aquest procés"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            thread = threading.Thread(target=self._run, name='firebase-cert-prefetch', daemon=True)
+            thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def refresh(self) -> bool:
+        """Descarrega (o revalida) els certificats d'ID token de Google"""
+        try:
+            from firebase_admin import auth, _token_gen
+            request = auth._get_client(None)._token_verifier.request
+            response = request(url=_token_gen.ID_TOKEN_CERT_URI, method='GET')
+            if response.status != 200:
+                raise ValueError(f"HTTP {response.status}")
+            self.refreshes += 1
+            return True
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"No s'han pogut precarregar els certificats de Firebase: {str(e)}")
+            return False
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.interval)
+
+    def stats(self) -> dict:
+        return {
+            'running': self._pid == os.getpid() and not self._stop.is_set(),
+            'refreshes': self.refreshes,
+            'failures': self.failures,
+        }
+
+
+class TokenCacheService:
+    """Servei singleton que verifica tokens d'ID amb cache i precàrrega de certificats"""
+
+    _instance = None
+
+    # Configuració per defecte (es pot sobreescriure amb settings.AUTH_TOKEN_CACHE)
+    DEFAULTS = {
+        'ENABLED': True,
+        'MAX_ENTRIES': 10000,
+        'MAX_TTL': 3600,                  # segons
+        'CERT_PREFETCH': True,
+        'CERT_PREFETCH_INTERVAL': 300,    # segons
+    }
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(TokenCacheService, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        config = {**self.DEFAULTS, **getattr(settings, 'AUTH_TOKEN_CACHE', {})}
+        self.enabled = config['ENABLED']
+        self.cache = VerifiedTokenCache(max_entries=config['MAX_ENTRIES'], max_ttl=config['MAX_TTL'])
+        self.prefetcher = (
+            CertificatePrefetcher(interval=config['CERT_PREFETCH_INTERVAL'])
+            if config['CERT_PREFETCH'] and not _is_testing_environment() else None
+        )
+        self._initialized = True
+
+    def verify_id_token(self, token: str, verify_fn: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Verifica un token d'ID reutilitzant verificacions anteriors
+
+        Args:
+            token: Token d'ID de Firebase
+            verify_fn: Funció de verificació de firebase_admin
+
+        Returns:
+            Claims del token verificat
+        """
+        if self.prefetcher is not None:
+            self.prefetcher.ensure_started()
+        if not self.enabled:
+            return verify_fn(token)
+        return self.cache.get_or_verify(token, verify_fn)
+
+    def get_stats(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            **self.cache.stats(),
+            'cert_prefetch': self.prefetcher.stats() if self.prefetcher is not None else None,
+        }
+
+
+# Instància global del servei
+token_cache_service = TokenCacheService()
@@ -70,7 +70,7 @@ class TestDoubtController:
         """Test creació de resposta exitosa"""
         mock_doubt_dao = mock_doubt_dao_class.return_value
         
-        mock_doubt_dao.get_doubt_by_id.return_value = MagicMock(spec=Doubt)
+        mock_doubt_dao.get_doubt_by_id.return_value = Doubt(id="doubt_1", refuge_id="ref_1", creator_uid="u", message="m", created_at="d")
         mock_time.return_value.isoformat.return_value = "2024-01-01"
         mock_doubt_dao.create_answer.return_value = MagicMock(spec=Answer, id="ans_1")
         
@@ -80,6 +80,8 @@ class TestDoubtController:
         assert error is None
         assert answer.id == "ans_1"
         mock_doubt_dao.create_answer.assert_called()
+        # El refuge_id es desnormalitzat a la resposta
+        assert mock_doubt_dao.create_answer.call_args[0][1]['refuge_id'] == "ref_1"
 
     @patch('api.controllers.doubt_controller.DoubtDAO')
     @patch('api.controllers.doubt_controller.RefugiLliureDAO')
@@ -55,7 +55,8 @@ class TestDoubtDAO:
         assert isinstance(result, Doubt)
         assert result.id == "doubt_123"
         mock_doc_ref.set.assert_called()
-        mock_cache.delete_pattern.assert_called_with("doubt_list:refuge_id:ref_1")
+        mock_cache.generate_key.assert_any_call('doubt_list', refuge_id='ref_1')
+        mock_cache.delete.assert_called_with(mock_cache.generate_key.return_value)
 
     def test_get_doubt_by_id_found(self, dao, mock_db, mock_cache):
         """Test obtenció de dubte existent"""
@@ -100,6 +101,53 @@ class TestDoubtDAO:
         assert result[0].id == "doubt_1"
         assert len(result[0].answers) == 1
 
+    def _make_answer_doc(self, answer_id, doubt_id, created_at):
+        doc = MagicMock()
+        doc.id = answer_id
+        doc.to_dict.return_value = {'creator_uid': 'user_2', 'message': 'Reply', 'created_at': created_at, 'refuge_id': 'ref_1'}
+        doc.reference.parent.parent.id = doubt_id
+        return doc
+
+    def test_get_doubts_by_refuge_id_fetch_all_single_answers_query(self, dao, mock_db, mock_cache):
+        """Test fetch_all carrega les respostes amb una sola consulta collection_group"""
+        doubt_docs = []
+        for doubt_id, count in [('d1', 2), ('d2', 0)]:
+            doc = MagicMock()
+            doc.id = doubt_id
+            doc.to_dict.return_value = {'refuge_id': 'ref_1', 'creator_uid': 'u', 'message': 'm', 'created_at': '2024-01-01', 'answers_count': count}
+            doubt_docs.append(doc)
+        mock_db.collection.return_value.where.return_value.order_by.return_value.stream.return_value = doubt_docs
+        mock_db.collection_group.return_value.where.return_value.stream.return_value = [
+            self._make_answer_doc('a2', 'd1', '2024-01-03'),
+            self._make_answer_doc('a1', 'd1', '2024-01-02'),
+        ]
+        mock_cache.get_or_fetch_list.side_effect = lambda **kwargs: kwargs['fetch_all_fn']()
+
+        with patch.object(dao, '_get_answers_by_doubt_id') as mock_per_doubt:
+            result = dao.get_doubts_by_refuge_id('ref_1')
+
+        mock_per_doubt.assert_not_called()
+        mock_db.collection_group.assert_called_once_with('answers')
+        mock_db.collection_group.return_value.where.assert_called_once_with('refuge_id', '==', 'ref_1')
+        assert [answer.id for answer in result[0].answers] == ['a1', 'a2']
+        assert result[1].answers == []
+
+    def test_get_doubts_by_refuge_id_fetch_all_legacy_answers_fallback(self, dao, mock_db, mock_cache):
+        """Test respostes sense refuge_id desnormalitzat: consulta la subcollection del dubte"""
+        doubt_doc = MagicMock()
+        doubt_doc.id = 'd1'
+        doubt_doc.to_dict.return_value = {'refuge_id': 'ref_1', 'creator_uid': 'u', 'message': 'm', 'created_at': '2024-01-01', 'answers_count': 1}
+        mock_db.collection.return_value.where.return_value.order_by.return_value.stream.return_value = [doubt_doc]
+        mock_db.collection_group.return_value.where.return_value.stream.return_value = []
+        mock_cache.get_or_fetch_list.side_effect = lambda **kwargs: kwargs['fetch_all_fn']()
+
+        legacy = Answer(id='old', creator_uid='u2', message='r', created_at='2023-01-01')
+        with patch.object(dao, '_get_answers_by_doubt_id', return_value=[legacy]) as mock_per_doubt:
+            result = dao.get_doubts_by_refuge_id('ref_1')
+
+        mock_per_doubt.assert_called_once_with('d1')
+        assert result[0].answers[0].id == 'old'
+
     def test_create_answer_success(self, dao, mock_db, mock_cache, mock_increment):
         """Test creació de resposta exitosa"""
         mock_doc_ref = MagicMock()
@@ -317,8 +365,9 @@ class TestDoubtDAOExtended:
         
         assert success is True
         assert error is None
-        mock_doubt.reference.delete.assert_called()
-        mock_answer.reference.delete.assert_called()
+        batch = mock_db.batch.return_value
+        assert [c[0][0] for c in batch.delete.call_args_list] == [mock_answer.reference, mock_doubt.reference]
+        batch.commit.assert_called_once()
 
     @patch('api.daos.doubt_dao.FirestoreService')
     @patch('api.daos.doubt_dao.cache_service')
@@ -346,19 +395,19 @@ class TestDoubtDAOExtended:
         
         mock_db.collection_group.return_value.where.return_value.stream.return_value = [mock_answer]
         
-        mock_doubt_doc = MagicMock()
-        mock_doubt_doc.exists = True
-        mock_doubt_doc.to_dict.return_value = {'refuge_id': 'r1'}
-        mock_db.collection.return_value.document.return_value.get.return_value = mock_doubt_doc
-        mock_db.collection.return_value.document.return_value.collection.return_value.stream.return_value = []
+        mock_firestore_class.return_value.get_documents.return_value = {'d1': {'id': 'd1', 'answers_count': 1}}
         
         dao = DoubtDAO()
-        success, error = dao.delete_answers_by_creator("u1")
+        with patch('api.daos.doubt_dao.Increment') as mock_increment:
+            success, error = dao.delete_answers_by_creator("u1")
         
         assert success is True
         assert error is None
-        mock_answer.reference.delete.assert_called()
-        mock_db.collection.return_value.document.return_value.update.assert_called_with({'answers_count': 0})
+        batch = mock_db.batch.return_value
+        batch.delete.assert_called_once_with(mock_answer.reference)
+        batch.update.assert_called_once_with(mock_db.collection.return_value.document.return_value, {'answers_count': mock_increment.return_value})
+        mock_increment.assert_called_once_with(-1)
+        mock_firestore_class.return_value.get_documents.assert_called_once_with('doubts', ['d1'], field_paths=['answers_count'])
 
     @patch('api.daos.doubt_dao.FirestoreService')
     @patch('api.daos.doubt_dao.cache_service')
@@ -513,18 +562,16 @@ class TestDoubtDAOExtended:
         
         mock_db.collection_group.return_value.where.return_value.stream.return_value = [mock_answer]
         
-        mock_doubt_doc = MagicMock()
-        mock_doubt_doc.exists = False
-        mock_db.collection.return_value.document.return_value.get.return_value = mock_doubt_doc
+        mock_firestore_class.return_value.get_documents.return_value = {}
         
         dao = DoubtDAO()
         success, error = dao.delete_answers_by_creator("u1")
         
         assert success is True
         assert error is None
-        mock_answer.reference.delete.assert_called()
+        mock_db.batch.return_value.delete.assert_called_once_with(mock_answer.reference)
         # Should NOT update count if doubt not found
-        mock_db.collection.return_value.document.return_value.update.assert_not_called()
+        mock_db.batch.return_value.update.assert_not_called()
 
     @patch('api.daos.doubt_dao.FirestoreService')
     @patch('api.daos.doubt_dao.cache_service')
@@ -539,19 +586,15 @@ class TestDoubtDAOExtended:
         
         mock_db.collection_group.return_value.where.return_value.stream.return_value = [mock_answer]
         
-        mock_doubt_doc = MagicMock()
-        mock_doubt_doc.exists = True
-        mock_doubt_doc.to_dict.return_value = {} # No refuge_id
-        mock_db.collection.return_value.document.return_value.get.return_value = mock_doubt_doc
-        mock_db.collection.return_value.document.return_value.collection.return_value.stream.return_value = []
+        mock_firestore_class.return_value.get_documents.return_value = {'d1': {'id': 'd1'}} # No refuge_id
         
         dao = DoubtDAO()
         success, error = dao.delete_answers_by_creator("u1")
         
         assert success is True
         assert error is None
-        # Should call delete for doubt detail cache via _invalidate_doubt_detail_cache
-        mock_cache.delete.assert_called()
+        # Should invalidate the doubt detail cache
+        mock_cache.delete_many.assert_called_once()
         mock_cache.generate_key.assert_called()
 
     @patch('api.daos.doubt_dao.FirestoreService')
@@ -573,8 +616,8 @@ class TestDoubtDAOExtended:
         
         assert success is True
         assert error is None
-        # Should call delete for doubt detail cache via _invalidate_doubt_detail_cache
-        mock_cache.delete.assert_called()
+        # Should invalidate the doubt detail cache
+        mock_cache.delete_many.assert_called_once()
         mock_cache.generate_key.assert_called()
         # Should NOT call delete_pattern for refuge_id if not present
         assert mock_cache.delete_pattern.call_count == 0
@@ -53,7 +53,8 @@ class TestExperienceDAO:
         assert result is not None
         assert result.id == "exp_123"
         mock_doc_ref.set.assert_called()
-        mock_cache.delete_pattern.assert_called()
+        mock_cache.generate_key.assert_any_call('experience_list', refuge_id='ref_1')
+        mock_cache.delete.assert_called()
 
     def test_get_experience_by_id_found(self, dao, mock_db, mock_cache):
         """Test obtenció d'experiència existent"""
@@ -116,7 +117,8 @@ class TestExperienceDAO:
         
         assert success is True
         mock_doc_ref.delete.assert_called()
-        mock_cache.delete_pattern.assert_called()
+        mock_cache.generate_key.assert_any_call('experience_list', refuge_id='ref_1')
+        assert mock_cache.delete.call_count == 2
 
     def test_remove_media_key_success(self, dao, mock_db):
         """Test eliminació de media key d'experiència"""
@@ -324,7 +326,11 @@ class TestExperienceDAO:
         
         assert success is True
         assert error is None
-        mock_exp_doc.reference.delete.assert_called()
+        mock_db.batch.return_value.delete.assert_called_once_with(mock_exp_doc.reference)
+        mock_db.batch.return_value.commit.assert_called_once()
+        # Detalls i llistes dels refugis afectats
+        assert mock_cache.delete_many.call_count == 2
+        mock_cache.generate_key.assert_any_call('experience_list', refuge_id='ref_1')
 
     def test_delete_experiences_by_creator_no_experiences(self, dao, mock_db, mock_cache):
         """Test eliminació d'experiències per creador sense experiències"""
@@ -0,0 +1,68 @@
+"""
+Tests unitaris per al management command backfill_visitor_uids
+"""
+from unittest.mock import MagicMock, patch
+from io import StringIO
+from api.management.commands.backfill_visitor_uids import Command as BackfillCommand
+
+
+def _make_doc(doc_id, data):
+    doc = MagicMock()
+    doc.id = doc_id
+    doc.to_dict.return_value = data
+    return doc
+
+
+class TestBackfillVisitorUids:
+    """Tests per al command backfill_visitor_uids"""
+
+    def _run(self, mock_firestore_class, docs, **options):
+        db = MagicMock()
+        mock_firestore_class.return_value.get_db.return_value = db
+        db.collection.return_value.stream.return_value = docs
+
+        command = BackfillCommand()
+        out = StringIO()
+        command.stdout = out
+        command.handle(dry_run=options.get('dry_run', False), batch_size=options.get('batch_size', 500))
+        return db, out.getvalue()
+
+    @patch('api.management.commands.backfill_visitor_uids.FirestoreService')
+    def test_backfill_updates_only_out_of_sync_visits(self, mock_firestore_class):
+        """Test: Només s'actualitzen les visites sense visitor_uids o desincronitzades"""
+        docs = [
+            _make_doc('v1', {'visitors': [{'uid': 'u1', 'num_visitors': 2}]}),
+            _make_doc('v2', {'visitors': [{'uid': 'u2', 'num_visitors': 1}], 'visitor_uids': ['u2']}),
+            _make_doc('v3', {'visitors': [], 'visitor_uids': ['u3']}),
+        ]
+
+        db, output = self._run(mock_firestore_class, docs)
+
+        batch = db.batch.return_value
+        assert batch.update.call_count == 2
+        assert batch.update.call_args_list[0][0][1] == {'visitor_uids': ['u1']}
+        assert batch.update.call_args_list[1][0][1] == {'visitor_uids': []}
+        batch.commit.assert_called_once()
+        assert 'Visites actualitzades: 2' in output
+        assert 'Visites ja actualitzades: 1' in output
+
+    @patch('api.management.commands.backfill_visitor_uids.FirestoreService')
+    def test_backfill_commits_every_batch_size(self, mock_firestore_class):
+        """Test: Es fa commit cada batch_size documents"""
+        docs = [_make_doc(f'v{i}', {'visitors': [{'uid': f'u{i}'}]}) for i in range(5)]
+
+        db, _ = self._run(mock_firestore_class, docs, batch_size=2)
+
+        assert db.batch.return_value.commit.call_count == 3
+
+    @patch('api.management.commands.backfill_visitor_uids.FirestoreService')
+    def test_backfill_dry_run(self, mock_firestore_class):
+        """Test: En mode dry-run no es fa cap escriptura"""
+        docs = [_make_doc('v1', {'visitors': [{'uid': 'u1'}]})]
+
+        db, output = self._run(mock_firestore_class, docs, dry_run=True)
+
+        db.batch.return_value.update.assert_not_called()
+        db.batch.return_value.commit.assert_not_called()
+        assert 'DRY RUN' in output
+        assert 'Visites actualitzades: 1' in output
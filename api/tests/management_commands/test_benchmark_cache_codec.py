@@ -0,0 +1,21 @@
+"""
+Tests unitaris per al management command benchmark_cache_codec
+"""
+from io import StringIO
+from api.management.commands.benchmark_cache_codec import Command as BenchmarkCommand
+
+
+class TestBenchmarkCacheCodec:
+    """Tests per al command benchmark_cache_codec"""
+
+    def test_prints_summary(self):
+        command = BenchmarkCommand()
+        out = StringIO()
+        command.stdout = out
+        command.handle(refuges=5, iterations=1)
+
+        output = out.getvalue()
+        assert 'refugi_coords (1 valors):' in output
+        assert 'refugi_detail (5 valors):' in output
+        assert 'pickle+zlib' in output
+        assert 'msgpack+zlib' in output
@@ -0,0 +1,21 @@
+"""
+Tests unitaris per al management command benchmark_r2_clients
+"""
+from io import StringIO
+from api.management.commands.benchmark_r2_clients import Command as BenchmarkCommand
+
+
+class TestBenchmarkR2Clients:
+    """Tests per al command benchmark_r2_clients"""
+
+    def test_prints_summary(self):
+        command = BenchmarkCommand()
+        out = StringIO()
+        command.stdout = out
+        command.handle(refuges=5, requests=1)
+
+        output = out.getvalue()
+        assert 'Refugis per petició: 5' in output
+        assert 'Client per crida:' in output
+        assert 'Client compartit:' in output
+        assert 'Estalvi per petició:' in output
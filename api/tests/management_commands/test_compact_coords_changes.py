@@ -0,0 +1,65 @@
+"""
+Tests unitaris per al management command compact_coords_changes
+"""
+from unittest.mock import MagicMock, patch
+from io import StringIO
+from api.management.commands.compact_coords_changes import Command as CompactCommand
+
+
+class TestCompactCoordsChanges:
+    """Tests per al command compact_coords_changes"""
+
+    def _run(self, mock_firestore_class, coords_data, old_entries, **options):
+        db = MagicMock()
+        mock_firestore_class.return_value.get_db.return_value = db
+        coords_doc = db.collection.return_value.document.return_value.get.return_value
+        coords_doc.exists = coords_data is not None
+        coords_doc.to_dict.return_value = coords_data
+        db.collection.return_value.where.return_value.stream.return_value = old_entries
+
+        command = CompactCommand()
+        out = StringIO()
+        command.stdout = out
+        command.handle(keep=options.get('keep', 10), dry_run=options.get('dry_run', False))
+        return db, out.getvalue()
+
+    @patch('api.management.commands.compact_coords_changes.cache_service')
+    @patch('api.management.commands.compact_coords_changes.FirestoreService')
+    def test_advances_floor_and_deletes_old_entries(self, mock_firestore_class, mock_cache):
+        """Test: s'avança changes_floor i s'eliminen les entrades anteriors"""
+        entries = [MagicMock(), MagicMock()]
+        db, output = self._run(mock_firestore_class, {'version': 25, 'changes_floor': 3}, entries)
+
+        db.collection.return_value.document.return_value.update.assert_called_once_with({'changes_floor': 15})
+        db.collection.return_value.where.assert_called_once_with('version', '<=', 15)
+        assert db.batch.return_value.delete.call_count == 2
+        mock_cache.invalidate_tags.assert_called_once_with(['refugi_coords'])
+        assert 'Eliminades 2 entrades' in output
+
+    @patch('api.management.commands.compact_coords_changes.cache_service')
+    @patch('api.management.commands.compact_coords_changes.FirestoreService')
+    def test_floor_never_moves_back(self, mock_firestore_class, mock_cache):
+        """Test: amb poques versions el floor actual es manté"""
+        db, _ = self._run(mock_firestore_class, {'version': 12, 'changes_floor': 5}, [])
+
+        db.collection.return_value.document.return_value.update.assert_not_called()
+        db.collection.return_value.where.assert_called_once_with('version', '<=', 5)
+
+    @patch('api.management.commands.compact_coords_changes.cache_service')
+    @patch('api.management.commands.compact_coords_changes.FirestoreService')
+    def test_dry_run(self, mock_firestore_class, mock_cache):
+        """Test: en mode dry run no es fa cap canvi"""
+        db, output = self._run(mock_firestore_class, {'version': 25}, [MagicMock()], dry_run=True)
+
+        db.collection.return_value.document.return_value.update.assert_not_called()
+        db.batch.assert_not_called()
+        assert "S'eliminarien 1 entrades" in output
+
+    @patch('api.management.commands.compact_coords_changes.cache_service')
+    @patch('api.management.commands.compact_coords_changes.FirestoreService')
+    def test_missing_coords_document(self, mock_firestore_class, mock_cache):
+        """Test: sense document de coordenades no es fa res"""
+        db, output = self._run(mock_firestore_class, None, [])
+
+        db.batch.assert_not_called()
+        assert 'no existeix' in output
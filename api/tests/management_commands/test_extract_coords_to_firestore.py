@@ -88,8 +88,8 @@ class TestExtractCoordsToFirestore:
         # Assert
         output = out.getvalue()
         assert 'Reading refugis from collection: data_refugis_lliures' in output
-        assert 'Writing all 2 coordinates to a single document' in output
-        assert 'Successfully created single document with 2 refugi coordinates' in output
+        assert 'Writing 2 coordinates in 1 shards' in output
+        assert 'Successfully created 1 shards with 2 refugi coordinates' in output
     
     @patch('api.management.commands.extract_coords_to_firestore.firebase_admin')
     @patch('api.management.commands.extract_coords_to_firestore.firestore')
@@ -163,7 +163,7 @@ class TestExtractCoordsToFirestore:
         output = out.getvalue()
         assert 'Skipping refugi 1: missing coordinates' in output
         assert 'Skipped 1 refugis due to missing coordinates' in output
-        assert 'Successfully created single document with 1 refugi coordinates' in output
+        assert 'Successfully created 1 shards with 1 refugi coordinates' in output
     
     @patch('api.management.commands.extract_coords_to_firestore.firebase_admin')
     @patch('api.management.commands.extract_coords_to_firestore.firestore')
@@ -193,7 +193,7 @@ class TestExtractCoordsToFirestore:
         output = out.getvalue()
         assert '[DRY RUN] Would create coordinate document for refugi: 0' in output
         assert '[DRY RUN] Would create coordinate document for refugi: 1' in output
-        assert '[DRY RUN] Would create a single document with 2 refugi coordinates' in output
+        assert '[DRY RUN] Would create the sharded catalogue with 2 refugi coordinates' in output
         
         # Verify no actual writes
         assert not mock_firestore_db.collection().document().set.called
@@ -335,13 +335,15 @@ class TestExtractCoordsToFirestore:
             clear_target=False
         )
         
-        # Assert - verify document was set with geohash
-        set_call = mock_firestore_db.collection().document().set
-        assert set_call.called
-        call_args = set_call.call_args[0][0]
-        assert 'refugis_coordinates' in call_args
-        assert len(call_args['refugis_coordinates']) == 1
-        assert 'geohash' in call_args['refugis_coordinates'][0]
+        # Assert - verify shard was written with geohash and the manifest points to it
+        shard = mock_firestore_db.batch().set.call_args[0][1]
+        shard_id = shard['shard']
+        assert len(shard['refugis_coordinates']) == 1
+        assert shard['refugis_coordinates'][0]['geohash'].startswith(shard_id)
+        assert shard['ids'] == [shard['refugis_coordinates'][0]['id']]
+        manifest = mock_firestore_db.collection().document().set.call_args[0][0]
+        assert manifest['shards'] == {shard_id: manifest['version']}
+        assert 'refugis_coordinates' not in manifest
     
     @patch('api.management.commands.extract_coords_to_firestore.firebase_admin')
     @patch('api.management.commands.extract_coords_to_firestore.firestore')
@@ -369,5 +371,5 @@ class TestExtractCoordsToFirestore:
         
         # Assert
         output = out.getvalue()
-        assert 'Writing all 0 coordinates to a single document' in output
-        assert 'Successfully created single document with 0 refugi coordinates' in output
+        assert 'Writing 0 coordinates in 0 shards' in output
+        assert 'Successfully created 0 shards with 0 refugi coordinates' in output
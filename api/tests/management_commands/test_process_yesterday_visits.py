@@ -4,6 +4,8 @@ Tests unitaris per al management command process_yesterday_visits
 import pytest
 from unittest.mock import MagicMock, patch
 from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from api.management.commands.process_yesterday_visits import Command as ProcessVisitsCommand
 
 
@@ -307,3 +309,40 @@ class TestProcessYesterdayVisits:
         assert '=' * 80 in output
         assert 'Visites d\'ahir processades correctament' in output
         assert output.count('=') >= 160  # Two lines of separators
+    
+    @patch('api.management.commands.process_yesterday_visits.RefugeVisitController')
+    def test_process_visits_options_and_timings(self, mock_controller_class):
+        """Test: Les opcions --date, --batch-size i --workers es passen al controller i es mostren els temps"""
+        # Arrange
+        mock_controller = MagicMock()
+        mock_controller_class.return_value = mock_controller
+        
+        mock_controller.process_yesterday_visits.return_value = (
+            True,
+            {
+                'processed_visits': 2,
+                'deleted_visits': 0,
+                'updated_refuges': 1,
+                'updated_users': 2,
+                'total_visitors_added': 2,
+                'timings': {'load': 0.1, 'merge': 0.0, 'apply': 0.25, 'total': 0.35}
+            },
+            None
+        )
+        
+        out = StringIO()
+        
+        # Act
+        call_command('process_yesterday_visits', '--date', '2024-03-01', '--batch-size', '100', '--workers', '8', stdout=out)
+        
+        # Assert
+        mock_controller.process_yesterday_visits.assert_called_once_with(target_date='2024-03-01', batch_size=100, workers=8)
+        output = out.getvalue()
+        assert 'Usuaris actualitzats: 2' in output
+        assert 'Temps apply: 0.250s' in output
+        assert 'Temps total: 0.350s' in output
+    
+    def test_process_visits_invalid_date(self):
+        """Test: Una data amb format invàlid retorna un error de command"""
+        with pytest.raises(CommandError):
+            call_command('process_yesterday_visits', '--date', '01/03/2024', stdout=StringIO())
@@ -8,10 +8,66 @@ from datetime import datetime
 from api.daos.refuge_proposal_dao import (
     generate_simple_geohash, add_refuge_to_coords_refugis,
     update_refuge_from_coords_refugis, delete_refuge_from_coords_refugis,
+    coords_shard_id, COORDS_COLLECTION, COORDS_SHARDS_COLLECTION,
     CreateRefugeStrategy, UpdateRefugeStrategy, DeleteRefugeStrategy,
     ProposalStrategySelector, RefugeProposalDAO
 )
 from api.models.refuge_proposal import RefugeProposal
+from google.cloud import firestore
+
+
+def _coords_db(manifest, shards=None):
+    """
+    Firestore mínim per als helpers de coords_refugis: manifest i shards {shard_id: entrades}.
+    Retorna (db, transaction, manifest_ref, shard_refs)
+    """
+    shards = shards or {}
+    db = MagicMock()
+    transaction = db.transaction.return_value
+    transaction.get.side_effect = lambda query: iter(query)
+
+    manifest_ref = MagicMock(name='manifest')
+    manifest_ref.get.return_value.exists = manifest is not None
+    manifest_ref.get.return_value.to_dict.return_value = manifest
+
+    shard_refs = {}
+
+    def shard_ref(shard_id):
+        if shard_id not in shard_refs:
+            ref = shard_refs[shard_id] = MagicMock(name=f'shard_{shard_id}')
+            ref.get.return_value.exists = shard_id in shards
+            ref.get.return_value.to_dict.return_value = {'refugis_coordinates': shards.get(shard_id, [])}
+        return shard_refs[shard_id]
+
+    def where(filter):
+        matches = []
+        for shard_id, entries in shards.items():
+            if any(entry['id'] == filter.value for entry in entries):
+                doc = MagicMock()
+                doc.id = shard_id
+                doc.to_dict.return_value = {'refugis_coordinates': [dict(entry) for entry in entries]}
+                matches.append(doc)
+        query = MagicMock()
+        query.limit.return_value = matches[:1]
+        return query
+
+    collections = {COORDS_COLLECTION: MagicMock(), COORDS_SHARDS_COLLECTION: MagicMock()}
+    collections[COORDS_COLLECTION].document.return_value = manifest_ref
+    collections[COORDS_SHARDS_COLLECTION].document.side_effect = shard_ref
+    collections[COORDS_SHARDS_COLLECTION].where.side_effect = where
+    changes = MagicMock(name='changes')
+    db.collection.side_effect = lambda name: collections.get(name, changes)
+    return db, transaction, manifest_ref, shard_refs
+
+
+def _writes(transaction, ref):
+    """Dades escrites amb transaction.set a una referència"""
+    return [c.args[1] for c in transaction.set.call_args_list if c.args[0] is ref]
+
+
+def _change_entry(transaction):
+    """Entrada del registre de canvis escrita a la transacció"""
+    return next(c.args[1] for c in transaction.set.call_args_list if 'action' in c.args[1])
 
 @pytest.mark.daos
 class TestRefugeProposalDAO:
@@ -57,7 +113,7 @@ class TestRefugeProposalDAO:
             assert result is not None
             assert result.id == "prop_123"
             mock_doc_ref.set.assert_called()
-            mock_cache.delete_pattern.assert_called_with('proposal_list:')
+            mock_cache.invalidate_tags.assert_called_with(['proposal_list'])
 
     def test_get_by_id_found(self, dao, mock_db, mock_cache):
         """Test obtenció de proposta existent"""
@@ -136,68 +192,121 @@ class TestRefugeProposalDAOExtended:
         assert generate_simple_geohash(41.3851, 2.1734, 5) == gh
 
     def test_add_refuge_to_coords_refugis(self):
-        """Test add_refuge_to_coords_refugis"""
-        db = MagicMock()
-        ref_id = "ref_1"
+        """Test add_refuge_to_coords_refugis: només s'escriu el shard del refugi"""
         ref_data = {'name': 'Refugi 1', 'coord': {'lat': 41.0, 'long': 2.0}, 'surname': 'S1'}
-        
-        # Cas document existeix
-        mock_doc = db.collection.return_value.document.return_value.get.return_value
-        mock_doc.exists = True
-        mock_doc.to_dict.return_value = {'refugis_coordinates': []}
-        
-        add_refuge_to_coords_refugis(db, ref_id, ref_data)
-        db.collection.return_value.document.return_value.update.assert_called_once()
-        
-        # Cas document no existeix
-        db.collection.return_value.document.return_value.update.reset_mock()
-        mock_doc.exists = False
-        add_refuge_to_coords_refugis(db, ref_id, ref_data)
-        db.collection.return_value.document.return_value.set.assert_called_once()
+        shard_id = coords_shard_id({'coord': ref_data['coord']})
+        other = {'id': 'ref_0', 'name': 'Refugi 0', 'coord': {'lat': 41.0, 'long': 2.0}}
+        db, transaction, manifest_ref, shard_refs = _coords_db(
+            {'version': 4, 'total_refugis': 3, 'shards': {shard_id: 2, 'zzz': 4}},
+            {shard_id: [other]}
+        )
+        
+        add_refuge_to_coords_refugis(db, 'ref_1', ref_data)
+        
+        shard = _writes(transaction, shard_refs[shard_id])[0]
+        assert [entry['id'] for entry in shard['refugis_coordinates']] == ['ref_0', 'ref_1']
+        assert shard['ids'] == ['ref_0', 'ref_1']
+        assert shard['version'] == 5
+        manifest_update = transaction.update.call_args[0][1]
+        assert manifest_update['version'] == 5
+        assert manifest_update['shards'] == {shard_id: 5, 'zzz': 4}
+        assert manifest_update['total_refugis'] == 4
+        change = _change_entry(transaction)
+        assert (change['version'], change['refuge_id'], change['action']) == (5, 'ref_1', 'create')
+        assert change['refuge']['surname'] == 'S1'
+        
+    def test_add_refuge_creates_manifest(self):
+        """Test add_refuge_to_coords_refugis sense catàleg: es crea el manifest"""
+        db, transaction, manifest_ref, shard_refs = _coords_db(None)
+        
+        add_refuge_to_coords_refugis(db, 'ref_1', {'name': 'Refugi 1', 'coord': {'lat': 41.0, 'long': 2.0}})
+        
+        transaction.update.assert_not_called()
+        manifest = _writes(transaction, manifest_ref)[0]
+        assert manifest['version'] == 1
+        assert manifest['total_refugis'] == 1
+        assert list(manifest['shards'].values()) == [1]
 
     def test_update_refuge_from_coords_refugis(self):
         """Test update_refuge_from_coords_refugis"""
-        db = MagicMock()
-        ref_id = "ref_1"
-        
         # No cal actualitzar
-        update_refuge_from_coords_refugis(db, ref_id, {'other': 'data'})
+        db = MagicMock()
+        update_refuge_from_coords_refugis(db, 'ref_1', {'other': 'data'})
         db.collection.assert_not_called()
         
-        # Document no existeix
-        mock_doc = db.collection.return_value.document.return_value.get.return_value
-        mock_doc.exists = False
-        update_refuge_from_coords_refugis(db, ref_id, {'name': 'New Name'})
-        db.collection.return_value.document.return_value.update.assert_not_called()
+        # El refugi no és al catàleg
+        db, transaction, _, _ = _coords_db({'version': 7, 'shards': {}})
+        update_refuge_from_coords_refugis(db, 'ref_1', {'name': 'New Name'})
+        transaction.set.assert_not_called()
+        transaction.update.assert_not_called()
         
-        # Document existeix i s'actualitza
-        mock_doc.exists = True
-        mock_doc.to_dict.return_value = {
-            'refugis_coordinates': [
-                {'id': 'ref_1', 'name': 'Old Name', 'coord': {'lat': 40, 'long': 1}, 'surname': 'Old'}
-            ]
-        }
-        update_refuge_from_coords_refugis(db, ref_id, {'name': 'New Name', 'coord': {'lat': 41, 'long': 2}, 'surname': None})
-        db.collection.return_value.document.return_value.update.assert_called_once()
+        # Canvi de nom: el refugi es manté a la mateixa posició del shard
+        entries = [
+            {'id': 'ref_1', 'name': 'Old Name', 'coord': {'lat': 40, 'long': 1}, 'surname': 'Old'},
+            {'id': 'ref_2', 'name': 'Other', 'coord': {'lat': 40, 'long': 1}},
+        ]
+        shard_id = coords_shard_id(entries[0])
+        db, transaction, _, shard_refs = _coords_db({'version': 7, 'total_refugis': 2, 'shards': {shard_id: 7}}, {shard_id: entries})
+        update_refuge_from_coords_refugis(db, 'ref_1', {'name': 'New Name', 'surname': None})
+        shard = _writes(transaction, shard_refs[shard_id])[0]
+        assert [entry['name'] for entry in shard['refugis_coordinates']] == ['New Name', 'Other']
+        assert transaction.update.call_args[0][1]['total_refugis'] == 2
+        change = _change_entry(transaction)
+        assert (change['version'], change['action']) == (8, 'update')
+        assert 'surname' not in change['refuge']
+
+    def test_update_refuge_moves_between_shards(self):
+        """Test update_refuge_from_coords_refugis: un refugi que es mou canvia de shard"""
+        entry = {'id': 'ref_1', 'name': 'Refugi', 'coord': {'lat': 40, 'long': 1}}
+        old_shard = coords_shard_id(entry)
+        new_shard = coords_shard_id({'coord': {'lat': 42.5, 'long': 1.5}})
+        assert old_shard != new_shard
+        db, transaction, _, shard_refs = _coords_db(
+            {'version': 3, 'total_refugis': 1, 'shards': {old_shard: 3}},
+            {old_shard: [entry]}
+        )
+        
+        update_refuge_from_coords_refugis(db, 'ref_1', {'coord': {'lat': 42.5, 'long': 1.5}})
+        
+        transaction.delete.assert_called_once_with(shard_refs[old_shard])
+        assert _writes(transaction, shard_refs[new_shard])[0]['ids'] == ['ref_1']
+        assert transaction.update.call_args[0][1]['shards'] == {new_shard: 4}
 
     def test_delete_refuge_from_coords_refugis(self):
         """Test delete_refuge_from_coords_refugis"""
-        db = MagicMock()
-        ref_id = "ref_1"
-        
-        # Document no existeix
-        mock_doc = db.collection.return_value.document.return_value.get.return_value
-        mock_doc.exists = False
-        delete_refuge_from_coords_refugis(db, ref_id)
-        db.collection.return_value.document.return_value.update.assert_not_called()
-        
-        # Document existeix i s'elimina
-        mock_doc.exists = True
-        mock_doc.to_dict.return_value = {
-            'refugis_coordinates': [{'id': 'ref_1'}, {'id': 'ref_2'}]
-        }
-        delete_refuge_from_coords_refugis(db, ref_id)
-        db.collection.return_value.document.return_value.update.assert_called_once()
+        # El refugi no és al catàleg
+        db, transaction, _, _ = _coords_db(None)
+        delete_refuge_from_coords_refugis(db, 'ref_1')
+        transaction.set.assert_not_called()
+        
+        # El refugi s'elimina del seu shard
+        entries = [{'id': 'ref_1', 'coord': {'lat': 41, 'long': 2}}, {'id': 'ref_2', 'coord': {'lat': 41, 'long': 2}}]
+        shard_id = coords_shard_id(entries[0])
+        db, transaction, _, shard_refs = _coords_db({'version': 2, 'total_refugis': 2, 'shards': {shard_id: 2}}, {shard_id: entries})
+        delete_refuge_from_coords_refugis(db, 'ref_1')
+        assert _writes(transaction, shard_refs[shard_id])[0]['ids'] == ['ref_2']
+        assert transaction.update.call_args[0][1]['total_refugis'] == 1
+        change = _change_entry(transaction)
+        assert (change['version'], change['refuge_id'], change['action'], change['refuge']) == (3, 'ref_1', 'delete', None)
+
+    def test_legacy_coords_document_is_migrated_to_shards(self):
+        """Test: el primer canvi sobre el format anterior (un sol array) el reparteix en shards"""
+        legacy = [
+            {'id': 'ref_1', 'coord': {'lat': 41, 'long': 2}},
+            {'id': 'ref_2', 'coord': {'lat': 42.5, 'long': 1.5}},
+        ]
+        db, transaction, _, shard_refs = _coords_db({'version': 5, 'refugis_coordinates': legacy})
+        
+        delete_refuge_from_coords_refugis(db, 'ref_1')
+        
+        remaining_shard = coords_shard_id(legacy[1])
+        assert _writes(transaction, shard_refs[remaining_shard])[0]['ids'] == ['ref_2']
+        manifest_update = transaction.update.call_args[0][1]
+        assert manifest_update['shards'] == {remaining_shard: 6}
+        assert manifest_update['total_refugis'] == 1
+        assert manifest_update['refugis_coordinates'] is firestore.DELETE_FIELD
+        # No hi ha cap query de shards: encara no n'hi havia
+        db.collection(COORDS_SHARDS_COLLECTION).where.assert_not_called()
 
     @patch('api.daos.refuge_proposal_dao.RefugiLliureMapper')
     @patch('api.daos.refuge_proposal_dao.add_refuge_to_coords_refugis')
@@ -223,7 +332,7 @@ class TestRefugeProposalDAOExtended:
         assert error is None
         db.collection.return_value.document.return_value.set.assert_called_once()
         mock_add_coords.assert_called_once()
-        mock_cache.delete_pattern.assert_called()
+        mock_cache.invalidate_tags.assert_called_with(['refugi_search', 'refugi_coords'])
 
     @patch('api.daos.refuge_proposal_dao.ConditionService')
     @patch('api.daos.refuge_proposal_dao.update_refuge_from_coords_refugis')
@@ -260,6 +369,8 @@ class TestRefugeProposalDAOExtended:
         success, error = strategy.execute(proposal, db)
         assert success is True
         db.collection.return_value.document.return_value.update.assert_called()
+        # El canvi de nom modifica els resultats de les cerques per nom
+        mock_cache.invalidate_tags.assert_called_with(['refugi_search', 'refugi_coords'])
 
     @patch('api.daos.refuge_proposal_dao.RefugeProposalDAO')
     @patch('api.controllers.doubt_controller.DoubtController')
@@ -362,9 +473,10 @@ class TestRefugeProposalDAOExtended:
         
         assert success is True
         mock_coll.where.assert_called_with('creator_uid', '==', 'user_1')
-        mock_doc.reference.update.assert_called_with({'creator_uid': 'unknown'})
-        # Should call cache.delete for detail cache
-        mock_cache.delete.assert_called()
+        mock_db.batch.return_value.update.assert_called_with(mock_doc.reference, {'creator_uid': 'unknown'})
+        mock_db.batch.return_value.commit.assert_called_once()
+        # Should invalidate the detail cache
+        mock_cache.delete_many.assert_called_once()
         
         # Cas d'error
         mock_coll.where.side_effect = Exception("DB Error")
@@ -15,7 +15,7 @@ class TestRefugeVisitController:
     def controller(self):
         with patch('api.controllers.refuge_visit_controller.RefugeVisitDAO'), \
              patch('api.controllers.refuge_visit_controller.RefugiLliureDAO'), \
-             patch('api.controllers.refuge_visit_controller.UserController'):
+             patch('api.controllers.refuge_visit_controller.UserDAO'):
             return RefugeVisitController()
 
     def test_get_refuge_visits_success(self, controller):
@@ -200,27 +200,33 @@ class TestRefugeVisitControllerExtended:
 
     @patch('api.controllers.refuge_visit_controller.RefugiLliureDAO')
     @patch('api.controllers.refuge_visit_controller.RefugeVisitDAO')
-    @patch('api.controllers.refuge_visit_controller.UserController')
+    @patch('api.controllers.refuge_visit_controller.UserDAO')
     @patch('api.controllers.refuge_visit_controller.get_madrid_today')
-    def test_process_yesterday_visits_scenarios(self, mock_today, mock_user_ctrl_class, 
+    def test_process_yesterday_visits_scenarios(self, mock_today, mock_user_dao_class, 
                                               mock_visit_dao_class, mock_refuge_dao_class):
         """Test process_yesterday_visits diferents escenaris"""
         ctrl = RefugeVisitController()
         mock_visit_dao = mock_visit_dao_class.return_value
         mock_refuge_dao = mock_refuge_dao_class.return_value
-        mock_user_ctrl = mock_user_ctrl_class.return_value
+        mock_user_dao = mock_user_dao_class.return_value
         mock_today.return_value = date(2024, 1, 2)
+        mock_refuge_dao.add_visitors_to_refugis.side_effect = lambda chunk: list(chunk)
+        mock_user_dao.add_refugis_to_visited.side_effect = lambda chunk: list(chunk)
+        mock_visit_dao.delete_visits.side_effect = lambda chunk: [visit_id for visit_id, _ in chunk]
         
         # Case 1: Empty visit (deleted)
         empty_visit = MagicMock(spec=RefugeVisit)
         empty_visit.total_visitors = 0
         empty_visit.visitors = []
+        empty_visit.refuge_id = "r0"
         mock_visit_dao.get_visits_by_date.return_value = [("v1", empty_visit)]
         
         success, stats, error = ctrl.process_yesterday_visits()
         assert success is True
         assert stats['deleted_visits'] == 1
-        mock_visit_dao.delete_visit.assert_called_with("v1")
+        mock_visit_dao.get_visits_by_date.assert_called_with("2024-01-01")
+        mock_visit_dao.delete_visits.assert_called_with([("v1", "r0")])
+        mock_refuge_dao.add_visitors_to_refugis.assert_not_called()
         
         # Case 2: Visit with visitors, refuge not found
         visit = MagicMock(spec=RefugeVisit)
@@ -228,34 +234,96 @@ class TestRefugeVisitControllerExtended:
         visit.visitors = [UserVisit(uid="u1", num_visitors=2)]
         visit.refuge_id = "r1"
         mock_visit_dao.get_visits_by_date.return_value = [("v2", visit)]
-        mock_refuge_dao.get_by_id.return_value = None
+        mock_refuge_dao.add_visitors_to_refugis.side_effect = lambda chunk: []
         
         success, stats, error = ctrl.process_yesterday_visits()
         assert success is True
         assert stats['updated_refuges'] == 0
+        assert stats['updated_users'] == 0
+        assert stats['total_visitors_added'] == 0
+        mock_user_dao.add_refugis_to_visited.assert_not_called()
         
         # Case 3: Success update
-        mock_refuge = MagicMock()
-        mock_refuge.visitors = ["u2"]
-        mock_refuge_dao.get_by_id.return_value = mock_refuge
-        mock_refuge_dao.update_refugi_visitors.return_value = True
+        mock_refuge_dao.add_visitors_to_refugis.side_effect = lambda chunk: list(chunk)
         
         success, stats, error = ctrl.process_yesterday_visits()
         assert success is True
         assert stats['updated_refuges'] == 1
-        mock_user_ctrl.add_refugi_visitat.assert_called()
-        
-        # Case 4: update_refugi_visitors failure
-        mock_refuge_dao.update_refugi_visitors.return_value = False
-        success, stats, error = ctrl.process_yesterday_visits()
-        assert success is True # Still returns True but logs warning
+        assert stats['updated_users'] == 1
+        assert stats['total_visitors_added'] == 1
+        mock_refuge_dao.add_visitors_to_refugis.assert_called_with({"r1": ["u1"]})
+        mock_user_dao.add_refugis_to_visited.assert_called_with({"u1": ["r1"]})
+        assert set(stats['timings']) == {'load', 'merge', 'apply', 'total'}
         
-        # Case 5: Exception
+        # Case 4: Exception
         mock_visit_dao.get_visits_by_date.side_effect = Exception("Process Error")
         success, stats, error = ctrl.process_yesterday_visits()
         assert success is False
         assert "Process Error" in error
 
+    @patch('api.controllers.refuge_visit_controller.RefugiLliureDAO')
+    @patch('api.controllers.refuge_visit_controller.RefugeVisitDAO')
+    @patch('api.controllers.refuge_visit_controller.UserDAO')
+    def test_process_yesterday_visits_merges_and_batches(self, mock_user_dao_class,
+                                                        mock_visit_dao_class, mock_refuge_dao_class):
+        """Test process_yesterday_visits fusiona visitants per refugi i divideix en batches"""
+        ctrl = RefugeVisitController()
+        mock_visit_dao = mock_visit_dao_class.return_value
+        mock_refuge_dao = mock_refuge_dao_class.return_value
+        mock_user_dao = mock_user_dao_class.return_value
+        mock_refuge_dao.add_visitors_to_refugis.side_effect = lambda chunk: list(chunk)
+        mock_user_dao.add_refugis_to_visited.side_effect = lambda chunk: list(chunk)
+        mock_visit_dao.delete_visits.side_effect = lambda chunk: [visit_id for visit_id, _ in chunk]
+        
+        mock_visit_dao.get_visits_by_date.return_value = [
+            ("v1", RefugeVisit(date="2024-03-01", refuge_id="r1", visitors=[UserVisit(uid="u1", num_visitors=1)], total_visitors=1)),
+            ("v2", RefugeVisit(date="2024-03-01", refuge_id="r1", visitors=[UserVisit(uid="u1", num_visitors=1), UserVisit(uid="u2", num_visitors=2)], total_visitors=3)),
+            ("v3", RefugeVisit(date="2024-03-01", refuge_id="r2", visitors=[UserVisit(uid="u2", num_visitors=1)], total_visitors=1)),
+            ("v4", RefugeVisit(date="2024-03-01", refuge_id="r3", visitors=[], total_visitors=0)),
+        ]
+        
+        success, stats, error = ctrl.process_yesterday_visits(target_date="2024-03-01", batch_size=1, workers=2)
+        
+        assert success is True
+        mock_visit_dao.get_visits_by_date.assert_called_once_with("2024-03-01")
+        # Un batch per refugi i per usuari amb batch_size=1
+        refuge_chunks = [c[0][0] for c in mock_refuge_dao.add_visitors_to_refugis.call_args_list]
+        assert sorted(refuge_chunks, key=lambda c: list(c)) == [{"r1": ["u1", "u2"]}, {"r2": ["u2"]}]
+        user_chunks = [c[0][0] for c in mock_user_dao.add_refugis_to_visited.call_args_list]
+        assert sorted(user_chunks, key=lambda c: list(c)) == [{"u1": ["r1"]}, {"u2": ["r1", "r2"]}]
+        assert stats['processed_visits'] == 4
+        assert stats['deleted_visits'] == 1
+        assert stats['updated_refuges'] == 2
+        assert stats['updated_users'] == 2
+        assert stats['total_visitors_added'] == 3
+
+    @patch('api.controllers.refuge_visit_controller.RefugiLliureDAO')
+    @patch('api.controllers.refuge_visit_controller.RefugeVisitDAO')
+    @patch('api.controllers.refuge_visit_controller.UserDAO')
+    def test_process_yesterday_visits_skips_missing_refuges_for_users(self, mock_user_dao_class,
+                                                                     mock_visit_dao_class, mock_refuge_dao_class):
+        """Test process_yesterday_visits no afegeix als usuaris els refugis que no existeixen"""
+        ctrl = RefugeVisitController()
+        mock_visit_dao = mock_visit_dao_class.return_value
+        mock_refuge_dao = mock_refuge_dao_class.return_value
+        mock_user_dao = mock_user_dao_class.return_value
+        # r_missing no existeix: add_visitors_to_refugis l'omet
+        mock_refuge_dao.add_visitors_to_refugis.side_effect = lambda chunk: [refuge_id for refuge_id in chunk if refuge_id != "r_missing"]
+        mock_user_dao.add_refugis_to_visited.side_effect = lambda chunk: list(chunk)
+        
+        mock_visit_dao.get_visits_by_date.return_value = [
+            ("v1", RefugeVisit(date="2024-03-01", refuge_id="r1", visitors=[UserVisit(uid="u1", num_visitors=1)], total_visitors=1)),
+            ("v2", RefugeVisit(date="2024-03-01", refuge_id="r_missing", visitors=[UserVisit(uid="u1", num_visitors=1), UserVisit(uid="u2", num_visitors=1)], total_visitors=2)),
+        ]
+        
+        success, stats, error = ctrl.process_yesterday_visits(target_date="2024-03-01")
+        
+        assert success is True
+        mock_user_dao.add_refugis_to_visited.assert_called_once_with({"u1": ["r1"]})
+        assert stats['updated_refuges'] == 1
+        assert stats['updated_users'] == 1
+        assert stats['total_visitors_added'] == 1
+
     @patch('api.controllers.refuge_visit_controller.RefugeVisitDAO')
     @patch('api.controllers.refuge_visit_controller.RefugiLliureDAO')
     @patch('api.controllers.refuge_visit_controller.get_madrid_today')
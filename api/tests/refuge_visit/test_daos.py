@@ -44,7 +44,8 @@ class TestRefugeVisitDAO:
         assert success is True
         assert visit_id == "visit_123"
         mock_doc_ref.set.assert_called_with(data)
-        mock_cache.delete_pattern.assert_called()
+        assert data['visitor_uids'] == []
+        mock_cache.invalidate_tags.assert_called_once()
 
     def test_get_visit_by_id_found(self, dao, mock_db, mock_cache):
         """Test obtenció de visita per ID existent"""
@@ -88,7 +89,27 @@ class TestRefugeVisitDAO:
         assert success is True
         mock_doc_ref.delete.assert_called()
         mock_cache.delete.assert_called()
-        mock_cache.delete_pattern.assert_called()
+        mock_cache.invalidate_tags.assert_called_once()
+
+    def test_delete_visits_batch(self, dao, mock_db, mock_cache):
+        """Test eliminació de diverses visites amb un sol WriteBatch"""
+        mock_batch = mock_db.batch.return_value
+        
+        deleted = dao.delete_visits([("v1", "ref_1"), ("v2", "ref_1"), ("v3", "ref_2")])
+        
+        assert deleted == ["v1", "v2", "v3"]
+        assert mock_batch.delete.call_count == 3
+        mock_batch.commit.assert_called_once()
+        assert mock_cache.delete.call_count == 3
+        # La llista de cada refugi s'invalida una sola vegada
+        assert mock_cache.invalidate_tags.call_count == 2
+
+    def test_delete_visits_error(self, dao, mock_db, mock_cache):
+        """Test error al commit del WriteBatch d'eliminació"""
+        assert dao.delete_visits([]) == []
+        mock_db.batch.return_value.commit.side_effect = Exception("Commit Error")
+        assert dao.delete_visits([("v1", "ref_1")]) == []
+        mock_cache.delete.assert_not_called()
 
 class TestRefugeVisitDAOExtended:
     """Tests per a RefugeVisitDAO cobrint casos d'error i excepcions"""
@@ -249,11 +270,16 @@ class TestRefugeVisitDAOExtended:
             'date': '2024-01-01',
             'visitors': [{'uid': 'u1', 'num_visitors': 2}]
         }
-        mock_db.collection.return_value.order_by.return_value.get.return_value = [mock_doc]
+        mock_query = mock_db.collection.return_value.where.return_value
+        mock_query.order_by.return_value.get.return_value = [mock_doc]
         
         results = dao.get_visits_by_user("u1")
         assert len(results) == 1
         assert results[0][0] == "v1"
+        # Només es consulten les visites de l'usuari (array_contains sobre visitor_uids)
+        field_filter = mock_db.collection.return_value.where.call_args.kwargs['filter']
+        assert (field_filter.field_path, field_filter.op_string, field_filter.value) == ('visitor_uids', 'array_contains', 'u1')
+        mock_db.collection.return_value.order_by.assert_not_called()
 
     @patch('api.daos.refuge_visit_dao.FirestoreService')
     @patch('api.daos.refuge_visit_dao.cache_service')
@@ -268,6 +294,7 @@ class TestRefugeVisitDAOExtended:
         
         assert dao.add_visitor_to_visit("v1", data) is True
         assert dao.update_visitor_in_visit("v1", data) is True
+        assert mock_doc_ref.update.call_args[0][0]['visitor_uids'] == ['u1']
         assert mock_doc_ref.update.call_count == 2
 
     @patch('api.daos.refuge_visit_dao.FirestoreService')
@@ -290,6 +317,7 @@ class TestRefugeVisitDAOExtended:
         # total_visitors should be 5 - 2 = 3
         args, kwargs = mock_doc_ref.update.call_args
         assert args[0]['total_visitors'] == 3
+        assert args[0]['visitor_uids'] == ['u2']
 
     @patch('api.daos.refuge_visit_dao.FirestoreService')
     def test_get_visits_by_date_success(self, mock_firestore_service):
@@ -312,23 +340,26 @@ class TestRefugeVisitDAOExtended:
         """Test remove_user_from_all_visits èxit"""
         dao = RefugeVisitDAO()
         mock_db = mock_firestore_service.return_value.get_db.return_value
-        mock_doc_ref = mock_db.collection.return_value.document.return_value
-        mock_doc = mock_doc_ref.get.return_value
-        mock_doc.exists = True
-        mock_doc.to_dict.return_value = {
-            'refuge_id': 'r1',
-            'total_visitors': 2,
-            'visitors': [{'uid': 'u1', 'num_visitors': 1}, {'uid': 'u2', 'num_visitors': 1}]
+        mock_firestore_service.return_value.get_documents.return_value = {
+            'v1': {
+                'refuge_id': 'r1',
+                'total_visitors': 2,
+                'visitors': [{'uid': 'u1', 'num_visitors': 1}, {'uid': 'u2', 'num_visitors': 1}]
+            },
+            'v2': {'refuge_id': 'r2', 'total_visitors': 1, 'visitors': [{'uid': 'u3', 'num_visitors': 1}]}
         }
         
         visit = MagicMock(spec=RefugeVisit)
-        success, error = dao.remove_user_from_all_visits("u1", [("v1", visit)])
+        success, error = dao.remove_user_from_all_visits("u1", [("v1", visit), ("v2", visit)])
         
         assert success is True
-        mock_doc_ref.update.assert_called_once()
-        args, kwargs = mock_doc_ref.update.call_args
-        assert len(args[0]['visitors']) == 1
-        assert args[0]['total_visitors'] == 1
+        batch = mock_db.batch.return_value
+        batch.update.assert_called_once()
+        args, kwargs = batch.update.call_args
+        assert len(args[1]['visitors']) == 1
+        assert args[1]['visitor_uids'] == ['u2']
+        assert args[1]['total_visitors'] == 1
+        batch.commit.assert_called_once()
 
     @patch('api.daos.refuge_visit_dao.FirestoreService')
     def test_remove_user_from_all_visits_errors(self, mock_firestore_service):
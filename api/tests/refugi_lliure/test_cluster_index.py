@@ -0,0 +1,169 @@
+"""
+Tests per a l'agrupació dels refugis del mapa
+"""
+
+import pytest
+from unittest.mock import MagicMock, patch
+from api.services.refugi_cluster_service import (
+    RefugiClusterIndex,
+    MAX_ZOOM,
+    refugi_cluster_service
+)
+from api.daos.refugi_lliure_dao import RefugiLliureDAO
+
+
+PYRENEES_BBOX = [-2.0, 42.0, 3.5, 43.5]
+
+
+@pytest.fixture
+def catalogue():
+    """Dos refugis molt propers, un de més lluny i un sense coordenades"""
+    return [
+        {'id': 'r1', 'name': 'Refugi 1', 'coord': {'lat': 42.5000, 'long': 1.5000}},
+        {'id': 'r2', 'name': 'Refugi 2', 'coord': {'lat': 42.5010, 'long': 1.5010}},
+        {'id': 'r3', 'name': 'Refugi 3', 'coord': {'lat': 42.9000, 'long': 0.5000}},
+        {'id': 'r4', 'name': 'Refugi 4', 'coord': {}},
+    ]
+
+
+def _snapshot(refugis, version, etag=None):
+    return {'version': version, 'changes_floor': 0, 'etag': etag or f'"v{version}"', 'refugis': refugis}
+
+
+@pytest.fixture(autouse=True)
+def reset_cluster_service():
+    """Assegura que cada test comença sense índex construït"""
+    refugi_cluster_service.invalidate()
+    yield
+    refugi_cluster_service.invalidate()
+
+
+# ==================== TESTS DE L'ÍNDEX ====================
+
+class TestRefugiClusterIndex:
+    """Tests per a les graelles d'agrupació"""
+
+    def test_low_zoom_groups_nearby_refuges(self, catalogue):
+        index = RefugiClusterIndex(catalogue)
+        result = index.clusters(5, PYRENEES_BBOX)
+
+        assert len(index) == 3
+        assert result['zoom'] == 5
+        assert sum(cluster['count'] for cluster in result['clusters']) == 3
+        grouped = next(cluster for cluster in result['clusters'] if cluster['count'] > 1)
+        assert 'id' not in grouped
+
+    def test_max_zoom_returns_single_refuges(self, catalogue):
+        index = RefugiClusterIndex(catalogue)
+        result = index.clusters(MAX_ZOOM, [1.49, 42.49, 1.51, 42.51])
+
+        assert sorted(cluster['id'] for cluster in result['clusters']) == ['r1', 'r2']
+        assert all(cluster['count'] == 1 for cluster in result['clusters'])
+
+    def test_bbox_excludes_outside_refuges(self, catalogue):
+        index = RefugiClusterIndex(catalogue)
+        result = index.clusters(10, [0.4, 42.8, 0.6, 43.0])
+
+        assert result['clusters'] == [
+            {'id': 'r3', 'name': 'Refugi 3', 'count': 1, 'coord': {'lat': 42.9, 'long': 0.5}}
+        ]
+
+    def test_large_bbox_lowers_zoom(self, catalogue):
+        index = RefugiClusterIndex(catalogue)
+        result = index.clusters(MAX_ZOOM, [-180, -85, 180, 85])
+
+        assert result['zoom'] < MAX_ZOOM
+        assert sum(cluster['count'] for cluster in result['clusters']) == 3
+
+    def test_apply_changes(self, catalogue):
+        index = RefugiClusterIndex(catalogue, version=3)
+        index.apply_changes({
+            'version': 5,
+            'added': [{'id': 'r5', 'name': 'Refugi 5', 'coord': {'lat': 42.7, 'long': 1.0}}],
+            'updated': [{'id': 'r1', 'name': 'Refugi 1', 'coord': {'lat': 42.9001, 'long': 0.5001}}],
+            'deleted': ['r2'],
+        })
+
+        assert index.version == 5
+        assert sorted(index.points) == ['r1', 'r3', 'r5']
+        # r1 s'ha mogut al costat de r3
+        result = index.clusters(10, [0.4, 42.8, 0.6, 43.0])
+        assert result['clusters'][0]['count'] == 2
+        assert index.clusters(MAX_ZOOM, [1.49, 42.49, 1.51, 42.51])['clusters'] == []
+
+    def test_centroid_after_removal(self, catalogue):
+        index = RefugiClusterIndex(catalogue)
+        index.remove('r2')
+        index.add({'id': 'r2', 'name': 'Refugi 2', 'coord': {'lat': 42.502, 'long': 1.502}})
+
+        result = index.clusters(10, [1.4, 42.4, 1.6, 42.6])
+        assert result['clusters'] == [{'count': 2, 'coord': {'lat': 42.501, 'long': 1.501}}]
+
+
+# ==================== TESTS DEL SERVEI ====================
+
+class TestRefugiClusterService:
+    """Tests per a la construcció i actualització de l'índex"""
+
+    def test_builds_once_and_reuses(self, catalogue):
+        snapshot_loader = MagicMock(return_value=_snapshot(catalogue, 3))
+        changes_loader = MagicMock()
+
+        first = refugi_cluster_service.get_index(snapshot_loader, changes_loader)
+        second = refugi_cluster_service.get_index(snapshot_loader, changes_loader)
+
+        assert first is second
+        changes_loader.assert_not_called()
+
+    def test_applies_changes_when_version_advances(self, catalogue):
+        first = refugi_cluster_service.get_index(lambda: _snapshot(catalogue, 3), MagicMock())
+        changes_loader = MagicMock(return_value={
+            'version': 4, 'full': False, 'added': [], 'updated': [], 'deleted': ['r3']
+        })
+
+        second = refugi_cluster_service.get_index(lambda: _snapshot(catalogue[:2], 4), changes_loader)
+
+        assert second is first
+        changes_loader.assert_called_once_with(3)
+        assert sorted(second.points) == ['r1', 'r2']
+        assert second.etag == '"v4"'
+
+    def test_rebuilds_when_changes_not_available(self, catalogue):
+        first = refugi_cluster_service.get_index(lambda: _snapshot(catalogue, 3), MagicMock())
+        changes_loader = MagicMock(return_value={'version': 9, 'full': True, 'refugis': catalogue[:1]})
+
+        second = refugi_cluster_service.get_index(lambda: _snapshot(catalogue[:1], 9), changes_loader)
+
+        assert second is not first
+        assert sorted(second.points) == ['r1']
+
+    def test_rebuilds_when_catalogue_rewritten(self, catalogue):
+        first = refugi_cluster_service.get_index(lambda: _snapshot(catalogue, 3), MagicMock())
+        changes_loader = MagicMock()
+
+        second = refugi_cluster_service.get_index(lambda: _snapshot(catalogue[:1], 3, '"other"'), changes_loader)
+
+        assert second is not first
+        changes_loader.assert_not_called()
+
+    def test_catalogue_not_available(self):
+        assert refugi_cluster_service.get_index(lambda: None, MagicMock()) is None
+
+
+# ==================== TESTS DEL DAO ====================
+
+class TestRefugiLliureDAOClusters:
+    """Tests per a l'agrupació des del DAO"""
+
+    def test_get_clusters(self, catalogue):
+        dao = RefugiLliureDAO()
+        with patch.object(dao, '_get_coordinates_snapshot', return_value=_snapshot(catalogue, 7)):
+            result = dao.get_clusters(MAX_ZOOM, [0.4, 42.8, 0.6, 43.0])
+
+        assert result['version'] == 7
+        assert [cluster['id'] for cluster in result['clusters']] == ['r3']
+
+    def test_get_clusters_without_catalogue(self):
+        dao = RefugiLliureDAO()
+        with patch.object(dao, '_get_coordinates_snapshot', return_value=None):
+            assert dao.get_clusters(5, PYRENEES_BBOX) is None
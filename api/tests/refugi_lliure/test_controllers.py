@@ -363,6 +363,30 @@ class TestRefugiController:
 class TestRefugiLliureControllerExtended:
     """Tests per a RefugiLliureController cobrint casos d'error i lògica d'autenticació"""
 
+    @patch('api.controllers.refugi_lliure_controller.RefugiLliureDAO')
+    @patch('api.controllers.refugi_lliure_controller.UserDAO')
+    def test_get_refugi_etag_changes_with_presigned_url_window(self, mock_user_dao_class, mock_ref_dao_class):
+        """Test l'ETag autenticada canvia quan es tornen a signar les URLs i és feble"""
+        ctrl = RefugiLliureController()
+        mock_ref_dao = mock_ref_dao_class.return_value
+        mock_ref_dao.get_etag.side_effect = lambda refuge_id, variant: f'"{variant}-abc"'
+        
+        with patch('api.services.r2_media_service.time.time', return_value=1000.0):
+            first = ctrl.get_refugi_etag("r1", True)
+            assert ctrl.get_refugi_etag("r1", True) == first
+            public = ctrl.get_refugi_etag("r1", False)
+        with patch('api.services.r2_media_service.time.time', return_value=1000.0 + 1800):
+            second = ctrl.get_refugi_etag("r1", True)
+            assert ctrl.get_refugi_etag("r1", False) == public
+        
+        assert first.startswith('W/"auth-')
+        assert second != first
+        assert public == '"public-abc"'
+        
+        mock_ref_dao.get_etag.side_effect = None
+        mock_ref_dao.get_etag.return_value = None
+        assert ctrl.get_refugi_etag("r1", True) is None
+
     @patch('api.controllers.refugi_lliure_controller.r2_media_service')
     @patch('api.controllers.refugi_lliure_controller.RefugiLliureDAO')
     @patch('api.controllers.refugi_lliure_controller.UserDAO')
@@ -509,6 +533,77 @@ class TestRefugiLliureControllerExtended:
         assert res is None
         assert "Fatal Error" in error
 
+    @patch('api.controllers.refugi_lliure_controller.r2_media_service')
+    @patch('api.controllers.refugi_lliure_controller.RefugiLliureDAO')
+    @patch('api.controllers.refugi_lliure_controller.UserDAO')
+    def test_upload_refugi_media_concurrent_keeps_order(self, mock_user_dao_class, mock_ref_dao_class, mock_r2):
+        """Test pujada concurrent: resultats en ordre d'entrada i fallades parcials"""
+        import threading
+        ctrl = RefugiLliureController()
+        mock_ref_dao = mock_ref_dao_class.return_value
+        mock_ref_dao.refugi_exists.return_value = True
+        mock_ref_dao.add_media_metadata.return_value = True
+        mock_media_service = mock_r2.get_refugi_media_service.return_value
+        mock_media_service.generate_media_metadata_from_dict.side_effect = (
+            lambda entry: MagicMock(to_dict=MagicMock(return_value={'key': next(iter(entry))}))
+        )
+        
+        threads = set()
+        def upload(file_content, entity_id, content_type, filename):
+            threads.add(threading.get_ident())
+            if filename == 'bad.jpg':
+                raise ValueError("Invalid file")
+            return {'key': f"refugis-lliures/{entity_id}/{filename}"}
+        mock_media_service.upload_file.side_effect = upload
+        
+        files = []
+        for name in ['a.jpg', 'bad.jpg', 'b.jpg', 'c.jpg']:
+            file = MagicMock(content_type='image/jpeg')
+            file.name = name
+            files.append(file)
+        
+        res, error = ctrl.upload_refugi_media("r1", files, "u1")
+        
+        assert error is None
+        assert [item['key'] for item in res['uploaded']] == [
+            'refugis-lliures/r1/a.jpg', 'refugis-lliures/r1/b.jpg', 'refugis-lliures/r1/c.jpg'
+        ]
+        assert res['failed'] == [{'filename': 'bad.jpg', 'error': 'Invalid file'}]
+        assert mock_media_service.upload_file.call_count == 4
+        assert threading.get_ident() not in threads
+        saved = mock_ref_dao.add_media_metadata.call_args[0][1]
+        assert list(saved) == [item['key'] for item in res['uploaded']]
+        assert len({metadata['uploaded_at'] for metadata in saved.values()}) == 1
+    
+    @patch('api.controllers.refugi_lliure_controller.r2_media_service')
+    @patch('api.controllers.refugi_lliure_controller.RefugiLliureDAO')
+    @patch('api.controllers.refugi_lliure_controller.UserDAO')
+    def test_upload_refugi_media_concurrent_rollback(self, mock_user_dao_class, mock_ref_dao_class, mock_r2):
+        """Test pujada concurrent: si Firestore falla s'eliminen tots els fitxers pujats"""
+        ctrl = RefugiLliureController()
+        mock_ref_dao = mock_ref_dao_class.return_value
+        mock_ref_dao.refugi_exists.return_value = True
+        mock_ref_dao.add_media_metadata.return_value = False
+        mock_media_service = mock_r2.get_refugi_media_service.return_value
+        mock_media_service.upload_file.side_effect = (
+            lambda file_content, entity_id, content_type, filename: {'key': filename}
+        )
+        mock_media_service.generate_media_metadata_from_dict.side_effect = (
+            lambda entry: MagicMock(to_dict=MagicMock(return_value={'key': next(iter(entry))}))
+        )
+        files = []
+        for name in ['a.jpg', 'b.jpg', 'c.jpg']:
+            file = MagicMock(content_type='image/jpeg')
+            file.name = name
+            files.append(file)
+        
+        res, error = ctrl.upload_refugi_media("r1", files, "u1")
+        
+        assert res is None
+        assert "Error intern guardant les metadades" in error
+        mock_media_service.delete_files.assert_called_once_with(['a.jpg', 'b.jpg', 'c.jpg'])
+        mock_user_dao_class.return_value.add_uploaded_photos_keys.assert_not_called()
+
     @patch('api.controllers.refugi_lliure_controller.r2_media_service')
     @patch('api.controllers.refugi_lliure_controller.RefugiLliureDAO')
     @patch('api.controllers.refugi_lliure_controller.UserDAO')
@@ -116,6 +116,7 @@ class TestRefugiDAO:
     def test_search_refugis_no_filters(self, mock_cache, mock_firestore):
         """Test cerca de refugis sense filtres (retorna coordenades)"""
         mock_cache.get.return_value = None
+        mock_cache.get_or_compute.side_effect = lambda key, compute_fn, timeout=None, tags=None: compute_fn()
         
         mock_db = MagicMock()
         mock_firestore.get_db.return_value = mock_db
@@ -463,6 +464,30 @@ class TestRefugiLliureDAOExtended:
         with pytest.raises(Exception, match="DB Error"):
             dao.get_by_id("r1")
 
+    @pytest.mark.parametrize('method, uid, visitors, operation', [
+        ('add_visitor_to_refugi', 'u2', ['u1'], 'ArrayUnion'),
+        ('remove_visitor_from_refugi', 'u1', ['u1', 'u2'], 'ArrayRemove'),
+    ])
+    @patch('api.daos.refugi_lliure_dao.firestore')
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    @patch('api.daos.refugi_lliure_dao.cache_service')
+    def test_visitor_update_does_not_mutate_cached_refugi(self, mock_cache, mock_firestore, mock_fs,
+                                                          method, uid, visitors, operation):
+        """Test afegir o eliminar un visitant no modifica el refugi en cache i falla sense deixar-lo alterat"""
+        cached = {'id': 'r1', 'name': 'Refugi 1', 'coord': {'lat': 42.0, 'long': 1.0}, 'visitors': list(visitors)}
+        mock_cache.get.return_value = cached
+        doc_ref = mock_firestore.get_db.return_value.collection.return_value.document.return_value
+        dao = RefugiLliureDAO()
+        
+        assert getattr(dao, method)('r1', uid) is True
+        doc_ref.update.assert_called_once_with({'visitors': getattr(mock_fs, operation).return_value})
+        getattr(mock_fs, operation).assert_called_once_with([uid])
+        assert cached['visitors'] == visitors
+        
+        doc_ref.update.side_effect = Exception("Firestore Error")
+        assert getattr(dao, method)('r1', uid) is False
+        assert cached['visitors'] == visitors
+
     @patch('api.daos.refugi_lliure_dao.firestore_service')
     @patch('api.daos.refugi_lliure_dao.cache_service')
     def test_search_refugis_exception(self, mock_cache, mock_firestore):
@@ -481,6 +506,7 @@ class TestRefugiLliureDAOExtended:
     def test_get_coordinates_errors(self, mock_cache, mock_firestore):
         """Test errors a _get_coordinates_as_refugi_list"""
         mock_cache.get.return_value = None
+        mock_cache.get_or_compute.side_effect = lambda key, compute_fn, timeout=None, tags=None: compute_fn()
         mock_db = MagicMock()
         mock_firestore.get_db.return_value = mock_db
         
@@ -653,10 +679,18 @@ class TestRefugiLliureDAOExtended:
         success, error = dao.remove_visitor_from_all_refuges("u1", [])
         assert success is True
         
-        # Inner exception
-        mock_db.collection.side_effect = Exception("Inner Error")
+        # Refugi no trobat: s'omet sense escriure
+        mock_firestore.get_documents.return_value = {}
         success, error = dao.remove_visitor_from_all_refuges("u1", ["r1"])
-        assert success is True # Returns True but logs error
+        assert success is True
+        mock_db.batch.return_value.update.assert_not_called()
+        
+        # Error al commit del batch
+        mock_firestore.get_documents.return_value = {'r1': {'id': 'r1'}}
+        mock_db.batch.return_value.commit.side_effect = Exception("Commit Error")
+        success, error = dao.remove_visitor_from_all_refuges("u1", ["r1"])
+        assert success is False
+        assert "Commit Error" in error
         
         # Outer exception
         with patch('api.daos.refugi_lliure_dao.firestore_service.get_db', side_effect=Exception("Outer Error")):
@@ -744,18 +778,309 @@ class TestRefugiLliureDAOExtended:
         dao = RefugiLliureDAO()
         assert dao.update_refugi_visitors("r1", ["u1"]) is True
 
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    @patch('api.daos.refugi_lliure_dao.cache_service')
+    def test_add_visitors_to_refugis_batch(self, mock_cache, mock_firestore):
+        """Test add_visitors_to_refugis: un sol WriteBatch amb ArrayUnion i refugis inexistents omesos"""
+        mock_db = MagicMock()
+        mock_firestore.get_db.return_value = mock_db
+        mock_firestore.get_documents.return_value = {'r1': {'id': 'r1', 'visitors': []}}
+        mock_batch = mock_db.batch.return_value
+        
+        dao = RefugiLliureDAO()
+        updated = dao.add_visitors_to_refugis({'r1': ['u1', 'u2'], 'missing': ['u3']})
+        
+        assert updated == ['r1']
+        mock_firestore.get_documents.assert_called_once_with('data_refugis_lliures', ['r1', 'missing'], field_paths=['visitors'])
+        mock_batch.update.assert_called_once()
+        assert mock_batch.update.call_args[0][1]['visitors'].values == ['u1', 'u2']
+        mock_batch.commit.assert_called_once()
+        mock_cache.delete_many.assert_called_once()
+
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    @patch('api.daos.refugi_lliure_dao.cache_service')
+    def test_add_visitors_to_refugis_errors(self, mock_cache, mock_firestore):
+        """Test add_visitors_to_refugis sense refugis existents o amb error al commit"""
+        mock_db = MagicMock()
+        mock_firestore.get_db.return_value = mock_db
+        dao = RefugiLliureDAO()
+        
+        assert dao.add_visitors_to_refugis({}) == []
+        
+        mock_firestore.get_documents.return_value = {}
+        assert dao.add_visitors_to_refugis({'r1': ['u1']}) == []
+        mock_db.batch.return_value.commit.assert_not_called()
+        
+        mock_firestore.get_documents.return_value = {'r1': {'id': 'r1'}}
+        mock_db.batch.return_value.commit.side_effect = Exception("Commit Error")
+        assert dao.add_visitors_to_refugis({'r1': ['u1']}) == []
+        mock_cache.delete_many.assert_not_called()
+
     @patch('api.daos.refugi_lliure_dao.firestore_service')
     @patch('api.daos.refugi_lliure_dao.cache_service')
     def test_remove_visitor_from_all_refuges_success(self, mock_cache, mock_firestore):
         """Test remove_visitor_from_all_refuges èxit"""
+        mock_db = MagicMock()
+        mock_firestore.get_db.return_value = mock_db
+        mock_firestore.get_documents.return_value = {'r1': {'id': 'r1'}, 'r2': {'id': 'r2'}}
+        
+        dao = RefugiLliureDAO()
+        success, error = dao.remove_visitor_from_all_refuges("u1", ["r1", "r2"])
+        assert success is True
+        assert mock_db.batch.return_value.update.call_count == 2
+        mock_db.batch.return_value.commit.assert_called_once()
+        assert len(mock_cache.delete_many.call_args[0][0]) == 2
+
+
+class TestRefugiLliureDAOEtags:
+    """Tests de les ETags del catàleg i del detall"""
+
+    @staticmethod
+    def _coords_db(mock_firestore, coords_data):
         mock_db = MagicMock()
         mock_firestore.get_db.return_value = mock_db
         mock_doc = MagicMock()
         mock_doc.exists = True
+        mock_doc.to_dict.return_value = coords_data
         mock_db.collection.return_value.document.return_value.get.return_value = mock_doc
-        
+
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    @patch('api.daos.refugi_lliure_dao.cache_service')
+    def test_coordinates_etag_follows_version_and_content(self, mock_cache, mock_firestore):
+        """L'ETag del catàleg canvia amb la versió del document i amb el contingut"""
+        mock_cache.get_or_compute.side_effect = lambda key, compute_fn, timeout=None, tags=None: compute_fn()
+        coords = [{'id': 'ref_001', 'name': 'Refugi A', 'coord': {'lat': 42.5, 'long': 1.5}, 'geohash': 'sp9'}]
         dao = RefugiLliureDAO()
-        success, error = dao.remove_visitor_from_all_refuges("u1", ["r1"])
-        assert success is True
-        mock_db.collection.return_value.document.return_value.update.assert_called()
 
+        self._coords_db(mock_firestore, {'refugis_coordinates': coords, 'version': 3})
+        etag = dao.get_coordinates_etag()
+        assert etag.startswith('"coords-v3-')
+        assert dao.get_coordinates_etag() == etag
+
+        self._coords_db(mock_firestore, {'refugis_coordinates': coords, 'version': 4})
+        assert dao.get_coordinates_etag().startswith('"coords-v4-')
+
+        renamed = [{**coords[0], 'name': 'Refugi B'}]
+        self._coords_db(mock_firestore, {'refugis_coordinates': renamed, 'version': 3})
+        assert dao.get_coordinates_etag() != etag
+
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    @patch('api.daos.refugi_lliure_dao.cache_service')
+    def test_coordinates_etag_unavailable(self, mock_cache, mock_firestore):
+        """Sense document de coordenades no hi ha ETag"""
+        mock_cache.get_or_compute.side_effect = lambda key, compute_fn, timeout=None, tags=None: compute_fn()
+        mock_firestore.get_db.return_value.collection.return_value.document.return_value.get.return_value.exists = False
+
+        assert RefugiLliureDAO().get_coordinates_etag() is None
+
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    @patch('api.daos.refugi_lliure_dao.cache_service')
+    def test_refugi_etag_from_cached_document(self, mock_cache, mock_firestore, sample_refugi_data):
+        """L'ETag del detall es deriva del document en cache (sense llegir Firestore) i de la variant"""
+        mock_cache.get.return_value = sample_refugi_data
+        dao = RefugiLliureDAO()
+
+        public = dao.get_etag('refugi_001', 'public')
+        assert public.startswith('"public-')
+        assert dao.get_etag('refugi_001', 'auth') != public
+        mock_firestore.get_db.assert_not_called()
+
+        mock_cache.get.return_value = {**sample_refugi_data, 'visitors': ['uid_1']}
+        assert dao.get_etag('refugi_001', 'public') != public
+
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    @patch('api.daos.refugi_lliure_dao.cache_service')
+    def test_refugi_etag_not_found(self, mock_cache, mock_firestore):
+        mock_cache.get.return_value = None
+        mock_firestore.get_db.return_value.collection.return_value.document.return_value.get.return_value.exists = False
+
+        assert RefugiLliureDAO().get_etag('nonexistent') is None
+
+
+class TestRefugiLliureDAOCoordinatesShards:
+    """Tests de la lectura del catàleg de coordenades repartit en shards"""
+
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    @patch('api.daos.refugi_lliure_dao.cache_service')
+    def test_only_missing_shards_are_read(self, mock_cache, mock_firestore):
+        """Els shards en cache no es llegeixen i els llegits es guarden amb la seva versió"""
+        mock_cache.get_or_compute.side_effect = lambda key, compute_fn, timeout=None, tags=None: compute_fn()
+        mock_cache.generate_key.side_effect = lambda prefix, **kwargs: f"{prefix}:{kwargs.get('shard')}:{kwargs.get('version')}"
+        mock_cache.get_timeout.return_value = 86400
+        mock_cache.get_many.return_value = {
+            'refugi_coords_shard:ezz:3': [{'id': 'ref_1', 'name': 'A', 'coord': {'lat': 41.0, 'long': 2.0}}]
+        }
+        mock_firestore.get_db.return_value.collection.return_value.document.return_value.get.return_value.to_dict.return_value = {
+            'version': 5, 'shards': {'sp9': 5, 'ezz': 3, 'sp8': 4}
+        }
+        mock_firestore.get_documents.return_value = {
+            'sp9': {'version': 5, 'refugis_coordinates': [{'id': 'ref_2', 'name': 'B', 'coord': {'lat': 42.5, 'long': 1.5}}]},
+            # El shard ja té una versió posterior a la del manifest llegit: no es guarda a la cache
+            'sp8': {'version': 6, 'refugis_coordinates': [{'id': 'ref_3', 'name': 'C', 'coord': {'lat': 42.0, 'long': 0.5}}]},
+        }
+
+        refugis = RefugiLliureDAO()._get_coordinates_as_refugi_list()
+
+        assert [refugi['id'] for refugi in refugis] == ['ref_1', 'ref_3', 'ref_2']
+        collection, shard_ids = mock_firestore.get_documents.call_args[0]
+        assert collection == 'coords_refugis/all_refugis_coords/shards'
+        assert shard_ids == ['sp8', 'sp9']
+        mock_cache.set_many.assert_called_once_with(
+            {'refugi_coords_shard:sp9:5': [{'id': 'ref_2', 'name': 'B', 'coord': {'lat': 42.5, 'long': 1.5}}]},
+            86400
+        )
+
+
+class TestRefugiLliureDAOChanges:
+    """Tests de la sincronització incremental del catàleg"""
+
+    SNAPSHOT = {
+        'version': 5,
+        'changes_floor': 2,
+        'etag': '"coords-v5-abc"',
+        'refugis': [{'id': 'ref_001', 'name': 'Refugi A', 'coord': {'lat': 42.5, 'long': 1.5}, 'geohash': 'sp9'}],
+    }
+
+    @staticmethod
+    def _entry(version, refuge_id, action, name=None):
+        refuge = None if action == 'delete' else {
+            'id': refuge_id, 'name': name or refuge_id, 'coord': {'lat': 42.0, 'long': 1.0}, 'geohash': 'sp9'
+        }
+        doc = MagicMock()
+        doc.to_dict.return_value = {'version': version, 'refuge_id': refuge_id, 'action': action, 'refuge': refuge}
+        return doc
+
+    @pytest.fixture
+    def dao(self):
+        with patch('api.daos.refugi_lliure_dao.cache_service') as mock_cache:
+            mock_cache.get_or_compute.side_effect = lambda key, compute_fn, timeout=None, tags=None: compute_fn()
+            dao = RefugiLliureDAO()
+            with patch.object(RefugiLliureDAO, '_get_coordinates_snapshot', return_value=self.SNAPSHOT):
+                yield dao
+
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    def test_changes_are_folded_by_refuge(self, mock_firestore, dao):
+        query = mock_firestore.get_db.return_value.collection.return_value.where.return_value.where.return_value.order_by.return_value
+        query.stream.return_value = [
+            self._entry(3, 'ref_new', 'create', 'Nou'),
+            self._entry(4, 'ref_001', 'update', 'Refugi A2'),
+            self._entry(5, 'ref_new', 'update', 'Nou 2'),
+        ]
+
+        changes = dao.get_coordinates_changes(2)
+
+        assert changes['version'] == 5
+        assert changes['full'] is False
+        assert [refugi['name'] for refugi in changes['added']] == ['Nou 2']
+        assert [refugi['name'] for refugi in changes['updated']] == ['Refugi A2']
+        assert changes['deleted'] == []
+
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    def test_created_and_deleted_refuge_is_omitted(self, mock_firestore, dao):
+        query = mock_firestore.get_db.return_value.collection.return_value.where.return_value.where.return_value.order_by.return_value
+        query.stream.return_value = [
+            self._entry(4, 'ref_tmp', 'create'),
+            self._entry(5, 'ref_tmp', 'delete'),
+        ]
+
+        changes = dao.get_coordinates_changes(3)
+
+        assert (changes['added'], changes['updated'], changes['deleted']) == ([], [], [])
+
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    def test_deleted_refuge(self, mock_firestore, dao):
+        query = mock_firestore.get_db.return_value.collection.return_value.where.return_value.where.return_value.order_by.return_value
+        query.stream.return_value = [self._entry(5, 'ref_001', 'delete')]
+
+        assert dao.get_coordinates_changes(4)['deleted'] == ['ref_001']
+
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    def test_current_version_has_no_changes(self, mock_firestore, dao):
+        changes = dao.get_coordinates_changes(5)
+
+        assert changes == {'version': 5, 'full': False, 'added': [], 'updated': [], 'deleted': []}
+        mock_firestore.get_db.assert_not_called()
+
+    @pytest.mark.parametrize('since', [0, 1, 9])
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    def test_compacted_or_unknown_version_returns_full_snapshot(self, mock_firestore, dao, since):
+        changes = dao.get_coordinates_changes(since)
+
+        assert changes['full'] is True
+        assert changes['refugis'] == self.SNAPSHOT['refugis']
+        mock_firestore.get_db.assert_not_called()
+
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    def test_missing_log_entry_returns_full_snapshot(self, mock_firestore, dao):
+        query = mock_firestore.get_db.return_value.collection.return_value.where.return_value.where.return_value.order_by.return_value
+        query.stream.return_value = [self._entry(3, 'ref_001', 'update'), self._entry(5, 'ref_001', 'update')]
+
+        assert dao.get_coordinates_changes(2)['full'] is True
+
+
+class TestRefugiLliureDAOSearchSubsumption:
+    """Tests de la derivació de cerques a partir de cerques més àmplies a la cache"""
+
+    BROADER = {'type': ['garde', 'non gardé'], 'altitude_min': 1000}
+    DETAILS = {
+        'r1': {'id': 'r1', 'name': 'Refugi 1', 'type': 'garde', 'altitude': 1200},
+        'r2': {'id': 'r2', 'name': 'Refugi 2', 'type': 'non gardé', 'altitude': 1800},
+        'r3': {'id': 'r3', 'name': 'Refugi 3', 'type': 'garde', 'altitude': 2400},
+    }
+
+    @pytest.fixture
+    def mock_cache(self):
+        with patch('api.daos.refugi_lliure_dao.cache_service') as mock_cache:
+            mock_cache.generate_key.side_effect = lambda prefix, **kwargs: ':'.join(
+                [prefix] + [f'{key}:{kwargs[key]}' for key in sorted(kwargs)]
+            )
+            mock_cache.get_timeout.return_value = 300
+            mock_cache.get_or_fetch_list.side_effect = lambda **kwargs: kwargs['fetch_all_fn']()
+            mock_cache.get_or_fetch_many.side_effect = lambda ids, **kwargs: [self.DETAILS[refugi_id] for refugi_id in ids]
+            yield mock_cache
+
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    def test_narrower_search_is_derived_from_cached_list(self, mock_firestore, mock_cache):
+        broader_key = mock_cache.generate_key('refugi_search', **self.BROADER)
+        mock_cache.get.return_value = [self.BROADER]
+        mock_cache.peek_many.return_value = {broader_key: ['r1', 'r2', 'r3']}
+
+        dao = RefugiLliureDAO()
+        with patch.object(dao, '_get_search_index') as mock_index:
+            result = dao.search_refugis(RefugiSearchFilters(type=['garde'], altitude_min=1100.0, altitude_max=2000))
+
+        assert [refugi.id for refugi in result['results']] == ['r1']
+        mock_index.assert_not_called()
+        mock_firestore.get_db.assert_not_called()
+        mock_cache.get_or_fetch_many.assert_called_once()
+        # La cerca nova queda registrada al davant, amb els filtres canònics
+        registry = mock_cache.set.call_args[0][1]
+        assert registry == [{'type': ['garde'], 'altitude_min': 1100, 'altitude_max': 2000}, self.BROADER]
+
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    def test_search_not_covered_uses_index(self, mock_firestore, mock_cache):
+        mock_cache.get.return_value = [self.BROADER]
+        index = MagicMock()
+        index.search.return_value = ['r3']
+
+        dao = RefugiLliureDAO()
+        with patch.object(dao, '_get_search_index', return_value=index):
+            result = dao.search_refugis(RefugiSearchFilters(type=['garde'], altitude_min=900))
+
+        assert [refugi.id for refugi in result['results']] == ['r3']
+        mock_cache.peek_many.assert_not_called()
+        index.search.assert_called_once()
+
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    def test_expired_broader_list_uses_index(self, mock_firestore, mock_cache):
+        mock_cache.get.return_value = [self.BROADER]
+        mock_cache.peek_many.return_value = {}
+        index = MagicMock()
+        index.search.return_value = ['r1']
+
+        dao = RefugiLliureDAO()
+        with patch.object(dao, '_get_search_index', return_value=index):
+            result = dao.search_refugis(RefugiSearchFilters(type=['garde'], altitude_min=1100))
+
+        assert [refugi.id for refugi in result['results']] == ['r1']
+        index.search.assert_called_once()
@@ -152,6 +152,17 @@ class TestRefugiModels:
         assert isinstance(refugi.coord, Coordinates)
         assert isinstance(refugi.info_comp, InfoComplementaria)
     
+    def test_refugi_from_dict_copies_lists(self, sample_refugi_data):
+        """Test modificar el refugi no modifica el diccionari d'origen (compartit amb la cache L1)"""
+        data = {**sample_refugi_data, 'visitors': ['u1'], 'links': ['https://a']}
+        refugi = Refugi.from_dict(data)
+        
+        refugi.visitors.append('u2')
+        refugi.links.append('https://b')
+        
+        assert data['visitors'] == ['u1']
+        assert data['links'] == ['https://a']
+    
     def test_refugi_str_representation(self, sample_refugi):
         """Test representació textual del refugi"""
         refugi_str = str(sample_refugi)
@@ -225,5 +236,29 @@ class TestRefugiModels:
         # Els filtres buits no haurien d'aparèixer
         assert len(filters_dict) == 0 or all(v for v in filters_dict.values())
 
+    def test_refugi_search_filters_to_dict_is_canonical(self):
+        """Test filtres equivalents generen el mateix diccionari (i la mateixa clau de cache)"""
+        first = RefugiSearchFilters(type=['orri', 'garde', 'orri'], condition=[1, 0, 1], altitude_min=1000.0)
+        second = RefugiSearchFilters(type=[' garde', 'orri', ''], condition=[0, 1], altitude_min=1000)
+
+        assert first.to_dict() == second.to_dict() == {
+            'type': ['garde', 'orri'], 'condition': [0, 1], 'altitude_min': 1000
+        }
+
+    @pytest.mark.parametrize('narrower, expected', [
+        (RefugiSearchFilters(type=['garde'], altitude_min=1200, altitude_max=2000), True),
+        (RefugiSearchFilters(type=['garde', 'orri'], condition=[1], altitude_min=1000, altitude_max=2500, places_min=4), True),
+        (RefugiSearchFilters(type=['garde', 'orri'], altitude_min=900, altitude_max=2000), False),
+        (RefugiSearchFilters(type=['garde', 'orri'], altitude_min=1200), False),
+        (RefugiSearchFilters(altitude_min=1200, altitude_max=2000), False),
+        (RefugiSearchFilters(name='Colomers', type=['garde'], altitude_min=1200, altitude_max=2000), False),
+        (RefugiSearchFilters(type=['garde'], altitude_min=1200, altitude_max=2000, bbox=[0.5, 42.0, 1.5, 43.0]), False),
+    ])
+    def test_refugi_search_filters_subsumes(self, narrower, expected):
+        """Test una cerca inclou una altra quan aquesta és igual o més restrictiva"""
+        broader = RefugiSearchFilters(type=['orri', 'garde'], altitude_min=1000, altitude_max=2500)
+
+        assert broader.subsumes(narrower) is expected
+
 
 # ==================== TESTS DE SERIALIZERS ====================
@@ -0,0 +1,205 @@
+"""
+Tests per a l'índex de noms dels refugis (cerca parcial i autocompletat)
+"""
+
+import pytest
+from unittest.mock import MagicMock, patch
+from api.models.refugi_lliure import RefugiSearchFilters
+from api.services.refugi_index_service import RefugiSearchIndex
+from api.services.refugi_name_index_service import (
+    RefugiNameIndex,
+    fold,
+    trigrams,
+    refugi_name_index_service
+)
+from api.daos.refugi_lliure_dao import RefugiLliureDAO
+
+
+@pytest.fixture
+def catalogue():
+    """Catàleg de coordenades amb accents, sobrenoms i noms semblants"""
+    return [
+        {'id': 'r1', 'name': "Refuge de l'Étang Fourcat", 'coord': {'lat': 42.68, 'long': 1.49}},
+        {'id': 'r2', 'name': 'Cabane de Pletà', 'surname': 'Orri', 'coord': {'lat': 42.55, 'long': 1.61}},
+        {'id': 'r3', 'name': 'Refugi de Colomers', 'coord': {'lat': 42.63, 'long': 0.92}},
+        {'id': 'r4', 'name': 'Refugi Colomina', 'coord': {'lat': 42.52, 'long': 1.00}},
+        {'id': 'r5', 'name': 'Cabana del Pla', 'coord': {'lat': 42.40, 'long': 1.20}},
+        {'id': 'r6', 'name': '', 'coord': {'lat': 42.40, 'long': 1.20}},
+    ]
+
+
+def _snapshot(refugis, version, etag=None):
+    return {'version': version, 'changes_floor': 0, 'etag': etag or f'"v{version}"', 'refugis': refugis}
+
+
+def _ids(results):
+    return [result['id'] for result in results]
+
+
+@pytest.fixture(autouse=True)
+def reset_name_index_service():
+    """Assegura que cada test comença sense índex construït"""
+    refugi_name_index_service.invalidate()
+    yield
+    refugi_name_index_service.invalidate()
+
+
+# ==================== TESTS DE LA NORMALITZACIÓ ====================
+
+class TestFold:
+    """Tests per a la normalització dels noms"""
+
+    @pytest.mark.parametrize('text, expected', [
+        ("Refuge de l'Étang", 'refuge de l etang'),
+        ('  CABANA   Pletà ', 'cabana pleta'),
+        ('Œil-de-Bœuf', 'oeil de boeuf'),
+        ('Straße', 'strasse'),
+        (None, ''),
+    ])
+    def test_fold(self, text, expected):
+        assert fold(text) == expected
+
+    def test_trigrams_per_word(self):
+        assert trigrams('de') == {'  d', ' de', 'de '}
+        assert trigrams('a b') == {'  a', ' a ', '  b', ' b '}
+
+
+# ==================== TESTS DE L'ÍNDEX ====================
+
+class TestRefugiNameIndex:
+    """Tests per a la cerca de noms"""
+
+    def test_skips_entries_without_name(self, catalogue):
+        assert len(RefugiNameIndex(catalogue)) == 5
+
+    def test_accent_insensitive_prefix(self, catalogue):
+        index = RefugiNameIndex(catalogue)
+
+        assert _ids(index.search('etang')) == ['r1']
+        assert _ids(index.search('PLETA')) == ['r2']
+
+    def test_surname_is_searchable(self, catalogue):
+        index = RefugiNameIndex(catalogue)
+        result = index.search('orri')
+
+        assert _ids(result) == ['r2']
+        assert result[0]['surname'] == 'Orri'
+
+    def test_every_word_must_match(self, catalogue):
+        index = RefugiNameIndex(catalogue)
+
+        assert _ids(index.search('refu colom')) == ['r4', 'r3']
+        # El nom sencer que comença per la consulta té prioritat
+        assert [(match['id'], match['match']) for match in index.search('refugi colo')] == [('r4', 'prefix'), ('r3', 'words')]
+
+    def test_ranks_exact_before_prefix_and_fuzzy(self, catalogue):
+        index = RefugiNameIndex(catalogue)
+        result = index.search('cabana del pla')
+
+        assert [(match['id'], match['match']) for match in result] == [('r5', 'exact'), ('r2', 'fuzzy')]
+
+    def test_fuzzy_match_with_typos(self, catalogue):
+        index = RefugiNameIndex(catalogue)
+
+        assert _ids(index.search('colmers')) == ['r3']
+        assert _ids(index.search('fourkat')) == ['r1']
+
+    def test_limit_and_empty_query(self, catalogue):
+        index = RefugiNameIndex(catalogue)
+
+        assert len(index.search('refu', limit=1)) == 1
+        assert index.search('  ') == []
+        assert index.search('xyz') == []
+
+
+# ==================== TESTS DEL SERVEI ====================
+
+class TestRefugiNameIndexService:
+    """Tests per a la construcció de l'índex de noms"""
+
+    def test_builds_once_and_reuses(self, catalogue):
+        snapshot_loader = MagicMock(return_value=_snapshot(catalogue, 3))
+
+        first = refugi_name_index_service.get_index(snapshot_loader)
+        second = refugi_name_index_service.get_index(snapshot_loader)
+
+        assert first is second
+        assert first.version == 3
+
+    def test_rebuilds_when_catalogue_changes(self, catalogue):
+        first = refugi_name_index_service.get_index(lambda: _snapshot(catalogue, 3))
+        renamed = [{**catalogue[0], 'name': 'Refugi Nou'}]
+
+        second = refugi_name_index_service.get_index(lambda: _snapshot(renamed, 4))
+
+        assert second is not first
+        assert _ids(second.search('nou')) == ['r1']
+        assert second.search('etang') == []
+
+    def test_catalogue_not_available(self):
+        assert refugi_name_index_service.get_index(lambda: None) is None
+
+
+# ==================== TESTS DEL DAO ====================
+
+class TestRefugiLliureDAONameSearch:
+    """Tests per a la cerca per nom des del DAO"""
+
+    @patch('api.daos.refugi_lliure_dao.cache_service')
+    def test_search_names(self, mock_cache, catalogue):
+        dao = RefugiLliureDAO()
+        with patch.object(dao, '_get_coordinates_snapshot', return_value=_snapshot(catalogue, 7)):
+            result = dao.search_names('colom', 5)
+
+        assert _ids(result) == ['r4', 'r3']
+
+    def test_search_names_without_catalogue(self):
+        dao = RefugiLliureDAO()
+        with patch.object(dao, '_get_coordinates_snapshot', return_value=None):
+            assert dao.search_names('colom', 5) is None
+
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    @patch('api.daos.refugi_lliure_dao.cache_service')
+    def test_search_by_partial_name_ranked(self, mock_cache, mock_firestore, catalogue):
+        mock_cache.get_or_fetch_list.side_effect = lambda **kwargs: kwargs['fetch_all_fn']()
+        mock_cache.get_or_fetch_many.side_effect = lambda ids, **kwargs: [
+            {'id': refugi_id, 'name': f'Refugi {refugi_id}'} for refugi_id in ids
+        ]
+
+        dao = RefugiLliureDAO()
+        with patch.object(dao, '_get_coordinates_snapshot', return_value=_snapshot(catalogue, 7)):
+            result = dao.search_refugis(RefugiSearchFilters(name='colom'))
+
+        assert [refugi.id for refugi in result['results']] == ['r4', 'r3']
+        mock_firestore.get_db.assert_not_called()
+
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    @patch('api.daos.refugi_lliure_dao.cache_service')
+    def test_search_by_name_with_other_filters(self, mock_cache, mock_firestore, catalogue):
+        mock_cache.get_or_fetch_list.side_effect = lambda **kwargs: kwargs['fetch_all_fn']()
+        mock_cache.get_or_fetch_many.side_effect = lambda ids, **kwargs: [{'id': refugi_id, 'name': 'Refugi'} for refugi_id in ids]
+        search_index = RefugiSearchIndex([
+            {'id': 'r3', 'type': 'non gardé', 'places': 10},
+            {'id': 'r4', 'type': 'fermée', 'places': 4},
+        ])
+
+        dao = RefugiLliureDAO()
+        with patch.object(dao, '_get_coordinates_snapshot', return_value=_snapshot(catalogue, 7)), \
+                patch.object(dao, '_get_search_index', return_value=search_index):
+            result = dao.search_refugis(RefugiSearchFilters(name='colom', type=['non gardé']))
+
+        assert [refugi.id for refugi in result['results']] == ['r3']
+
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    @patch('api.daos.refugi_lliure_dao.cache_service')
+    def test_search_by_name_falls_back_to_exact_query(self, mock_cache, mock_firestore):
+        mock_cache.get_or_fetch_list.side_effect = lambda **kwargs: kwargs['fetch_all_fn']()
+
+        dao = RefugiLliureDAO()
+        with patch.object(dao, '_get_coordinates_snapshot', return_value=None), \
+                patch.object(dao, '_search_by_name', return_value=[]) as mock_exact:
+            result = dao.search_refugis(RefugiSearchFilters(name='Refugi de Colomers'))
+
+        assert result['results'] == []
+        mock_exact.assert_called_once()
+        mock_cache.get_or_fetch_many.assert_not_called()
@@ -2,7 +2,13 @@
 Tests per als models de metadades de mitjans
 """
 import pytest
+from unittest.mock import MagicMock, patch
 from api.models.media_metadata import MediaMetadata, RefugeMediaMetadata
+from api.models.refugi_lliure import Refugi
+from api.services.r2_media_service import (
+    PresignedUrlCache, presigned_url_cache, get_refugi_media_service, get_user_avatar_service,
+    R2MediaService, RefugiMediaStrategy
+)
 
 @pytest.mark.models
 class TestMediaMetadata:
@@ -113,3 +119,142 @@ class TestRefugeMediaMetadata:
         assert media.key == "path/to/file.jpg"
         assert media.creator_uid == "user_123"
         assert media.experience_id == "exp_456"
+
+
+@pytest.mark.models
+class TestLazyMediaUrl:
+    """Tests per a la signatura diferida de les URLs dels mitjans"""
+    
+    def test_resolve_url_only_once(self):
+        """La URL es genera la primera vegada que es serialitza"""
+        resolver = MagicMock(return_value="https://signed/file.jpg")
+        media = RefugeMediaMetadata(key="path/to/file.jpg", url="", url_resolver=resolver)
+        
+        resolver.assert_not_called()
+        assert media.to_dict()['url'] == "https://signed/file.jpg"
+        assert media.to_dict()['url'] == "https://signed/file.jpg"
+        resolver.assert_called_once_with("path/to/file.jpg")
+    
+    def test_resolve_url_error_returns_empty(self):
+        """Un error signant la URL no trenca la serialització"""
+        media = MediaMetadata(key="k1", url="", url_resolver=MagicMock(side_effect=Exception("R2 Error")))
+        assert media.to_dict()['url'] == ""
+    
+    @patch('api.services.r2_media_service.R2MediaService._sign_url')
+    def test_refugi_from_dict_defers_signing(self, mock_sign):
+        """Refugi.from_dict no signa cap URL fins que es crida to_dict"""
+        presigned_url_cache.clear()
+        mock_sign.side_effect = lambda key, expiration: f"https://signed/{key}"
+        refugi = Refugi.from_dict({
+            'id': 'r1',
+            'name': 'Refugi 1',
+            'coord': {'lat': 42.0, 'long': 1.0},
+            'media_metadata': {'refugis-lliures/r1/a.jpg': {'creator_uid': 'u1', 'uploaded_at': '2024-12-08'}}
+        })
+        
+        mock_sign.assert_not_called()
+        assert refugi.to_dict()['media_metadata'] == {'refugis-lliures/r1/a.jpg': {'creator_uid': 'u1', 'uploaded_at': '2024-12-08'}}
+        mock_sign.assert_called_once()
+        assert refugi.images_metadata[0].url == "https://signed/refugis-lliures/r1/a.jpg"
+
+
+class TestPresignedUrlCache:
+    """Tests per a la cache d'URLs prefirmades"""
+    
+    def test_reuses_url_within_window(self):
+        cache = PresignedUrlCache()
+        sign = MagicMock(side_effect=lambda key, expiration: f"url-{key}")
+        
+        with patch('api.services.r2_media_service.time.time', return_value=1000.0):
+            assert cache.get_or_sign('bucket', 'k1', 3600, sign) == 'url-k1'
+            assert cache.get_or_sign('bucket', 'k1', 3600, sign) == 'url-k1'
+        
+        sign.assert_called_once_with('k1', 3600)
+        assert cache.hits == 1 and cache.misses == 1
+    
+    def test_resigns_when_window_changes(self):
+        cache = PresignedUrlCache()
+        sign = MagicMock(return_value='url')
+        
+        with patch('api.services.r2_media_service.time.time', return_value=1000.0):
+            cache.get_or_sign('bucket', 'k1', 3600, sign)
+        with patch('api.services.r2_media_service.time.time', return_value=1000.0 + 1800):
+            cache.get_or_sign('bucket', 'k1', 3600, sign)
+        
+        assert sign.call_count == 2
+    
+    def test_current_window_follows_signing_window(self):
+        cache = PresignedUrlCache()
+        
+        with patch('api.services.r2_media_service.time.time', return_value=1000.0):
+            window = cache.current_window(3600)
+        with patch('api.services.r2_media_service.time.time', return_value=1799.0):
+            assert cache.current_window(3600) == window
+        with patch('api.services.r2_media_service.time.time', return_value=1800.0):
+            assert cache.current_window(3600) == window + 1
+    
+    def test_evicts_expired_then_least_recently_used(self):
+        cache = PresignedUrlCache(max_entries=2)
+        sign = MagicMock(side_effect=lambda key, expiration: f"url-{key}")
+        
+        with patch('api.services.r2_media_service.time.time', return_value=0.0):
+            cache.get_or_sign('bucket', 'old', 10, sign)
+        with patch('api.services.r2_media_service.time.time', return_value=100.0):
+            cache.get_or_sign('bucket', 'k1', 3600, sign)
+            cache.get_or_sign('bucket', 'k2', 3600, sign)
+            cache.get_or_sign('bucket', 'k1', 3600, sign)
+            cache.get_or_sign('bucket', 'k3', 3600, sign)
+        
+        keys = [cache_key[1] for cache_key in cache._entries]
+        assert keys == ['k1', 'k3']
+    
+    def test_service_creates_client_lazily(self):
+        with patch('api.services.r2_media_service.get_r2_client') as mock_client:
+            service = get_refugi_media_service()
+            mock_client.assert_not_called()
+            service.delete_file('k1')
+            mock_client.assert_called_once()
+
+    def test_upload_file_streams_with_transfer_config(self):
+        from api.services.r2_media_service import UPLOAD_TRANSFER_CONFIG
+        service = R2MediaService(RefugiMediaStrategy())
+        service.client = MagicMock()
+        file_content = MagicMock()
+        
+        with patch.object(service, 'generate_presigned_url', return_value='url'):
+            result = service.upload_file(file_content, 'r1', 'video/mp4', 'v.mp4')
+        
+        assert result == {'key': 'refugis-lliures/r1/v.mp4', 'url': 'url'}
+        file_content.seek.assert_called_once_with(0)
+        service.client.upload_fileobj.assert_called_once_with(
+            Fileobj=file_content,
+            Bucket=service.bucket_name,
+            Key='refugis-lliures/r1/v.mp4',
+            ExtraArgs={'ContentType': 'video/mp4'},
+            Config=UPLOAD_TRANSFER_CONFIG
+        )
+        service.client.put_object.assert_not_called()
+
+    def test_media_services_are_cached_per_strategy(self):
+        assert get_refugi_media_service() is get_refugi_media_service()
+        assert get_user_avatar_service() is get_user_avatar_service()
+        assert get_refugi_media_service() is not get_user_avatar_service()
+    
+    def test_r2_client_is_shared_per_process(self):
+        from api import r2_config
+        r2_config.reset_r2_clients()
+        with patch('api.r2_config.create_r2_client', side_effect=lambda: MagicMock()) as mock_create:
+            first = r2_config.get_r2_client()
+            assert r2_config.get_r2_client() is first
+            mock_create.assert_called_once()
+            
+            # Un procés nou (fork) no reutilitza el client del pare
+            with patch('api.r2_config.os.getpid', return_value=-1):
+                assert r2_config.get_r2_client() is not first
+        r2_config.reset_r2_clients()
+    
+    def test_r2_client_pool_configuration(self):
+        from api import r2_config
+        client = r2_config.create_r2_client()
+        assert client.meta.config.max_pool_connections == r2_config.DEFAULT_R2_MAX_POOL_CONNECTIONS
+        assert client.meta.config.tcp_keepalive is True
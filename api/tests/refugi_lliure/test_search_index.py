@@ -0,0 +1,346 @@
+"""
+Tests per a l'índex de cerca en memòria dels refugis
+"""
+
+import pytest
+from unittest.mock import MagicMock, patch
+from api.models.refugi_lliure import RefugiSearchFilters
+from api.services.refugi_index_service import (
+    RefugiSearchIndex,
+    RefugiIndexService,
+    RangeColumn,
+    GeoArea,
+    GeoGridColumn,
+    Histogram,
+    RefugiSearchStatistics,
+    haversine_km,
+    mask_to_rows,
+    refugi_index_service
+)
+from api.daos.refugi_lliure_dao import RefugiLliureDAO
+
+
+@pytest.fixture
+def catalogue():
+    """Catàleg de refugis amb valors absents i condicions decimals"""
+    return [
+        {'id': 'r1', 'type': 'non gardé', 'condition': 2, 'places': 10, 'altitude': 2000, 'region': 'Ariège', 'coord': {'lat': 42.5, 'long': 1.5}},
+        {'id': 'r2', 'type': 'fermée', 'condition': 1, 'places': 4, 'altitude': 2600, 'region': 'Ariège', 'coord': {'lat': 42.6, 'long': 1.6}},
+        {'id': 'r3', 'type': 'non gardé', 'condition': None, 'places': 6, 'altitude': 1800, 'region': 'Andorra', 'coord': {'lat': 42.7, 'long': 1.7}},
+        {'id': 'r4', 'type': 'orri', 'condition': 1.5, 'places': None, 'altitude': 2500, 'region': 'Andorra', 'coord': {'lat': 42.8, 'long': 1.8}},
+        {'id': 'r5', 'type': 'non gardé', 'condition': 1.0, 'places': 15},
+    ]
+
+
+@pytest.fixture(autouse=True)
+def reset_index_service():
+    """Assegura que cada test comença sense índex construït"""
+    refugi_index_service._index = None
+    yield
+    refugi_index_service._index = None
+
+
+# ==================== TESTS DE L'ÍNDEX ====================
+
+class TestRefugiSearchIndex:
+    """Tests per a la resolució de filtres amb màscares de bits"""
+
+    def test_mask_to_rows(self):
+        assert mask_to_rows(0) == []
+        assert mask_to_rows(0b101101) == [0, 2, 3, 5]
+
+    def test_range_column_bounds(self):
+        column = RangeColumn([5, None, 10, 'x', 5, 20])
+        assert mask_to_rows(column.mask(5, 10)) == [0, 2, 4]
+        assert mask_to_rows(column.mask(6, None)) == [2, 5]
+        assert mask_to_rows(column.mask(None, 4)) == []
+        assert mask_to_rows(column.mask(11, 19)) == []
+
+    def test_search_by_type(self, catalogue):
+        index = RefugiSearchIndex(catalogue)
+        filters = RefugiSearchFilters(type=['non gardé', 'orri'])
+        assert index.search(filters) == ['r1', 'r3', 'r4', 'r5']
+
+    def test_search_by_condition_excludes_null(self, catalogue):
+        index = RefugiSearchIndex(catalogue)
+        filters = RefugiSearchFilters(condition=[1, 2])
+        # r5 té condition 1.0, que equival a 1 igual que a Firestore
+        assert index.search(filters) == ['r1', 'r2', 'r5']
+
+    def test_search_by_ranges_excludes_missing_values(self, catalogue):
+        index = RefugiSearchIndex(catalogue)
+        assert index.search(RefugiSearchFilters(places_min=5)) == ['r1', 'r3', 'r5']
+        assert index.search(RefugiSearchFilters(altitude_min=1900, altitude_max=2500)) == ['r1', 'r4']
+
+    def test_search_combined_filters(self, catalogue):
+        index = RefugiSearchIndex(catalogue)
+        filters = RefugiSearchFilters(
+            type=['non gardé', 'fermée'],
+            condition=[1, 2],
+            places_min=4,
+            altitude_max=2100
+        )
+        assert index.search(filters) == ['r1']
+
+    def test_search_unknown_values_returns_empty(self, catalogue):
+        index = RefugiSearchIndex(catalogue)
+        assert index.search(RefugiSearchFilters(type=['emergence'])) == []
+
+    def test_columns_keep_region_and_coords(self, catalogue):
+        index = RefugiSearchIndex(catalogue)
+        assert len(index) == 5
+        assert index.region.frequencies() == {'Ariège': 2, 'Andorra': 2}
+        assert index.lat[index.positions['r2']] == 42.6
+
+
+# ==================== TESTS DE LA CERCA GEOGRÀFICA ====================
+
+class TestGeoSearch:
+    """Tests per a les cerques per bbox i per radi"""
+
+    def test_haversine_km(self):
+        # Un grau de latitud són ~111.2 km
+        assert haversine_km(42.0, 1.0, 43.0, 1.0) == pytest.approx(111.195, abs=0.01)
+        assert haversine_km(42.5, 1.5, 42.5, 1.5) == 0
+
+    def test_grid_mask_returns_candidate_rows(self):
+        grid = GeoGridColumn([42.51, 42.55, 43.5, float('nan')], [1.51, 1.52, 2.0, 1.5])
+        assert mask_to_rows(grid.mask(42.5, 1.5, 42.6, 1.6)) == [0, 1]
+        # Rectangle gran: es recorren les cel·les ocupades
+        assert mask_to_rows(grid.mask(-90, -180, 90, 180)) == [0, 1, 2]
+        assert grid.mask(10, 10, 11, 11) == 0
+
+    def test_search_bbox_sorted_by_distance_to_centre(self, catalogue):
+        index = RefugiSearchIndex(catalogue)
+        filters = RefugiSearchFilters(bbox=[1.55, 42.55, 1.9, 42.9])
+        # Centre (42.725, 1.725): r3 és el més proper; r5 no té coordenades
+        assert index.search(filters) == ['r3', 'r4', 'r2']
+
+    def test_search_near_radius(self, catalogue):
+        index = RefugiSearchIndex(catalogue)
+        filters = RefugiSearchFilters(near=[42.61, 1.61], radius_km=20)
+        # r1 és a ~15.2 km i r4 a ~26 km
+        assert index.search(filters) == ['r2', 'r3', 'r1']
+        assert index.search(RefugiSearchFilters(near=[42.61, 1.61], radius_km=15)) == ['r2', 'r3']
+
+    def test_search_geo_combined_with_filters(self, catalogue):
+        index = RefugiSearchIndex(catalogue)
+        filters = RefugiSearchFilters(near=[42.61, 1.61], radius_km=20, type=['non gardé'])
+        assert index.search(filters) == ['r3', 'r1']
+
+    def test_area_intersects_bbox_and_radius(self):
+        filters = RefugiSearchFilters(bbox=[1.5, 42.5, 1.65, 42.65], near=[42.6, 1.6], radius_km=50)
+        area = GeoArea.from_filters(filters)
+        assert (area.min_lat, area.max_lat) == (42.5, 42.65)
+        assert (area.origin_lat, area.origin_long) == (42.6, 1.6)
+
+    def test_filter_documents(self, catalogue):
+        area = GeoArea.from_filters(RefugiSearchFilters(near=[42.8, 1.8], radius_km=20))
+        assert [doc['id'] for doc in area.filter_documents(catalogue)] == ['r4', 'r3']
+
+    def test_no_geo_filters(self):
+        assert GeoArea.from_filters(RefugiSearchFilters(type=['orri'])) is None
+        assert RefugiSearchFilters(near=[42.0, 1.0]).has_geo_filters() is False
+
+
+class TestSearchStatistics:
+    """Tests per a les estadístiques de selectivitat del catàleg"""
+
+    def test_histogram_equi_depth(self):
+        histogram = Histogram.from_counts([1, 2, 3, 4], [5, 1, 1, 1], max_buckets=2)
+
+        # El valor repetit no es reparteix entre cubetes
+        assert histogram.buckets == [(1, 1, 5), (2, 4, 3)]
+        assert histogram.estimate() == 8
+        assert histogram.estimate(3, None) == pytest.approx(2)
+        assert histogram.estimate(None, 0) == 0
+
+    def test_from_index(self, catalogue):
+        statistics = RefugiSearchStatistics.from_index(RefugiSearchIndex(catalogue))
+
+        assert statistics.total == 5
+        assert statistics.type_counts == {'non gardé': 3, 'fermée': 1, 'orri': 1}
+        assert statistics.estimate_field('condition', RefugiSearchFilters(condition=[1])) == 2
+        assert statistics.estimate_field('places', RefugiSearchFilters(places_min=6)) == pytest.approx(3)
+        assert statistics.estimate_rows(['type', 'altitude'], RefugiSearchFilters(
+            type=['non gardé'], altitude_min=2400
+        )) == pytest.approx(5 * 3 / 5 * 2 / 5)
+
+    def test_round_trip(self, catalogue):
+        statistics = RefugiSearchStatistics.from_index(RefugiSearchIndex(catalogue))
+        restored = RefugiSearchStatistics.from_dict(statistics.to_dict())
+
+        filters = RefugiSearchFilters(type=['orri'], condition=[1.5], places_max=10, altitude_min=2000)
+        for field in RefugiSearchStatistics.FIELDS:
+            assert restored.estimate_field(field, filters) == statistics.estimate_field(field, filters)
+
+    def test_from_invalid_data(self):
+        assert RefugiSearchStatistics.from_dict(None) is None
+        assert RefugiSearchStatistics.from_dict({'total': 3}) is None
+
+
+# ==================== TESTS DEL SERVEI ====================
+
+@patch('api.services.refugi_index_service.cache_service')
+class TestRefugiIndexService:
+    """Tests per a la construcció i invalidació de l'índex"""
+
+    def test_builds_once_and_reuses(self, mock_cache, catalogue):
+        mock_cache.get.return_value = None
+        mock_cache.get_timeout.return_value = 3600
+        loader = MagicMock(return_value=catalogue)
+
+        first = refugi_index_service.get_index(loader)
+        second = refugi_index_service.get_index(loader)
+
+        assert first is second
+        loader.assert_called_once()
+
+    def test_rebuilds_when_version_changes(self, mock_cache, catalogue):
+        mock_cache.get_timeout.return_value = 3600
+        loader = MagicMock(return_value=catalogue)
+
+        mock_cache.get.return_value = 'v1'
+        first = refugi_index_service.get_index(loader)
+        mock_cache.get.return_value = 'v2'
+        second = refugi_index_service.get_index(loader)
+
+        assert first is not second
+        assert second.version == 'v2'
+        assert loader.call_count == 2
+
+    def test_empty_catalogue_returns_none(self, mock_cache):
+        mock_cache.get.return_value = None
+        mock_cache.get_timeout.return_value = 3600
+        assert refugi_index_service.get_index(lambda: []) is None
+
+    def test_loader_error_returns_none(self, mock_cache):
+        mock_cache.get.return_value = None
+        mock_cache.get_timeout.return_value = 3600
+        loader = MagicMock(side_effect=Exception('Firestore error'))
+        assert refugi_index_service.get_index(loader) is None
+
+    def test_publishes_statistics_on_build(self, mock_cache, catalogue):
+        mock_cache.get.return_value = None
+        mock_cache.get_timeout.return_value = 86400
+        refugi_index_service.get_index(lambda: catalogue)
+
+        key, data, timeout = mock_cache.set.call_args[0]
+        assert key == RefugiIndexService.STATISTICS_CACHE_KEY
+        assert timeout == 86400
+        mock_cache.get_timeout.assert_any_call('refugi_search_stats')
+
+        mock_cache.get.return_value = data
+        assert refugi_index_service.get_statistics().total == 5
+
+    def test_invalidate_bumps_shared_version(self, mock_cache, catalogue):
+        mock_cache.get.return_value = None
+        mock_cache.get_timeout.return_value = 3600
+        refugi_index_service.get_index(lambda: catalogue)
+
+        refugi_index_service.invalidate()
+
+        assert refugi_index_service._index is None
+        key, _, timeout = mock_cache.set.call_args[0]
+        assert key == RefugiIndexService.VERSION_CACHE_KEY
+        assert timeout is None
+
+
+# ==================== TESTS DEL DAO ====================
+
+class TestRefugiLliureDAOWithIndex:
+    """Tests per a la cerca del DAO resolta amb l'índex"""
+
+    @patch('api.services.refugi_index_service.cache_service')
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    @patch('api.daos.refugi_lliure_dao.cache_service')
+    def test_search_uses_index_without_firestore_queries(self, mock_cache, mock_firestore, mock_index_cache, catalogue):
+        mock_index_cache.get.return_value = None
+        mock_index_cache.get_timeout.return_value = 3600
+
+        docs = []
+        for data in catalogue:
+            doc = MagicMock()
+            doc.id = data['id']
+            doc.to_dict.return_value = {**data, 'name': f"Refugi {data['id']}", 'coord': data.get('coord', {'lat': 42.0, 'long': 1.0})}
+            docs.append(doc)
+        mock_db = MagicMock()
+        mock_db.collection.return_value.stream.return_value = docs
+        mock_firestore.get_db.return_value = mock_db
+
+        mock_cache.get_or_fetch_list.side_effect = lambda **kwargs: kwargs['fetch_all_fn']()
+        mock_cache.get_or_fetch_many.side_effect = lambda ids, **kwargs: [
+            doc.to_dict() for doc in docs if doc.id in ids
+        ]
+
+        dao = RefugiLliureDAO()
+        result = dao.search_refugis(RefugiSearchFilters(type=['fermée']))
+        dao.search_refugis(RefugiSearchFilters(places_max=5))
+
+        assert result['has_filters'] is True
+        assert [refugi.id for refugi in result['results']] == ['r2']
+        assert mock_cache.get_or_fetch_many.call_args_list[0].kwargs['ids'] == ['r2']
+        # Només una lectura de la col·lecció per construir l'índex i cap query per cerca
+        mock_db.collection.return_value.stream.assert_called_once()
+        mock_db.collection.return_value.where.assert_not_called()
+        mock_cache.set_many.assert_called_once()
+
+    @patch('api.services.refugi_index_service.cache_service')
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    @patch('api.daos.refugi_lliure_dao.cache_service')
+    def test_search_falls_back_to_strategies_without_index(self, mock_cache, mock_firestore, mock_index_cache):
+        mock_index_cache.get.return_value = None
+        mock_index_cache.get_timeout.return_value = 3600
+        mock_firestore.get_db.return_value.collection.return_value.stream.return_value = []
+        mock_cache.get_or_fetch_list.side_effect = lambda **kwargs: kwargs['fetch_all_fn']()
+
+        dao = RefugiLliureDAO()
+        with patch.object(dao, '_build_optimized_query', return_value=[]) as mock_query:
+            result = dao.search_refugis(RefugiSearchFilters(type=['fermée']))
+
+        assert result['results'] == []
+        mock_query.assert_called_once()
+        mock_cache.get_or_fetch_many.assert_not_called()
+
+    @patch('api.services.refugi_index_service.cache_service')
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    @patch('api.daos.refugi_lliure_dao.cache_service')
+    def test_geo_search_skips_list_cache(self, mock_cache, mock_firestore, mock_index_cache, catalogue):
+        mock_index_cache.get.return_value = None
+        mock_index_cache.get_timeout.return_value = 3600
+        docs = []
+        for data in catalogue:
+            doc = MagicMock()
+            doc.id = data['id']
+            doc.to_dict.return_value = {**data, 'name': f"Refugi {data['id']}"}
+            docs.append(doc)
+        mock_firestore.get_db.return_value.collection.return_value.stream.return_value = docs
+        mock_cache.get_or_fetch_many.side_effect = lambda ids, **kwargs: [
+            next(doc.to_dict() for doc in docs if doc.id == refugi_id) for refugi_id in ids
+        ]
+
+        dao = RefugiLliureDAO()
+        result = dao.search_refugis(RefugiSearchFilters(near=[42.61, 1.61], radius_km=20))
+
+        assert [refugi.id for refugi in result['results']] == ['r2', 'r3', 'r1']
+        mock_cache.get_or_fetch_list.assert_not_called()
+
+    @patch('api.services.refugi_index_service.cache_service')
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    @patch('api.daos.refugi_lliure_dao.cache_service')
+    def test_geo_search_without_index_streams_collection(self, mock_cache, mock_firestore, mock_index_cache, catalogue):
+        dao = RefugiLliureDAO()
+        docs = []
+        for data in catalogue:
+            doc = MagicMock()
+            doc.id = data['id']
+            doc.to_dict.return_value = {**data, 'name': f"Refugi {data['id']}"}
+            docs.append(doc)
+        mock_db = mock_firestore.get_db.return_value
+        mock_db.collection.return_value.stream.return_value = docs
+
+        with patch.object(dao, '_get_search_index', return_value=None):
+            result = dao.search_refugis(RefugiSearchFilters(bbox=[1.55, 42.55, 1.9, 42.9]))
+
+        assert [refugi.id for refugi in result['results']] == ['r3', 'r4', 'r2']
+        mock_db.collection.return_value.where.assert_not_called()
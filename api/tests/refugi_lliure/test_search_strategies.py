@@ -21,9 +21,12 @@ from api.daos.search_strategies import (
     TypeOnlyStrategy,
     ConditionOnlyStrategy,
     PlacesOnlyStrategy,
-    AltitudeOnlyStrategy
+    AltitudeOnlyStrategy,
+    SearchPlan,
+    matches_field
 )
 from api.daos.refugi_lliure_dao import RefugiLliureDAO
+from api.services.refugi_index_service import RefugiSearchIndex, RefugiSearchStatistics
 
 
 # ==================== TESTS PER SearchStrategySelector ====================
@@ -181,6 +184,129 @@ class TestSearchStrategySelector:
             SearchStrategySelector.select_strategy(filters)
 
 
+# ==================== TESTS DEL PLANIFICADOR ====================
+
+@pytest.fixture
+def statistics():
+    """
+    Estadístiques d'un catàleg de 1000 refugis: la majoria 'non gardé' i amb condició 2,
+    places repartides entre 1 i 20 i poques altituds per sobre de 2500 m
+    """
+    documents = []
+    for i in range(1000):
+        documents.append({
+            'id': f'r{i}',
+            'type': 'non gardé' if i % 10 else 'orri',
+            'condition': 2 if i % 4 else 1,
+            'places': i % 20 + 1,
+            'altitude': 2600 if i % 50 == 0 else 1500 + i % 900,
+        })
+    return RefugiSearchStatistics.from_index(RefugiSearchIndex(documents))
+
+
+class TestSearchPlanner:
+    """Tests per a la planificació basada en costos"""
+
+    def test_without_statistics_uses_fixed_order(self):
+        filters = RefugiSearchFilters(type=['orri'], places_min=5, altitude_min=2500)
+        plan = SearchStrategySelector.plan(filters)
+
+        assert isinstance(plan.strategy, TypePlacesAltitudeStrategy)
+        assert plan.residual_fields == ()
+        assert plan.estimated_rows is None
+
+    def test_prefers_most_selective_range(self, statistics):
+        filters = RefugiSearchFilters(type=['non gardé'], places_min=5, altitude_min=2500)
+        plan = SearchStrategySelector.plan(filters, statistics)
+
+        # L'altitud (2%) és més selectiva que les places (80%): es consulta type + altitude
+        assert isinstance(plan.strategy, TypeAltitudeStrategy)
+        assert plan.residual_fields == ('places',)
+        assert plan.estimated_rows == pytest.approx(1000 * 0.9 * 0.02, rel=0.1)
+
+    def test_prefers_most_selective_category(self, statistics):
+        filters = RefugiSearchFilters(type=['non gardé'], condition=[1])
+        plan = SearchStrategySelector.plan(filters, statistics)
+
+        # Amb type + condition només es consulta un camp: condition=1 (25%) és més selectiu
+        assert isinstance(plan.strategy, ConditionOnlyStrategy)
+        assert plan.residual_fields == ('type',)
+
+    def test_keeps_composite_index_when_cheapest(self, statistics):
+        filters = RefugiSearchFilters(type=['orri'], condition=[1], places_max=2)
+        plan = SearchStrategySelector.plan(filters, statistics)
+
+        assert isinstance(plan.strategy, TypeConditionPlacesStrategy)
+        assert plan.residual_fields == ()
+
+    def test_execute_applies_residual_filters(self):
+        strategy = MagicMock()
+        strategy.execute_query.return_value = [
+            {'id': '1', 'places': 10, 'altitude': 2600},
+            {'id': '2', 'places': 2, 'altitude': 2700},
+            {'id': '3', 'altitude': 2800},
+        ]
+        strategy.rows_read = 3
+        filters = RefugiSearchFilters(places_min=5, altitude_min=2500)
+
+        results = SearchPlan(strategy, ('places',), 2.5).execute(MagicMock(), 'test_collection', filters)
+
+        assert [r['id'] for r in results] == ['1']
+
+    def test_strategies_record_rows_read(self):
+        mock_db = MagicMock()
+        docs = []
+        for i, altitude in enumerate([1000, 2600]):
+            doc = MagicMock()
+            doc.id = str(i)
+            doc.to_dict.return_value = {'places': 10, 'altitude': altitude}
+            docs.append(doc)
+        mock_db.collection.return_value.where.return_value.stream.return_value = docs
+        mock_db.collection.return_value.where.return_value.where.return_value.stream.return_value = docs
+
+        strategy = PlacesAltitudeStrategy()
+        results = strategy.execute_query(mock_db, 'test_collection', RefugiSearchFilters(places_min=5, altitude_min=2000))
+
+        assert strategy.rows_read == 2
+        assert len(results) == 1
+
+    @pytest.mark.parametrize('refugi, field, expected', [
+        ({'type': 'orri'}, 'type', True),
+        ({'condition': None}, 'condition', False),
+        ({'places': 4}, 'places', False),
+        ({}, 'altitude', False),
+        ({'altitude': 2600}, 'altitude', True),
+    ])
+    def test_matches_field(self, refugi, field, expected):
+        filters = RefugiSearchFilters(type=['orri'], condition=[1], places_min=5, altitude_min=2500)
+        assert matches_field(refugi, field, filters) is expected
+
+    @patch('api.daos.refugi_lliure_dao.refugi_index_service')
+    @patch('api.daos.refugi_lliure_dao.firestore_service')
+    @patch('api.daos.refugi_lliure_dao.cache_service')
+    def test_build_optimized_query_uses_plan(self, mock_cache, mock_firestore, mock_index_service, statistics):
+        mock_index_service.get_statistics.return_value = statistics
+        mock_db = MagicMock()
+        docs = []
+        for i, places in enumerate([10, 2]):
+            doc = MagicMock()
+            doc.id = str(i)
+            doc.to_dict.return_value = {'type': 'non gardé', 'places': places, 'altitude': 2600}
+            docs.append(doc)
+        mock_query = MagicMock()
+        mock_query.where.return_value = mock_query
+        mock_query.stream.return_value = docs
+        mock_db.collection.return_value.where.return_value = mock_query
+
+        dao = RefugiLliureDAO()
+        filters = RefugiSearchFilters(type=['non gardé'], places_min=5, altitude_min=2500)
+        results = dao._build_optimized_query(mock_db, filters)
+
+        assert [r['id'] for r in results] == ['0']
+        fields = [call.kwargs['filter'].field_path for call in mock_query.where.call_args_list]
+        assert 'places' not in fields
+
+
 # ==================== TESTS PER ESTRATÈGIES INDIVIDUALS ====================
 
 class TestIndividualStrategies:
@@ -607,6 +733,7 @@ class TestRefugiLliureDAOWithStrategies:
     def test_search_refugis_no_filters_returns_coordinates(self, mock_cache, mock_firestore):
         """Test cerca sense filtres retorna coordenades"""
         mock_cache.get.return_value = None
+        mock_cache.get_or_compute.side_effect = lambda key, compute_fn, timeout=None, tags=None: compute_fn()
         
         coords_data = {
             'refugis_coordinates': [
@@ -197,6 +197,32 @@ class TestRefugiSerializers:
         
         assert not serializer.is_valid()
     
+    def test_refugi_search_filters_serializer_geo_filters(self):
+        """Test filtres geogràfics: bbox i near es converteixen a llistes de floats"""
+        data = {'bbox': '1.2,42.3,1.9,42.8', 'near': '42.5,1.5', 'radius_km': '10'}
+        serializer = RefugiSearchFiltersSerializer(data=data)
+        
+        assert serializer.is_valid()
+        assert serializer.validated_data['bbox'] == [1.2, 42.3, 1.9, 42.8]
+        assert serializer.validated_data['near'] == [42.5, 1.5]
+        assert serializer.validated_data['radius_km'] == 10.0
+    
+    @pytest.mark.parametrize('data, field', [
+        ({'bbox': '1.2,42.3,1.9'}, 'bbox'),
+        ({'bbox': '1.9,42.3,1.2,42.8'}, 'bbox'),
+        ({'bbox': '1.2,-95,1.9,42.8'}, 'bbox'),
+        ({'near': '42.5,abc', 'radius_km': 5}, 'near'),
+        ({'near': '42.5,1.5'}, 'radius_km'),
+        ({'radius_km': 5}, 'near'),
+        ({'near': '42.5,1.5', 'radius_km': 1000}, 'radius_km'),
+    ])
+    def test_refugi_search_filters_serializer_invalid_geo_filters(self, data, field):
+        """Test filtres geogràfics invàlids"""
+        serializer = RefugiSearchFiltersSerializer(data=data)
+        
+        assert not serializer.is_valid()
+        assert field in serializer.errors
+    
     def test_refugi_search_response_serializer(self):
         """Test serialització de resposta de cerca"""
         data = {
@@ -19,6 +19,9 @@ from api.models.refugi_lliure import (
 from api.views.refugi_lliure_views import (
     RefugiLliureDetailAPIView,
     RefugiLliureCollectionAPIView,
+    RefugiLliureChangesAPIView,
+    RefugiLliureClustersAPIView,
+    RefugiLliureAutocompleteAPIView,
     RefugeRenovationsAPIView
 )
 from api.views.health_check_views import HealthCheckAPIView
@@ -311,6 +314,36 @@ class TestRefugiViews:
         assert response.status_code == status.HTTP_200_OK
         assert response.data['count'] == 1
     
+    @patch('api.views.refugi_lliure_views.RefugiLliureController')
+    def test_get_refugis_collection_with_geo_filters(self, mock_controller_class):
+        """Test obtenció de col·lecció amb filtres geogràfics"""
+        mock_controller = mock_controller_class.return_value
+        mock_controller.get_catalogue_etag.return_value = None
+        mock_controller.search_refugis.return_value = ({'count': 0, 'results': []}, None)
+        
+        factory = APIRequestFactory()
+        request = factory.get('/refuges/', {'near': '42.5,1.5', 'radius_km': '10', 'type': 'orri'})
+        
+        view = RefugiLliureCollectionAPIView.as_view()
+        response = view(request)
+        
+        assert response.status_code == status.HTTP_200_OK
+        query_params = mock_controller.search_refugis.call_args[0][0]
+        assert query_params['near'] == [42.5, 1.5]
+        assert query_params['radius_km'] == 10.0
+        assert query_params['bbox'] is None
+    
+    @patch('api.views.refugi_lliure_views.RefugiLliureController')
+    def test_get_refugis_collection_invalid_bbox(self, mock_controller_class):
+        """Test obtenció de col·lecció amb un bbox invàlid"""
+        factory = APIRequestFactory()
+        request = factory.get('/refuges/', {'bbox': '1.5,42.5'})
+        
+        view = RefugiLliureCollectionAPIView.as_view()
+        response = view(request)
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
     @patch('api.views.refugi_lliure_views.RefugiLliureController')
     def test_get_refugis_collection_without_auth_no_visitors(self, mock_controller_class):
         """Test obtenció de col·lecció sense autenticació - no retorna visitants"""
@@ -464,6 +497,186 @@ class TestRefugiViews:
         assert response.status_code == http_status.HTTP_500_INTERNAL_SERVER_ERROR
         assert 'error' in response.data
     
+    @patch('api.views.refugi_lliure_views.RefugiLliureController')
+    def test_get_refugi_detail_not_modified(self, mock_controller_class):
+        """Test detall amb If-None-Match coincident: 304 sense obtenir ni serialitzar el refugi"""
+        mock_controller = mock_controller_class.return_value
+        mock_controller.get_refugi_etag.return_value = '"public-abc"'
+        
+        factory = APIRequestFactory()
+        request = factory.get('/refuges/refugi_001/', HTTP_IF_NONE_MATCH='"public-abc"')
+        
+        view = RefugiLliureDetailAPIView.as_view()
+        response = view(request, id='refugi_001')
+        
+        assert response.status_code == http_status.HTTP_304_NOT_MODIFIED
+        assert response['ETag'] == '"public-abc"'
+        assert 'Authorization' in response['Vary']
+        mock_controller.get_refugi_by_id.assert_not_called()
+    
+    @patch('api.views.refugi_lliure_views.RefugiLliureController')
+    def test_get_refugi_detail_sets_etag(self, mock_controller_class, sample_refugi):
+        """Test detall amb ETag diferent: 200 amb la nova ETag"""
+        mock_controller = mock_controller_class.return_value
+        mock_controller.get_refugi_etag.return_value = '"public-new"'
+        mock_controller.get_refugi_by_id.return_value = (sample_refugi, None)
+        
+        factory = APIRequestFactory()
+        request = factory.get('/refuges/refugi_001/', HTTP_IF_NONE_MATCH='"public-old"')
+        
+        view = RefugiLliureDetailAPIView.as_view()
+        response = view(request, id='refugi_001')
+        
+        assert response.status_code == http_status.HTTP_200_OK
+        assert response['ETag'] == '"public-new"'
+    
+    @patch('api.views.refugi_lliure_views.RefugiLliureController')
+    def test_get_catalogue_not_modified(self, mock_controller_class):
+        """Test catàleg sense filtres amb If-None-Match coincident (també amb ETag feble)"""
+        mock_controller = mock_controller_class.return_value
+        mock_controller.get_catalogue_etag.return_value = '"coords-v3-abc"'
+        
+        factory = APIRequestFactory()
+        request = factory.get('/refuges/', HTTP_IF_NONE_MATCH='"other", W/"coords-v3-abc"')
+        
+        view = RefugiLliureCollectionAPIView.as_view()
+        response = view(request)
+        
+        assert response.status_code == http_status.HTTP_304_NOT_MODIFIED
+        assert response['ETag'] == '"coords-v3-abc"'
+        mock_controller.search_refugis.assert_not_called()
+    
+    @patch('api.views.refugi_lliure_views.RefugiLliureController')
+    def test_get_catalogue_sets_etag(self, mock_controller_class):
+        """Test catàleg sense filtres: la resposta inclou l'ETag"""
+        mock_controller = mock_controller_class.return_value
+        mock_controller.get_catalogue_etag.return_value = '"coords-v3-abc"'
+        mock_controller.search_refugis.return_value = ({'count': 0, 'results': [], 'has_filters': False}, None)
+        
+        factory = APIRequestFactory()
+        request = factory.get('/refuges/')
+        
+        view = RefugiLliureCollectionAPIView.as_view()
+        response = view(request)
+        
+        assert response.status_code == http_status.HTTP_200_OK
+        assert response['ETag'] == '"coords-v3-abc"'
+    
+    @patch('api.views.refugi_lliure_views.RefugiLliureController')
+    def test_get_changes_success(self, mock_controller_class):
+        """Test sincronització incremental del catàleg"""
+        mock_controller = mock_controller_class.return_value
+        changes = {'version': 8, 'full': False, 'added': [], 'updated': [], 'deleted': ['ref_1']}
+        mock_controller.get_coordinates_changes.return_value = (changes, None)
+        
+        factory = APIRequestFactory()
+        request = factory.get('/refuges/changes/', {'since': '6'})
+        
+        view = RefugiLliureChangesAPIView.as_view()
+        response = view(request)
+        
+        assert response.status_code == http_status.HTTP_200_OK
+        assert response.data == changes
+        mock_controller.get_coordinates_changes.assert_called_once_with(6)
+    
+    @pytest.mark.parametrize('params', [{}, {'since': 'abc'}, {'since': '-1'}])
+    @patch('api.views.refugi_lliure_views.RefugiLliureController')
+    def test_get_changes_invalid_since(self, mock_controller_class, params):
+        """Test sincronització amb since absent o invàlid"""
+        factory = APIRequestFactory()
+        request = factory.get('/refuges/changes/', params)
+        
+        view = RefugiLliureChangesAPIView.as_view()
+        response = view(request)
+        
+        assert response.status_code == http_status.HTTP_400_BAD_REQUEST
+        mock_controller_class.return_value.get_coordinates_changes.assert_not_called()
+    
+    @patch('api.views.refugi_lliure_views.RefugiLliureController')
+    def test_get_changes_catalogue_unavailable(self, mock_controller_class):
+        """Test sincronització sense catàleg disponible"""
+        mock_controller_class.return_value.get_coordinates_changes.return_value = (None, 'Refuge catalogue not available')
+        
+        factory = APIRequestFactory()
+        request = factory.get('/refuges/changes/', {'since': '1'})
+        
+        view = RefugiLliureChangesAPIView.as_view()
+        response = view(request)
+        
+        assert response.status_code == http_status.HTTP_500_INTERNAL_SERVER_ERROR
+    
+    @patch('api.views.refugi_lliure_views.RefugiLliureController')
+    def test_get_clusters_success(self, mock_controller_class):
+        """Test agrupació dels refugis del mapa"""
+        mock_controller = mock_controller_class.return_value
+        clusters = {'zoom': 9, 'version': 8, 'count': 1, 'clusters': [{'count': 3, 'coord': {'lat': 42.5, 'long': 1.5}}]}
+        mock_controller.get_clusters.return_value = (clusters, None)
+        
+        factory = APIRequestFactory()
+        request = factory.get('/refuges/clusters/', {'zoom': '9', 'bbox': '0.5,42.2,2.0,42.9'})
+        
+        view = RefugiLliureClustersAPIView.as_view()
+        response = view(request)
+        
+        assert response.status_code == http_status.HTTP_200_OK
+        assert response.data == clusters
+        mock_controller.get_clusters.assert_called_once_with(9, [0.5, 42.2, 2.0, 42.9])
+    
+    @pytest.mark.parametrize('params', [
+        {'bbox': '0.5,42.2,2.0,42.9'},
+        {'zoom': '9'},
+        {'zoom': '30', 'bbox': '0.5,42.2,2.0,42.9'},
+        {'zoom': '9', 'bbox': '2.0,42.2,0.5,42.9'},
+    ])
+    @patch('api.views.refugi_lliure_views.RefugiLliureController')
+    def test_get_clusters_invalid_params(self, mock_controller_class, params):
+        """Test agrupació amb zoom o bbox absents o invàlids"""
+        factory = APIRequestFactory()
+        request = factory.get('/refuges/clusters/', params)
+        
+        view = RefugiLliureClustersAPIView.as_view()
+        response = view(request)
+        
+        assert response.status_code == http_status.HTTP_400_BAD_REQUEST
+        mock_controller_class.return_value.get_clusters.assert_not_called()
+    
+    @patch('api.views.refugi_lliure_views.RefugiLliureController')
+    def test_autocomplete_success(self, mock_controller_class):
+        """Test autocompletat del nom dels refugis"""
+        mock_controller = mock_controller_class.return_value
+        suggestions = {'query': 'colom', 'count': 1, 'results': [
+            {'id': 'r1', 'name': 'Refugi de Colomers', 'coord': {'lat': 42.6, 'long': 0.9}, 'match': 'words'}
+        ]}
+        mock_controller.autocomplete.return_value = (suggestions, None)
+        
+        factory = APIRequestFactory()
+        request = factory.get('/refuges/autocomplete/', {'q': 'colom'})
+        
+        view = RefugiLliureAutocompleteAPIView.as_view()
+        response = view(request)
+        
+        assert response.status_code == http_status.HTTP_200_OK
+        assert response.data == suggestions
+        mock_controller.autocomplete.assert_called_once_with('colom', 10)
+    
+    @pytest.mark.parametrize('params', [
+        {},
+        {'q': ''},
+        {'q': 'colom', 'limit': '0'},
+        {'q': 'colom', 'limit': '100'},
+    ])
+    @patch('api.views.refugi_lliure_views.RefugiLliureController')
+    def test_autocomplete_invalid_params(self, mock_controller_class, params):
+        """Test autocompletat sense text o amb un límit invàlid"""
+        factory = APIRequestFactory()
+        request = factory.get('/refuges/autocomplete/', params)
+        
+        view = RefugiLliureAutocompleteAPIView.as_view()
+        response = view(request)
+        
+        assert response.status_code == http_status.HTTP_400_BAD_REQUEST
+        mock_controller_class.return_value.autocomplete.assert_not_called()
+    
     @patch('api.views.refugi_lliure_views.RenovationController')
     def test_get_refuge_renovations_success(self, mock_controller_class, sample_renovation):
         """Test obtenció de renovations d'un refugi exitosa"""
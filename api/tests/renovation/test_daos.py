@@ -980,7 +980,8 @@ class TestRenovationDAO:
         assert error is None
         assert 'user1' in participants
         assert 'user2' in participants
-        mock_doc.reference.delete.assert_called_once()
+        mock_db.batch.return_value.delete.assert_called_once_with(mock_doc.reference)
+        mock_db.batch.return_value.commit.assert_called_once()
 
     @patch('api.daos.renovation_dao.FirestoreService')
     @patch('api.daos.renovation_dao.cache_service')
@@ -1026,10 +1027,11 @@ class TestRenovationDAO:
         
         assert success is True
         assert error is None
-        mock_doc.reference.update.assert_called_once_with({
+        mock_db.batch.return_value.update.assert_called_once_with(mock_doc.reference, {
             'creator_uid': 'unknown',
             'group_link': None
         })
+        mock_db.batch.return_value.commit.assert_called_once()
 
     @patch('api.daos.renovation_dao.FirestoreService')
     @patch('api.daos.renovation_dao.cache_service')
@@ -1070,7 +1072,8 @@ class TestRenovationDAO:
         
         assert success is True
         assert error is None
-        mock_doc.reference.update.assert_called_once()
+        mock_db.batch.return_value.update.assert_called_once()
+        assert mock_db.batch.return_value.update.call_args[0][0] is mock_doc.reference
 
     @patch('api.daos.renovation_dao.FirestoreService')
     @patch('api.daos.renovation_dao.cache_service')
@@ -1111,7 +1114,8 @@ class TestRenovationDAO:
         
         assert success is True
         assert error is None
-        mock_doc.reference.update.assert_called_once()
+        mock_db.batch.return_value.update.assert_called_once()
+        assert mock_db.batch.return_value.update.call_args[0][0] is mock_doc.reference
 
     @patch('api.daos.renovation_dao.FirestoreService')
     @patch('api.daos.renovation_dao.cache_service')
@@ -192,6 +192,25 @@ class TestFirebaseAuthenticationMiddleware:
         assert request.user_uid == 'test_uid_12345'
         mock_verify.assert_called_once_with(valid_token)
     
+    @patch('api.middleware.firebase_auth_middleware.auth.verify_id_token')
+    def test_valid_token_verified_once(self, mock_verify, request_factory, valid_token, decoded_token):
+        """Test que un token ja verificat es reutilitza fins a la seva expiració"""
+        import time
+        from api.services.token_cache_service import token_cache_service
+        token_cache_service.cache.clear()
+        mock_verify.return_value = {**decoded_token, 'exp': time.time() + 600}
+        
+        middleware = FirebaseAuthenticationMiddleware(get_response=lambda r: None)
+        for _ in range(3):
+            request = request_factory.get('/api/users/')
+            request.META['HTTP_AUTHORIZATION'] = f'Bearer {valid_token}'
+            assert middleware.process_request(request) is None
+            assert request.user_uid == 'test_uid_12345'
+        
+        mock_verify.assert_called_once_with(valid_token)
+        assert token_cache_service.get_stats()['hits'] == 2
+        token_cache_service.cache.clear()
+    
     @patch('api.middleware.firebase_auth_middleware.auth.verify_id_token')
     def test_expired_token(self, mock_verify, request_factory, expired_token):
         """Test que retorna error 401 amb token expirat"""
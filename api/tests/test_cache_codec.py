@@ -0,0 +1,129 @@
+"""
+Tests per al codec dels valors de cache (msgpack + compressió amb capçalera de versió)
+"""
+import zlib
+import pickle
+import pytest
+from datetime import datetime
+from unittest.mock import patch
+from api.services import cache_codec
+from api.services.cache_codec import CacheValueCodec, CacheCodecError, CodecSerializer, build_codec
+
+
+@pytest.fixture
+def codec():
+    return CacheValueCodec(serializer='msgpack', compression='zlib', compress_min_size=64)
+
+
+class TestCacheValueCodec:
+    """Tests de codificació i descodificació"""
+
+    @pytest.mark.parametrize('value', [
+        {'id': 'refugi_1', 'coord': {'latitude': 42.5, 'longitude': 1.2}, 'places': 4},
+        ['a', 'b', 'c'],
+        'text amb accents: àèòç',
+        None,
+        True,
+        1.5,
+        {1: 'clau enter'},
+    ])
+    def test_roundtrip_msgpack(self, codec, value):
+        data = codec.encode(value)
+        assert data[:2] == CacheValueCodec.MAGIC
+        assert data[3] == CacheValueCodec.FORMAT_MSGPACK
+        assert codec.decode(data) == value
+
+    @pytest.mark.parametrize('value', [
+        ('tupla', 1),
+        {'a', 'b'},
+        datetime(2025, 1, 1, 12, 0),
+        {'nested': ('tupla',)},
+        2 ** 70,
+    ])
+    def test_unsupported_types_fall_back_to_pickle(self, codec, value):
+        data = codec.encode(value)
+        assert data[3] == CacheValueCodec.FORMAT_PICKLE
+        decoded = codec.decode(data)
+        assert decoded == value
+        assert type(decoded) is type(value)
+
+    def test_small_values_are_not_compressed(self, codec):
+        data = codec.encode({'id': 'refugi_1'})
+        assert data[4] == CacheValueCodec.COMPRESSION_NONE
+
+    def test_large_values_are_compressed(self, codec):
+        value = [{'id': f'refugi_{i}', 'name': 'Refugi'} for i in range(100)]
+        data = codec.encode(value)
+        assert data[4] == CacheValueCodec.COMPRESSION_ZLIB
+        assert codec.decode(data) == value
+
+    def test_compression_none(self):
+        codec = CacheValueCodec(compression='none', compress_min_size=0)
+        data = codec.encode('x' * 5000)
+        assert data[4] == CacheValueCodec.COMPRESSION_NONE
+
+    def test_incompressible_values_are_stored_raw(self):
+        codec = CacheValueCodec(compression='zlib', compress_min_size=0)
+        data = codec.encode(b'\x01')
+        assert data[4] == CacheValueCodec.COMPRESSION_NONE
+
+    def test_pickle_serializer(self):
+        codec = CacheValueCodec(serializer='pickle')
+        data = codec.encode({'a': 1})
+        assert data[3] == CacheValueCodec.FORMAT_PICKLE
+        assert codec.decode(data) == {'a': 1}
+
+    def test_decodes_legacy_pickle_zlib_values(self, codec):
+        value = {'id': 'refugi_1', 'places': 4}
+        assert codec.decode(zlib.compress(pickle.dumps(value))) == value
+
+    def test_decodes_legacy_uncompressed_pickle_values(self, codec):
+        assert codec.decode(pickle.dumps([1, 2])) == [1, 2]
+
+    def test_unknown_version_raises(self, codec):
+        data = bytearray(codec.encode('valor'))
+        data[2] = 99
+        with pytest.raises(CacheCodecError):
+            codec.decode(bytes(data))
+
+    def test_values_written_with_other_settings_are_readable(self):
+        writer = CacheValueCodec(compression='zlib', compress_min_size=0)
+        reader = CacheValueCodec(serializer='pickle', compression='none')
+        value = {'refugis': list(range(200))}
+        assert reader.decode(writer.encode(value)) == value
+
+    def test_auto_compression_falls_back_to_zlib(self):
+        with patch.object(cache_codec, 'zstandard', None), patch.object(cache_codec, 'lz4_frame', None):
+            assert CacheValueCodec(compression='auto').compression == CacheValueCodec.COMPRESSION_ZLIB
+
+    def test_missing_zstd_falls_back_to_zlib(self):
+        with patch.object(cache_codec, 'zstandard', None):
+            assert CacheValueCodec(compression='zstd').compression == CacheValueCodec.COMPRESSION_ZLIB
+
+    def test_unknown_compression_raises(self):
+        with pytest.raises(ValueError):
+            CacheValueCodec(compression='brotli')
+
+    def test_describe(self, codec):
+        assert codec.describe() == {
+            'version': 1,
+            'serializer': 'msgpack',
+            'compression': 'zlib',
+            'compress_min_size': 64,
+        }
+
+
+class TestCodecSerializer:
+    """Tests de la integració amb django-redis"""
+
+    def test_build_codec_from_settings(self, settings):
+        settings.CACHE_CODEC = {'SERIALIZER': 'pickle', 'COMPRESSION': 'none', 'COMPRESS_MIN_SIZE': 10}
+        codec = build_codec()
+        assert codec.format == CacheValueCodec.FORMAT_PICKLE
+        assert codec.compression == CacheValueCodec.COMPRESSION_NONE
+        assert codec.compress_min_size == 10
+
+    def test_serializer_roundtrip(self):
+        serializer = CodecSerializer({})
+        value = {'ids': ['refugi_1', 'refugi_2']}
+        assert serializer.loads(serializer.dumps(value)) == value
@@ -0,0 +1,186 @@
+"""
+Tests per a les mètriques de cache per prefix
+"""
+import pytest
+from unittest.mock import patch
+from api.services.cache_metrics import CacheMetrics, common_prefix, OTHER_PREFIX
+from api.services.cache_service import CacheService
+from api.tests.test_cache_service import FakeRedisCache
+
+
+class FakeHashConnection:
+    """Connexió de Redis en memòria amb els hashes i el pipeline que fan servir les mètriques"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.fail = False
+
+    def pipeline(self, transaction=True):
+        return FakeHashPipeline(self)
+
+    def hgetall(self, name):
+        return {field.encode(): str(value).encode() for field, value in self.hashes.get(name, {}).items()}
+
+    def delete(self, name):
+        self.hashes.pop(name, None)
+
+
+class FakeHashPipeline:
+    def __init__(self, connection):
+        self.connection = connection
+        self.commands = []
+
+    def hincrby(self, name, field, amount):
+        self.commands.append((name, field, amount))
+
+    def hincrbyfloat(self, name, field, amount):
+        self.commands.append((name, field, amount))
+
+    def execute(self):
+        if self.connection.fail:
+            raise ConnectionError("Connection refused")
+        for name, field, amount in self.commands:
+            values = self.connection.hashes.setdefault(name, {})
+            values[field] = values.get(field, 0) + amount
+
+
+@pytest.fixture
+def connection():
+    fake = FakeHashConnection()
+    with patch.object(CacheMetrics, '_get_redis_connection', return_value=fake), \
+            patch.object(CacheMetrics, '_redis_key', return_value='refugis:1:cache_metrics'):
+        yield fake
+
+
+@pytest.fixture
+def metrics(connection):
+    return CacheMetrics({'ENABLED': True, 'FLUSH_INTERVAL': 3600, 'BUCKETS': [0.001, 0.01]})
+
+
+class TestCacheMetrics:
+    """Tests dels comptadors, histogrames i l'agregació entre workers"""
+
+    def test_snapshot_by_prefix(self, metrics):
+        metrics.incr('refugi_detail', 'hits', 3)
+        metrics.incr('refugi_detail', 'misses')
+        metrics.incr('doubt_list', 'sets')
+
+        snapshot = metrics.snapshot()
+
+        assert snapshot['refugi_detail']['hits'] == 3
+        assert snapshot['refugi_detail']['misses'] == 1
+        assert snapshot['refugi_detail']['hit_rate'] == 0.75
+        assert snapshot['doubt_list']['sets'] == 1
+        assert snapshot['doubt_list']['hit_rate'] == 0.0
+
+    def test_latency_histogram_is_cumulative(self, metrics):
+        metrics.observe('refugi_search', 'get', 0.0005)
+        metrics.observe('refugi_search', 'get', 0.005)
+        metrics.observe('refugi_search', 'get', 0.5)
+
+        latency = metrics.snapshot()['refugi_search']['latency']['get']
+
+        assert latency['count'] == 3
+        assert latency['buckets'] == {'0.001': 1, '0.01': 2, '+Inf': 3}
+        assert latency['avg_ms'] == pytest.approx(168.5)
+
+    def test_workers_are_aggregated(self, connection, metrics):
+        other_worker = CacheMetrics({'ENABLED': True, 'FLUSH_INTERVAL': 3600})
+        metrics.incr('refugi_detail', 'hits', 2)
+        other_worker.incr('refugi_detail', 'hits', 5)
+        other_worker.flush()
+
+        assert metrics.snapshot()['refugi_detail']['hits'] == 7
+
+    def test_flush_after_interval(self, connection):
+        metrics = CacheMetrics({'ENABLED': True, 'FLUSH_INTERVAL': 0})
+        metrics.incr('refugi_detail', 'hits')
+
+        assert connection.hashes['refugis:1:cache_metrics']['refugi_detail|hits'] == 1
+
+    def test_failed_flush_keeps_pending_counters(self, connection, metrics):
+        metrics.incr('refugi_detail', 'hits')
+        connection.fail = True
+        assert metrics.flush() is False
+
+        connection.fail = False
+        assert metrics.snapshot()['refugi_detail']['hits'] == 1
+
+    def test_bytes_attributed_to_current_prefix(self, metrics):
+        with metrics.timed('refugi_coords', 'get'):
+            metrics.record_bytes('read', 1200)
+        metrics.record_bytes('written', 10)
+
+        snapshot = metrics.snapshot()
+        assert snapshot['refugi_coords']['bytes_read'] == 1200
+        assert snapshot[OTHER_PREFIX]['bytes_written'] == 10
+
+    def test_disabled_records_nothing(self, connection):
+        metrics = CacheMetrics({'ENABLED': False})
+        metrics.incr('refugi_detail', 'hits')
+        metrics.observe('refugi_detail', 'get', 0.1)
+
+        assert metrics.snapshot() == {}
+
+    def test_prometheus_exposition(self, metrics):
+        metrics.incr('refugi_detail', 'hits', 4)
+        metrics.incr('refugi_detail', 'bytes_read', 100)
+        metrics.observe('refugi_detail', 'get', 0.002)
+
+        text = metrics.prometheus()
+
+        assert '# TYPE refugis_cache_requests_total counter' in text
+        assert 'refugis_cache_requests_total{prefix="refugi_detail",result="hit"} 4' in text
+        assert 'refugis_cache_bytes_total{prefix="refugi_detail",direction="read"} 100' in text
+        assert 'refugis_cache_operation_seconds_bucket{prefix="refugi_detail",op="get",le="0.001"} 0' in text
+        assert 'refugis_cache_operation_seconds_bucket{prefix="refugi_detail",op="get",le="+Inf"} 1' in text
+        assert 'refugis_cache_operation_seconds_count{prefix="refugi_detail",op="get"} 1' in text
+
+    def test_common_prefix(self):
+        assert common_prefix(['refugi_detail:refugi_id:1', 'refugi_detail:refugi_id:2']) == 'refugi_detail'
+        assert common_prefix(['refugi_detail:refugi_id:1', 'user_detail:uid:1']) == OTHER_PREFIX
+
+
+class TestCacheServiceMetrics:
+    """Tests de la instrumentació de CacheService"""
+
+    @pytest.fixture
+    def service(self, metrics):
+        fake = FakeRedisCache()
+        with patch('api.services.cache_service.cache', fake), \
+                patch('api.services.cache_service.cache_metrics', metrics):
+            instance = CacheService()
+            yield instance
+        CacheService()
+
+    def test_get_set_and_delete_are_counted(self, service, metrics):
+        service.set('user_detail:uid:1', {'uid': '1'}, 600)
+        service.get('user_detail:uid:1')
+        service.get('user_detail:uid:2')
+        service.delete('user_detail:uid:1')
+
+        stats = metrics.snapshot()['user_detail']
+        assert (stats['sets'], stats['hits'], stats['misses'], stats['deletes']) == (1, 1, 1, 1)
+        assert stats['latency']['get']['count'] == 2
+
+    def test_l1_hits_are_counted_separately(self, service, metrics):
+        service.set('refugi_detail:refugi_id:1', {'id': '1'}, 600)
+        service.get('refugi_detail:refugi_id:1')
+
+        stats = metrics.snapshot()['refugi_detail']
+        assert stats['l1_hits'] == 1
+        assert stats['hits'] == 0
+
+    def test_get_many_counts_each_key(self, service, metrics):
+        service.set('doubt_detail:doubt_id:1', {'id': '1'}, 600)
+        service.get_many(['doubt_detail:doubt_id:1', 'doubt_detail:doubt_id:2', 'doubt_detail:doubt_id:3'])
+
+        stats = metrics.snapshot()['doubt_detail']
+        assert (stats['hits'], stats['misses']) == (1, 2)
+
+    def test_errors_are_counted(self, service, metrics):
+        with patch('api.services.cache_service.cache') as broken:
+            broken.get.side_effect = Exception("Connection refused")
+            service.get('user_detail:uid:1')
+
+        assert metrics.snapshot()['user_detail']['errors'] == 1
@@ -0,0 +1,633 @@
+"""
+Tests per al CacheService amb cache L1 en memòria davant de Redis
+"""
+import pytest
+from unittest.mock import MagicMock, patch
+from api.services.cache_service import CacheService, LocalLRUCache, ENVELOPE_MARKER
+
+
+class FakeRedisCache:
+    """Backend de cache en memòria que imita l'API de django-redis utilitzada pel servei"""
+
+    def __init__(self):
+        self.store = {}
+        self.get_calls = 0
+
+    def get(self, key, default=None):
+        self.get_calls += 1
+        return self.store.get(key, default)
+
+    def get_many(self, keys):
+        self.get_calls += 1
+        return {key: self.store[key] for key in keys if key in self.store}
+
+    def set(self, key, value, timeout=None):
+        self.store[key] = value
+
+    def add(self, key, value, timeout=None):
+        if key in self.store:
+            return False
+        self.store[key] = value
+        return True
+
+    def set_many(self, data, timeout=None):
+        self.store.update(data)
+
+    def delete(self, key):
+        self.store.pop(key, None)
+
+    def delete_many(self, keys):
+        for key in keys:
+            self.store.pop(key, None)
+
+    def delete_pattern(self, pattern):
+        needle = pattern.strip('*')
+        for key in [key for key in self.store if needle in key]:
+            del self.store[key]
+
+    def incr(self, key):
+        if key not in self.store:
+            raise ValueError(f"Key {key} not found")
+        self.store[key] += 1
+        return self.store[key]
+
+    def clear(self):
+        self.store.clear()
+
+    def make_key(self, key, version=None):
+        return f"refugis:1:{key}"
+
+
+class FakeRedisConnection:
+    """Connexió de Redis en memòria (conjunts i pipelines) sobre el mateix store que FakeRedisCache"""
+
+    def __init__(self, fake_cache):
+        self.fake_cache = fake_cache
+        self.sets = {}
+        self.ttls = {}
+        self.pipelines = 0
+
+    def _unprefix(self, key):
+        return key.split(':', 2)[2]
+
+    def pipeline(self, transaction=True):
+        self.pipelines += 1
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, connection):
+        self.connection = connection
+        self.commands = []
+
+    def sadd(self, name, *values):
+        self.commands.append(lambda: self.connection.sets.setdefault(name, set()).update(values))
+
+    def expire(self, name, ttl):
+        self.commands.append(lambda: self.connection.ttls.__setitem__(name, ttl))
+
+    def smembers(self, name):
+        self.commands.append(lambda: {value.encode() for value in self.connection.sets.get(name, set())})
+
+    def srem(self, name, *values):
+        def run():
+            members = self.connection.sets.get(name, set())
+            members.difference_update(values)
+            if not members:
+                self.connection.sets.pop(name, None)
+        self.commands.append(run)
+
+    def delete(self, *names):
+        def run():
+            for name in names:
+                self.connection.sets.pop(name, None)
+                self.connection.fake_cache.store.pop(self.connection._unprefix(name), None)
+        self.commands.append(run)
+
+    def execute(self):
+        return [command() for command in self.commands]
+
+
+@pytest.fixture
+def redis_cache():
+    fake = FakeRedisCache()
+    with patch('api.services.cache_service.cache', fake):
+        yield fake
+
+
+@pytest.fixture
+def redis_connection(redis_cache):
+    connection = FakeRedisConnection(redis_cache)
+    with patch.object(CacheService, '_get_redis_connection', return_value=connection):
+        yield connection
+
+
+@pytest.fixture
+def service(redis_cache):
+    """Reinicialitza el singleton amb una L1 buida per a cada test"""
+    instance = CacheService()
+    yield instance
+    CacheService()
+
+
+class TestLocalLRUCache:
+    """Tests per a la cache LRU local"""
+
+    def test_evicts_least_recently_used(self):
+        l1 = LocalLRUCache(max_entries=2, max_ttl=60)
+        l1.set('a', 1, None, 0)
+        l1.set('b', 2, None, 0)
+        assert l1.get('a', 0) == 1
+        l1.set('c', 3, None, 0)
+
+        assert l1.get('b', 0) is None
+        assert l1.get('a', 0) == 1
+        assert l1.get('c', 0) == 3
+
+    def test_entries_expire_with_bounded_ttl(self):
+        l1 = LocalLRUCache(max_entries=10, max_ttl=60)
+        with patch('api.services.cache_service.time.monotonic', return_value=100.0):
+            l1.set('a', 1, 3600, 0)
+        with patch('api.services.cache_service.time.monotonic', return_value=159.0):
+            assert l1.get('a', 0) == 1
+        with patch('api.services.cache_service.time.monotonic', return_value=161.0):
+            assert l1.get('a', 0) is None
+
+    def test_generation_change_invalidates(self):
+        l1 = LocalLRUCache()
+        l1.set('a', 1, None, 3)
+        assert l1.get('a', 4) is None
+
+
+class TestCacheServiceL1:
+    """Tests per a la integració de la L1 amb Redis"""
+
+    def test_hot_prefix_served_from_l1(self, service, redis_cache):
+        redis_cache.store['refugi_detail:refugi_id:1'] = {'id': '1'}
+
+        assert service.get('refugi_detail:refugi_id:1') == {'id': '1'}
+        calls = redis_cache.get_calls
+        assert service.get('refugi_detail:refugi_id:1') == {'id': '1'}
+
+        # El segon accés no va a Redis
+        assert redis_cache.get_calls == calls
+        assert service.l1.hits == 1
+
+    def test_other_prefixes_skip_l1(self, service, redis_cache):
+        service.set('user_detail:uid:1', {'uid': '1'}, 600)
+        assert len(service.l1._entries) == 0
+        assert service.get('user_detail:uid:1') == {'uid': '1'}
+
+    def test_set_and_set_many_populate_l1(self, service, redis_cache):
+        service.set('refugi_coords:document:all', [1, 2], 3600)
+        service.set_many({'refugi_detail:refugi_id:2': {'id': '2'}, 'user_detail:uid:1': {}}, 600)
+
+        assert set(service.l1._entries) == {'refugi_coords:document:all', 'refugi_detail:refugi_id:2'}
+
+    def test_delete_bumps_generation_for_other_workers(self, service, redis_cache):
+        other_worker = LocalLRUCache()
+        service.set('refugi_detail:refugi_id:1', {'id': '1'}, 600)
+        other_worker.set('refugi_detail:refugi_id:1', {'id': '1'}, 600, service._generation)
+
+        service.delete('refugi_detail:refugi_id:1')
+
+        assert redis_cache.store[CacheService.GENERATION_CACHE_KEY] == service._generation
+        assert 'refugi_detail:refugi_id:1' not in service.l1._entries
+        assert other_worker.get('refugi_detail:refugi_id:1', redis_cache.store[CacheService.GENERATION_CACHE_KEY]) is None
+
+    @pytest.mark.parametrize('delete', [
+        lambda service: service.delete('refugi_detail:refugi_id:1'),
+        lambda service: service.delete_many(['refugi_detail:refugi_id:1']),
+        lambda service: service.delete_pattern('refugi_detail:'),
+    ])
+    def test_redis_deleted_before_generation_bump(self, service, redis_cache, delete):
+        # Si la generació canviés abans, un altre worker podria tornar a desar el valor antic a la L1
+        service.set('refugi_detail:refugi_id:1', {'id': '1'}, 600)
+        generations_seen = []
+        for method in ('delete', 'delete_many', 'delete_pattern'):
+            original = getattr(redis_cache, method)
+            setattr(redis_cache, method, lambda *args, original=original: (
+                generations_seen.append(redis_cache.store.get(CacheService.GENERATION_CACHE_KEY)), original(*args)
+            ))
+
+        delete(service)
+
+        assert generations_seen == [None]
+        assert 'refugi_detail:refugi_id:1' not in service.l1._entries
+        assert redis_cache.store[CacheService.GENERATION_CACHE_KEY] == service._generation
+
+    def test_remote_invalidation_detected_after_check_interval(self, service, redis_cache):
+        with patch('api.services.cache_service.time.monotonic', return_value=1000.0):
+            service.set('refugi_coords:document:all', ['old'], 3600)
+
+        # Un altre worker invalida i actualitza el valor a Redis
+        redis_cache.store[CacheService.GENERATION_CACHE_KEY] = 7
+        redis_cache.store['refugi_coords:document:all'] = ['new']
+
+        with patch('api.services.cache_service.time.monotonic', return_value=1000.5):
+            assert service.get('refugi_coords:document:all') == ['old']
+        with patch('api.services.cache_service.time.monotonic', return_value=1001.5):
+            assert service.get('refugi_coords:document:all') == ['new']
+
+    def test_clear_all_invalidates_workers_that_saw_first_generation(self, service, redis_cache):
+        # Un altre worker ja ha vist la generació 1 i té el valor a la L1
+        redis_cache.store[CacheService.GENERATION_CACHE_KEY] = 1
+        other_worker = object.__new__(CacheService)
+        other_worker.__init__()
+        with patch('api.services.cache_service.time.monotonic', return_value=1000.0):
+            other_worker.set('refugi_coords:document:snapshot', ['old'], 3600)
+
+        # clear_all elimina també la clau de generació i la torna a crear
+        assert service.clear_all() is True
+        redis_cache.store['refugi_coords:document:snapshot'] = ['new']
+
+        assert redis_cache.store[CacheService.GENERATION_CACHE_KEY] != 1
+        with patch('api.services.cache_service.time.monotonic', return_value=1001.5):
+            assert other_worker.get('refugi_coords:document:snapshot') == ['new']
+
+    def test_delete_pattern_evicts_local_entries(self, service, redis_cache):
+        service.set('refugi_coords:document:all', [1], 3600)
+        service.set('refugi_detail:refugi_id:1', {'id': '1'}, 600)
+
+        service.delete_pattern('refugi_coords:')
+
+        assert list(service.l1._entries) == ['refugi_detail:refugi_id:1']
+        assert redis_cache.store[CacheService.GENERATION_CACHE_KEY] == service._generation
+
+    def test_l1_bypassed_when_generation_unavailable(self, service):
+        broken = MagicMock()
+        broken.get.side_effect = Exception("Connection refused")
+        with patch('api.services.cache_service.cache', broken):
+            assert service.get('refugi_detail:refugi_id:1') is None
+        assert len(service.l1._entries) == 0
+
+    def test_l1_disabled_by_settings(self, service, settings):
+        settings.CACHE_L1 = {'ENABLED': False}
+        instance = CacheService()
+        instance.set('refugi_detail:refugi_id:1', {'id': '1'}, 600)
+
+        assert instance.l1 is None
+        assert instance.get('refugi_detail:refugi_id:1') == {'id': '1'}
+
+
+class TestCacheServiceBulk:
+    """Tests per a les lectures i escriptures en bloc de l'estratègia ID caching"""
+
+    def test_get_many_combines_l1_and_redis(self, service, redis_cache):
+        service.set('refugi_detail:refugi_id:1', {'id': '1'}, 600)
+        redis_cache.store['experience_detail:experience_id:2'] = {'id': '2'}
+
+        found = service.get_many(['refugi_detail:refugi_id:1', 'experience_detail:experience_id:2', 'missing'])
+
+        assert found == {'refugi_detail:refugi_id:1': {'id': '1'}, 'experience_detail:experience_id:2': {'id': '2'}}
+
+    def test_get_many_redis_error_returns_partial(self, service):
+        broken = MagicMock()
+        broken.get_many.side_effect = Exception("Connection refused")
+        broken.get.side_effect = Exception("Connection refused")
+        with patch('api.services.cache_service.cache', broken):
+            assert service.get_many(['experience_detail:experience_id:1']) == {}
+
+    def test_peek_many_unwraps_computed_values(self, service, redis_cache):
+        service.get_or_compute('refugi_search:type:a', lambda: ['1', '2'], 600)
+        redis_cache.store['refugi_search:type:b'] = ['3']
+
+        found = service.peek_many(['refugi_search:type:a', 'refugi_search:type:b', 'refugi_search:type:c'])
+
+        assert found == {'refugi_search:type:a': ['1', '2'], 'refugi_search:type:b': ['3']}
+
+    def test_get_or_fetch_many_uses_single_mget_and_bulk_fetch(self, service, redis_cache):
+        redis_cache.store['experience_detail:experience_id:a'] = {'id': 'a'}
+        fetch_single = MagicMock()
+        fetch_many = MagicMock(return_value={'b': {'id': 'b'}})
+
+        calls_before = redis_cache.get_calls
+        results = service.get_or_fetch_many(
+            ids=['a', 'b', 'c'],
+            detail_key_prefix='experience_detail',
+            fetch_single_fn=fetch_single,
+            id_param_name='experience_id',
+            fetch_many_fn=fetch_many
+        )
+
+        assert results == [{'id': 'a'}, {'id': 'b'}]
+        assert redis_cache.get_calls - calls_before == 1
+        fetch_many.assert_called_once_with(['b', 'c'])
+        fetch_single.assert_not_called()
+        assert redis_cache.store['experience_detail:experience_id:b'] == {'id': 'b'}
+
+    def test_get_or_fetch_many_falls_back_to_single_fetch(self, service, redis_cache):
+        fetch_single = MagicMock(side_effect=lambda item_id: {'id': item_id} if item_id != 'x' else None)
+
+        results = service.get_or_fetch_many(
+            ids=['a', 'x'],
+            detail_key_prefix='experience_detail',
+            fetch_single_fn=fetch_single,
+            id_param_name='experience_id'
+        )
+
+        assert results == [{'id': 'a'}]
+        assert fetch_single.call_count == 2
+
+    def test_delete_many_evicts_l1_and_bumps_generation_once(self, service, redis_cache):
+        redis_cache.store[CacheService.GENERATION_CACHE_KEY] = 0
+        service.set('refugi_detail:refugi_id:1', {'id': '1'}, 600)
+        service.set('refugi_detail:refugi_id:2', {'id': '2'}, 600)
+        redis_cache.store['user_detail:uid:1'] = {'uid': '1'}
+
+        assert service.delete_many(['refugi_detail:refugi_id:1', 'refugi_detail:refugi_id:2', 'user_detail:uid:1']) is True
+
+        assert len(service.l1._entries) == 0
+        assert 'user_detail:uid:1' not in redis_cache.store
+        assert redis_cache.store[CacheService.GENERATION_CACHE_KEY] == 1
+
+    def test_get_or_fetch_list_miss_stores_details_in_one_call(self, service, redis_cache):
+        redis_cache.set_many = MagicMock(side_effect=redis_cache.set_many)
+        data = [{'id': 'a'}, {'id': 'b'}]
+
+        results = service.get_or_fetch_list(
+            list_cache_key='experience_list:refuge_id:r1',
+            detail_key_prefix='experience_detail',
+            fetch_all_fn=lambda: data,
+            fetch_single_fn=MagicMock(),
+            get_id_fn=lambda item: item['id'],
+            id_param_name='experience_id'
+        )
+
+        assert results == data
+        assert redis_cache.store['experience_list:refuge_id:r1']['value'] == ['a', 'b']
+        redis_cache.set_many.assert_called_once()
+
+
+
+class TestCacheServiceStampede:
+    """Tests de get_or_compute: single-flight, stale-while-revalidate i refresc anticipat"""
+
+    KEY = 'experience_list:refuge_id:r1'
+    LOCK = CacheService._lock_key(KEY)
+
+    def _envelope(self, value, fresh_until, delta=0.0):
+        return {ENVELOPE_MARKER: 1, 'value': value, 'fresh_until': fresh_until, 'delta': delta, 'fence': 1}
+
+    def test_miss_computes_once_and_releases_lock(self, service, redis_cache):
+        compute = MagicMock(return_value=['a'])
+
+        assert service.get_or_compute(self.KEY, compute, 600) == ['a']
+        assert service.get_or_compute(self.KEY, compute, 600) == ['a']
+
+        compute.assert_called_once()
+        assert self.LOCK not in redis_cache.store
+        assert isinstance(redis_cache.store[self.KEY]['fence'], str)
+        # El fencing token és el valor del lock: no queda cap clau per clau de cache sense expiració
+        assert set(redis_cache.store) == {self.KEY}
+
+    def test_fresh_value_is_served_without_refresh(self, service, redis_cache):
+        import time
+        redis_cache.store[self.KEY] = self._envelope(['old'], time.time() + 600)
+        compute = MagicMock()
+
+        with patch.dict(service.stampede, {'EARLY_REFRESH_BETA': 0}):
+            assert service.get_or_compute(self.KEY, compute, 600) == ['old']
+
+        compute.assert_not_called()
+
+    def test_stale_value_served_while_other_worker_refreshes(self, service, redis_cache):
+        import time
+        redis_cache.store[self.KEY] = self._envelope(['old'], time.time() - 1)
+        redis_cache.store[self.LOCK] = 99
+        compute = MagicMock(return_value=['new'])
+
+        assert service.get_or_compute(self.KEY, compute, 600) == ['old']
+        compute.assert_not_called()
+
+    def test_stale_value_refreshed_by_lock_holder(self, service, redis_cache):
+        import time
+        redis_cache.store[self.KEY] = self._envelope(['old'], time.time() - 1)
+        compute = MagicMock(return_value=['new'])
+
+        assert service.get_or_compute(self.KEY, compute, 600) == ['new']
+        assert redis_cache.store[self.KEY]['value'] == ['new']
+
+    def test_refresh_error_serves_stale_value(self, service, redis_cache):
+        import time
+        redis_cache.store[self.KEY] = self._envelope(['old'], time.time() - 1)
+        compute = MagicMock(side_effect=Exception('Firestore down'))
+
+        assert service.get_or_compute(self.KEY, compute, 600) == ['old']
+        assert self.LOCK not in redis_cache.store
+
+    def test_early_refresh_near_expiry(self, service, redis_cache):
+        import time
+        redis_cache.store[self.KEY] = self._envelope(['old'], time.time() + 1, delta=5.0)
+        compute = MagicMock(return_value=['new'])
+
+        with patch('api.services.cache_service.random.random', return_value=0.01):
+            assert service.get_or_compute(self.KEY, compute, 600) == ['new']
+
+    def test_miss_waits_for_lock_holder(self, service, redis_cache):
+        redis_cache.store[self.LOCK] = 99
+        compute = MagicMock(return_value=['mine'])
+
+        def holder_finishes(_):
+            redis_cache.store[self.KEY] = self._envelope(['theirs'], 0)
+
+        with patch('api.services.cache_service.time.sleep', side_effect=holder_finishes):
+            assert service.get_or_compute(self.KEY, compute, 600) == ['theirs']
+        compute.assert_not_called()
+
+    def test_miss_computes_when_lock_holder_disappears(self, service, redis_cache):
+        redis_cache.store[self.LOCK] = 99
+        compute = MagicMock(return_value=['mine'])
+
+        def holder_fails(_):
+            redis_cache.store.pop(self.LOCK, None)
+
+        with patch('api.services.cache_service.time.sleep', side_effect=holder_fails):
+            assert service.get_or_compute(self.KEY, compute, 600) == ['mine']
+
+    def test_stale_fencing_token_does_not_overwrite(self, service, redis_cache):
+        def compute():
+            # Mentre calculem, el lock caduca i un altre worker l'agafa amb un altre token
+            redis_cache.store[self.LOCK] = 'other-worker'
+            return ['slow']
+
+        assert service.get_or_compute(self.KEY, compute, 600) == ['slow']
+        assert self.KEY not in redis_cache.store
+        assert redis_cache.store[self.LOCK] == 'other-worker'
+
+    def test_lock_keys_survive_pattern_invalidation(self, service, redis_cache):
+        redis_cache.store[self.KEY] = ['a']
+        redis_cache.store[self.LOCK] = 'other-worker'
+        service.delete_pattern('experience_list:refuge_id:r1')
+
+        assert self.KEY not in redis_cache.store
+        assert redis_cache.store[self.LOCK] == 'other-worker'
+
+    def test_plain_values_are_treated_as_fresh(self, service, redis_cache):
+        redis_cache.store[self.KEY] = ['legacy']
+        compute = MagicMock()
+
+        assert service.get_or_compute(self.KEY, compute, 600) == ['legacy']
+        compute.assert_not_called()
+
+    def test_none_is_not_stored(self, service, redis_cache):
+        assert service.get_or_compute(self.KEY, lambda: None, 600) is None
+        assert self.KEY not in redis_cache.store
+
+
+class TestCacheServiceTags:
+    """Tests per a la invalidació per etiquetes"""
+
+    def test_set_registers_key_under_tags(self, service, redis_cache, redis_connection):
+        service.set('refugi_search:region:Pirineu', ['1'], 600, tags=['refugi_search'])
+
+        assert redis_connection.sets['refugis:1:cache_tag:refugi_search'] == {'refugis:1:refugi_search:region:Pirineu'}
+        assert redis_connection.ttls['refugis:1:cache_tag:refugi_search'] == service.tag_ttl
+
+    def test_invalidate_tags_deletes_only_tagged_keys(self, service, redis_cache, redis_connection):
+        service.set('refugi_search:region:A', ['1'], 600, tags=['refugi_search'])
+        service.set('refugi_search:region:B', ['2'], 600, tags=['refugi_search'])
+        service.set('refuge_visits_list:from_date:2025-01-01:refuge_id:r1', ['v'], 600,
+                    tags=['refuge_visits_list:refuge_id:r1'])
+        service.set('refugi_detail:refugi_id:1', {'id': '1'}, 600)
+        pipelines = redis_connection.pipelines
+
+        assert service.invalidate_tags(['refugi_search', 'refuge_visits_list:refuge_id:r1']) is True
+
+        assert set(redis_cache.store) == {'refugi_detail:refugi_id:1'}
+        assert redis_connection.sets == {}
+        # Una lectura dels conjunts i una eliminació
+        assert redis_connection.pipelines - pipelines == 2
+
+    def test_invalidate_tags_evicts_l1(self, service, redis_cache, redis_connection):
+        service.set('refugi_coords:document:all', [1], 3600, tags=['refugi_coords'])
+        service.set('refugi_detail:refugi_id:1', {'id': '1'}, 600)
+
+        service.invalidate_tags(['refugi_coords'])
+
+        assert list(service.l1._entries) == ['refugi_detail:refugi_id:1']
+        assert redis_cache.store[CacheService.GENERATION_CACHE_KEY] == service._generation
+
+    def test_invalidate_tags_bumps_generation_without_local_entries(self, service, redis_cache, redis_connection):
+        # Un altre worker (p. ex. el cron de compactació) invalida una clau que només tenen els altres
+        other_worker = LocalLRUCache()
+        service.set('refugi_coords:document:snapshot', ['old'], 3600, tags=['refugi_coords'])
+        other_worker.set('refugi_coords:document:snapshot', ['old'], 3600, service._current_generation())
+        service.l1.clear()
+
+        service.invalidate_tags(['refugi_coords'])
+
+        generation = redis_cache.store[CacheService.GENERATION_CACHE_KEY]
+        assert other_worker.get('refugi_coords:document:snapshot', generation) is None
+
+    def test_invalidate_tags_without_l1_keys_keeps_generation(self, service, redis_cache, redis_connection):
+        service.set('refugi_search:region:A', ['1'], 600, tags=['refugi_search'])
+
+        service.invalidate_tags(['refugi_search'])
+
+        assert CacheService.GENERATION_CACHE_KEY not in redis_cache.store
+
+    def test_key_registered_during_invalidation_stays_indexed(self, service, redis_cache, redis_connection):
+        service.set('refugi_search:region:A', ['1'], 600, tags=['refugi_search'])
+        pipeline = redis_connection.pipeline
+        pipelines = []
+
+        def interleaved_pipeline(transaction=True):
+            pipe = pipeline(transaction)
+            pipelines.append(pipe)
+            if len(pipelines) == 2:
+                # Una altra petició desa una cerca entre la lectura del conjunt i la neteja
+                service.set('refugi_search:region:B', ['2'], 600, tags=['refugi_search'])
+            return pipe
+
+        with patch.object(redis_connection, 'pipeline', side_effect=interleaved_pipeline):
+            service.invalidate_tags(['refugi_search'])
+
+        assert redis_connection.sets['refugis:1:cache_tag:refugi_search'] == {'refugis:1:refugi_search:region:B'}
+        service.invalidate_tags(['refugi_search'])
+        assert 'refugi_search:region:B' not in redis_cache.store
+
+    def test_get_or_compute_registers_tags(self, service, redis_cache, redis_connection):
+        service.get_or_compute('proposal_list:status:all', lambda: ['p1'], 600, tags=['proposal_list'])
+
+        service.invalidate_tags(['proposal_list'])
+
+        assert 'proposal_list:status:all' not in redis_cache.store
+
+    def test_set_many_registers_all_keys(self, service, redis_cache, redis_connection):
+        service.set_many({'renovation_list:a': [1], 'renovation_list:b': [2]}, 600, tags=['renovation_list'])
+
+        assert len(redis_connection.sets['refugis:1:cache_tag:renovation_list']) == 2
+
+    def test_unknown_tag_is_noop(self, service, redis_cache, redis_connection):
+        redis_cache.store['user_detail:uid:1'] = {'uid': '1'}
+
+        assert service.invalidate_tags(['refugi_search']) is True
+        assert 'user_detail:uid:1' in redis_cache.store
+
+    def test_redis_error_returns_false(self, service, redis_cache):
+        with patch.object(CacheService, '_get_redis_connection', side_effect=Exception("Connection refused")):
+            assert service.invalidate_tags(['refugi_search']) is False
+            # El valor es guarda encara que no es pugui registrar l'etiqueta
+            assert service.set('refugi_search:x', [1], 600, tags=['refugi_search']) is True
+
+
+class TestFirestoreGetDocuments:
+    """Tests per a la lectura en bloc de documents de Firestore"""
+
+    def test_get_documents_uses_get_all(self):
+        from api.services.firestore_service import FirestoreService
+
+        existing = MagicMock(exists=True, id='a')
+        existing.to_dict.return_value = {'name': 'A'}
+        missing = MagicMock(exists=False, id='b')
+        db = MagicMock()
+        db.get_all.return_value = [existing, missing]
+
+        with patch.object(FirestoreService, 'get_db', return_value=db):
+            documents = FirestoreService().get_documents('experiences', ['a', 'b'])
+
+        assert documents == {'a': {'name': 'A', 'id': 'a'}}
+        db.get_all.assert_called_once()
+        assert len(db.get_all.call_args[0][0]) == 2
+
+    def test_get_documents_empty_ids(self):
+        from api.services.firestore_service import FirestoreService
+        assert FirestoreService().get_documents('experiences', []) == {}
+
+
+class TestFirestoreBatchWriter:
+    """Tests per a l'escriptor de batches de Firestore"""
+
+    def test_commits_in_chunks(self):
+        from api.services.firestore_service import FirestoreBatchWriter
+
+        db = MagicMock()
+        with FirestoreBatchWriter(db, max_operations=2) as writer:
+            for i in range(5):
+                writer.delete(MagicMock(name=f'ref{i}'))
+
+        assert writer.committed == 5
+        assert db.batch.call_count == 3
+        assert db.batch.return_value.commit.call_count == 3
+
+    def test_no_commit_when_empty(self):
+        from api.services.firestore_service import FirestoreBatchWriter
+
+        db = MagicMock()
+        with FirestoreBatchWriter(db) as writer:
+            pass
+
+        assert writer.committed == 0
+        db.batch.assert_not_called()
+
+    def test_no_commit_on_exception(self):
+        from api.services.firestore_service import FirestoreBatchWriter
+
+        db = MagicMock()
+        with pytest.raises(RuntimeError):
+            with FirestoreBatchWriter(db) as writer:
+                writer.update(MagicMock(), {'a': 1})
+                raise RuntimeError('boom')
+
+        db.batch.return_value.commit.assert_not_called()
@@ -88,6 +88,25 @@ class TestCacheStatsView:
         assert response.data['keys'] == 150
         mock_cache_service.get_stats.assert_called_once()
     
+    def test_cache_stats_prometheus(self, api_factory, admin_user, mock_admin_claims, mock_cache_service):
+        """Test: Mètriques en format de text de Prometheus"""
+        # Arrange
+        request = api_factory.get('/api/cache/stats/?output=prometheus')
+        force_authenticate(request, user=admin_user)
+        request.user_uid = mock_admin_claims['uid']
+        request.user_claims = mock_admin_claims  # Mock Firebase custom claims
+        
+        # Act
+        with patch('api.views.cache_views.cache_metrics') as mock_metrics:
+            mock_metrics.prometheus.return_value = 'refugis_cache_sets_total{prefix="refugi_detail"} 3\n'
+            response = cache_stats(request)
+        
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'].startswith('text/plain')
+        assert b'refugis_cache_sets_total{prefix="refugi_detail"} 3' in response.content
+        mock_cache_service.get_stats.assert_not_called()
+    
     def test_cache_stats_not_authenticated(self, api_factory):
         """Test: Accés sense autenticació"""
         # Arrange
@@ -445,6 +464,44 @@ class TestCacheInvalidateView:
         assert 'error' in response.data
         assert 'detail' in response.data
     
+    def test_cache_invalidate_tags(self, api_factory, admin_user, mock_admin_claims,
+                                   mock_cache_service):
+        """Test: Invalidació per etiquetes (sense recórrer totes les claus)"""
+        # Arrange
+        mock_cache_service.invalidate_tags.return_value = True
+        
+        request = api_factory.delete('/api/cache/invalidate/?tags=refugi_search, refugi_coords')
+        force_authenticate(request, user=admin_user)
+        request.user_uid = mock_admin_claims['uid']
+        request.user_claims = mock_admin_claims  # Mock Firebase custom claims
+        
+        # Act
+        response = cache_invalidate(request)
+        
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert 'refugi_search, refugi_coords' in response.data['message']
+        mock_cache_service.invalidate_tags.assert_called_once_with(['refugi_search', 'refugi_coords'])
+        assert not mock_cache_service.delete_pattern.called
+    
+    def test_cache_invalidate_tags_failure(self, api_factory, admin_user, mock_admin_claims,
+                                           mock_cache_service):
+        """Test: Error quan no es poden invalidar les etiquetes"""
+        # Arrange
+        mock_cache_service.invalidate_tags.return_value = False
+        
+        request = api_factory.delete('/api/cache/invalidate/?tags=refugi_search')
+        force_authenticate(request, user=admin_user)
+        request.user_uid = mock_admin_claims['uid']
+        request.user_claims = mock_admin_claims  # Mock Firebase custom claims
+        
+        # Act
+        response = cache_invalidate(request)
+        
+        # Assert
+        assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+        assert 'error' in response.data
+    
     def test_cache_invalidate_complex_pattern(self, api_factory, admin_user, mock_admin_claims,
                                              mock_cache_service):
         """Test: Patró complex amb wildcards"""
@@ -0,0 +1,150 @@
+"""
+Tests per a la comptabilitat del cost de les peticions (Server-Timing i log d'accés)
+"""
+import json
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from django.http import HttpResponse
+from django.test import RequestFactory
+from api.middleware import RequestCostMiddleware
+from api.services.cache_metrics import CacheMetrics
+from api.utils import request_cost
+from api.utils.request_cost import track_request, record, record_time, submit_with_context
+from api.utils.step_executor import DependencyStepExecutor, Step
+
+
+class FakeFirestoreClient:
+    """Client GAPIC mínim amb la forma de les respostes de Firestore"""
+
+    def batch_get_documents(self, request=None, **kwargs):
+        return iter([SimpleNamespace(found=object()), SimpleNamespace(found=None)])
+
+    def run_query(self, request=None, **kwargs):
+        return iter([SimpleNamespace(document=object()) for _ in range(3)] + [SimpleNamespace(document=None)])
+
+    def commit(self, request=None, **kwargs):
+        return SimpleNamespace(write_results=[])
+
+
+@pytest.fixture
+def client():
+    instrumented = type('InstrumentedClient', (FakeFirestoreClient,), {
+        'batch_get_documents': request_cost._timed_stream(
+            None, request_cost._has_found_document, FakeFirestoreClient.batch_get_documents
+        ),
+        'run_query': request_cost._timed_stream(
+            'firestore_queries', request_cost._has_query_document, FakeFirestoreClient.run_query
+        ),
+        'commit': request_cost._commit(FakeFirestoreClient.commit),
+    })
+    return instrumented()
+
+
+class TestRequestCost:
+    """Tests del context de la petició i de la instrumentació"""
+
+    def test_records_are_ignored_outside_a_request(self):
+        record('firestore_reads')
+        record_time('firestore', 1.0)
+        assert request_cost.current_cost() is None
+
+    def test_firestore_reads_queries_and_writes(self, client):
+        with track_request() as cost:
+            list(client.batch_get_documents(request={'documents': ['a', 'b']}))
+            list(client.run_query(request={}))
+            client.commit(request={'writes': [1, 2, 3]})
+
+        assert cost.counters == {
+            'firestore_reads': 4,
+            'firestore_queries': 1,
+            'firestore_commits': 1,
+            'firestore_writes': 3,
+        }
+        assert cost.timings['firestore'] >= 0
+
+    def test_instrumented_client_works_outside_a_request(self, client):
+        assert len(list(client.run_query(request={}))) == 4
+
+    def test_cache_metrics_are_forwarded(self):
+        metrics = CacheMetrics({'ENABLED': False})
+        with track_request() as cost:
+            with metrics.timed('refugi_detail', 'get'):
+                metrics.incr('refugi_detail', 'hits')
+            metrics.incr('refugi_detail', 'misses', 2)
+            metrics.incr('refugi_detail', 'sets')
+
+        assert cost.counters == {'cache_hits': 1, 'cache_misses': 2}
+        assert 'cache' in cost.timings
+
+    def test_r2_calls_are_counted(self):
+        with track_request() as cost:
+            request_cost._before_r2_call()
+            request_cost._after_r2_call()
+
+        assert cost.counters == {'r2_calls': 1}
+        assert 'r2' in cost.timings
+
+    def test_context_reaches_thread_pools(self):
+        with track_request() as cost:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                futures = [submit_with_context(executor, record, 'firestore_reads') for _ in range(4)]
+                [future.result() for future in futures]
+
+        assert cost.counters['firestore_reads'] == 4
+
+    def test_step_executor_propagates_context(self):
+        def step():
+            record('firestore_writes')
+            return True, None
+
+        with track_request() as cost:
+            DependencyStepExecutor([Step('a', step), Step('b', step, depends_on=('a',))]).run()
+
+        assert cost.counters['firestore_writes'] == 2
+
+    def test_server_timing_header(self):
+        with track_request() as cost:
+            record('firestore_reads', 12)
+            record('firestore_queries', 2)
+            record_time('firestore', 0.0305)
+            record('cache_hits', 3)
+            record_time('cache', 0.001)
+
+        header = cost.server_timing()
+
+        assert 'cache;desc="hits=3";dur=1.00' in header
+        assert 'firestore;desc="queries=2 reads=12";dur=30.50' in header
+        assert header.split(', ')[-1].startswith('total;dur=')
+
+
+class TestRequestCostMiddleware:
+    """Tests del middleware"""
+
+    def _view(self, request):
+        record('firestore_reads', 5)
+        record_time('firestore', 0.01)
+        return HttpResponse('ok')
+
+    def test_sets_server_timing_and_logs_cost(self):
+        middleware = RequestCostMiddleware(self._view)
+        request = RequestFactory().get('/api/refuges/')
+
+        with patch('api.middleware.request_cost_middleware.logger') as mock_logger:
+            response = middleware(request)
+
+        assert response['Server-Timing'].startswith('firestore;desc="reads=5";dur=10.00')
+        entry = json.loads(mock_logger.info.call_args[0][0])
+        assert entry['path'] == '/api/refuges/'
+        assert entry['status'] == 200
+        assert entry['cost']['firestore_reads'] == 5
+        assert entry['cost']['firestore_ms'] == 10.0
+        assert request_cost.current_cost() is None
+
+    def test_disabled(self, settings):
+        settings.REQUEST_COST = {'ENABLED': False}
+        view = MagicMock(return_value=HttpResponse('ok'))
+        response = RequestCostMiddleware(view)(RequestFactory().get('/api/health/'))
+
+        assert 'Server-Timing' not in response
@@ -0,0 +1,88 @@
+"""
+Tests per a l'executor de passos amb dependències
+"""
+import threading
+import pytest
+from api.utils.step_executor import DependencyStepExecutor, Step
+
+
+class TestDependencyStepExecutor:
+    """Tests de DependencyStepExecutor"""
+
+    def test_runs_all_steps_in_declaration_order(self):
+        steps = [Step(name, lambda: (True, None)) for name in ('a', 'b', 'c')]
+        results = DependencyStepExecutor(steps, max_workers=2).run()
+
+        assert list(results) == ['a', 'b', 'c']
+        assert all(result.success for result in results.values())
+        assert DependencyStepExecutor.first_error(results) is None
+
+    def test_independent_steps_run_concurrently(self):
+        barrier = threading.Barrier(2, timeout=2)
+
+        def wait_other():
+            barrier.wait()
+            return True, None
+
+        results = DependencyStepExecutor(
+            [Step('a', wait_other), Step('b', wait_other)], max_workers=2
+        ).run()
+
+        assert results['a'].success and results['b'].success
+
+    def test_dependency_runs_after_parent(self):
+        order = []
+
+        def record(name):
+            def fn():
+                order.append(name)
+                return True, None
+            return fn
+
+        DependencyStepExecutor([
+            Step('child', record('child'), depends_on=('parent',)),
+            Step('parent', record('parent')),
+        ]).run()
+
+        assert order == ['parent', 'child']
+
+    def test_failed_step_skips_dependents_transitively(self):
+        called = []
+
+        def ok(name):
+            def fn():
+                called.append(name)
+                return True, None
+            return fn
+
+        results = DependencyStepExecutor([
+            Step('root', lambda: (False, 'Error root')),
+            Step('child', ok('child'), depends_on=('root',)),
+            Step('grandchild', ok('grandchild'), depends_on=('child',)),
+            Step('other', ok('other')),
+        ]).run()
+
+        assert called == ['other']
+        assert results['child'].skipped and results['grandchild'].skipped
+        assert DependencyStepExecutor.first_error(results).error == 'Error root'
+        assert set(DependencyStepExecutor.timings(results)) == {'root', 'other'}
+
+    def test_exception_is_reported_as_failure(self):
+        def boom():
+            raise RuntimeError('boom')
+
+        results = DependencyStepExecutor([Step('a', boom)]).run()
+
+        assert results['a'].success is False
+        assert results['a'].error == 'Error intern: boom'
+
+    def test_unknown_dependency_raises(self):
+        with pytest.raises(ValueError):
+            DependencyStepExecutor([Step('a', lambda: (True, None), depends_on=('missing',))])
+
+    def test_cycle_raises(self):
+        with pytest.raises(ValueError):
+            DependencyStepExecutor([
+                Step('a', lambda: (True, None), depends_on=('b',)),
+                Step('b', lambda: (True, None), depends_on=('a',)),
+            ])
@@ -0,0 +1,120 @@
+"""
+Tests per a la cache de tokens d'ID verificats
+"""
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+from firebase_admin import auth
+from api.services.token_cache_service import VerifiedTokenCache, CertificatePrefetcher, TokenCacheService
+
+
+class TestVerifiedTokenCache:
+    """Tests de VerifiedTokenCache"""
+
+    def test_reuses_verified_claims_until_exp(self):
+        cache = VerifiedTokenCache()
+        verify = MagicMock(return_value={'uid': 'u1', 'exp': time.time() + 600})
+
+        first = cache.get_or_verify('token', verify)
+        second = cache.get_or_verify('token', verify)
+
+        assert first == second
+        verify.assert_called_once_with('token')
+        assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+        assert cache.stats()['hit_rate'] == 0.5
+
+    def test_expired_entry_is_verified_again(self):
+        cache = VerifiedTokenCache()
+        exp = time.time() + 600
+        verify = MagicMock(return_value={'uid': 'u1', 'exp': exp})
+        cache.get_or_verify('token', verify)
+
+        with patch('api.services.token_cache_service.time.time', return_value=exp):
+            cache.get_or_verify('token', verify)
+
+        assert verify.call_count == 2
+
+    def test_ttl_is_capped(self):
+        cache = VerifiedTokenCache(max_ttl=10)
+        cache.set('token', {'uid': 'u1', 'exp': time.time() + 3600})
+
+        with patch('api.services.token_cache_service.time.time', return_value=time.time() + 11):
+            assert cache.get('token') is None
+
+    def test_errors_and_tokens_without_exp_are_not_cached(self):
+        cache = VerifiedTokenCache()
+        failing = MagicMock(side_effect=auth.InvalidIdTokenError('Invalid token'))
+        with pytest.raises(auth.InvalidIdTokenError):
+            cache.get_or_verify('bad', failing)
+        with pytest.raises(auth.InvalidIdTokenError):
+            cache.get_or_verify('bad', failing)
+        assert failing.call_count == 2
+
+        cache.get_or_verify('no_exp', MagicMock(return_value={'uid': 'u1'}))
+        assert cache.stats()['entries'] == 0
+
+    def test_evicts_least_recently_used(self):
+        cache = VerifiedTokenCache(max_entries=2)
+        exp = time.time() + 600
+        for token in ['a', 'b']:
+            cache.set(token, {'uid': token, 'exp': exp})
+        cache.get('a')
+        cache.set('c', {'uid': 'c', 'exp': exp})
+
+        assert cache.get('b') is None
+        assert cache.get('a') is not None and cache.get('c') is not None
+
+    def test_token_is_not_stored_in_clear(self):
+        cache = VerifiedTokenCache()
+        cache.set('secret_token', {'uid': 'u1', 'exp': time.time() + 600})
+        assert 'secret_token' not in cache._entries
+
+    def test_returns_copies(self):
+        cache = VerifiedTokenCache()
+        cache.set('token', {'uid': 'u1', 'exp': time.time() + 600})
+        cache.get('token')['uid'] = 'changed'
+        assert cache.get('token')['uid'] == 'u1'
+
+
+class TestCertificatePrefetcher:
+    """Tests de CertificatePrefetcher"""
+
+    def test_refresh_uses_firebase_verifier_session(self):
+        prefetcher = CertificatePrefetcher()
+        request = MagicMock(return_value=MagicMock(status=200))
+        client = MagicMock()
+        client._token_verifier.request = request
+
+        with patch('firebase_admin.auth._get_client', return_value=client):
+            assert prefetcher.refresh() is True
+
+        assert 'securetoken' in request.call_args.kwargs['url']
+        assert prefetcher.stats()['refreshes'] == 1
+
+    def test_refresh_failure_is_counted(self):
+        prefetcher = CertificatePrefetcher()
+        with patch('firebase_admin.auth._get_client', side_effect=ValueError('no app')):
+            assert prefetcher.refresh() is False
+        assert prefetcher.stats()['failures'] == 1
+
+    def test_starts_once_per_process(self):
+        prefetcher = CertificatePrefetcher(interval=3600)
+        with patch.object(prefetcher, 'refresh', return_value=True), \
+                patch('api.services.token_cache_service.threading.Thread') as mock_thread:
+            prefetcher.ensure_started()
+            prefetcher.ensure_started()
+        mock_thread.assert_called_once()
+        prefetcher.stop()
+
+
+class TestTokenCacheService:
+    """Tests de TokenCacheService"""
+
+    def test_disabled_always_verifies(self):
+        service = TokenCacheService()
+        verify = MagicMock(return_value={'uid': 'u1', 'exp': time.time() + 600})
+        with patch.object(service, 'enabled', False):
+            service.verify_id_token('token', verify)
+            service.verify_id_token('token', verify)
+        assert verify.call_count == 2
+        assert service.prefetcher is None  # Desactivat als tests
@@ -584,35 +584,31 @@ class TestUserDAO:
     @patch('api.daos.user_dao.cache_service')
     def test_get_refugis_info_with_ids_provided(self, mock_cache, mock_firestore_service):
         """Test obtenció d'info de refugis amb IDs proporcionats"""
-        mock_cache.get.side_effect = [None, None]  # Cache miss per result i refugi
+        mock_cache.get.return_value = None  # Cache miss pel resultat
         mock_cache.get_timeout.return_value = 300
+        # El cache_service llegeix de Firestore en bloc els detalls que falten
+        mock_cache.get_or_fetch_many.side_effect = lambda **kwargs: list(kwargs['fetch_many_fn'](kwargs['ids']).values())
         
-        mock_db = MagicMock()
         mock_firestore_instance = mock_firestore_service.return_value
-        mock_firestore_instance.get_db.return_value = mock_db
-        
-        mock_doc_snapshot = MagicMock()
-        mock_doc_snapshot.exists = True
-        mock_doc_snapshot.to_dict.return_value = {
-            'name': 'Test Refugi',
-            'region': 'Pirineus',
-            'places': 20,
-            'coord': {'lat': 42.0, 'long': 1.0}
+        mock_firestore_instance.get_documents.return_value = {
+            'refugi_123': {
+                'id': 'refugi_123',
+                'name': 'Test Refugi',
+                'region': 'Pirineus',
+                'places': 20,
+                'coord': {'lat': 42.0, 'long': 1.0}
+            }
         }
         
-        mock_doc_ref = MagicMock()
-        mock_doc_ref.get.return_value = mock_doc_snapshot
-        
-        mock_collection = MagicMock()
-        mock_collection.document.return_value = mock_doc_ref
-        mock_db.collection.return_value = mock_collection
-        
         dao = UserDAO()
         result = dao.get_refugis_info('test_uid', 'favourite_refuges', ['refugi_123'])
         
         assert len(result) == 1
         # The refugi_mapper transformation might not preserve the id, so just check it's a dict
         assert isinstance(result[0], dict)
+        assert result[0]['id'] == 'refugi_123'
+        mock_firestore_instance.get_documents.assert_called_once_with('data_refugis_lliures', ['refugi_123'])
+        assert mock_cache.get_or_fetch_many.call_args.kwargs['id_param_name'] == 'refugi_id'
     
     @patch('api.daos.user_dao.UserDAO.get_user_by_uid')
     @patch('api.daos.user_dao.cache_service')
@@ -747,6 +743,41 @@ class TestUserDAO:
         
         assert result is False
 
+class TestUserDAOBatch:
+    """Tests per a les escriptures en bloc de UserDAO"""
+    
+    @patch('api.daos.user_dao.FirestoreService')
+    @patch('api.daos.user_dao.cache_service')
+    def test_add_refugis_to_visited_batch(self, mock_cache, mock_firestore_service):
+        """Test afegir refugis visitats a diversos usuaris amb un sol WriteBatch"""
+        mock_firestore = mock_firestore_service.return_value
+        mock_db = mock_firestore.get_db.return_value
+        mock_firestore.get_documents.return_value = {'u1': {'id': 'u1'}}
+        mock_batch = mock_db.batch.return_value
+        
+        dao = UserDAO()
+        updated = dao.add_refugis_to_visited({'u1': ['r1', 'r2'], 'ghost': ['r1']})
+        
+        assert updated == ['u1']
+        mock_batch.update.assert_called_once()
+        assert mock_batch.update.call_args[0][1]['visited_refuges'].values == ['r1', 'r2']
+        mock_batch.commit.assert_called_once()
+        # user_detail + user_refugis_info de l'únic usuari actualitzat
+        assert len(mock_cache.delete_many.call_args[0][0]) == 2
+    
+    @patch('api.daos.user_dao.FirestoreService')
+    @patch('api.daos.user_dao.cache_service')
+    def test_add_refugis_to_visited_error(self, mock_cache, mock_firestore_service):
+        """Test error al commit del WriteBatch"""
+        mock_firestore = mock_firestore_service.return_value
+        mock_firestore.get_documents.return_value = {'u1': {'id': 'u1'}}
+        mock_firestore.get_db.return_value.batch.return_value.commit.side_effect = Exception("Commit Error")
+        
+        dao = UserDAO()
+        assert dao.add_refugis_to_visited({}) == []
+        assert dao.add_refugis_to_visited({'u1': ['r1']}) == []
+
+
 class TestUserDAOExtended:
     """Tests per a UserDAO cobrint casos d'error i mètodes restants"""
 
@@ -1196,18 +1227,13 @@ class TestUserDAOExtended:
     def test_get_refugis_info_success(self, mock_cache, mock_firestore_class):
         """Test get_refugis_info èxit"""
         mock_cache.get.return_value = None
-        mock_db = MagicMock()
-        mock_firestore_class.return_value.get_db.return_value = mock_db
+        mock_cache.get_or_fetch_many.side_effect = lambda **kwargs: list(kwargs['fetch_many_fn'](kwargs['ids']).values())
+        mock_firestore_class.return_value.get_documents.return_value = {'r1': {'id': 'r1', 'name': 'Refugi 1'}}
         
         dao = UserDAO()
         mock_user = MagicMock(spec=User)
         mock_user.favourite_refuges = ["r1"]
         
-        mock_doc = MagicMock()
-        mock_doc.exists = True
-        mock_doc.to_dict.return_value = {'name': 'Refugi 1'}
-        mock_db.collection.return_value.document.return_value.get.return_value = mock_doc
-        
         with patch.object(dao, 'get_user_by_uid', return_value=mock_user):
             res = dao.get_refugis_info("u1", "favourite_refuges")
             assert len(res) == 1
@@ -1383,22 +1409,20 @@ class TestUserDAOExtended:
     @patch('api.daos.user_dao.cache_service')
     def test_get_refugis_info_no_cache(self, mock_cache, mock_firestore_class):
         """Test get_refugis_info quan el refugi no està a cache"""
-        mock_cache.get.side_effect = [None, None, None] # user_refugis_info, user_detail (in get_user_by_uid), refugi_detail
-        mock_db = MagicMock()
-        mock_firestore_class.return_value.get_db.return_value = mock_db
+        mock_cache.get.return_value = None # user_refugis_info
+        mock_cache.get_or_fetch_many.side_effect = lambda **kwargs: list(kwargs['fetch_many_fn'](kwargs['ids']).values())
+        mock_firestore_class.return_value.get_documents.return_value = {'r1': {'id': 'r1', 'name': 'Refugi 1'}}
         
         dao = UserDAO()
         mock_user = MagicMock(spec=User)
         mock_user.favourite_refuges = ["r1"]
         
-        mock_doc = MagicMock()
-        mock_doc.exists = True
-        mock_doc.to_dict.return_value = {'name': 'Refugi 1'}
-        mock_db.collection.return_value.document.return_value.get.return_value = mock_doc
-        
         with patch.object(dao, 'get_user_by_uid', return_value=mock_user):
             res = dao.get_refugis_info("u1", "favourite_refuges")
             assert len(res) == 1
             assert res[0]['name'] == 'Refugi 1'
-            assert mock_cache.set.call_count >= 2 # refugi_detail and user_refugis_info
+            # Els detalls es llegeixen i es guarden en bloc al cache_service
+            mock_cache.get_or_fetch_many.assert_called_once()
+            assert mock_cache.get_or_fetch_many.call_args.kwargs['detail_key_prefix'] == 'refugi_detail'
+            assert mock_cache.set.call_count >= 1 # user_refugis_info
 
@@ -3,6 +3,9 @@ from .views.health_check_views import HealthCheckAPIView
 from .views.refugi_lliure_views import (
     RefugiLliureDetailAPIView,
     RefugiLliureCollectionAPIView,
+    RefugiLliureChangesAPIView,
+    RefugiLliureClustersAPIView,
+    RefugiLliureAutocompleteAPIView,
     RefugeRenovationsAPIView
 )
 from .views.refugi_media_views import (
@@ -53,6 +56,9 @@ urlpatterns = [
     
     # Refugis endpoints 
     path('refuges/', RefugiLliureCollectionAPIView.as_view(), name='refugi_lliure_collection'),
+    path('refuges/changes/', RefugiLliureChangesAPIView.as_view(), name='refugi_lliure_changes'),  # GET /refuges/changes/?since={version}
+    path('refuges/clusters/', RefugiLliureClustersAPIView.as_view(), name='refugi_lliure_clusters'),  # GET /refuges/clusters/?zoom={zoom}&bbox={bbox}
+    path('refuges/autocomplete/', RefugiLliureAutocompleteAPIView.as_view(), name='refugi_lliure_autocomplete'),  # GET /refuges/autocomplete/?q={text}
     path('refuges/<str:id>/', RefugiLliureDetailAPIView.as_view(), name='refugi_lliure_detail'),
     path('refuges/<str:id>/renovations/', RefugeRenovationsAPIView.as_view(), name='refuge_renovations'),  # GET /refuges/{id}/renovations/
     
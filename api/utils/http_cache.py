@@ -0,0 +1,40 @@
+"""
+Utilitats per a les peticions condicionals (ETag / If-None-Match -> 304 Not Modified)
+"""
+import json
+import hashlib
+from typing import Any, Optional
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+
+def content_etag(data: Any, *parts: str) -> str:
+    """
+    ETag forta derivada del contingut (JSON canònic) i de parts addicionals opcionals
+    (per exemple, la variant de la resposta segons l'autenticació)
+    """
+    payload = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str, ensure_ascii=False)
+    digest = hashlib.blake2b(payload.encode('utf-8'), digest_size=12).hexdigest()
+    return '"' + '-'.join([*parts, digest]) + '"'
+
+
+def etag_matches(request, etag: Optional[str]) -> bool:
+    """Indica si l'ETag coincideix amb alguna de les de la capçalera If-None-Match"""
+    if not etag:
+        return False
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    # Comparació feble (RFC 9110): W/"x" i "x" són equivalents per a If-None-Match
+    return '*' in etags or etag.removeprefix('W/') in {tag.removeprefix('W/') for tag in etags}
+
+
+def not_modified(etag: str, vary: Optional[str] = None) -> HttpResponseNotModified:
+    """Resposta 304 amb les mateixes capçaleres de validació que tindria la 200"""
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    if vary:
+        patch_vary_headers(response, [vary])
+    return response
@@ -0,0 +1,256 @@
+"""
+Comptabilitat del cost de cada petició: lectures, queries i escriptures de Firestore,
+crides a R2, hits i misses de cache, i el temps de paret dedicat a cadascun.
+
+El RequestCostMiddleware obre un RequestCost per petició (en una ContextVar) i l'emet com a
+capçalera Server-Timing i com a línia de log estructurada. Les crides es compten a nivell de
+les RPC del client de Firestore i dels events de boto3, de manera que els DAOs no s'han de
+modificar. Fora d'una petició (commands, crons) els registres no fan res.
+
+Els threads dels ThreadPoolExecutor no hereten les ContextVars: per comptar el que s'hi
+executa, s'ha d'enviar la funció amb contextvars.copy_context().run (veure submit_with_context).
+"""
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# Cost de la petició en curs (None fora d'una petició)
+_current: contextvars.ContextVar[Optional['RequestCost']] = contextvars.ContextVar('request_cost', default=None)
+
+
+class RequestCost:
+    """
+    Comptadors i temps acumulats d'una petició (thread-safe: s'hi pot escriure des d'un pool).
+    Els comptadors es nomenen "<categoria>_<mètrica>" (firestore_reads, cache_hits, r2_calls...)
+    i els temps per categoria (firestore, cache, r2).
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.counters: Dict[str, int] = {}
+        self.timings: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def add_time(self, category: str, seconds: float) -> None:
+        with self._lock:
+            self.timings[category] = self.timings.get(category, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Resum per al log d'accés (temps en mil·lisegons)"""
+        return {
+            **dict(sorted(self.counters.items())),
+            **{f"{category}_ms": round(seconds * 1000, 2) for category, seconds in sorted(self.timings.items())},
+            'total_ms': round(self.elapsed() * 1000, 2),
+        }
+
+    def server_timing(self) -> str:
+        """Valor de la capçalera Server-Timing"""
+        metrics = []
+        for category, seconds in sorted(self.timings.items()):
+            description = self._describe(category)
+            metrics.append(f'{category};desc="{description}";dur={seconds * 1000:.2f}')
+        metrics.append(f'total;dur={self.elapsed() * 1000:.2f}')
+        return ', '.join(metrics)
+
+    def _describe(self, category: str) -> str:
+        prefix = f"{category}_"
+        parts = [
+            f"{counter[len(prefix):]}={value}"
+            for counter, value in sorted(self.counters.items()) if counter.startswith(prefix)
+        ]
+        return ' '.join(parts) or category
+
+
+@contextmanager
+def track_request() -> Iterator[RequestCost]:
+    """Obre un RequestCost per al bloc (el fa servir el middleware)"""
+    cost = RequestCost()
+    token = _current.set(cost)
+    try:
+        yield cost
+    finally:
+        _current.reset(token)
+
+
+def current_cost() -> Optional[RequestCost]:
+    return _current.get()
+
+
+def record(counter: str, amount: int = 1) -> None:
+    """Suma amount al comptador de la petició en curs (no fa res fora d'una petició)"""
+    cost = _current.get()
+    if cost is not None and amount:
+        cost.add(counter, amount)
+
+
+def record_time(category: str, seconds: float) -> None:
+    cost = _current.get()
+    if cost is not None:
+        cost.add_time(category, seconds)
+
+
+def submit_with_context(executor, fn: Callable, *args, **kwargs):
+    """executor.submit que propaga el RequestCost (i la resta de ContextVars) al thread"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+# ----------------------------------------------------------------------
+# Instrumentació de Firestore (RPCs del client GAPIC)
+# ----------------------------------------------------------------------
+
+def _get_request_field(request, name: str, default=None):
+    if request is None:
+        return default
+    if isinstance(request, dict):
+        return request.get(name, default)
+    return getattr(request, name, default)
+
+
+def _timed_call(counter: Optional[str], method: Callable) -> Callable:
+    """RPC unària: compta la crida i el temps"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if _current.get() is None:
+            return method(self, *args, **kwargs)
+        started_at = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            record_time('firestore', time.perf_counter() - started_at)
+            if counter:
+                record(counter)
+    return wrapper
+
+
+def _timed_stream(call_counter: Optional[str], has_document: Callable[[Any], bool], method: Callable) -> Callable:
+    """RPC de streaming: compta els documents rebuts i el temps fins a consumir el stream"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if _current.get() is None:
+            return method(self, *args, **kwargs)
+        started_at = time.perf_counter()
+        if call_counter:
+            record(call_counter)
+        try:
+            stream = method(self, *args, **kwargs)
+        finally:
+            record_time('firestore', time.perf_counter() - started_at)
+        return _CountingStream(stream, has_document)
+    return wrapper
+
+
+class _CountingStream:
+    """Iterador que compta documents llegits i el temps d'espera de cada resposta"""
+
+    def __init__(self, stream, has_document: Callable[[Any], bool]):
+        self._stream = stream
+        self._has_document = has_document
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started_at = time.perf_counter()
+        try:
+            response = next(self._stream)
+        finally:
+            record_time('firestore', time.perf_counter() - started_at)
+        if self._has_document(response):
+            record('firestore_reads')
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _commit(method: Callable) -> Callable:
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if _current.get() is None:
+            return method(self, *args, **kwargs)
+        writes = _get_request_field(kwargs.get('request', args[0] if args else None), 'writes', []) or []
+        record('firestore_commits')
+        record('firestore_writes', len(writes))
+        started_at = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            record_time('firestore', time.perf_counter() - started_at)
+    return wrapper
+
+
+def _has_found_document(response) -> bool:
+    return bool(_get_request_field(response, 'found'))
+
+
+def _has_query_document(response) -> bool:
+    return bool(_get_request_field(response, 'document'))
+
+
+_firestore_installed = False
+_install_lock = threading.Lock()
+
+
+def install_firestore_instrumentation() -> bool:
+    """
+    Instrumenta el client GAPIC de Firestore (una sola vegada per procés).
+    Retorna False si la llibreria no està disponible.
+    """
+    global _firestore_installed
+    with _install_lock:
+        if _firestore_installed:
+            return True
+        try:
+            from google.cloud.firestore_v1.services.firestore.client import FirestoreClient
+        except ImportError:
+            return False
+
+        FirestoreClient.batch_get_documents = _timed_stream(
+            None, _has_found_document, FirestoreClient.batch_get_documents
+        )
+        FirestoreClient.run_query = _timed_stream(
+            'firestore_queries', _has_query_document, FirestoreClient.run_query
+        )
+        FirestoreClient.run_aggregation_query = _timed_stream(
+            'firestore_queries', lambda response: False, FirestoreClient.run_aggregation_query
+        )
+        FirestoreClient.list_documents = _timed_call('firestore_queries', FirestoreClient.list_documents)
+        FirestoreClient.commit = _commit(FirestoreClient.commit)
+        _firestore_installed = True
+        return True
+
+
+# ----------------------------------------------------------------------
+# Instrumentació de R2 (events de boto3)
+# ----------------------------------------------------------------------
+
+_r2_started = threading.local()
+
+
+def _before_r2_call(**kwargs) -> None:
+    _r2_started.at = time.perf_counter()
+
+
+def _after_r2_call(**kwargs) -> None:
+    started_at = getattr(_r2_started, 'at', None)
+    if started_at is None:
+        return
+    _r2_started.at = None
+    record('r2_calls')
+    record_time('r2', time.perf_counter() - started_at)
+
+
+def instrument_r2_client(client) -> None:
+    """Compta les crides a l'API de R2 fetes amb el client (les URLs signades no en fan cap)"""
+    client.meta.events.register('before-call.s3', _before_r2_call)
+    client.meta.events.register('after-call.s3', _after_r2_call)
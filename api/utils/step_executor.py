@@ -0,0 +1,127 @@
+"""
+Executor de passos amb dependències sobre un pool de threads
+
+Cada pas és una funció que retorna (èxit, missatge d'error). Els passos sense
+dependències pendents s'executen en paral·lel; si un pas falla, els passos que
+en depenen (directament o indirectament) no s'executen.
+"""
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from .request_cost import submit_with_context
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Step:
+    """Pas executable amb els noms dels passos dels quals depèn"""
+    name: str
+    fn: Callable[[], Tuple[bool, Optional[str]]]
+    depends_on: Tuple[str, ...] = ()
+
+
+@dataclass
+class StepResult:
+    """Resultat d'un pas: èxit, error, durada en segons i si s'ha omès per una dependència fallida"""
+    name: str
+    success: bool
+    error: Optional[str] = None
+    duration: float = 0.0
+    skipped: bool = False
+
+
+class DependencyStepExecutor:
+    """Executa una llista de passos respectant les dependències entre ells"""
+
+    def __init__(self, steps: List[Step], max_workers: int = 4):
+        names = [step.name for step in steps]
+        if len(set(names)) != len(names):
+            raise ValueError("Els noms dels passos han de ser únics")
+        for step in steps:
+            unknown = [dependency for dependency in step.depends_on if dependency not in names]
+            if unknown:
+                raise ValueError(f"El pas {step.name} depèn de passos inexistents: {unknown}")
+        self.steps = steps
+        self.max_workers = max(1, max_workers)
+        self._check_acyclic()
+
+    def run(self) -> Dict[str, StepResult]:
+        """
+        Executa tots els passos
+
+        Returns:
+            Diccionari nom del pas -> StepResult, en l'ordre de declaració dels passos
+        """
+        results: Dict[str, StepResult] = {}
+        pending = {step.name: step for step in self.steps}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            running = {}
+            while pending or running:
+                self._skip_blocked(pending, results)
+                for name in [name for name, step in pending.items() if self._is_ready(step, results)]:
+                    running[submit_with_context(executor, self._run_step, pending.pop(name))] = name
+
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    results[result.name] = result
+                    del running[future]
+
+        return {step.name: results[step.name] for step in self.steps}
+
+    @staticmethod
+    def first_error(results: Dict[str, StepResult]) -> Optional[StepResult]:
+        """Retorna el primer pas fallit (no omès) en ordre de declaració"""
+        for result in results.values():
+            if not result.success and not result.skipped:
+                return result
+        return None
+
+    @staticmethod
+    def timings(results: Dict[str, StepResult]) -> Dict[str, float]:
+        """Retorna la durada de cada pas executat en segons"""
+        return {name: result.duration for name, result in results.items() if not result.skipped}
+
+    @staticmethod
+    def _run_step(step: Step) -> StepResult:
+        started_at = time.perf_counter()
+        try:
+            success, error = step.fn()
+        except Exception as e:
+            logger.error(f"Error executant el pas {step.name}: {str(e)}")
+            success, error = False, f"Error intern: {str(e)}"
+        duration = round(time.perf_counter() - started_at, 3)
+        return StepResult(name=step.name, success=bool(success), error=error, duration=duration)
+
+    @staticmethod
+    def _is_ready(step: Step, results: Dict[str, StepResult]) -> bool:
+        return all(dependency in results and results[dependency].success for dependency in step.depends_on)
+
+    @staticmethod
+    def _skip_blocked(pending: Dict[str, Step], results: Dict[str, StepResult]) -> None:
+        """Omet els passos amb alguna dependència fallida o omesa (propagació transitiva)"""
+        changed = True
+        while changed:
+            changed = False
+            for name, step in list(pending.items()):
+                if any(dependency in results and not results[dependency].success for dependency in step.depends_on):
+                    results[name] = StepResult(name=name, success=False, error="Dependència fallida", skipped=True)
+                    del pending[name]
+                    changed = True
+
+    def _check_acyclic(self) -> None:
+        resolved = set()
+        remaining = {step.name: set(step.depends_on) for step in self.steps}
+        while remaining:
+            ready = [name for name, dependencies in remaining.items() if dependencies <= resolved]
+            if not ready:
+                raise ValueError(f"Dependències cícliques entre els passos: {sorted(remaining)}")
+            for name in ready:
+                resolved.add(name)
+                del remaining[name]
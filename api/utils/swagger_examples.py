@@ -353,6 +353,67 @@ EXAMPLE_REFUGI_SEARCH_RESPONSE = {
     ]
 }
 
+EXAMPLE_REFUGI_CHANGES_RESPONSE = {
+    'version': 128,
+    'full': False,
+    'added': [
+        {
+            'id': 'nou_refugi_id',
+            'name': 'Cabana del Pla',
+            'coord': {'lat': 42.6124, 'long': 1.0432},
+            'geohash': 'sp9hv'
+        }
+    ],
+    'updated': [
+        {
+            'id': '9d2a0b3f5c1e4a7b',
+            'name': 'Refugi dels Colomers',
+            'surname': 'Cabana',
+            'coord': {'lat': 42.6318, 'long': 0.9237},
+            'geohash': 'sp9hu'
+        }
+    ],
+    'deleted': ['refugi_eliminat_id']
+}
+
+EXAMPLE_REFUGI_CLUSTERS_RESPONSE = {
+    'zoom': 9,
+    'version': 128,
+    'count': 2,
+    'clusters': [
+        {
+            'count': 14,
+            'coord': {'lat': 42.628114, 'long': 0.951206}
+        },
+        {
+            'id': '9d2a0b3f5c1e4a7b',
+            'name': 'Refugi dels Colomers',
+            'count': 1,
+            'coord': {'lat': 42.6318, 'long': 0.9237}
+        }
+    ]
+}
+
+EXAMPLE_REFUGI_AUTOCOMPLETE_RESPONSE = {
+    'query': 'colom',
+    'count': 2,
+    'results': [
+        {
+            'id': '9d2a0b3f5c1e4a7b',
+            'name': 'Refugi dels Colomers',
+            'surname': 'Cabana',
+            'coord': {'lat': 42.6318, 'long': 0.9237},
+            'match': 'words'
+        },
+        {
+            'id': '3f8c1a9e2b7d4c60',
+            'name': 'Cabana de Colomina',
+            'coord': {'lat': 42.5219, 'long': 0.9984},
+            'match': 'words'
+        }
+    ]
+}
+
 EXAMPLE_RENOVATIONS_LIST = [
     EXAMPLE_RENOVATION_1,
     EXAMPLE_RENOVATION_2
@@ -363,7 +424,32 @@ EXAMPLE_CACHE_STATS = {
     'keys': 145,
     'memory_used': '2.5 MB',
     'hits': 2340,
-    'misses': 156
+    'misses': 156,
+    'prefixes': {
+        'refugi_detail': {
+            'hits': 1210,
+            'l1_hits': 3480,
+            'misses': 64,
+            'sets': 70,
+            'deletes': 6,
+            'errors': 0,
+            'bytes_read': 1043200,
+            'bytes_written': 61800,
+            'hit_rate': 0.9865,
+            'latency': {
+                'get': {'count': 1274, 'avg_ms': 0.84, 'buckets': {'0.0005': 410, '0.001': 1050, '0.0025': 1260, '+Inf': 1274}}
+            }
+        }
+    },
+    'auth_tokens': {
+        'enabled': True,
+        'entries': 42,
+        'max_entries': 10000,
+        'hits': 1830,
+        'misses': 57,
+        'hit_rate': 0.9698,
+        'cert_prefetch': {'running': True, 'refreshes': 12, 'failures': 0}
+    }
 }
 
 EXAMPLE_CACHE_CLEAR_RESPONSE = {
@@ -2,12 +2,15 @@
 Views per gestionar la cache
 """
 import logging
+from django.http import HttpResponse
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from ..services.cache_service import cache_service
+from ..services.cache_metrics import cache_metrics
+from ..services.token_cache_service import token_cache_service
 from ..permissions import IsFirebaseAdmin
 from ..utils.swagger_examples import (
     EXAMPLE_CACHE_STATS,
@@ -26,7 +29,15 @@ logger = logging.getLogger(__name__)
 @swagger_auto_schema(
     method='get',
     tags=['Cache Admin'],
-    operation_description="Obté estadístiques de la cache Redis. Requereix ser administrador",
+    operation_description=(
+        "Obté estadístiques de la cache Redis i mètriques per prefix de clau agregades entre workers. "
+        "Amb output=prometheus retorna les mètriques en format de text de Prometheus. Requereix ser administrador"
+    ),
+    manual_parameters=[
+        openapi.Parameter('output', openapi.IN_QUERY,
+                         description="'prometheus' per obtenir l'exposició en text de Prometheus",
+                         type=openapi.TYPE_STRING, required=False)
+    ],
     responses={
         200: openapi.Response(
             description='Estadístiques de cache',
@@ -38,6 +49,14 @@ logger = logging.getLogger(__name__)
                     'memory_used': openapi.Schema(type=openapi.TYPE_STRING),
                     'hits': openapi.Schema(type=openapi.TYPE_INTEGER),
                     'misses': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'prefixes': openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        description='Per prefix: hits, l1_hits, misses, hit_rate, sets, deletes, errors, bytes i latència'
+                    ),
+                    'auth_tokens': openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        description='Cache de tokens verificats: entries, hits, misses, hit_rate i cert_prefetch'
+                    ),
                 }
             ),
             examples={
@@ -53,7 +72,14 @@ logger = logging.getLogger(__name__)
 def cache_stats(request):
     """Obté estadístiques de la cache"""
     try:
+        if request.query_params.get('output') == 'prometheus':
+            return HttpResponse(
+                cache_metrics.prometheus(),
+                content_type='text/plain; version=0.0.4; charset=utf-8'
+            )
+        
         stats = cache_service.get_stats()
+        stats['auth_tokens'] = token_cache_service.get_stats()
         return Response(stats, status=status.HTTP_200_OK)
     except Exception as e:
         logger.error(f"Error getting cache stats: {str(e)}")
@@ -104,11 +130,17 @@ def cache_clear(request):
 @swagger_auto_schema(
     method='delete',
     tags=['Cache Admin'],
-    operation_description="Elimina claus de cache que coincideixin amb un patró. Requereix ser administrador",
+    operation_description=(
+        "Elimina les claus de cache registrades amb les etiquetes indicades o, si no se'n indiquen, "
+        "les que coincideixin amb un patró (recorre totes les claus de Redis). Requereix ser administrador"
+    ),
     manual_parameters=[
+        openapi.Parameter('tags', openapi.IN_QUERY,
+                         description="Etiquetes a invalidar separades per comes (ex: 'refugi_search,refugi_coords')",
+                         type=openapi.TYPE_STRING, required=False),
         openapi.Parameter('pattern', openapi.IN_QUERY, 
                          description="Patró de claus a eliminar (ex: 'refugi_*')", 
-                         type=openapi.TYPE_STRING, required=True)
+                         type=openapi.TYPE_STRING, required=False)
     ],
     responses={
         200: openapi.Response(
@@ -117,7 +149,7 @@ def cache_clear(request):
                 'application/json': EXAMPLE_CACHE_INVALIDATE_RESPONSE
             }
         ),
-        400: 'Patró no proporcionat',
+        400: 'Etiquetes o patró no proporcionats',
         401: ERROR_401_UNAUTHORIZED,
         403: ERROR_403_FORBIDDEN,
         500: ERROR_500_INTERNAL_ERROR
@@ -126,8 +158,18 @@ def cache_clear(request):
 @api_view(['DELETE'])
 @permission_classes([IsFirebaseAdmin])
 def cache_invalidate(request):
-    """Elimina claus que coincideixin amb un patró"""
+    """Elimina claus per etiquetes o que coincideixin amb un patró"""
     try:
+        tags = [tag.strip() for tag in request.query_params.get('tags', '').split(',') if tag.strip()]
+        if tags:
+            if cache_service.invalidate_tags(tags):
+                return Response({
+                    'message': f'Claus amb etiquetes {", ".join(tags)} eliminades correctament'
+                }, status=status.HTTP_200_OK)
+            return Response({
+                'error': 'Error eliminant claus'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
         pattern = request.query_params.get('pattern')
         if not pattern:
             return Response({
@@ -2,6 +2,7 @@
 Views per a la gestió de refugis amb endpoints REST estàndard
 """
 import logging
+from django.utils.cache import patch_vary_headers
 from rest_framework import status
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
@@ -13,14 +14,21 @@ from ..controllers.renovation_controller import RenovationController
 from ..serializers.refugi_lliure_serializer import (
     RefugiSerializer, 
     RefugiSearchResponseSerializer,
-    RefugiSearchFiltersSerializer
+    RefugiSearchFiltersSerializer,
+    RefugiChangesQuerySerializer,
+    RefugiClustersQuerySerializer,
+    RefugiAutocompleteQuerySerializer
 )
 from ..serializers.renovation_serializer import RenovationSerializer
 from ..utils.swagger_examples import (
     EXAMPLE_REFUGI_SEARCH_RESPONSE,
+    EXAMPLE_REFUGI_CHANGES_RESPONSE,
+    EXAMPLE_REFUGI_CLUSTERS_RESPONSE,
+    EXAMPLE_REFUGI_AUTOCOMPLETE_RESPONSE,
     EXAMPLE_REFUGI_COLOMERS_DETAILED,
     EXAMPLE_RENOVATIONS_LIST,
 )
+from ..utils.http_cache import etag_matches, not_modified
 from ..utils.swagger_error_responses import (
     ERROR_400_INVALID_PARAMS,
     ERROR_401_UNAUTHORIZED,
@@ -51,6 +59,8 @@ class RefugiLliureCollectionAPIView(APIView):
             "\n- Quan no s'especifiquen filtres, retorna totes les coordenades dels refugis. "
             "\n- Quan s'utilitzen filtres, retorna els refugis que compleixen els criteris especificats. "
             "\n- Els filtres 'type' i 'condition' accepten múltiples valors separats per comes."
+            "\n- Els filtres 'bbox' i 'near' + 'radius_km' limiten la cerca a una àrea i es poden combinar amb la resta; els resultats s'ordenen per distància."
+            "\n- Sense filtres, la resposta inclou una capçalera ETag: si s'envia a If-None-Match i el catàleg no ha canviat, es retorna 304 sense cos."
             "\n\n**Autenticació:** Opcional. Si s'envia un token d'autenticació, la resposta inclourà camps addicionals com visitants i metadades de mitjans."
         ),
         manual_parameters=[
@@ -104,6 +114,27 @@ class RefugiLliureCollectionAPIView(APIView):
                 description="Capacitat màxima de places",
                 type=openapi.TYPE_INTEGER,
                 required=False
+            ),
+            openapi.Parameter(
+                'bbox',
+                openapi.IN_QUERY,
+                description="Rectangle de cerca min_lon,min_lat,max_lon,max_lat. Els resultats s'ordenen per distància al centre",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+            openapi.Parameter(
+                'near',
+                openapi.IN_QUERY,
+                description="Centre de la cerca lat,lon (requereix radius_km). Els resultats s'ordenen per distància",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+            openapi.Parameter(
+                'radius_km',
+                openapi.IN_QUERY,
+                description="Radi de cerca en quilòmetres al voltant de near (0.1 - 500)",
+                type=openapi.TYPE_NUMBER,
+                required=False
             )
         ],
         responses={
@@ -114,6 +145,7 @@ class RefugiLliureCollectionAPIView(APIView):
                     'application/json': EXAMPLE_REFUGI_SEARCH_RESPONSE
                 }
             ),
+            304: openapi.Response(description="Catàleg sense canvis respecte a l'ETag de If-None-Match"),
             400: ERROR_400_INVALID_PARAMS,
             500: ERROR_500_INTERNAL_ERROR
         }
@@ -133,6 +165,12 @@ class RefugiLliureCollectionAPIView(APIView):
                 }, status=status.HTTP_400_BAD_REQUEST)
             
             controller = RefugiLliureController()
+            
+            # Catàleg sense filtres: si el client ja té la versió actual, 304 sense cos
+            etag = controller.get_catalogue_etag(filters_serializer.validated_data)
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            
             search_result, error = controller.search_refugis(
                 filters_serializer.validated_data,
                 is_authenticated=is_authenticated
@@ -157,7 +195,10 @@ class RefugiLliureCollectionAPIView(APIView):
                 return Response(response_serializer.data, status=status.HTTP_200_OK)
             else:
                 # Només coordenades - no necessita context d'autenticació
-                return Response(search_result, status=status.HTTP_200_OK)
+                response = Response(search_result, status=status.HTTP_200_OK)
+                if etag:
+                    response['ETag'] = etag
+                return response
             
         except Exception as e:
             logger.error(f'Error processing refugis request: {str(e)}')
@@ -165,6 +206,212 @@ class RefugiLliureCollectionAPIView(APIView):
                 'error': f'Internal server error: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+# ========== CHANGES ENDPOINT: /refuges/changes/ ==========
+
+class RefugiLliureChangesAPIView(APIView):
+    """
+    Sincronització incremental del catàleg de coordenades:
+    - GET: Refugis afegits, actualitzats i eliminats des d'una versió (no requereix autenticació)
+    """
+    permission_classes = [AllowAny]
+    
+    @swagger_auto_schema(
+        tags=['Refuges'],
+        operation_description=(
+            "Retorna els canvis del catàleg de coordenades des de la versió `since`. "
+            "\n- `added` i `updated` contenen les entrades del catàleg (id, name, surname, coord, geohash); `deleted` conté IDs. "
+            "\n- Si el registre de canvis ja no cobreix la versió demanada (s'ha compactat o és desconeguda), "
+            "es retorna el catàleg sencer a `refugis` amb `full: true`. "
+            "\n- El client ha de guardar `version` i enviar-la com a `since` a la següent sincronització."
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                'since',
+                openapi.IN_QUERY,
+                description="Versió del catàleg que té el client",
+                type=openapi.TYPE_INTEGER,
+                required=True
+            )
+        ],
+        responses={
+            200: openapi.Response(
+                description='Canvis del catàleg (o catàleg sencer si full és true)',
+                examples={
+                    'application/json': EXAMPLE_REFUGI_CHANGES_RESPONSE
+                }
+            ),
+            400: ERROR_400_INVALID_PARAMS,
+            500: ERROR_500_INTERNAL_ERROR
+        }
+    )
+    def get(self, request):
+        """Obtenir els canvis del catàleg des d'una versió"""
+        try:
+            query_serializer = RefugiChangesQuerySerializer(data=request.GET)
+            if not query_serializer.is_valid():
+                return Response({
+                    'error': 'Invalid query parameters',
+                    'details': query_serializer.errors
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            controller = RefugiLliureController()
+            changes, error = controller.get_coordinates_changes(query_serializer.validated_data['since'])
+            
+            if error:
+                return Response({
+                    'error': error
+                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            
+            return Response(changes, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            logger.error(f'Error processing refugis changes request: {str(e)}')
+            return Response({
+                'error': f'Internal server error: {str(e)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class RefugiLliureClustersAPIView(APIView):
+    """
+    Agrupació dels refugis per al mapa:
+    - GET: Agrupacions visibles per a un zoom i una àrea (no requereix autenticació)
+    """
+    permission_classes = [AllowAny]
+    
+    @swagger_auto_schema(
+        tags=['Refuges'],
+        operation_description=(
+            "Retorna els refugis de l'àrea visible agrupats per al nivell de zoom indicat. "
+            "\n- Cada agrupació té `count` i el centroide a `coord`; les que tenen un sol refugi inclouen també `id` i `name`. "
+            "\n- Les agrupacions es precalculen per a cada zoom: la mida de la resposta depèn de l'àrea visible i no del nombre de refugis. "
+            "\n- Si el bbox és massa gran per al zoom demanat, es respon amb un zoom menor (camp `zoom` de la resposta)."
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                'zoom',
+                openapi.IN_QUERY,
+                description="Nivell de zoom del mapa (0 - 16)",
+                type=openapi.TYPE_INTEGER,
+                required=True
+            ),
+            openapi.Parameter(
+                'bbox',
+                openapi.IN_QUERY,
+                description="Àrea visible min_lon,min_lat,max_lon,max_lat",
+                type=openapi.TYPE_STRING,
+                required=True
+            )
+        ],
+        responses={
+            200: openapi.Response(
+                description='Agrupacions de refugis visibles',
+                examples={
+                    'application/json': EXAMPLE_REFUGI_CLUSTERS_RESPONSE
+                }
+            ),
+            400: ERROR_400_INVALID_PARAMS,
+            500: ERROR_500_INTERNAL_ERROR
+        }
+    )
+    def get(self, request):
+        """Obtenir les agrupacions de refugis d'una àrea del mapa"""
+        try:
+            query_serializer = RefugiClustersQuerySerializer(data=request.GET)
+            if not query_serializer.is_valid():
+                return Response({
+                    'error': 'Invalid query parameters',
+                    'details': query_serializer.errors
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            controller = RefugiLliureController()
+            clusters, error = controller.get_clusters(
+                query_serializer.validated_data['zoom'],
+                query_serializer.validated_data['bbox']
+            )
+            
+            if error:
+                return Response({
+                    'error': error
+                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            
+            return Response(clusters, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            logger.error(f'Error processing refugis clusters request: {str(e)}')
+            return Response({
+                'error': f'Internal server error: {str(e)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class RefugiLliureAutocompleteAPIView(APIView):
+    """
+    Autocompletat del nom dels refugis:
+    - GET: Suggeriments de refugis per a un text parcial (no requereix autenticació)
+    """
+    permission_classes = [AllowAny]
+    
+    @swagger_auto_schema(
+        tags=['Refuges'],
+        operation_description=(
+            "Retorna els refugis el nom (o sobrenom) dels quals coincideix amb el text escrit. "
+            "\n- No distingeix accents ni majúscules: `etang` troba `Étang`. "
+            "\n- Cada paraula del text pot ser l'inici d'una paraula del nom (`refu colo` troba `Refugi de Colomers`) i es toleren errors d'ortografia. "
+            "\n- Els resultats s'ordenen per qualitat de la coincidència (camp `match`: `exact`, `prefix`, `words` o `fuzzy`)."
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                'q',
+                openapi.IN_QUERY,
+                description="Text escrit per l'usuari",
+                type=openapi.TYPE_STRING,
+                required=True
+            ),
+            openapi.Parameter(
+                'limit',
+                openapi.IN_QUERY,
+                description="Nombre màxim de suggeriments (1 - 50, per defecte 10)",
+                type=openapi.TYPE_INTEGER,
+                required=False
+            )
+        ],
+        responses={
+            200: openapi.Response(
+                description='Suggeriments de refugis',
+                examples={
+                    'application/json': EXAMPLE_REFUGI_AUTOCOMPLETE_RESPONSE
+                }
+            ),
+            400: ERROR_400_INVALID_PARAMS,
+            500: ERROR_500_INTERNAL_ERROR
+        }
+    )
+    def get(self, request):
+        """Obtenir suggeriments de refugis per al text escrit"""
+        try:
+            query_serializer = RefugiAutocompleteQuerySerializer(data=request.GET)
+            if not query_serializer.is_valid():
+                return Response({
+                    'error': 'Invalid query parameters',
+                    'details': query_serializer.errors
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            controller = RefugiLliureController()
+            suggestions, error = controller.autocomplete(
+                query_serializer.validated_data['q'],
+                query_serializer.validated_data['limit']
+            )
+            
+            if error:
+                return Response({
+                    'error': error
+                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            
+            return Response(suggestions, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            logger.error(f'Error processing refugis autocomplete request: {str(e)}')
+            return Response({
+                'error': f'Internal server error: {str(e)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 # ========== ITEM ENDPOINT: /refugis/{id}/ ==========
 
 class RefugiLliureDetailAPIView(APIView):
@@ -180,6 +427,7 @@ class RefugiLliureDetailAPIView(APIView):
             "Obté els detalls complets d'un refugi específic per ID. "
             "\nRetorna informació completa del refugi incloent nom, descripció, coordenades, "
             "dificultats, rutes properes i altres detalls. "
+            "\nLa resposta inclou una capçalera ETag: si s'envia a If-None-Match i el refugi no ha canviat, es retorna 304 sense cos. "
             "\n\n**Autenticació:** Opcional. Si s'envia un token d'autenticació, la resposta inclourà camps addicionals com visitants i metadades de mitjans."
         ),
         manual_parameters=[
@@ -199,6 +447,7 @@ class RefugiLliureDetailAPIView(APIView):
                     'application/json': EXAMPLE_REFUGI_COLOMERS_DETAILED
                 }
             ),
+            304: openapi.Response(description="Refugi sense canvis respecte a l'ETag de If-None-Match"),
             404: ERROR_404_REFUGI_NOT_FOUND,
             500: ERROR_500_INTERNAL_ERROR
         }
@@ -210,6 +459,12 @@ class RefugiLliureDetailAPIView(APIView):
             is_authenticated = request.user and hasattr(request.user, 'is_authenticated') and request.user.is_authenticated
             
             controller = RefugiLliureController()
+            
+            # Si el client ja té la versió actual del refugi, 304 sense serialitzar-lo
+            etag = controller.get_refugi_etag(id, is_authenticated=is_authenticated)
+            if etag_matches(request, etag):
+                return not_modified(etag, vary='Authorization')
+            
             refugi, error = controller.get_refugi_by_id(id, is_authenticated=is_authenticated)
             
             if error:
@@ -227,7 +482,11 @@ class RefugiLliureDetailAPIView(APIView):
             
             # Serialitzar el refugi passant el context d'autenticació
             serializer = RefugiSerializer(refugi_dict, context={'is_authenticated': is_authenticated})
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            response = Response(serializer.data, status=status.HTTP_200_OK)
+            if etag:
+                response['ETag'] = etag
+                patch_vary_headers(response, ['Authorization'])
+            return response
             
         except Exception as e:
             logger.error(f'Error processing refugis request: {str(e)}')
@@ -64,6 +64,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestCostMiddleware',  # Server-Timing i log d'accés amb el cost de la petició
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -194,13 +195,69 @@ CACHES = {
                 'max_connections': 50,
                 'retry_on_timeout': True
             },
-            'COMPRESSOR': 'django_redis.compressors.zlib.ZlibCompressor',
+            # Serialització msgpack + compressió amb capçalera de versió (veure api/services/cache_codec.py)
+            'SERIALIZER': 'api.services.cache_codec.CodecSerializer',
+            'COMPRESSOR': 'django_redis.compressors.identity.IdentityCompressor',
         },
         'KEY_PREFIX': 'refugis',
         'TIMEOUT': 300,  # 5 minuts per defecte
     }
 }
 
+# Codec dels valors de Redis: msgpack (pickle per als tipus no suportats) i compressió
+# a partir de COMPRESS_MIN_SIZE bytes. 'auto' tria zstd > lz4 > zlib segons el que estigui instal·lat
+CACHE_CODEC = {
+    'SERIALIZER': os.environ.get('CACHE_CODEC_SERIALIZER', 'msgpack'),
+    'COMPRESSION': os.environ.get('CACHE_CODEC_COMPRESSION', 'auto'),
+    'COMPRESS_MIN_SIZE': int(os.environ.get('CACHE_CODEC_COMPRESS_MIN_SIZE', '512')),
+    'LEVEL': None,
+}
+
+# Cache L1 en memòria de cada worker davant de Redis (veure CacheService)
+# La invalidació entre workers es fa amb un comptador de generació guardat a Redis
+CACHE_L1 = {
+    'ENABLED': os.environ.get('CACHE_L1_ENABLED', 'true').lower() == 'true',
+    'MAX_ENTRIES': int(os.environ.get('CACHE_L1_MAX_ENTRIES', '2048')),
+    'MAX_TTL': 60,
+    'GENERATION_CHECK_INTERVAL': 1.0,
+    'PREFIXES': ['refugi_coords', 'refugi_detail'],
+}
+
+
+# Protecció contra stampedes de CacheService.get_or_compute (llistes, cerques i coordenades):
+# un sol worker recalcula cada clau i la resta serveix el valor anterior durant STALE_TTL segons
+CACHE_STAMPEDE = {
+    'STALE_TTL': int(os.environ.get('CACHE_STALE_TTL', '120')),
+    'EARLY_REFRESH_BETA': 1.0,
+    'LOCK_TIMEOUT': 30,
+    'WAIT_TIMEOUT': 5.0,
+    'WAIT_INTERVAL': 0.05,
+}
+
+# Mètriques de la cache per prefix (hits, misses, bytes i latència), agregades entre workers
+# en un hash de Redis cada FLUSH_INTERVAL segons (veure /api/cache/stats/)
+CACHE_METRICS = {
+    'ENABLED': os.environ.get('CACHE_METRICS_ENABLED', 'true').lower() == 'true',
+    'FLUSH_INTERVAL': 10,
+    'BUCKETS': [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0],
+}
+
+# Cost per petició (lectures/escriptures de Firestore, cache i R2) a Server-Timing i al log d'accés
+REQUEST_COST = {
+    'ENABLED': os.environ.get('REQUEST_COST_ENABLED', 'true').lower() == 'true',
+    'SERVER_TIMING': os.environ.get('REQUEST_COST_SERVER_TIMING', 'true').lower() == 'true',
+    'ACCESS_LOG': os.environ.get('REQUEST_COST_ACCESS_LOG', 'true').lower() == 'true',
+}
+
+# Cache de tokens d'ID de Firebase verificats (veure TokenCacheService)
+# Els certificats de Google es refresquen en segon pla (desactivat durant els tests)
+AUTH_TOKEN_CACHE = {
+    'ENABLED': os.environ.get('AUTH_TOKEN_CACHE_ENABLED', 'true').lower() == 'true',
+    'MAX_ENTRIES': int(os.environ.get('AUTH_TOKEN_CACHE_MAX_ENTRIES', '10000')),
+    'MAX_TTL': 3600,
+    'CERT_PREFETCH': os.environ.get('AUTH_CERT_PREFETCH', 'true').lower() == 'true',
+    'CERT_PREFETCH_INTERVAL': 300,
+}
 
 
 # Logging configuration: enable INFO logs for cache and firestore access tracing
@@ -247,6 +304,12 @@ LOGGING = {
             'level': DAO_LEVEL,
             'propagate': False,
         },
+        # One JSON line per request with its Firestore/cache/R2 cost (RequestCostMiddleware)
+        'api.access': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
         # Fallback for whole api package
         'api': {
             'handlers': ['console'],
@@ -275,4 +338,6 @@ SWAGGER_SETTINGS = {
 CRONJOBS = [
     # Processa les visites d'ahir cada dia a les 3:00 AM (hora de Madrid)
     ('0 3 * * *', 'django.core.management.call_command', ['process_yesterday_visits'], {'verbosity': 1}),
+    # Compacta el registre de canvis del catàleg de coordenades cada dilluns a les 4:00 AM
+    ('0 4 * * 1', 'django.core.management.call_command', ['compact_coords_changes'], {'verbosity': 1}),
 ]